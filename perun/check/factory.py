@@ -1,5 +1,6 @@
 """Collection of global methods for detection of performance changes"""
 
+import concurrent.futures
 import contextlib
 import os
 
@@ -73,18 +74,21 @@ def pre_collect_profiles(minor_version):
         pre_collect_profiles.minor_version_cache.add(minor_version.checksum)
 
 
-def degradation_in_minor(minor_version, quiet=False):
-    """Checks for degradation according to the profiles stored for the given minor version.
+def pair_profiles_with_baselines(minor_version):
+    """Pairs the profiles of the minor version with the profiles of the same configuration
+    registered in the nearest predecessor minor versions.
 
-    :param str minor_version: representation of head point of degradation checking
-    :param bool quiet: if set to true then nothing will be printed
-    :returns: list of found changes
+    The predecessors (baselines) are walked in BFS manner, until all of the profiles of the
+    minor version (targets) are paired or there are no predecessors left.
+
+    :param str minor_version: target minor version, whose profiles are paired
+    :returns: iterable stream of pairs of baseline minor version info and the list of pairs
+        (baseline profile, target profile) of the same configuration
     """
     minor_version_info = vcs.get_minor_version_info(minor_version)
     baseline_version_queue = minor_version_info.parents
     pre_collect_profiles(minor_version_info)
     target_profile_queue = profiles_to_queue(minor_version)
-    detected_changes = []
     while target_profile_queue and baseline_version_queue:
         # Pop the nearest baseline
         baseline = baseline_version_queue.pop(0)
@@ -96,23 +100,35 @@ def degradation_in_minor(minor_version, quiet=False):
         # Precollect profiles if this is set
         pre_collect_profiles(baseline_info)
 
-        # Print header if there is at least some profile to check against
+        # Pair the profiles of the same configuration
         baseline_profiles = profiles_to_queue(baseline)
-
-        # Iterate through the profiles and check degradation between those of same configuration
+        profile_pairs = []
         for baseline_config, baseline_profile in baseline_profiles.items():
             target_profile = target_profile_queue.get(baseline_config)
-            cmdstr = profiles.config_tuple_to_cmdstr(baseline_config)
             if target_profile:
-                # Print information about configuration
-                # and extend the list of the detected changes including the configuration
-                # and source minor version.
-                detected_changes.extend([
-                    (deg, cmdstr, baseline_info.checksum) for deg in
-                    degradation_between_profiles(baseline_profile, target_profile)
-                    if deg.result != PerformanceChange.NoChange
-                ])
+                profile_pairs.append((baseline_profile, target_profile))
                 del target_profile_queue[target_profile.config_tuple]
+        yield baseline_info, profile_pairs
+
+
+def degradation_in_minor(minor_version, quiet=False):
+    """Checks for degradation according to the profiles stored for the given minor version.
+
+    :param str minor_version: representation of head point of degradation checking
+    :param bool quiet: if set to true then nothing will be printed
+    :returns: list of found changes
+    """
+    detected_changes = []
+    for baseline_info, profile_pairs in pair_profiles_with_baselines(minor_version):
+        # Check degradation between those of same configuration and extend the list of the
+        # detected changes including the configuration and source minor version.
+        for baseline_profile, target_profile in profile_pairs:
+            cmdstr = profiles.config_tuple_to_cmdstr(baseline_profile.config_tuple)
+            detected_changes.extend([
+                (deg, cmdstr, baseline_info.checksum) for deg in
+                degradation_between_profiles(baseline_profile, target_profile)
+                if deg.result != PerformanceChange.NoChange
+            ])
 
         # Store the detected degradation
         store.save_degradation_list_for(pcs.get_object_directory(), minor_version, detected_changes)
@@ -123,12 +139,20 @@ def degradation_in_minor(minor_version, quiet=False):
 
 @decorators.print_elapsed_time
 @decorators.phase_function('check whole repository')
-def degradation_in_history(head):
+def degradation_in_history(head, jobs=1):
     """Walks through the minor version starting from the given head, checking for degradation.
 
+    If more than one job is requested, then the pairs of profiles are first collected for the
+    whole history and checked in parallel by the pool of processes (see
+    :func:`degradation_in_history_in_parallel`).
+
     :param str head: starting point of the checked history for degradation.
+    :param int jobs: number of processes checking the pairs of profiles in parallel
     :returns: tuple (degradation result, degradation location, degradation rate)
     """
+    if jobs > 1:
+        return degradation_in_history_in_parallel(head, jobs)
+
     detected_changes = []
     with log.History(head) as history:
         for minor_version in vcs.walk_minor_versions(head):
@@ -144,6 +168,82 @@ def degradation_in_history(head):
     return detected_changes
 
 
+def degradation_between_stored_profiles(baseline_path, target_path):
+    """Checks the pair of profiles stored in objects in the process of pool
+
+    :param str baseline_path: path to the object of the baseline profile
+    :param str target_path: path to the object of the target profile
+    :returns list: list of detected changes (without those without change)
+    """
+    baseline_profile = profiles.load_profile_from_file(baseline_path, False)
+    target_profile = profiles.load_profile_from_file(target_path, False)
+    return [
+        deg for deg in degradation_between_profiles(baseline_profile, target_profile)
+        if deg.result != PerformanceChange.NoChange
+    ]
+
+
+def degradation_in_history_in_parallel(head, jobs):
+    """Walks through the minor versions starting from the given head and checks for degradation
+    between the pairs of profiles in parallel.
+
+    First the history is walked and the profiles of each minor version are paired with their
+    baselines (and precollected, if this is set). Then all of the pairs are submitted to the pool
+    of processes and the results are gathered back in the order of the history, so they are
+    printed and stored for each minor version in the same way as by sequential checking.
+
+    :param str head: starting point of the checked history for degradation.
+    :param int jobs: number of processes checking the pairs of profiles in parallel
+    :returns: list of found changes
+    """
+    minor_versions = list(vcs.walk_minor_versions(head))
+    paired_profiles = [
+        list(pair_profiles_with_baselines(minor_version.checksum))
+        for minor_version in minor_versions
+    ]
+
+    detected_changes = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        # Submit all of the checks upfront, so the pool is never waiting for printing of results
+        submitted_checks = []
+        for minor_version_pairs in paired_profiles:
+            minor_version_checks = []
+            for baseline_info, profile_pairs in minor_version_pairs:
+                minor_version_checks.append((baseline_info, [
+                    (
+                        profiles.config_tuple_to_cmdstr(baseline_profile.config_tuple),
+                        executor.submit(
+                            degradation_between_stored_profiles,
+                            baseline_profile.realpath, target_profile.realpath
+                        )
+                    ) for baseline_profile, target_profile in profile_pairs
+                ]))
+            submitted_checks.append(minor_version_checks)
+
+        with log.History(head) as history:
+            for minor_version, minor_version_checks in zip(minor_versions, submitted_checks):
+                history.progress_to_next_minor_version(minor_version)
+                newly_detected_changes = []
+                for baseline_info, baseline_checks in minor_version_checks:
+                    for cmdstr, check in baseline_checks:
+                        newly_detected_changes.extend([
+                            (deg, cmdstr, baseline_info.checksum) for deg in check.result()
+                        ])
+                    store.save_degradation_list_for(
+                        pcs.get_object_directory(), minor_version.checksum, newly_detected_changes
+                    )
+                log.print_short_change_string(
+                    log.count_degradations_per_group(newly_detected_changes)
+                )
+                history.finish_minor_version(minor_version, newly_detected_changes)
+                log.print_list_of_degradations(newly_detected_changes)
+                detected_changes.extend(newly_detected_changes)
+                history.flush(with_border=True)
+    print("")
+    log.print_short_summary_of_degradations(detected_changes)
+    return detected_changes
+
+
 def degradation_between_profiles(baseline_profile, target_profile):
     """Checks between pair of (baseline, target) profiles, whether the can be degradation detected
 
@@ -575,9 +575,29 @@ def status(**kwargs):
         perun_log.error(str(exception))
 
 
+@cli.command()
+def gc():
+    """Packs loose objects of profiles into pack with sorted index.
+
+    Bundles all of the loose objects of profiles stored in ``.perun/objects``
+    into the new pack file stored in ``.perun/objects/pack``, along with index
+    of the pack with checksums of objects sorted for fast lookup. Profiles of
+    the same configuration (i.e. collected by the same collector for the same
+    command, arguments and workload and postprocessed by the same
+    postprocessors) are delta compressed against each other.
+
+    Packed profiles are loaded transparently, as if they were stored as loose
+    objects.
+    """
+    try:
+        commands.gc()
+    except NotPerunRepositoryException as exception:
+        perun_log.error(str(exception))
+
+
 @cli.group()
 @click.argument('profile', required=True, metavar='<profile>',
-                callback=cli_helpers.lookup_any_profile_callback)
+                callback=cli_helpers.lookup_any_profile_file_callback)
 @click.option('--minor', '-m', nargs=1, default=None, is_eager=True,
               callback=cli_helpers.lookup_minor_version_callback,
               help='Will check the index of different minor version <hash>'
@@ -627,7 +647,12 @@ def show(ctx, profile, **_):
     For a thorough list and description of supported visualization techniques
     refer to :ref:`views-list`.
     """
-    ctx.obj = profile
+    # Views processing the profile in one pass stream the resources from the file
+    view = ctx.command.get_command(ctx, ctx.invoked_subcommand)
+    if getattr(view.callback, 'is_lazy_view', False):
+        ctx.obj = profiles.load_lazy_profile_from_file(*profile)
+    else:
+        ctx.obj = profiles.load_profile_from_file(*profile)
 
 
 @cli.group()
@@ -783,6 +808,8 @@ def run(ctx, **kwargs):
 @click.pass_context
 @click.option('--without-vcs-history', '-q', 'quiet', is_flag=True, default=False,
               help="Will not print the VCS history tree during the collection of the data.")
+@click.option('--jobs', '-j', type=click.IntRange(min=1), default=1,
+              help="Runs the jobs of the matrix in parallel by <jobs> processes.")
 def matrix(ctx, quiet, **kwargs):
     """Runs the jobs matrix specified in the local.yml configuration.
 
@@ -800,6 +827,11 @@ def matrix(ctx, quiet, **kwargs):
     Refer to :doc:`jobs` and :ref:`jobs-matrix` for more details how to specify
     the job matrix inside local configuration and to :doc:`config` how to work
     with Perun's configuration files.
+
+    With ``--jobs`` the jobs are collected in parallel, each in its own temporary working
+    directory, while the collected profiles are postprocessed by separate processes. Jobs of
+    collectors, which do not declare themselves safe to run concurrently (e.g. ``time``), are
+    collected first one by one.
     """
     kwargs.update({'minor_version_list': ctx.obj['minor_version_list']})
     kwargs.update({'with_history': not quiet})
@@ -1012,7 +1044,9 @@ def check_head(head_minor='HEAD'):
 @check_group.command('all')
 @click.argument('minor_head', required=False, metavar='<hash>', nargs=1,
                 callback=cli_helpers.lookup_minor_version_callback, default='HEAD')
-def check_all(minor_head='HEAD'):
+@click.option('--jobs', '-j', type=click.IntRange(min=1), default=1,
+              help='Checks the pairs of profiles in parallel by <jobs> processes.')
+def check_all(minor_head='HEAD', jobs=1):
     """Checks for changes in performance for the specified interval of version history.
 
     The commands crawls through the whole history of project versions starting from the specified
@@ -1020,9 +1054,13 @@ def check_all(minor_head='HEAD'):
     tries to find a suitable predecessor profile (corresponding to some `baseline` minor version)
     and runs the performance check according to the set of strategies set in the configuration
     (see :ref:`degradation-config` or :doc:`config`).
+
+    With ``--jobs`` the pairs of profiles are collected for the whole history first and are then
+    checked in parallel by the given number of processes. The results are still reported in the
+    order of the history.
     """
     print("[!] Running the degradation checks on the whole VCS history. This might take a while!\n")
-    check.degradation_in_history(minor_head)
+    check.degradation_in_history(minor_head, jobs)
 
 
 @check_group.command('profiles')
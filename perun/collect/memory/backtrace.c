@@ -8,16 +8,18 @@
  */
 #define UNW_LOCAL_ONLY
 #include <stdio.h>
+#include <stdint.h>
 #include <libunwind.h>
 
 const int SYMBOL_LEN = 256;
 
-void backtrace(FILE *log, unsigned skip){
+void backtrace(FILE *log, unsigned skip, unsigned max){
 
    unw_cursor_t cursor;
    unw_context_t context;
    unw_word_t ip, offset;
    int ret = 0;
+   unsigned logged = 0;
 
 //Initialize cursor to current frame for local unwinding.
    if(unw_getcontext(&context) != 0){
@@ -30,7 +32,7 @@ void backtrace(FILE *log, unsigned skip){
    }
 
 //Unwinding frames one by one, down througt the stack.
-   while(unw_step(&cursor) > 0){
+   while((!max || logged < max) && unw_step(&cursor) > 0){
 
       char symbol[SYMBOL_LEN];
 
@@ -45,6 +47,8 @@ void backtrace(FILE *log, unsigned skip){
       if(ip == 0)
          break;
 
+      logged++;
+
    //Obtain symbol name
       ret = unw_get_proc_name(&cursor, symbol, SYMBOL_LEN, &offset);
       if(ret != 0){
@@ -61,4 +65,32 @@ void backtrace(FILE *log, unsigned skip){
          fprintf(log, "%s 0x%lx\n", symbol, ip);
       }
    }
+}
+
+unsigned backtrace_ips(uint64_t *ips, unsigned max, unsigned skip){
+
+   unw_cursor_t cursor;
+   unw_context_t context;
+   unw_word_t ip;
+   unsigned frames = 0;
+
+//Initialize cursor to current frame for local unwinding.
+   if(unw_getcontext(&context) != 0 || unw_init_local(&cursor, &context) != 0){
+      fprintf(stderr, "error: unw_getcontext\n");
+      return 0;
+   }
+
+//Unwinding frames one by one, storing only the instruction pointers.
+   while(frames < max && unw_step(&cursor) > 0){
+      if(skip > 0){
+         skip--;
+         continue;
+      }
+      if(unw_get_reg(&cursor, UNW_REG_IP, &ip) != 0)
+         fprintf(stderr, "error: unw_get_reg (IP)\n");
+      if(ip == 0)
+         break;
+      ips[frames++] = ip;
+   }
+   return frames;
 }
\ No newline at end of file
@@ -1,11 +1,27 @@
 #ifndef BACKTRACE_H
 #define BACKTRACE_H
 
+#include <stdio.h>
+#include <stdint.h>
+
+// Maximal number of frames of the backtrace stored by backtrace_ips()
+#define MAX_FRAMES 32
+
 /** Function writes stack trace metadata into log file.
  * 
  *  @param log  File descriptor of the log file
  *  @param skip number of calls to omit in log
+ *  @param max  maximal number of logged calls (0 for the whole stack trace)
+ */
+void backtrace(FILE *log, unsigned skip, unsigned max);
+
+/** Function stores instruction pointers of the stack trace without resolving the symbols.
+ *
+ *  @param ips  array for the instruction pointers
+ *  @param max  maximal number of stored instruction pointers
+ *  @param skip number of calls to omit
+ *  @return number of stored instruction pointers
  */
-void backtrace(FILE *log, unsigned skip);
+unsigned backtrace_ips(uint64_t *ips, unsigned max, unsigned skip);
 
 #endif /* BACKTRACE_H */
\ No newline at end of file
@@ -1,5 +1,6 @@
 """This module provides methods for filtering the profile"""
 import perun.collect.memory.parsing as parsing
+import perun.profile.stacks as stacks
 
 __author__ = "Radim Podola"
 
@@ -23,6 +24,9 @@ def remove_allocators(profile):
 def trace_filter(profile, function, source):
     """ Remove records in trace section matching source or function
 
+        The traces are filtered in the table of stacks of the profile (see
+        :mod:`perun.profile.stacks`), hence each unique trace is filtered only once.
+
     :param dict profile: dictionary including "snapshots" and "global" sections in the profile
     :param list function: list of "function" records to omit
     :param list source: list of "source" records to omit
@@ -33,16 +37,17 @@ def trace_filter(profile, function, source):
         return (call['source'] not in source and
                 call['function'] not in function)
 
-    snapshots = profile['snapshots']
-    for snapshot in snapshots:
-
-        resources = snapshot['resources']
-        for res in resources:
-            # removing call records
-            res['trace'] = [call for call in res['trace']
-                            if determinate(call)]
-            # updating "uid"
-            res['uid'] = parsing.parse_allocation_location(res['trace'])
+    table, stack_map = stacks.intern_traces(profile).filter(determinate)
+    profile['stacks'] = table.nodes
+
+    uids = {}
+    for res in stacks.resources_of(profile):
+        # removing call records
+        stack_id = res['trace_id'] = stack_map[res['trace_id']]
+        # updating "uid"
+        if stack_id not in uids:
+            uids[stack_id] = parsing.parse_allocation_location(table.trace(stack_id))
+        res['uid'] = uids[stack_id]
 
     return profile
 
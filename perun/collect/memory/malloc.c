@@ -13,21 +13,66 @@
  */
 #define _GNU_SOURCE
 #include <dlfcn.h> //dlsym()
+#include <link.h> //dl_iterate_phdr()
 #include <stdio.h>
 #include <stdlib.h>
+#include <string.h>
+#include <stdint.h>
 #include <time.h> //clock()
 #include <stdbool.h>
+#include <math.h> //log(), exp()
 
 #include "backtrace.h"
 
 // File name of the log file
 #define LOG_FILE_NAME "MemoryLog"
+// Environment variable, which selects the format of the log file ("text" or "binary")
+#define LOG_FORMAT_VARIABLE "PERUN_MEMORY_LOG_FORMAT"
+// Environment variable, which sets the mean number of bytes between the sampled allocations
+// (unset or 0 logs every allocation)
+#define SAMPLE_BYTES_VARIABLE "PERUN_MEMORY_SAMPLE_BYTES"
+// Environment variable, which limits the number of frames of the logged backtraces
+// (unset or 0 logs the whole backtraces)
+#define MAX_DEPTH_VARIABLE "PERUN_MEMORY_MAX_DEPTH"
+// Allocator id of the record that marks the end of the binary log
+#define EXIT_ALLOCATOR 255
+// Allocator id of the record that holds the address range and the load bias of the profiled binary
+#define MODULE_ALLOCATOR 254
+// Number of bits of the slots of the set of sampled addresses
+#define SAMPLED_SET_BITS 20
+#define SAMPLED_SET_SIZE (1UL << SAMPLED_SET_BITS)
+#define SAMPLED_SET_MASK (SAMPLED_SET_SIZE - 1)
 // 0 - full backtrace log
 // 1 - omitting function log_allocation() from backtrace log
 // 2 - omitting allocation functions from backtrace log
 #define CALLS_TO_SKIP 1
 
 static FILE *logFile = NULL;
+static bool binaryLog = false;
+static double sampleBytes = 0;
+static unsigned maxDepth = 0;
+
+/* Ids of the allocators used in the binary log */
+enum allocator_id {
+    MALLOC, FREE, REALLOC, CALLOC, MEMALIGN, POSIX_MEMALIGN, VALLOC, ALIGNED_ALLOC
+};
+static const char *allocator_names[] = {
+    "malloc", "free", "realloc", "calloc", "memalign", "posix_memalign", "valloc", "aligned_alloc"
+};
+
+/**
+ * Fixed-size record of single allocation in the binary log. The unused instruction pointers are
+ * zeroed, so the records can be decoded at once as an array of records.
+ */
+struct binary_record {
+    double time;
+    uint64_t size;
+    uint64_t ptr;
+    double weight;
+    uint32_t allocator;
+    uint32_t frames;
+    uint64_t ips[MAX_FRAMES];
+};
 
 __thread unsigned int mutex = 0;
 
@@ -48,6 +93,123 @@ void unlock_mutex() {
     __sync_fetch_and_sub(&mutex, 1);
 }
 
+/*
+ * Sampling of the allocations, courtesy of the heap sampling of tcmalloc.
+ *
+ * Each thread counts down the allocated bytes until the next sample, where the distances between
+ * the samples are drawn from the exponential distribution with the mean of sampleBytes. Hence,
+ * the allocation of size bytes is sampled with the probability 1 - exp(-size / sampleBytes) and
+ * its logged weight is the inverse of this probability, so the parser can scale the amounts back.
+ * The addresses of the sampled allocations are kept in the set, so only their frees are logged.
+ */
+__thread double bytesUntilSample = -1;
+__thread uint64_t randomState = 0;
+
+static uintptr_t sampledSet[SAMPLED_SET_SIZE];
+static unsigned long sampledCount = 0;
+static int sampledSetLock = 0;
+
+/**
+ * Returns the next pseudo-random number of the thread (using the xorshift64* generator)
+ *
+ * @return: the random number in the interval (0, 1]
+ */
+double next_random() {
+    if(randomState == 0) {
+        randomState = ((uint64_t)(uintptr_t)&randomState ^ (uint64_t)time(NULL)) | 1;
+    }
+    randomState ^= randomState >> 12;
+    randomState ^= randomState << 25;
+    randomState ^= randomState >> 27;
+    return ((randomState * 0x2545F4914F6CDD1DULL >> 11) + 1) / 9007199254740992.0;
+}
+
+/**
+ * Decides whether the allocation is sampled.
+ *
+ * @param size: size of the allocated data
+ * @return: weight of the sampled allocation or 0 if the allocation is not sampled
+ */
+double sample_allocation(size_t size) {
+    if(bytesUntilSample < 0) {
+        bytesUntilSample = -log(next_random()) * sampleBytes;
+    }
+    bytesUntilSample -= size;
+    if(bytesUntilSample >= 0) {
+        return 0;
+    }
+    bytesUntilSample = -log(next_random()) * sampleBytes;
+    double probability = 1 - exp(-(double)size / sampleBytes);
+    return probability > 0 ? 1 / probability : 1;
+}
+
+void lock_sampled_set() {
+    while(__sync_lock_test_and_set(&sampledSetLock, 1));
+}
+
+void unlock_sampled_set() {
+    __sync_lock_release(&sampledSetLock);
+}
+
+/**
+ * @param ptr: the sampled address
+ * @return: the home slot of the address in the set of sampled addresses
+ */
+size_t sampled_slot(uintptr_t ptr) {
+    return (size_t)(((uint64_t)ptr * 0x9E3779B97F4A7C15ULL) >> (64 - SAMPLED_SET_BITS));
+}
+
+/**
+ * Adds the address to the set of sampled addresses (using linear probing). The set is filled at
+ * most to the half, further addresses are not added and hence their frees are not logged.
+ *
+ * @param ptr: the sampled address
+ */
+void insert_sampled(void *ptr) {
+    uintptr_t address = (uintptr_t)ptr;
+    lock_sampled_set();
+    size_t slot = sampled_slot(address);
+    while(sampledSet[slot] && sampledSet[slot] != address) {
+        slot = (slot + 1) & SAMPLED_SET_MASK;
+    }
+    if(!sampledSet[slot] && sampledCount < SAMPLED_SET_SIZE / 2) {
+        sampledSet[slot] = address;
+        ++sampledCount;
+    }
+    unlock_sampled_set();
+}
+
+/**
+ * Removes the address from the set of sampled addresses (shifting back the following addresses).
+ *
+ * @param ptr: the freed address
+ * @return: true if the address was sampled
+ */
+bool remove_sampled(void *ptr) {
+    uintptr_t address = (uintptr_t)ptr;
+    lock_sampled_set();
+    size_t slot = sampled_slot(address);
+    while(sampledSet[slot] && sampledSet[slot] != address) {
+        slot = (slot + 1) & SAMPLED_SET_MASK;
+    }
+    bool is_sampled = sampledSet[slot] != 0;
+    if(is_sampled) {
+        size_t next = slot;
+        while(sampledSet[next = (next + 1) & SAMPLED_SET_MASK]) {
+            // Move the address to the freed slot, unless its home slot is cyclically after it
+            size_t home = sampled_slot(sampledSet[next]);
+            if(((next - home) & SAMPLED_SET_MASK) >= ((next - slot) & SAMPLED_SET_MASK)) {
+                sampledSet[slot] = sampledSet[next];
+                slot = next;
+            }
+        }
+        sampledSet[slot] = 0;
+        --sampledCount;
+    }
+    unlock_sampled_set();
+    return is_sampled;
+}
+
 /* Pointers to original allocation/free functions */
 static void *(*real_malloc)(size_t) = NULL;
 static void  (*real_free)(void*) = NULL;
@@ -109,13 +271,59 @@ void* dummy_calloc(size_t nmemb, size_t size) {
  */
 void dummy_free(void *ptr) {}
 
+/**
+ * Callback of dl_iterate_phdr(), which stores the address range of the loaded segments and the load
+ * bias of the first module, i.e. of the profiled binary, and stops the iteration.
+ *
+ * @param info: the loaded module
+ * @param size: size of the info structure
+ * @param data: array of the start, end and load bias of the module
+ * @return: nonzero value to stop the iteration
+ */
+int find_binary_module(struct dl_phdr_info *info, size_t size, void *data){
+    uint64_t *module = data;
+    (void)size;
+    module[0] = UINT64_MAX;
+    module[1] = 0;
+    module[2] = (uint64_t)info->dlpi_addr;
+    for(unsigned i = 0; i < info->dlpi_phnum; i++) {
+        if(info->dlpi_phdr[i].p_type == PT_LOAD) {
+            uint64_t start = (uint64_t)(info->dlpi_addr + info->dlpi_phdr[i].p_vaddr);
+            uint64_t end = start + (uint64_t)info->dlpi_phdr[i].p_memsz;
+            module[0] = start < module[0] ? start : module[0];
+            module[1] = end > module[1] ? end : module[1];
+        }
+    }
+    return 1;
+}
+
+/**
+ * Writes the address range and the load bias of the profiled binary to the log, so the parser can
+ * translate the logged instruction pointers to the offsets in the binary (which do not depend on
+ * the address space layout randomization).
+ */
+void log_module(){
+    uint64_t module[3] = {0, 0, 0};
+    dl_iterate_phdr(find_binary_module, module);
+    if(binaryLog) {
+        struct binary_record record = {0};
+        record.allocator = MODULE_ALLOCATOR;
+        record.frames = 3;
+        memcpy(record.ips, module, sizeof(module));
+        fwrite(&record, sizeof(record), 1, logFile);
+    } else {
+        fprintf(logFile, "MODULE 0x%llx 0x%llx 0x%llx\n\n", (unsigned long long)module[0],
+                (unsigned long long)module[1], (unsigned long long)module[2]);
+    }
+}
+
 /**
  * Initialization of the shared library.
  *
  * During the initialization we first set allocators to its dummy version, in case dlsym() or other
  * function needs to allocate any data. Then we try to use dlsym() to dynamically load original
  * versions of allocators. If we are successful we set the real_ pointers to these original version.
- * At last the log is initialized.
+ * At last the log is initialized and the address range of the profiled binary is logged.
  */
 __attribute__ ((constructor)) void initialize (void) {
     lock_mutex();
@@ -152,11 +360,18 @@ __attribute__ ((constructor)) void initialize (void) {
     real_aligned_alloc =  temp_aligned_alloc;
 
     if(!logFile) {
-       logFile = fopen(LOG_FILE_NAME, "w");
+       const char *log_format = getenv(LOG_FORMAT_VARIABLE);
+       binaryLog = log_format != NULL && strcmp(log_format, "binary") == 0;
+       const char *sample_bytes = getenv(SAMPLE_BYTES_VARIABLE);
+       sampleBytes = sample_bytes != NULL ? atof(sample_bytes) : 0;
+       const char *max_depth = getenv(MAX_DEPTH_VARIABLE);
+       maxDepth = max_depth != NULL ? (unsigned)atoi(max_depth) : 0;
+       logFile = fopen(LOG_FILE_NAME, binaryLog ? "wb" : "w");
        if(logFile == NULL){
           fprintf(stderr, "error: fopen()\n");
           exit(EXIT_FAILURE);
        }
+       log_module();
     }
     unlock_mutex();
 }
@@ -167,25 +382,75 @@ __attribute__ ((constructor)) void initialize (void) {
  */
 __attribute__((destructor)) void finalize (void) {
     if(logFile != NULL){
-        fprintf(logFile, "EXIT %fs\n", clock() / (double)CLOCKS_PER_SEC);
+        if(binaryLog) {
+            struct binary_record record = {0};
+            record.time = clock() / (double)CLOCKS_PER_SEC;
+            record.allocator = EXIT_ALLOCATOR;
+            fwrite(&record, sizeof(record), 1, logFile);
+        } else {
+            fprintf(logFile, "EXIT %fs\n", clock() / (double)CLOCKS_PER_SEC);
+        }
         fclose(logFile);
     }
 }
 
 /**
- * Writes single allocation metadata to the log file.
+ * Writes single allocation metadata to the binary log file as a fixed-size record with the
+ * instruction pointers of the backtrace (the symbols are resolved when the log is parsed).
+ *
+ * @param allocator: id of the allocator that did the allocation
+ * @param size: size of the allocated data
+ * @param ptr: pointer to the allocated data
+ * @param weight: weight of the sampled allocation
+ **/
+void log_binary_allocation(enum allocator_id allocator, size_t size, void *ptr, double weight){
+    struct binary_record record;
+    memset(record.ips, 0, sizeof(record.ips));
+    record.time = clock() / (double)CLOCKS_PER_SEC;
+    record.size = size;
+    record.ptr = (uint64_t)(uintptr_t)ptr;
+    record.weight = weight;
+    record.allocator = allocator;
+    // Skip also this function in the backtrace
+    record.frames = backtrace_ips(
+        record.ips, maxDepth && maxDepth < MAX_FRAMES ? maxDepth : MAX_FRAMES, CALLS_TO_SKIP + 1
+    );
+    fwrite(&record, sizeof(record), 1, logFile);
+}
+
+/**
+ * Writes single allocation metadata to the log file. If the sampling is enabled, only the sampled
+ * allocations (with their weights) and the frees of the sampled allocations are written.
  *
- * @param allocator: name of the allocator that did the allocation
+ * @param allocator: id of the allocator that did the allocation
  * @param size: size of the allocated data
  * @param ptr: pointer to the allocated data
  **/
-void log_allocation(char *allocator, size_t size, void *ptr){
+void log_allocation(enum allocator_id allocator, size_t size, void *ptr){
     unsigned int locked = lock_mutex();
     if(!locked && ptr != NULL) {
-        fprintf(logFile, "time %fs\n", clock() / (double)CLOCKS_PER_SEC);
-        fprintf(logFile, "%s %luB %li\n", allocator, (unsigned long) size, (long int)ptr);
-        backtrace(logFile, CALLS_TO_SKIP);
-        fprintf(logFile, "\n");
+        double weight = 1;
+        if(sampleBytes > 0) {
+            if(allocator == FREE) {
+                weight = remove_sampled(ptr);
+            } else if((weight = sample_allocation(size)) > 0) {
+                insert_sampled(ptr);
+            }
+        }
+        if(weight > 0 && binaryLog) {
+            log_binary_allocation(allocator, size, ptr, weight);
+        } else if(weight > 0) {
+            fprintf(logFile, "time %fs\n", clock() / (double)CLOCKS_PER_SEC);
+            if(sampleBytes > 0 && allocator != FREE) {
+                fprintf(logFile, "%s %luB %li x%f\n", allocator_names[allocator],
+                        (unsigned long) size, (long int)ptr, weight);
+            } else {
+                fprintf(logFile, "%s %luB %li\n", allocator_names[allocator],
+                        (unsigned long) size, (long int)ptr);
+            }
+            backtrace(logFile, CALLS_TO_SKIP, maxDepth);
+            fprintf(logFile, "\n");
+        }
     }
     unlock_mutex();
 }
@@ -193,22 +458,22 @@ void log_allocation(char *allocator, size_t size, void *ptr){
 /* Redefinitions of the standard allocation functions */
 void *malloc(size_t size){
     void *ptr = real_malloc(size);
-    log_allocation("malloc", size, ptr);
+    log_allocation(MALLOC, size, ptr);
     return ptr;
 }
 
 void free(void *ptr){
     real_free(ptr);
-    log_allocation("free", 0, ptr);
+    log_allocation(FREE, 0, ptr);
 }
 
 void *realloc(void *ptr, size_t size){
     void *old_ptr = ptr;
     void *nptr = real_realloc(ptr, size);
 
-    log_allocation("realloc", size, nptr);
+    log_allocation(REALLOC, size, nptr);
     if(nptr) {
-        log_allocation("free", 0, old_ptr);
+        log_allocation(FREE, 0, old_ptr);
     }
 
     return nptr;
@@ -216,32 +481,32 @@ void *realloc(void *ptr, size_t size){
 
 void *calloc(size_t nmemb, size_t size){
     void *ptr = real_calloc(nmemb, size);
-    log_allocation("calloc", size*nmemb, ptr);
+    log_allocation(CALLOC, size*nmemb, ptr);
     return ptr;
 }
 
 void *memalign(size_t alignment, size_t size){
     void *ptr = real_memalign(alignment, size);
-    log_allocation("memalign", size, ptr);
+    log_allocation(MEMALIGN, size, ptr);
     return ptr;
 }
 
 int posix_memalign(void** memptr, size_t alignment, size_t size){
     int ret;
     if(ret = !real_posix_memalign(memptr, alignment, size)){
-        log_allocation("posix_memalign", size, *memptr);
+        log_allocation(POSIX_MEMALIGN, size, *memptr);
     }
     return ret;
 }
 
 void *valloc(size_t size){
     void *ptr = real_valloc(size);
-    log_allocation("valloc", size, ptr);
+    log_allocation(VALLOC, size, ptr);
     return ptr;
 }
 
 void *aligned_alloc(size_t alignment, size_t size){
     void *ptr = real_aligned_alloc(alignment, size);
-    log_allocation("aligned_alloc", size, ptr);
+    log_allocation(ALIGNED_ALLOC, size, ptr);
     return ptr;
 }
\ No newline at end of file
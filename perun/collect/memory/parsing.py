@@ -1,19 +1,46 @@
 """This module provides methods for parsing raw memory data"""
 
 import collections
+import concurrent.futures
+import os
 import re
 
 from decimal import Decimal
 import perun.profile.convert as convert
+import perun.profile.stacks as stacks
+import perun.collect.memory.symbolizer as symbolizer
 import perun.collect.memory.syscalls as syscalls
 
+import demandimport
+with demandimport.enabled():
+    import numpy
+
 __author__ = "Radim Podola"
 
 PATTERN_WORD = re.compile(r"(\w+|[?])")
 PATTERN_TIME = re.compile(r"\d+([,.]\d*)?|[,.]\d+")
 PATTERN_HEXADECIMAL = re.compile(r"0x[0-9a-fA-F]+")
 PATTERN_INT = re.compile(r"\d+")
+PATTERN_WEIGHT = re.compile(r"x(\d+([.]\d*)?)")
 UID_RESOURCE_MAP = collections.defaultdict(int)
+# The approximate number of characters of the log that are parsed at once
+LOG_CHUNK_SIZE = 1 << 22
+
+# The allocators indexed by their ids in the binary log (see malloc.c)
+ALLOCATORS = [
+    'malloc', 'free', 'realloc', 'calloc', 'memalign', 'posix_memalign', 'valloc', 'aligned_alloc'
+]
+# The id of the allocator of the record that marks the end of the binary log
+EXIT_ALLOCATOR = 255
+# The id of the allocator of the record with the address range and load bias of the profiled binary
+MODULE_ALLOCATOR = 254
+# The maximal number of frames of the backtrace in the binary log (see backtrace.h)
+MAX_FRAMES = 32
+# The fixed-size records of the binary log
+BINARY_RECORD_DTYPE = [
+    ('time', 'f8'), ('size', 'u8'), ('ptr', 'u8'), ('weight', 'f8'), ('allocator', 'u4'),
+    ('frames', 'u4'), ('ips', 'u8', (MAX_FRAMES, ))
+]
 
 
 def parse_stack(stack):
@@ -36,25 +63,32 @@ def parse_stack(stack):
         # parsing instruction pointer,
         # it's the first hexadecimal number in the call record
         ip = PATTERN_HEXADECIMAL.search(call).group()
-
-        # getting information of instruction pointer,
-        # the source file and line number in the source file
-        ip_info = syscalls.address_to_line(ip)
-        if ip_info[0] in ["?", "??"]:
-            ip_info[0] = "unreachable"
-        if ip_info[1] in ["?", "??"]:
-            ip_info[1] = 0
-        else:
-            ip_info[1] = PATTERN_INT.search(ip_info[1]).group()
-
-        call_data.update({'source': ip_info[0]})
-        call_data.update({'line': int(ip_info[1])})
+        call_data.update(parse_location(ip))
 
         data.append(call_data)
 
     return data
 
 
+def parse_location(ip):
+    """ Parse the source file and line of the instruction pointer
+
+    :param str ip: the instruction pointer as a hexadecimal number
+    :returns dict: the source file and line in the source file of the instruction pointer
+    """
+    # getting information of instruction pointer,
+    # the source file and line number in the source file
+    ip_info = syscalls.address_to_line(ip)
+    if ip_info[0] in ["?", "??"]:
+        ip_info[0] = "unreachable"
+    if ip_info[1] in ["?", "??"]:
+        ip_info[1] = 0
+    else:
+        ip_info[1] = PATTERN_INT.search(ip_info[1]).group()
+
+    return {'source': ip_info[0], 'line': int(ip_info[1])}
+
+
 def parse_allocation_location(trace):
     """ Parse the location of user's allocation from stack trace
 
@@ -72,33 +106,73 @@ def parse_allocation_location(trace):
     return {}
 
 
-def parse_resources(allocation, workload):
+def parse_resources(allocation, workload, uid_map=None):
     """ Parse resources of one allocation
 
     :param list allocation: list of raw allocation data
+    :param str workload: workload for which the data were collected
+    :param dict uid_map: the counts of the resources per flattened uid (UID_RESOURCE_MAP if None)
     :returns structure: formatted structure representing resources of one allocation
     """
-    data = {'workload': workload}
-
     # parsing amount of allocated memory,
     # it's the first number on the second line
     amount = PATTERN_INT.search(allocation[1]).group()
-    data.update({'amount': int(amount)})
 
     # parsing allocate function,
     # it's the first word on the second line
     allocator = PATTERN_WORD.search(allocation[1]).group()
-    data.update({'subtype': allocator})
 
     # parsing address of allocated memory,
     # it's the second number on the second line
     address = PATTERN_INT.findall(allocation[1])[1]
-    data.update({'address': int(address)})
+
+    # parsing weight of the sampled allocation,
+    # it's the number prefixed by 'x' on the second line (if the allocations were sampled)
+    weight = PATTERN_WEIGHT.search(allocation[1])
 
     # parsing stack in the moment of allocation
     # to getting trace of it
     trace = parse_stack(allocation[2:])
-    data.update({'trace': trace})
+
+    return create_resource(
+        allocator, int(amount), int(address), trace, workload, uid_map,
+        weight=float(weight.group(1)) if weight else 1
+    )
+
+
+def create_resource(allocator, amount, address, trace, workload, uid_map=None, trace_id=None,
+                    weight=1):
+    """ Creates resource of one allocation
+
+    The amounts of the sampled allocations are scaled by their weights, i.e. the inverse
+    probabilities of sampling the allocations, so they estimate the amounts of all allocations.
+
+    :param str allocator: the allocator that did the allocation
+    :param int amount: the amount of allocated memory
+    :param int address: the address of allocated memory
+    :param list trace: list representing stack call trace
+    :param str workload: workload for which the data were collected
+    :param dict uid_map: the counts of the resources per flattened uid (UID_RESOURCE_MAP if None)
+    :param int trace_id: the id of the trace interned in the table of stacks of the profile (see
+        :mod:`perun.profile.stacks`) or None, if the trace is stored in the resource
+    :param float weight: the weight of the sampled allocation (1 if it was not sampled)
+    :returns structure: formatted structure representing resources of one allocation
+    """
+    if uid_map is None:
+        uid_map = UID_RESOURCE_MAP
+
+    data = {'workload': workload}
+    if weight != 1:
+        data.update({'amount': int(round(amount * weight))})
+        data.update({'weight': weight})
+    else:
+        data.update({'amount': amount})
+    data.update({'subtype': allocator})
+    data.update({'address': address})
+    if trace_id is None:
+        data.update({'trace': trace})
+    else:
+        data.update({'trace_id': trace_id})
 
     # parsed data is memory type
     data.update({'type': 'memory'})
@@ -109,39 +183,77 @@ def parse_resources(allocation, workload):
 
     # update the resource number
     flattened_uid = convert.flatten(data['uid'])
-    UID_RESOURCE_MAP[flattened_uid] += 1
-    data.update({'allocation_order': UID_RESOURCE_MAP[flattened_uid]})
+    uid_map[flattened_uid] += 1
+    data.update({'allocation_order': uid_map[flattened_uid]})
 
     return data
 
 
-def parse_log(filename, cmd, snapshots_interval, workload):
-    """ Parse raw data in the log file
+def read_allocation_chunks(logfile, chunk_size=None):
+    """ Reads the log by chunks of complete allocations
 
-    :param string filename: name of the log file
-    :param string cmd: profiled binary
-    :param Decimal snapshots_interval: interval of snapshots [s]
-    :returns structure: formatted structure representing section "snapshots" and "global" in memory profile
+    The allocations are split by empty lines, hence the chunks are split only at the empty
+    lines, and the rest of the log (i.e. the exit record) is always yielded as the last chunk.
+
+    :param file logfile: the opened log file
+    :param int chunk_size: the number of characters that are read at once (LOG_CHUNK_SIZE if None)
+    :returns iterable: the stream of chunks of the log
     """
-    interval = snapshots_interval
-    with open(filename) as logfile:
-        log = logfile.read()
-    # allocations are splitted by empty line
-    log = log.split('\n\n')
+    chunk_size = chunk_size or LOG_CHUNK_SIZE
+    rest = ''
+    while True:
+        data = logfile.read(chunk_size)
+        if not data:
+            yield rest
+            return
+        data = rest + data
+        boundary = data.rfind('\n\n')
+        if boundary == -1:
+            rest = data
+        else:
+            yield data[:boundary]
+            rest = data[boundary + 2:]
 
-    glob = log.pop().strip()
-    if glob.find('EXIT') > -1:
-        # in some cases there is '.' instead of ',' in timestamp
-        index = glob.find(',')
-        if index > 0:
-            glob = glob.replace(',', '.')
-        glob = [{'time': PATTERN_TIME.search(glob).group()}]
-    else:
-        raise ValueError
 
-    allocations = []
-    for item in log:
-        allocations.append(item.splitlines())
+def read_module_record(logfile):
+    """ Reads the address range and the load bias of the profiled binary from the beginning of
+    the log (see :func:`symbolizer.resolve_addresses`)
+
+    :param file logfile: the opened log file
+    :returns tuple: the start, end and load bias of the profiled binary or None, if the log does
+        not start with the module record (then the log is read again from the beginning)
+    :raises ValueError: if the module record is malformed
+    """
+    line = logfile.readline()
+    if not line.startswith('MODULE'):
+        logfile.seek(0)
+        return None
+    # Skip the empty line after the record
+    logfile.readline()
+    module = tuple(int(address, 16) for address in line.split()[1:])
+    if len(module) != 3:
+        raise ValueError('malformed module record in the log')
+    return module
+
+
+def parse_allocation_chunk(chunk, cmd, workload, module=None):
+    """ Parse the chunk of allocations of the log
+
+    The allocation orders of the resources are counted only within the chunk, so the chunks
+    can be parsed independently (e.g. by separate processes) and the orders are offset by
+    the counts of the preceding chunks, when the results are merged in :func:`parse_log`.
+
+    :param str chunk: the chunk of allocations split by empty lines
+    :param string cmd: profiled binary
+    :param str workload: workload for which the data were collected
+    :param tuple module: the start, end and load bias of the profiled binary or None
+    :returns tuple: list of triples of timestamp, flattened uid and resource of allocation, the
+        counts of the resources per flattened uid and true if the chunk ends with exit record
+    """
+    allocations = [item.splitlines() for item in chunk.split('\n\n')]
+    has_exit = bool(allocations[-1]) and allocations[-1][0].startswith('EXIT')
+    if has_exit:
+        allocations.pop()
 
     # Collect names and addresses for demangling and addr2line collective call
     names, ips = set(), set()
@@ -153,12 +265,10 @@ def parse_log(filename, cmd, snapshots_interval, workload):
 
     # Build caches for demangle and addr2line for further calls
     syscalls.build_demangle_cache(names)
-    syscalls.build_address_to_line_cache(ips, cmd)
+    syscalls.build_address_to_line_cache(ips, cmd, module)
 
-    snapshots = []
-    data = {}
-    data.update({'time': '{0:f}'.format(interval)})
-    data.update({'resources': []})
+    timed_resources = []
+    uid_counts = collections.defaultdict(int)
     for allocation in allocations:
         if not allocation:
             continue
@@ -173,6 +283,197 @@ def parse_log(filename, cmd, snapshots_interval, workload):
 
         time = Decimal(PATTERN_TIME.search(time_string).group())
 
+        # using parse_resources()
+        # parsing resources,
+        resource = parse_resources(allocation, workload, uid_counts)
+        timed_resources.append((time, convert.flatten(resource['uid']), resource))
+
+    return timed_resources, dict(uid_counts), has_exit
+
+
+def parse_log(filename, cmd, snapshots_interval, workload, jobs=1):
+    """ Parse raw data in the log file
+
+    The log is read and parsed by chunks of allocations (see :func:`parse_allocation_chunk`),
+    which are optionally parsed by the pool of processes (see :func:`parse_chunks_in_parallel`),
+    and the resources of the chunks are then merged in the order of the log to the snapshots.
+
+    :param string filename: name of the log file
+    :param string cmd: profiled binary
+    :param Decimal snapshots_interval: interval of snapshots [s]
+    :param str workload: workload for which the data were collected
+    :param int jobs: number of processes parsing the chunks of the log in parallel
+    :returns structure: formatted structure representing section "snapshots" and "global"
+        in memory profile, with the traces interned in the table of stacks
+    """
+    with open(filename) as logfile:
+        module = read_module_record(logfile)
+        if jobs > 1:
+            parsed_chunks = parse_chunks_in_parallel(
+                read_allocation_chunks(logfile), cmd, workload, jobs, module
+            )
+        else:
+            parsed_chunks = (
+                parse_allocation_chunk(chunk, cmd, workload, module)
+                for chunk in read_allocation_chunks(logfile)
+            )
+        profile = {'snapshots': split_to_snapshots(_merge_parsed_chunks(parsed_chunks),
+                                                   snapshots_interval),
+                   'global': {'resources': []}}
+    # The symbols resolved for all of the chunks are persisted at once
+    symbolizer.save_caches()
+    stacks.intern_traces(profile)
+    return profile
+
+
+def parse_chunks_in_parallel(chunks, cmd, workload, jobs, module=None):
+    """ Parses the chunks of allocations by the pool of processes
+
+    At most twice as many chunks as there are processes are parsed at once, so the log is read
+    only slightly ahead of the parsed chunks, which are generated in the order of the log as soon
+    as they are finished. The symbols newly resolved by the processes are added to the caches of
+    this process (see :func:`symbolizer.take_new_entries`), which persists them afterwards.
+
+    :param iterable chunks: the chunks of allocations split by empty lines
+    :param string cmd: profiled binary
+    :param str workload: workload for which the data were collected
+    :param int jobs: number of processes parsing the chunks
+    :param tuple module: the start, end and load bias of the profiled binary or None
+    :returns iterable: the stream of results of :func:`parse_allocation_chunk`
+    """
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        parsed_chunks = collections.deque()
+        for chunk in chunks:
+            if len(parsed_chunks) >= 2 * jobs:
+                yield _take_parsed_chunk(parsed_chunks.popleft())
+            parsed_chunks.append(executor.submit(
+                _parse_allocation_chunk_in_worker, chunk, cmd, workload, module
+            ))
+        while parsed_chunks:
+            yield _take_parsed_chunk(parsed_chunks.popleft())
+
+
+def _parse_allocation_chunk_in_worker(chunk, cmd, workload, module):
+    """ Parses the chunk of allocations in the worker process
+
+    :param str chunk: the chunk of allocations split by empty lines
+    :param string cmd: profiled binary
+    :param str workload: workload for which the data were collected
+    :param tuple module: the start, end and load bias of the profiled binary or None
+    :returns tuple: the result of :func:`parse_allocation_chunk` and the newly resolved symbols
+    """
+    return parse_allocation_chunk(chunk, cmd, workload, module), symbolizer.take_new_entries()
+
+
+def _take_parsed_chunk(future):
+    """ Waits for the chunk parsed by the worker process and caches its newly resolved symbols
+
+    :param Future future: the future result of :func:`_parse_allocation_chunk_in_worker`
+    :returns tuple: the result of :func:`parse_allocation_chunk`
+    """
+    parsed_chunk, new_entries = future.result()
+    symbolizer.add_entries(new_entries)
+    return parsed_chunk
+
+
+def _merge_parsed_chunks(parsed_chunks):
+    """ Merges the resources of parsed chunks of allocations in the order of the log
+
+    The allocation orders of the resources are offset by the counts of the resources of the
+    same uid in the preceding chunks.
+
+    :param iterable parsed_chunks: the results of :func:`parse_allocation_chunk`
+    :returns iterable: the stream of pairs of timestamp and resource of allocation
+    :raises ValueError: if the log does not end with exit record
+    """
+    has_exit = False
+    for timed_resources, uid_counts, has_exit in parsed_chunks:
+        for time, flattened_uid, resource in timed_resources:
+            resource['allocation_order'] += UID_RESOURCE_MAP[flattened_uid]
+            yield time, resource
+        for flattened_uid, count in uid_counts.items():
+            UID_RESOURCE_MAP[flattened_uid] += count
+    if not has_exit:
+        raise ValueError('missing exit record in the log')
+
+
+def parse_binary_log(filename, cmd, snapshots_interval, workload):
+    """ Parse raw data in the binary log file
+
+    The binary log consists of the fixed-size records (see :data:`BINARY_RECORD_DTYPE`), which
+    are decoded at once, and the names of the functions, source files and lines are resolved
+    for the unique instruction pointers only.
+
+    :param string filename: name of the log file
+    :param string cmd: profiled binary
+    :param Decimal snapshots_interval: interval of snapshots [s]
+    :param str workload: workload for which the data were collected
+    :returns structure: formatted structure representing section "snapshots" and "global"
+        in memory profile, with the traces interned in the table of stacks
+    """
+    record_size = numpy.dtype(BINARY_RECORD_DTYPE).itemsize
+    if os.path.getsize(filename) % record_size:
+        raise ValueError('truncated record in the binary log')
+    records = numpy.fromfile(filename, dtype=BINARY_RECORD_DTYPE)
+    if not len(records) or records[-1]['allocator'] != EXIT_ALLOCATOR:
+        raise ValueError('missing exit record in the binary log')
+    records = records[:-1]
+    module = None
+    if len(records) and records[0]['allocator'] == MODULE_ALLOCATOR:
+        module = tuple(records[0]['ips'][:3].tolist())
+        records = records[1:]
+    if (records['allocator'] >= len(ALLOCATORS)).any() or (records['frames'] > MAX_FRAMES).any() \
+            or (records['weight'] < 1).any():
+        raise ValueError('malformed record in the binary log')
+
+    # Resolve the functions, source files and lines of the unique instruction pointers at once
+    frame_mask = numpy.arange(MAX_FRAMES) < records['frames'][:, numpy.newaxis]
+    ips = ['0x{:x}'.format(ip) for ip in numpy.unique(records['ips'][frame_mask]).tolist()]
+    syscalls.build_address_to_function_cache(ips, cmd, module)
+    symbolizer.save_caches()
+    calls = {}
+    for ip in ips:
+        function = syscalls.address_to_function(ip)
+        call_data = {'function': '?' if function == '??' else function}
+        call_data.update(parse_location(ip))
+        calls[int(ip, 16)] = call_data
+
+    # Intern the traces of the unique sequences of instruction pointers
+    table = stacks.StackTable()
+    traces = {}
+    timed_resources = []
+    for time, size, ptr, weight, allocator, frames, record_ips in zip(
+            records['time'].tolist(), records['size'].tolist(), records['ptr'].tolist(),
+            records['weight'].tolist(), records['allocator'].tolist(),
+            records['frames'].tolist(), records['ips'].tolist()):
+        trace_ips = tuple(record_ips[:frames])
+        if trace_ips not in traces:
+            trace = [calls[ip] for ip in trace_ips]
+            traces[trace_ips] = (trace, table.intern(trace))
+        trace, trace_id = traces[trace_ips]
+        resource = create_resource(
+            ALLOCATORS[allocator], size, ptr, trace, workload, trace_id=trace_id, weight=weight
+        )
+        timed_resources.append((Decimal('{0:f}'.format(time)), resource))
+
+    return {'snapshots': split_to_snapshots(timed_resources, snapshots_interval),
+            'global': {'resources': []},
+            'stacks': table.nodes}
+
+
+def split_to_snapshots(timed_resources, snapshots_interval):
+    """ Splits the resources of allocations to the snapshots by their timestamps
+
+    :param list timed_resources: list of pairs of the timestamp and resource of allocation
+    :param Decimal snapshots_interval: interval of snapshots [s]
+    :returns list: list of snapshots with the resources
+    """
+    interval = snapshots_interval
+    snapshots = []
+    data = {}
+    data.update({'time': '{0:f}'.format(interval)})
+    data.update({'resources': []})
+    for time, resource in timed_resources:
         while time > interval:
             snapshots.append(data)
             interval += snapshots_interval
@@ -180,14 +481,12 @@ def parse_log(filename, cmd, snapshots_interval, workload):
             data.update({'resources': []})
             data.update({'time': '{0:f}'.format(interval)})
 
-        # using parse_resources()
-        # parsing resources,
-        data['resources'].append(parse_resources(allocation, workload))
+        data['resources'].append(resource)
 
     if data:
         snapshots.append(data)
 
-    return {'snapshots': snapshots, 'global': {'resources': []}}
+    return snapshots
 
 
 if __name__ == "__main__":
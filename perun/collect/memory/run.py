@@ -6,6 +6,7 @@ import click
 
 import perun.collect.memory.filter as filters
 import perun.collect.memory.parsing as parser
+import perun.collect.memory.symbolizer as symbolizer
 import perun.collect.memory.syscalls as syscalls
 import perun.logic.runner as runner
 import perun.utils.log as log
@@ -15,27 +16,48 @@ __author__ = 'Radim Podola'
 _lib_name = "malloc.so"
 _tmp_log_filename = "MemoryLog"
 DEFAULT_SAMPLING = 0.001
+# The memory log is created in the working directory, hence jobs can run concurrently in isolation
+# (the injected library is built before, see prepare_concurrent_jobs())
+CONCURRENCY_SAFE = True
 
 
-def before(cmd, **_):
-    """ Phase for initialization the collect module
+def build_library():
+    """ Builds the injected library, if it is missing or outdated
 
-    :param string cmd: binary file to profile
-    :returns tuple: (return code, status message, updated kwargs)
+    :returns tuple: (return code, status message)
     """
-    pwd = os.path.dirname(os.path.abspath(__file__))
-    if not os.path.isfile("{}/{}".format(pwd, _lib_name)):
-        print("Missing compiled dynamic library 'lib{}'. Compiling from sources: ".format(
-            os.path.splitext(_lib_name)[0]
-        ), end='')
+    if syscalls.is_library_outdated():
+        print("Missing or outdated compiled dynamic library 'lib{}'. Compiling from sources: "
+              .format(os.path.splitext(_lib_name)[0]), end='')
         result = syscalls.init()
         if result:
             log.failed()
             error_msg = 'Build of the library failed with error code: '
             error_msg += str(result)
-            return CollectStatus.ERROR, error_msg, {}
+            return CollectStatus.ERROR, error_msg
         else:
             log.done()
+    return CollectStatus.OK, ''
+
+
+def prepare_concurrent_jobs():
+    """ Builds the injected library once before the jobs are collected concurrently, so the
+    jobs do not build the shared library at the same time
+
+    :returns bool: true if the library is ready to be used by the concurrent jobs
+    """
+    return build_library()[0] == CollectStatus.OK
+
+
+def before(cmd, **_):
+    """ Phase for initialization the collect module
+
+    :param string cmd: binary file to profile
+    :returns tuple: (return code, status message, updated kwargs)
+    """
+    build_status, error_msg = build_library()
+    if build_status != CollectStatus.OK:
+        return build_status, error_msg, {}
 
     print("Checking if binary contains debugging information: ", end='')
     if not syscalls.check_debug_symbols(cmd):
@@ -49,16 +71,21 @@ def before(cmd, **_):
     return CollectStatus.OK, '', {}
 
 
-def collect(cmd, args, workload, **_):
+def collect(cmd, args, workload, log_format='text', sample_bytes=0, max_depth=0, **_):
     """ Phase for collection of the profile data
 
     :param string cmd: binary file to profile
     :param string args: executing arguments
     :param string workload: file that has to be provided to binary
+    :param string log_format: format of the log written by the injected library, text or binary
+    :param int sample_bytes: mean number of bytes between the sampled allocations (0 logs all)
+    :param int max_depth: maximal number of logged frames of the backtraces (0 logs all)
     :returns tuple: (return code, status message, updated kwargs)
     """
     print("Collecting data: ", end='')
-    result, collector_errors = syscalls.run(cmd, args, workload)
+    result, collector_errors = syscalls.run(
+        cmd, args, workload, log_format, sample_bytes, max_depth
+    )
     if result:
         log.failed()
         error_msg = 'Execution of binary failed with error code: '
@@ -102,13 +129,21 @@ def after(cmd, workload, sampling=DEFAULT_SAMPLING, **kwargs):
 
     print("Generating profile: ", end='')
     try:
-        profile = parser.parse_log(_tmp_log_filename, cmd, sampling, workload)
+        if kwargs.get('log_format') == 'binary':
+            profile = parser.parse_binary_log(_tmp_log_filename, cmd, sampling, workload)
+        else:
+            profile = parser.parse_log(
+                _tmp_log_filename, cmd, sampling, workload, kwargs.get('jobs', 1)
+            )
     except IndexError as i_err:
         log.failed()
         return CollectStatus.ERROR, 'Info missing in log file: {}'.format(str(i_err)), {}
     except ValueError as v_err:
         log.failed()
         return CollectStatus.ERROR, 'Wrong format of log file: {}'.format(str(v_err)), {}
+    finally:
+        # The symbols are resolved only while parsing the log
+        symbolizer.close()
     log.done()
     filters.set_global_region(profile)
 
@@ -145,6 +180,20 @@ def after(cmd, workload, sampling=DEFAULT_SAMPLING, **kwargs):
 @click.option('--all', '-a', is_flag=True, default=False,
               help='Will record the full trace for each allocation, i.e. it'
               ' will include all allocators and even unreachable records.')
+@click.option('--log-format', '-lf', type=click.Choice(['text', 'binary']), default='text',
+              help='Sets the format of the log written by the injected library. The binary log'
+              ' consists of fixed-size records with instruction pointers of the traces, which'
+              ' are resolved only once, when the log is parsed.')
+@click.option('--jobs', '-j', type=click.IntRange(min=1), default=1,
+              help='Sets the number of processes parsing the chunks of the text log in'
+              ' parallel.')
+@click.option('--sample-bytes', '-sb', type=click.IntRange(min=0), default=0,
+              help='Samples the allocations, such that on average one allocation is logged'
+              ' per <sample_bytes> allocated bytes. The amounts of the sampled allocations'
+              ' are scaled by their weights (0 logs every allocation).')
+@click.option('--max-depth', '-md', type=click.IntRange(min=0), default=0,
+              help='Limits the number of logged frames of the backtraces of the allocations'
+              ' (0 logs the whole backtraces).')
 @click.pass_context
 def memory(ctx, **kwargs):
     """Generates `memory` performance profiel, capturing memory allocations of
@@ -168,13 +217,7 @@ def memory(ctx, **kwargs):
             "subtype": "malloc",
             "address": 19284560,
             "amount": 4,
-            "trace": [
-                {
-                    "source": "../memory_collect_test.c",
-                    "function": "main",
-                    "line": 22
-                },
-            ],
+            "trace_id": 0,
             "uid": {
                 "source": "../memory_collect_test.c",
                 "function": "main",
@@ -182,6 +225,16 @@ def memory(ctx, **kwargs):
             }
         },
 
+    The traces of the allocations are interned in the ``stacks`` region of the
+    profile, i.e. the prefix tree of frames of all the unique traces, and the
+    resources refer to them by ``trace_id``.
+
+    With ``--sample-bytes`` the allocations are sampled w.r.t. the number of
+    allocated bytes (similarly to tcmalloc), and only the sampled allocations
+    and their frees are logged. The `amount` of each sampled allocation is
+    then scaled by its `weight`, i.e. the inverse of the probability, that the
+    allocation was sampled.
+
     `Memory` profiles can be efficiently interpreted using :ref:`views-heapmap`
     technique (together with its `heat` mode), which shows memory allocations
     (by functions) in memory address map.
@@ -0,0 +1,343 @@
+"""This module provides persistent resolution of symbols for the memory collector
+
+The names are demangled by the ``c++filt`` and the addresses are translated to functions and
+lines by the ``addr2line``, both running as long-lived co-processes, which are fed over their
+standard input by batches of queries (hence the number of symbols is not limited by the maximal
+length of the command line). The resolved symbols are kept in the caches, which are persisted in
+the ``.perun/cache`` directory (if the collection is run inside the perun instance), where the
+addresses are cached per binary keyed by its build-id (see
+:func:`perun.utils.get_binary_identifier`). The addresses inside the profiled binary are cached
+by their offsets in the binary, which (unlike the addresses of position independent executables)
+do not change between the runs. The repeated collections of the same binary then resolve only
+the symbols, that were not seen before, while the least recently used symbols are evicted from
+the caches, when they grow over :data:`MAX_CACHE_ENTRIES`.
+"""
+
+import collections
+import json
+import os
+import subprocess
+import threading
+
+import perun.logic.pcs as pcs
+import perun.utils as utils
+import perun.utils.exceptions as exceptions
+
+__author__ = 'Tomas Fiedor'
+
+# The number of queries encoded and written to the co-process at once
+QUERY_BATCH_SIZE = 256
+# The name of the cache of demangled names
+DEMANGLE_CACHE = 'memory-demangled-names'
+# The prefix of the names of caches of the addresses in binaries
+ADDRESS_CACHE_PREFIX = 'memory-symbols-'
+# The maximal number of entries of each cache
+MAX_CACHE_ENTRIES = 1 << 16
+# The function and location of the addresses outside of the profiled binary
+UNKNOWN_SYMBOL = ['??', '??:0']
+
+_COPROCESSES = {}
+_CACHES = {}
+_BINARY_IDENTIFIERS = {}
+
+
+class CoProcess(object):
+    """Long-lived process answering the queries written to its standard input by the fixed
+    number of lines written to its standard output
+
+    :ivar list command: the command of the co-process
+    :ivar int answer_lines: the number of lines of the answer for each query
+    :ivar Popen process: the running co-process
+    :ivar int owner: the id of the process, that started the co-process
+    """
+    def __init__(self, command, answer_lines=1):
+        """
+        :param list command: the command of the co-process
+        :param int answer_lines: the number of lines of the answer for each query
+        """
+        self.command = command
+        self.answer_lines = answer_lines
+        self.process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        self.owner = os.getpid()
+
+    def query(self, queries):
+        """Writes the queries to the co-process and reads back the answers
+
+        The queries are written by the separate thread, while the answers are read concurrently,
+        hence neither of the pipes can fill up and block the co-process regardless of the
+        number and length of the queries.
+
+        :param list queries: the single-line queries
+        :returns list: the answers for the queries, i.e. lists of lines (or single line, if the
+            answers have only one line)
+        """
+        writer = threading.Thread(target=self._write_queries, args=(queries, ))
+        writer.start()
+        try:
+            answers = []
+            for _ in queries:
+                lines = [
+                    self.process.stdout.readline().decode('utf-8').rstrip('\n')
+                    for _ in range(self.answer_lines)
+                ]
+                answers.append(lines if self.answer_lines > 1 else lines[0])
+        finally:
+            writer.join()
+        return answers
+
+    def _write_queries(self, queries):
+        """Writes the queries to the standard input of the co-process by batches
+
+        :param list queries: the single-line queries
+        """
+        for batch_start in range(0, len(queries), QUERY_BATCH_SIZE):
+            batch = queries[batch_start:batch_start + QUERY_BATCH_SIZE]
+            self.process.stdin.write(('\n'.join(batch) + '\n').encode('utf-8'))
+            self.process.stdin.flush()
+
+    def close(self):
+        """Terminates the co-process by closing its standard input"""
+        self.process.stdin.close()
+        self.process.wait()
+        self.process.stdout.close()
+
+
+class PersistentCache(object):
+    """Cache of resolved symbols, which is persisted in the perun cache directory
+
+    The entries are ordered from the least to the most recently used one and the least recently
+    used entries are evicted, when the number of entries exceeds the limit.
+
+    :ivar str path: path to the persisted cache or None, if the cache is kept only in memory
+    :ivar OrderedDict entries: the cached symbols
+    :ivar int max_entries: the maximal number of entries of the cache
+    :ivar bool is_modified: true if there are entries, which were not persisted yet
+    :ivar set new_keys: the keys of the entries resolved since the last :func:`take_new_entries`
+    """
+    def __init__(self, name, max_entries=MAX_CACHE_ENTRIES):
+        """
+        :param str name: the name of the persisted cache
+        :param int max_entries: the maximal number of entries of the cache
+        """
+        try:
+            self.path = os.path.join(pcs.get_cache_directory(), name + '.json')
+        except (exceptions.NotPerunRepositoryException, OSError):
+            self.path = None
+        self.max_entries = max_entries
+        self.entries = self._load()
+        self._evict(self.entries)
+        self.is_modified = False
+        self.new_keys = set()
+
+    def get(self, key):
+        """
+        :param str key: the key of the entry
+        :returns object: the cached value (which is marked as the most recently used) or None
+        """
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    def update(self, entries):
+        """Adds the newly resolved entries to the cache
+
+        :param iterable entries: the pairs of the keys and values of the entries
+        """
+        entries = list(entries)
+        self.entries.update(entries)
+        self._evict(self.entries)
+        self.new_keys.update(key for key, _ in entries)
+        self.is_modified = True
+
+    def save(self):
+        """Persists the cache merged with the entries persisted by other processes"""
+        if self.path is None or not self.is_modified:
+            return
+        entries = self._load()
+        for key, value in self.entries.items():
+            entries.pop(key, None)
+            entries[key] = value
+        self._evict(entries)
+        # Write the cache through the temporary file so the concurrent processes never read
+        # the partially written cache
+        temporary_path = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(temporary_path, 'w') as cache_handle:
+            json.dump(entries, cache_handle)
+        os.replace(temporary_path, self.path)
+        self.entries, self.is_modified = entries, False
+
+    def _evict(self, entries):
+        """Removes the least recently used entries over the limit of the cache
+
+        :param OrderedDict entries: the entries ordered from the least recently used one
+        """
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def _load(self):
+        """
+        :returns OrderedDict: the persisted entries of the cache or empty dict
+        """
+        if self.path is None:
+            return collections.OrderedDict()
+        try:
+            with open(self.path, 'r') as cache_handle:
+                return json.load(cache_handle, object_pairs_hook=collections.OrderedDict)
+        except (OSError, ValueError):
+            return collections.OrderedDict()
+
+
+def demangle(names):
+    """Demangles the names, resolving only the names that are not cached
+
+    :param list names: the (mangled) names
+    :returns dict: the mapping of the names to the demangled names
+    """
+    return _resolve(_get_cache(DEMANGLE_CACHE), set(names), ('c++filt', ), DEMANGLE_CACHE)
+
+
+def resolve_addresses(addresses, binary, module=None):
+    """Translates the addresses in the binary to the functions and lines, resolving only the
+    addresses that are not cached
+
+    If the address range and the load bias of the binary in the profiled process are known, the
+    addresses are translated to the offsets in the binary (which are then cached and resolved)
+    and the addresses outside of the binary are not resolved at all.
+
+    :param list addresses: the hexadecimal addresses
+    :param str binary: path to the binary
+    :param tuple module: the start, end and load bias of the binary in the profiled process or
+        None, if the addresses are resolved as they are
+    :returns dict: the mapping of the addresses to pairs of the demangled function and the
+        location (i.e. source file and line separated by colon)
+    """
+    if module is None:
+        offsets = {address: address for address in addresses}
+    else:
+        start, end, bias = module
+        offsets = {}
+        for address in addresses:
+            value = int(address, 16)
+            if start <= value < end:
+                offsets[address] = '0x{:x}'.format(value - bias)
+    identifier = _get_binary_identifier(binary)
+    symbols = _resolve(
+        _get_cache(ADDRESS_CACHE_PREFIX + identifier), set(offsets.values()),
+        ('addr2line', '-f', '-C', '-e', binary), identifier, 2
+    )
+    return {
+        address: symbols[offsets[address]] if address in offsets else UNKNOWN_SYMBOL
+        for address in addresses
+    }
+
+
+def save_caches():
+    """Persists the caches with newly resolved symbols"""
+    for cache in _CACHES.values():
+        cache.save()
+
+
+def take_new_entries():
+    """Returns the entries resolved since the last call, so they can be passed from the worker
+    processes to the parent process, which then persists all of them at once
+
+    :returns dict: the mapping of the names of caches to lists of new entries
+    """
+    new_entries = {}
+    for name, cache in _CACHES.items():
+        new_entries[name] = [
+            (key, cache.entries[key]) for key in cache.new_keys if key in cache.entries
+        ]
+        cache.new_keys.clear()
+    return new_entries
+
+
+def add_entries(new_entries):
+    """Adds the entries resolved by other process to the caches
+
+    :param dict new_entries: the mapping of the names of caches to lists of new entries (see
+        :func:`take_new_entries`)
+    """
+    for name, entries in new_entries.items():
+        if entries:
+            _get_cache(name).update(entries)
+
+
+def close():
+    """Terminates the co-processes and forgets the caches (the persisted caches are kept)"""
+    save_caches()
+    for _, coprocess in _COPROCESSES.values():
+        if coprocess.owner == os.getpid():
+            coprocess.close()
+    _COPROCESSES.clear()
+    _CACHES.clear()
+
+
+def _resolve(cache, keys, command, identifier, answer_lines=1):
+    """Resolves the keys by the cache and the keys missing in the cache by the co-process
+
+    :param PersistentCache cache: the cache of the resolved keys
+    :param set keys: the keys to be resolved
+    :param tuple command: the command of the co-process resolving the missing keys
+    :param str identifier: the identifier of the cache (see :func:`_get_coprocess`)
+    :param int answer_lines: the number of lines of the answer for each query
+    :returns dict: the mapping of the keys to the resolved values
+    """
+    values = {key: cache.get(key) for key in keys}
+    missing = [key for key, value in values.items() if value is None]
+    if missing:
+        coprocess = _get_coprocess(command, identifier, answer_lines)
+        resolved = list(zip(missing, coprocess.query(missing)))
+        values.update(resolved)
+        cache.update(resolved)
+    return values
+
+
+def _get_coprocess(command, identifier, answer_lines=1):
+    """Returns the running co-process of the command, which is restarted, when the identifier
+    of its cache changes (e.g. when the resolved binary is rebuilt)
+
+    :param tuple command: the command of the co-process
+    :param str identifier: the identifier of the cache of the answers of the co-process
+    :param int answer_lines: the number of lines of the answer for each query
+    :returns CoProcess: the running co-process of the command
+    """
+    if command in _COPROCESSES:
+        coprocess_identifier, coprocess = _COPROCESSES[command]
+        # The co-processes inherited from the parent process (e.g. by the pool of processes)
+        # are not shared, so the answers are not read by several processes
+        if coprocess.owner != os.getpid():
+            del _COPROCESSES[command]
+        elif coprocess_identifier != identifier:
+            coprocess.close()
+            del _COPROCESSES[command]
+    if command not in _COPROCESSES:
+        _COPROCESSES[command] = (identifier, CoProcess(list(command), answer_lines))
+    return _COPROCESSES[command][1]
+
+
+def _get_cache(name):
+    """
+    :param str name: the name of the cache
+    :returns PersistentCache: the loaded cache
+    """
+    if name not in _CACHES:
+        _CACHES[name] = PersistentCache(name)
+    return _CACHES[name]
+
+
+def _get_binary_identifier(binary):
+    """Returns the identifier of the binary, which is computed only once for each version of
+    the binary
+
+    :param str binary: path to the binary
+    :returns str: the identifier of the binary
+    """
+    binary_stat = os.stat(binary)
+    key = (os.path.realpath(binary), binary_stat.st_mtime, binary_stat.st_size)
+    if key not in _BINARY_IDENTIFIERS:
+        _BINARY_IDENTIFIERS[key] = utils.get_binary_identifier(binary)
+    return _BINARY_IDENTIFIERS[key]
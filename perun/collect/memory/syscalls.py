@@ -3,22 +3,31 @@
 import os
 import re
 import subprocess
+import perun.collect.memory.symbolizer as symbolizer
 import perun.utils.log as log
 
 PATTERN_WORD = re.compile(r"(\w+)|[?]")
 PATTERN_HEXADECIMAL = re.compile(r"0x[0-9a-fA-F]+")
+# The injected library is built from the sources in the directory of this module
+LIBRARY_DIR = os.path.dirname(os.path.abspath(__file__))
+LIBRARY_NAME = 'malloc.so'
+LIBRARY_SOURCES = ('malloc.c', 'backtrace.c', 'backtrace.h', 'Makefile')
+# The flags of the last build of the library are stored next to it
+LIBRARY_FLAGS_NAME = 'malloc.so.flags'
 
 __author__ = "Radim Podola"
 
 demangle_cache = {}
 address_to_line_cache = {}
+address_to_function_cache = {}
 
 
 def build_demangle_cache(names):
     """Builds global cache for demangle() function calls.
 
     Instead of continuous calls to subprocess, this takes all of the collected names
-    and calls the demangle just once, while constructing the cache.
+    and demangles them by the long-lived c++filt co-process, while constructing the cache
+    (the names demangled in the previous collections are taken from the persistent cache).
 
     :param set names: set of names that will be demangled in future
     """
@@ -28,9 +37,7 @@ def build_demangle_cache(names):
     if not all(map(PATTERN_WORD.match, list_of_names)):
         log.error("incorrect values in demangled names")
     else:
-        sys_call = ['c++filt'] + list_of_names
-        output = subprocess.check_output(sys_call).decode("utf-8").strip()
-        demangle_cache = dict(zip(list_of_names, output.split("\n")))
+        demangle_cache = symbolizer.demangle(list_of_names)
 
 
 def demangle(name):
@@ -41,14 +48,17 @@ def demangle(name):
     return demangle_cache[name]
 
 
-def build_address_to_line_cache(addresses, binary_name):
+def build_address_to_line_cache(addresses, binary_name, module=None):
     """Builds global cache for address_to_line() function calls.
 
     Instead of continuous calls to subprocess, this takes all of the collected
-    names and calls the addr2line just once.
+    names and translates them by the long-lived addr2line co-process (the addresses translated
+    in the previous collections of the same binary are taken from the persistent cache).
 
     :param set addresses: set of addresses that will be translated to line info
     :param str binary_name: name of the binary which will be parsed for info
+    :param tuple module: the start, end and load bias of the binary in the profiled process
+        or None (see :func:`symbolizer.resolve_addresses`)
     """
     global address_to_line_cache
 
@@ -56,11 +66,48 @@ def build_address_to_line_cache(addresses, binary_name):
     if not all(map(PATTERN_HEXADECIMAL.match, list_of_addresses)):
         log.error("incorrect values in address translations")
     else:
-        sys_call = ['addr2line', '-e', binary_name] + list_of_addresses
-        output = subprocess.check_output(sys_call).decode("utf-8").strip()
-        address_to_line_cache = dict(zip(
-            list_of_addresses, map(lambda x: x.split(':'), output.split("\n"))
-        ))
+        address_to_line_cache = {
+            address: location.split(':')
+            for address, (_, location) in symbolizer.resolve_addresses(
+                list_of_addresses, binary_name, module
+            ).items()
+        }
+
+
+def build_address_to_function_cache(addresses, binary_name, module=None):
+    """Builds global caches for address_to_function() and address_to_line() function calls.
+
+    The names of the functions are resolved (and demangled) by the addr2line together with
+    the source files and line numbers, hence it is used when the names of the functions
+    are not part of the collected data (e.g. in the binary log).
+
+    :param set addresses: set of addresses that will be translated to function and line info
+    :param str binary_name: name of the binary which will be parsed for info
+    :param tuple module: the start, end and load bias of the binary in the profiled process
+        or None (see :func:`symbolizer.resolve_addresses`)
+    """
+    global address_to_function_cache
+    global address_to_line_cache
+
+    list_of_addresses = list(addresses)
+    if not all(map(PATTERN_HEXADECIMAL.match, list_of_addresses)):
+        log.error("incorrect values in address translations")
+    else:
+        symbols = symbolizer.resolve_addresses(list_of_addresses, binary_name, module)
+        address_to_function_cache = {
+            address: function for address, (function, _) in symbols.items()
+        }
+        address_to_line_cache = {
+            address: location.split(':') for address, (_, location) in symbols.items()
+        }
+
+
+def address_to_function(ip):
+    """
+    :param string ip: instruction pointer value
+    :returns string: the demangled name of the function
+    """
+    return address_to_function_cache[ip]
 
 
 def address_to_line(ip):
@@ -71,16 +118,21 @@ def address_to_line(ip):
     return address_to_line_cache[ip][:]
 
 
-def run(cmd, params, workload):
+def run(cmd, params, workload, log_format='text', sample_bytes=0, max_depth=0):
     """
     :param string cmd: binary file to profile
     :param string params: executing arguments
     :param string workload: file that has to be provided to binary
+    :param string log_format: format of the log written by the injected library, text or binary
+    :param int sample_bytes: mean number of bytes between the sampled allocations (0 logs all)
+    :param int max_depth: maximal number of logged frames of the backtraces (0 logs all)
     :returns int: return code of executed binary
     """
     pwd = os.path.dirname(os.path.abspath(__file__))
-    sys_call = ('LD_PRELOAD="' + pwd + '/malloc.so" ' + cmd +
-                ' ' + params + ' ' + workload)
+    sys_call = ('PERUN_MEMORY_LOG_FORMAT=' + log_format
+                + ' PERUN_MEMORY_SAMPLE_BYTES=' + str(sample_bytes)
+                + ' PERUN_MEMORY_MAX_DEPTH=' + str(max_depth)
+                + ' LD_PRELOAD="' + pwd + '/malloc.so" ' + cmd + ' ' + params + ' ' + workload)
 
     with open('ErrorCollectLog', 'w') as error_log:
         ret = subprocess.call(sys_call, shell=True, stderr=error_log)
@@ -91,17 +143,52 @@ def run(cmd, params, workload):
     return ret, "".join(log)
 
 
-def init():
+def get_build_flags():
+    """
+    :returns list: the variables of the build of the library (compiler and its flags) passed
+        to the make
+    """
+    return ['CC=' + os.environ.get('CC', 'gcc'), 'CFLAGS=' + os.environ.get('CFLAGS', '')]
+
+
+def is_library_outdated(library_dir=LIBRARY_DIR):
+    """Checks if the injected library has to be (re)built
+
+    The library is outdated, when it is missing, when any of its sources is newer than the
+    library or when it was built with different flags (see :func:`get_build_flags`).
+
+    :param str library_dir: directory with the sources of the library
+    :returns bool: true if the library has to be built
+    """
+    library = os.path.join(library_dir, LIBRARY_NAME)
+    if not os.path.isfile(library):
+        return True
+    library_mtime = os.path.getmtime(library)
+    if any(os.path.getmtime(os.path.join(library_dir, source)) > library_mtime
+           for source in LIBRARY_SOURCES):
+        return True
+    try:
+        with open(os.path.join(library_dir, LIBRARY_FLAGS_NAME), 'r') as flags_handle:
+            return flags_handle.read().splitlines() != get_build_flags()
+    except OSError:
+        return True
+
+
+def init(library_dir=LIBRARY_DIR):
     """ Initialize the injected library
 
+    :param str library_dir: directory with the sources of the library
     :returns bool: success of the operation
     """
-    pwd = os.path.dirname(os.path.abspath(__file__))
+    build_flags = get_build_flags()
     try:
-        ret = subprocess.call(["make"], cwd=pwd)
-    except subprocess.CalledProcessError:
+        ret = subprocess.call(["make"] + build_flags, cwd=library_dir)
+    except (subprocess.CalledProcessError, OSError):
         return 1
 
+    if not ret:
+        with open(os.path.join(library_dir, LIBRARY_FLAGS_NAME), 'w') as flags_handle:
+            flags_handle.write("\n".join(build_flags))
     return ret
 
 
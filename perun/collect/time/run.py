@@ -15,6 +15,8 @@ from perun.utils.helpers import CollectStatus
 __author__ = 'Tomas Fiedor'
 
 TIME_TYPES = ('real', 'user', 'sys')
+# Timing needs exclusive cores, hence the jobs are never run concurrently with others
+CONCURRENCY_SAFE = False
 
 
 def collect(repeat=10, warmup=3, **kwargs):
@@ -0,0 +1,116 @@
+"""On-line aggregation of the resources of the trace collector.
+
+Instead of producing one resource for every paired call (or pair of static probes), the
+durations are aggregated on the fly per uid, thread and bucket of structure unit sizes (i.e.
+the sequence numbers of the calls). Each aggregated resource then keeps:
+
+    - amount: the mean of the durations in the bucket
+    - count, sum, min and max: the summary statistics of the durations
+    - histogram: the counts of durations in power-of-two bins, where the i-th bin counts the
+      durations of bit length i, i.e. from [2^(i-1), 2^i), and 0-th bin counts zero durations
+    - structure-unit-size: the smallest structure unit size in the bucket
+
+The aggregation is done over the whole arrays of paired records, hence only the statistics of
+the groups (and not the separate durations) are kept between the blocks of the output.
+"""
+
+import demandimport
+with demandimport.enabled():
+    import numpy
+
+__author__ = 'Tomas Fiedor'
+
+# The default width of the buckets of structure unit sizes
+DEFAULT_BUCKET_WIDTH = 100
+# The thread of the resources that are not bound to threads (e.g. static probes)
+NO_THREAD = -1
+
+# The number of bins of the histogram, i.e. the maximal bit length of durations
+_HISTOGRAM_BINS = 64
+
+
+class ResourceAggregator(object):
+    """Aggregates the durations per uid, thread and bucket of structure unit sizes
+
+    :ivar int bucket_width: the width of the buckets of structure unit sizes
+    :ivar dict groups: mapping of the (uid id, thread, bucket) to the list of count, sum, min,
+        max and histogram of the durations
+    """
+    def __init__(self, bucket_width=DEFAULT_BUCKET_WIDTH):
+        """
+        :param int bucket_width: the width of the buckets of structure unit sizes
+        """
+        self.bucket_width = max(int(bucket_width), 1)
+        self.groups = {}
+
+    def add(self, uids, threads, sizes, amounts):
+        """Aggregates the arrays of durations into the groups
+
+        :param numpy.ndarray uids: the ids of the interned uids
+        :param numpy.ndarray threads: the threads of the durations
+        :param numpy.ndarray sizes: the structure unit sizes of the durations
+        :param numpy.ndarray amounts: the durations
+        """
+        if not len(amounts):
+            return
+        uids, threads = numpy.asarray(uids, dtype='i8'), numpy.asarray(threads, dtype='i8')
+        buckets = numpy.asarray(sizes, dtype='i8') // self.bucket_width
+        amounts = numpy.asarray(amounts, dtype='i8')
+
+        order = numpy.lexsort((buckets, threads, uids))
+        uids, threads = uids[order], threads[order]
+        buckets, amounts = buckets[order], amounts[order]
+        is_new_group = numpy.empty(len(amounts), dtype=bool)
+        is_new_group[0] = True
+        is_new_group[1:] = ((uids[1:] != uids[:-1]) | (threads[1:] != threads[:-1])
+                            | (buckets[1:] != buckets[:-1]))
+        starts = numpy.flatnonzero(is_new_group)
+
+        counts = numpy.diff(numpy.append(starts, len(amounts)))
+        sums = numpy.add.reduceat(amounts, starts)
+        minimums = numpy.minimum.reduceat(amounts, starts)
+        maximums = numpy.maximum.reduceat(amounts, starts)
+        bins = numpy.minimum(numpy.frexp(numpy.maximum(amounts, 0))[1], _HISTOGRAM_BINS - 1)
+        group_ids = numpy.cumsum(is_new_group) - 1
+        histograms = numpy.bincount(
+            group_ids * _HISTOGRAM_BINS + bins, minlength=len(starts) * _HISTOGRAM_BINS
+        ).reshape(len(starts), _HISTOGRAM_BINS)
+
+        for key, count, total, minimum, maximum, histogram in zip(
+                zip(uids[starts].tolist(), threads[starts].tolist(), buckets[starts].tolist()),
+                counts.tolist(), sums.tolist(), minimums.tolist(), maximums.tolist(), histograms):
+            group = self.groups.get(key)
+            if group is None:
+                self.groups[key] = [count, total, minimum, maximum, histogram.copy()]
+            else:
+                group[0] += count
+                group[1] += total
+                group[2] = min(group[2], minimum)
+                group[3] = max(group[3], maximum)
+                group[4] += histogram
+
+    def resources(self, name_table, workload):
+        """Transforms the aggregated groups into the resources sorted by uid, thread and bucket
+
+        :param NameTable name_table: the table of interned uids
+        :param str workload: the workload of the resources
+        :returns iterable: the stream of aggregated resources
+        """
+        for (uid, thread, bucket), (count, total, minimum, maximum, histogram) in sorted(
+                self.groups.items(), key=lambda group: (name_table[group[0][0]],) + group[0][1:]):
+            resource = {
+                'amount': total / count,
+                'uid': name_table[uid],
+                'type': 'mixed',
+                'subtype': 'time delta',
+                'structure-unit-size': bucket * self.bucket_width,
+                'workload': workload,
+                'count': count,
+                'sum': total,
+                'min': minimum,
+                'max': maximum,
+                'histogram': numpy.trim_zeros(histogram, 'b').tolist()
+            }
+            if thread != NO_THREAD:
+                resource['thread'] = thread
+            yield resource
@@ -0,0 +1,520 @@
+"""Batch decoder of the trace collector output.
+
+The output of the SystemTap is read by blocks of complete lines, which are decoded at once
+into the typed arrays of records (see :data:`RECORD_DTYPE`), instead of parsing every single
+line separately. The records in the arrays are represented by:
+
+    - type: the :class:`RecordType` of the record
+    - offset: the offset of the probe name, i.e. the depth of the call stack
+    - timestamp: the timestamp of the record
+    - thread: the id of the thread that hit the probe
+    - name: the id of the interned probe name (see :class:`NameTable`)
+
+The begin and end records of the functions are then paired over the whole arrays
+by :class:`FuncRecordPairing`, which keeps only the records that are still on the trace stacks
+between the blocks.
+"""
+
+import collections
+import json
+import time
+
+import perun.utils.exceptions as exceptions
+from perun.collect.trace.systemtap_script import RecordType, BINARY_END_TYPE
+
+import demandimport
+with demandimport.enabled():
+    import numpy
+
+__author__ = 'Tomas Fiedor'
+
+# The size of the blocks of the output that are decoded at once
+BLOCK_SIZE = 1 << 20
+# The end marker of the output
+END_MARKER = b'end'
+
+RECORD_DTYPE = [
+    ('type', 'i1'), ('offset', 'i4'), ('timestamp', 'i8'), ('thread', 'i8'), ('name', 'i4')
+]
+
+# The records of the binary output, as printed by the BINARY_RECORD_FORMAT of the script
+BINARY_RECORD_DTYPE = [
+    ('type', 'u1'), ('offset', 'i4'), ('name', 'i4'), ('timestamp', 'i8'), ('thread', 'i4')
+]
+
+# The record converted to tuple, e.g. for reporting the errors
+TraceRecord = collections.namedtuple(
+    'record', ['type', 'offset', 'name', 'timestamp', 'thread', 'sequence']
+)
+
+# The maximal number of digits of thread ids
+_THREAD_WIDTH = 20
+# The multiplier of the hashes of the names
+_HASH_MULTIPLIER = 1000003
+
+_NEWLINE, _SPACE, _COLON = b'\n'[0], b' '[0], b':'[0]
+_LEFT_PAREN, _RIGHT_PAREN, _ZERO, _NINE = b'('[0], b')'[0], b'0'[0], b'9'[0]
+
+
+class NameTable(object):
+    """Table of interned probe names
+
+    :ivar dict ids: mapping of the names to their ids
+    :ivar list names: list of the names indexed by their ids
+    """
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    def intern(self, name):
+        """Returns the id of the given name, the new names are assigned the next free id
+
+        :param str name: the probe name
+        :returns int: the id of the name
+        """
+        name_id = self.ids.get(name)
+        if name_id is None:
+            name_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return name_id
+
+    def __getitem__(self, name_id):
+        return self.names[name_id]
+
+    def __len__(self):
+        return len(self.names)
+
+
+def read_trace_blocks(trace, is_writing=None, block_size=BLOCK_SIZE, poll_interval=0.05):
+    """Reads the collection output by blocks of complete lines until the end marker is found
+
+    If the function ``is_writing`` is given, the output is followed while it is still written,
+    i.e. only the complete lines are yielded and the partially written line is kept until the
+    rest of it is written. The output is then followed until the ``is_writing`` returns false,
+    after which the rest of the output is read.
+
+    :param file trace: the collection output file opened in the binary mode
+    :param function is_writing: function returning true while the output is still being written,
+        or None if the output is already complete
+    :param int block_size: the number of bytes that are read at once
+    :param float poll_interval: time in seconds to wait for new data
+    :returns iterable: the stream of blocks (bytes) of complete lines, without the end marker
+    """
+    partial_line, is_written = b'', is_writing is None
+    while True:
+        data = trace.read(block_size)
+        if not data:
+            if not is_written and is_writing():
+                time.sleep(poll_interval)
+                continue
+            elif not is_written:
+                # The writing has finished, read the rest of the output
+                is_written = True
+                continue
+            if partial_line and partial_line != END_MARKER:
+                yield partial_line + b'\n'
+            return
+        data = partial_line + data
+        last_newline = data.rfind(b'\n')
+        if last_newline == -1:
+            partial_line = data
+            continue
+        block, partial_line = data[:last_newline + 1], data[last_newline + 1:]
+        # The end marker is on its own line, which starts either the block or follows newline
+        if block.startswith(END_MARKER + b'\n'):
+            return
+        end = block.find(b'\n' + END_MARKER + b'\n')
+        if end != -1:
+            yield block[:end + 1]
+            return
+        yield block
+
+
+def read_binary_blocks(trace, is_writing=None, block_size=BLOCK_SIZE, poll_interval=0.05):
+    """Reads the binary collection output by blocks of complete records until the end record
+
+    The output is followed in the same way as in :func:`read_trace_blocks`, only the partially
+    written record is kept instead of the partially written line.
+
+    :param file trace: the binary collection output file
+    :param function is_writing: function returning true while the output is still being written,
+        or None if the output is already complete
+    :param int block_size: the number of bytes that are read at once
+    :param float poll_interval: time in seconds to wait for new data
+    :returns iterable: the stream of arrays of :data:`BINARY_RECORD_DTYPE`, without the end record
+    """
+    record_size = numpy.dtype(BINARY_RECORD_DTYPE).itemsize
+    block_size = max(block_size - block_size % record_size, record_size)
+    partial_record, is_written = b'', is_writing is None
+    while True:
+        data = trace.read(block_size)
+        if not data:
+            if not is_written and is_writing():
+                time.sleep(poll_interval)
+                continue
+            elif not is_written:
+                # The writing has finished, read the rest of the output
+                is_written = True
+                continue
+            if partial_record:
+                raise ValueError("truncated binary record of {} bytes".format(len(partial_record)))
+            return
+        data = partial_record + data
+        complete_size = len(data) - len(data) % record_size
+        data, partial_record = data[:complete_size], data[complete_size:]
+        if not data:
+            continue
+        binary_records = numpy.frombuffer(data, dtype=BINARY_RECORD_DTYPE)
+        end = numpy.flatnonzero(binary_records['type'] == BINARY_END_TYPE)
+        if len(end):
+            if end[0]:
+                yield binary_records[:end[0]]
+            return
+        yield binary_records
+
+
+def is_binary_output_complete(output):
+    """Checks that the binary collection output is fully written, i.e. it consists of complete
+    records and the last of them is the end record.
+
+    :param str output: path to the binary collection output
+    :returns bool: true if the output is fully written
+    """
+    record_size = numpy.dtype(BINARY_RECORD_DTYPE).itemsize
+    with open(output, 'rb') as trace:
+        trace.seek(0, 2)
+        size = trace.tell()
+        if size == 0 or size % record_size:
+            return False
+        trace.seek(size - record_size)
+        return trace.read(1)[0] == BINARY_END_TYPE
+
+
+def load_probe_names(names_path, name_table):
+    """Loads the names of the probes of the binary output and interns them to the name table
+
+    :param str names_path: path to the JSON list of probe names indexed by the probe ids
+    :param NameTable name_table: table of the interned names
+    :returns numpy.ndarray: the map of probe ids to the ids of the interned names
+    """
+    with open(names_path, 'r') as names_handle:
+        probe_names = json.load(names_handle)
+    return numpy.array([name_table.intern(name) for name in probe_names], dtype='i4')
+
+
+def decode_binary_records(binary_records, probe_names):
+    """Converts the binary records to the array of records of :data:`RECORD_DTYPE`
+
+    :param numpy.ndarray binary_records: the records of :data:`BINARY_RECORD_DTYPE`
+    :param numpy.ndarray probe_names: the map of probe ids to the ids of the interned names
+    :returns numpy.ndarray: the decoded records
+    """
+    types, probe_ids = binary_records['type'], binary_records['name']
+    invalid = (types > RecordType.StaticEnd) | (probe_ids < 0) | (probe_ids >= len(probe_names))
+    if invalid.any():
+        index = int(numpy.flatnonzero(invalid)[0])
+        raise ValueError("malformed binary record: type {}, probe id {}".format(
+            types[index], probe_ids[index]
+        ))
+    records = numpy.empty(len(binary_records), dtype=RECORD_DTYPE)
+    records['type'] = types
+    records['offset'] = binary_records['offset']
+    records['timestamp'] = binary_records['timestamp']
+    records['thread'] = binary_records['thread']
+    records['name'] = probe_names[probe_ids]
+    return records
+
+
+def decode_block(block, name_table):
+    """Decodes the block of complete lines into the array of records
+
+    Every line has the format 'type timestamp process(thread): offset-spaces name'.
+
+    :param bytes block: the block of complete lines, each ending with newline
+    :param NameTable name_table: the table of interned probe names
+    :returns numpy.ndarray: the array of records with :data:`RECORD_DTYPE`
+    """
+    data = numpy.frombuffer(block, dtype=numpy.uint8)
+    line_ends = numpy.flatnonzero(data == _NEWLINE)
+    line_starts = numpy.concatenate(([0], line_ends[:-1] + 1))
+    records = numpy.empty(len(line_ends), dtype=RECORD_DTYPE)
+
+    types = data[line_starts].astype(numpy.int8) - _ZERO
+    if types.min() < RecordType.FuncBegin or types.max() > RecordType.StaticEnd:
+        raise ValueError("unknown type of the record in line {}".format(
+            _line_at(block, line_starts[numpy.argmax(
+                (types < RecordType.FuncBegin) | (types > RecordType.StaticEnd)
+            )])
+        ))
+    records['type'] = types
+
+    # The words of the lines are delimited by the runs of spaces, the block ends with word end
+    is_space = numpy.append(data == _SPACE, True)
+    word_starts = numpy.flatnonzero(is_space[:-1] & ~is_space[1:]) + 1
+    word_ends = numpy.flatnonzero(~is_space[:-1] & is_space[1:]) + 1
+    # The timestamp is the first word after the type and the process(thread): follows it
+    timestamp_starts = word_starts[numpy.searchsorted(word_starts, line_starts + 1)]
+    timestamp_ends = word_ends[numpy.searchsorted(word_ends, timestamp_starts)]
+    colons = numpy.minimum(
+        word_ends[numpy.searchsorted(word_ends, timestamp_ends + 1)], line_ends
+    ) - 1
+    thread_starts = colons - 1 - _count_trailing_digits(data, colons - 1, _THREAD_WIDTH)
+    is_malformed = ((data[colons] != _COLON) | (data[colons - 1] != _RIGHT_PAREN)
+                    | (data[thread_starts - 1] != _LEFT_PAREN) | (thread_starts == colons - 1)
+                    | (timestamp_ends > colons))
+    if is_malformed.any():
+        raise ValueError("malformed record in line {}".format(
+            _line_at(block, line_starts[numpy.argmax(is_malformed)])
+        ))
+    records['timestamp'] = _decode_integers(data, timestamp_starts, timestamp_ends)
+    records['thread'] = _decode_integers(data, thread_starts, colons - 1)
+
+    # The name is preceded by the offset-spaces, newline is never space so the search is bounded
+    name_starts = colons + 1
+    is_indented = is_space[name_starts]
+    name_starts[is_indented] = word_starts[
+        numpy.searchsorted(word_starts, name_starts[is_indented])
+    ]
+    records['offset'] = name_starts - colons - 1
+    # The function end records have no names, so only the rest of the names is interned
+    is_named = types != RecordType.FuncEnd
+    records['name'] = name_table.intern('')
+    records['name'][is_named] = _intern_names(
+        data, name_starts[is_named], line_ends[is_named], name_table
+    )
+    return records
+
+
+def _line_at(block, line_start):
+    """
+    :param bytes block: the block of complete lines
+    :param int line_start: the position of the beginning of the line
+    :returns str: the line starting at the given position, e.g. for reporting the errors
+    """
+    return repr(block[line_start:block.find(b'\n', line_start)].decode('utf-8', 'replace'))
+
+
+def _windows(data, starts, width):
+    """Gathers the windows of the data of the given width, i.e. data[start:start+width] for each
+    of the starts, where the bytes outside of the data are zero
+
+    :param numpy.ndarray data: the decoded block of lines
+    :param numpy.ndarray starts: the positions of the windows
+    :param int width: the width of the windows
+    :returns numpy.ndarray: two dimensional array of the windows
+    """
+    before, after = max(0, -int(starts.min())), max(0, int(starts.max()) + width - len(data))
+    if before or after:
+        data = numpy.concatenate((numpy.zeros(before, dtype=numpy.uint8), data,
+                                  numpy.zeros(after, dtype=numpy.uint8)))
+    windows = numpy.lib.stride_tricks.as_strided(
+        data, shape=(len(data) - width + 1, width), strides=(1, 1), writeable=False
+    )
+    return windows[starts + before]
+
+
+def _count_trailing_digits(data, ends, width):
+    """
+    :param numpy.ndarray data: the decoded block of lines
+    :param numpy.ndarray ends: the positions after the last digits
+    :param int width: the maximal number of digits
+    :returns numpy.ndarray: the number of digits preceding the ends
+    """
+    windows = _windows(data, ends - width, width)
+    is_digit = (windows >= _ZERO) & (windows <= _NINE)
+    # The windows full of digits are returned as having no digits, i.e. as malformed
+    return numpy.argmin(is_digit[:, ::-1], axis=1)
+
+
+def _decode_integers(data, starts, ends):
+    """Decodes the decimal integers stored in the data between the starts and ends
+
+    :param numpy.ndarray data: the decoded block of lines
+    :param numpy.ndarray starts: the positions of the first digits
+    :param numpy.ndarray ends: the positions after the last digits
+    :returns numpy.ndarray: the decoded integers
+    """
+    width = int((ends - starts).max())
+    # Align the integers to the right, so the weight of each digit is given by its column
+    digits = _windows(data, ends - width, width).astype(numpy.int64) - _ZERO
+    digits[numpy.arange(width) < (width - (ends - starts))[:, numpy.newaxis]] = 0
+    if digits.min() < 0 or digits.max() > 9:
+        raise ValueError("malformed number in the collection output")
+    return digits.dot(10 ** numpy.arange(width - 1, -1, -1, dtype=numpy.int64))
+
+
+def _intern_names(data, starts, ends, name_table):
+    """Interns the names stored in the data between the starts and ends
+
+    The names are grouped by their hashes, which are computed from the words of the names padded
+    to the same width. The names are compared by their strings only if the hashes collide.
+
+    :param numpy.ndarray data: the decoded block of lines
+    :param numpy.ndarray starts: the positions of the first characters of the names
+    :param numpy.ndarray ends: the positions after the last characters of the names
+    :param NameTable name_table: the table of interned probe names
+    :returns numpy.ndarray: the ids of the names
+    """
+    lengths = ends - starts
+    if not len(lengths) or not lengths.max():
+        return numpy.full(len(starts), name_table.intern(''), dtype=numpy.int32)
+    width = -(-int(lengths.max()) // 8) * 8
+    names = _windows(data, starts, width)
+    names[numpy.arange(width) >= lengths[:, numpy.newaxis]] = 0
+    words = names.view(numpy.uint64)
+    hashes = words[:, 0].copy()
+    for column in words.T[1:]:
+        hashes *= numpy.uint64(_HASH_MULTIPLIER)
+        hashes ^= column
+    _, first_names, block_ids = numpy.unique(hashes, return_index=True, return_inverse=True)
+    if not (words == words[first_names][block_ids]).all():
+        _, first_names, block_ids = numpy.unique(
+            names.view('S{}'.format(width)).ravel(), return_index=True, return_inverse=True
+        )
+    name_ids = numpy.array([
+        name_table.intern(name.decode('utf-8'))
+        for name in names[first_names].view('S{}'.format(width)).ravel()
+    ], dtype=numpy.int32)
+    return name_ids[block_ids]
+
+
+class FuncRecordPairing(object):
+    """Pairs the begin and end records of the functions over the arrays of records
+
+    The pairing corresponds to the trace stack of each thread: the end record is paired with
+    the last unpaired begin record of the same thread, i.e. with the begin record on the same
+    level of the call stack. The unpaired begin records are kept for the next arrays.
+
+    :ivar dict samples: mapping of the function names to their sampling
+    :ivar numpy.ndarray sample: the sampling of the functions indexed by name ids
+    :ivar numpy.ndarray counts: the number of begin records of the functions indexed by name ids
+    :ivar numpy.ndarray open_records: the unpaired begin records
+    :ivar numpy.ndarray open_sequences: the sequence numbers of the unpaired begin records
+    """
+    def __init__(self, func):
+        """
+        :param list func: the function probe specifications
+        """
+        self.samples = {record['name']: record['sample'] for record in func}
+        self.sample = numpy.empty(0, dtype=numpy.int64)
+        self.counts = numpy.empty(0, dtype=numpy.int64)
+        self.open_records = numpy.empty(0, dtype=RECORD_DTYPE)
+        self.open_sequences = numpy.empty(0, dtype=numpy.int64)
+
+    def pair(self, records, name_table):
+        """Pairs the function records with each other and with the records left from the previous
+        calls of the pair.
+
+        :param numpy.ndarray records: the function begin and end records
+        :param NameTable name_table: the table of interned probe names
+        :returns tuple: the arrays of paired begin records, sequence numbers of the begin records,
+            and indices of the corresponding end records in the ``records`` ordered by the indices
+        """
+        if not len(records):
+            return records, numpy.empty(0, dtype=numpy.int64), numpy.empty(0, dtype=numpy.int64)
+        self._update_samples(name_table)
+        is_begin = records['type'] == RecordType.FuncBegin
+        sequences = numpy.zeros(len(records), dtype=numpy.int64)
+        sequences[is_begin] = self._assign_sequences(records['name'][is_begin])
+
+        # Prepend the records that are still on the trace stacks
+        opened = len(self.open_records)
+        records = numpy.concatenate((self.open_records, records))
+        sequences = numpy.concatenate((self.open_sequences, sequences))
+        is_begin = numpy.concatenate((numpy.ones(opened, dtype=bool), is_begin))
+
+        # Compute the depth of the trace stacks, the begin and end have the same level
+        threads = records['thread']
+        if (threads == threads[0]).all():
+            # Most of the blocks are produced by single thread, hence need no grouping
+            by_thread = numpy.arange(len(records))
+        else:
+            by_thread = numpy.argsort(threads, kind='mergesort')
+            threads = threads[by_thread]
+        steps = numpy.where(is_begin[by_thread], 1, -1)
+        depths = numpy.cumsum(steps)
+        thread_starts = numpy.flatnonzero(numpy.concatenate(([True], threads[1:] != threads[:-1])))
+        thread_ids = numpy.cumsum(numpy.concatenate(([False], threads[1:] != threads[:-1])))
+        depths -= (depths - steps)[thread_starts][thread_ids]
+        if depths.min() < 0:
+            self._raise_corruption(
+                records, sequences, by_thread[numpy.argmax(depths < 0)], name_table
+            )
+        levels = depths + (steps < 0)
+
+        # The records on the same level then alternate between the begins and the ends
+        by_level = by_thread[
+            numpy.argsort(thread_ids * (levels.max() + 1) + levels, kind='mergesort')
+        ]
+        ends = numpy.flatnonzero(~is_begin[by_level])
+        # Order the pairs by the end records
+        paired_begins = numpy.empty(len(records), dtype=numpy.int64)
+        paired_begins[by_level[ends]] = by_level[ends - 1]
+        end_indices = numpy.flatnonzero(~is_begin)
+        begin_indices = paired_begins[end_indices]
+        invalid = records['offset'][end_indices] != records['offset'][begin_indices] - 1
+        if numpy.any(invalid):
+            self._raise_corruption(
+                records, sequences, end_indices[numpy.argmax(invalid)], name_table
+            )
+
+        is_open = is_begin.copy()
+        is_open[begin_indices] = False
+        self.open_records = records[is_open]
+        self.open_sequences = sequences[is_open]
+        return records[begin_indices], sequences[begin_indices], end_indices - opened
+
+    def _update_samples(self, name_table):
+        """Extends the sampling and counts of the functions by the newly interned names
+
+        :param NameTable name_table: the table of interned probe names
+        """
+        new_names = name_table.names[len(self.sample):]
+        self.sample = numpy.concatenate(
+            (self.sample, [self.samples.get(name, 1) for name in new_names])
+        ).astype(numpy.int64)
+        self.counts = numpy.concatenate(
+            (self.counts, numpy.zeros(len(new_names), dtype=numpy.int64))
+        )
+
+    def _assign_sequences(self, names):
+        """Assigns the sequence numbers to the begin records of the functions
+
+        :param numpy.ndarray names: the name ids of the begin records in the order of the records
+        :returns numpy.ndarray: the sequence numbers of the records
+        """
+        by_name = numpy.argsort(names, kind='mergesort')
+        sorted_names = names[by_name]
+        name_starts = numpy.searchsorted(sorted_names, sorted_names)
+        ranks = numpy.empty(len(names), dtype=numpy.int64)
+        ranks[by_name] = numpy.arange(len(names)) - name_starts
+        sequences = (self.counts[names] + ranks) * self.sample[names]
+        self.counts += numpy.bincount(names, minlength=len(self.counts))
+        return sequences
+
+    @staticmethod
+    def _raise_corruption(records, sequences, index, name_table):
+        """Raises the exception for the record that could not be paired, with the trace stack
+        of its thread replayed from the records preceding it
+
+        :param numpy.ndarray records: the function records
+        :param numpy.ndarray sequences: the sequence numbers of the records
+        :param int index: the index of the corrupted record
+        :param NameTable name_table: the table of interned probe names
+        """
+        def to_tuple(position):
+            record = records[position]
+            return TraceRecord(
+                RecordType(int(record['type'])), int(record['offset']),
+                name_table[int(record['name'])], int(record['timestamp']),
+                int(record['thread']), int(sequences[position])
+            )
+
+        trace_stack = []
+        thread_records = numpy.flatnonzero(records['thread'][:index] == records['thread'][index])
+        for position in thread_records:
+            if records['type'][position] == RecordType.FuncBegin:
+                trace_stack.append(to_tuple(position))
+            else:
+                trace_stack.pop()
+        raise exceptions.TraceStackException(to_tuple(index), trace_stack)
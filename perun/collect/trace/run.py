@@ -11,6 +11,7 @@ import os
 
 import click
 
+import perun.collect.trace.aggregator as aggregator
 import perun.collect.trace.strategy as strategy
 import perun.collect.trace.systemtap as systemtap
 import perun.collect.trace.systemtap_script as stap_script
@@ -41,6 +42,9 @@ _COLLECTOR_STATUS = {
 # The time conversion constant
 _MICRO_TO_SECONDS = 1000000.0
 
+# The collected times need exclusive cores, hence the jobs are never run concurrently with others
+CONCURRENCY_SAFE = False
+
 
 def before(**kwargs):
     """ Assembles the SystemTap script according to input parameters and collection strategy
@@ -51,6 +55,7 @@ def before(**kwargs):
      - script_path: path to the generated script file
      - log_path: path to the collection log
      - output_path: path to the collection output
+     - names_path: path to the names of the probes in the binary collection output
 
     :param kwargs: dictionary containing the configuration settings for the collector
     :returns: tuple (int as a status code, nonzero values for errors,
@@ -65,10 +70,14 @@ def before(**kwargs):
         _, kwargs['cmd_dir'], kwargs['cmd_base'] = utils.get_path_dir_file(kwargs['cmd'])
         kwargs['script_path'] = _create_collector_file('script', '.stp', **kwargs)
         kwargs['log_path'] = _create_collector_file('log', **kwargs)
-        kwargs['output_path'] = _create_collector_file('record', **kwargs)
 
         # Validate collection parameters
         kwargs = _validate_input(**kwargs)
+        if kwargs['output_format'] == 'binary':
+            kwargs['output_path'] = _create_collector_file('record', '.bin', **kwargs)
+            kwargs['names_path'] = _create_collector_file('names', '.json', **kwargs)
+        else:
+            kwargs['output_path'] = _create_collector_file('record', **kwargs)
 
         # Extract and / or post process the collect configuration
         kwargs = strategy.extract_configuration(**kwargs)
@@ -139,7 +148,9 @@ def after(**kwargs):
         # Update the profile dictionary
         kwargs['profile'] = {
             'global': {
-                'timestamp': sum(res['amount'] for res in resources) / _MICRO_TO_SECONDS,
+                'timestamp': sum(
+                    res.get('sum', res['amount']) for res in resources
+                ) / _MICRO_TO_SECONDS,
                 'resources': resources
             }
         }
@@ -181,6 +192,14 @@ def _validate_input(**kwargs):
     if 'cleanup' not in kwargs:
         kwargs['cleanup'] = True
 
+    if 'aggregate' not in kwargs:
+        kwargs['aggregate'] = False
+    if kwargs.get('bucket_width', 0) <= 0:
+        kwargs['bucket_width'] = aggregator.DEFAULT_BUCKET_WIDTH
+
+    if kwargs.get('output_format') not in ('text', 'binary'):
+        kwargs['output_format'] = 'text'
+
     # Set the binary if not provided
     if not kwargs['binary']:
         kwargs['binary'] = os.path.realpath(kwargs['cmd'])
@@ -234,6 +253,16 @@ def _create_collector_file(name, suffix='.txt', **kwargs):
 @click.option('--cleanup/--no-cleanup', default=True,
               help='Enable/disable the pre-cleanup of possibly running systemtap processes that'
                    ' could cause the corruption of the output file due to multiple writes.')
+@click.option('--output-format', '-of', type=click.Choice(['text', 'binary']), default='text',
+              help='Set the format of the collection output. The binary format consists of'
+                   ' fixed-width records with probe ids instead of names, which are smaller'
+                   ' and faster to both write and process.')
+@click.option('--aggregate/--no-aggregate', default=False,
+              help='Aggregate the durations per function (or pair of static probes), thread and'
+                   ' bucket of structure unit sizes into resources with count, sum, min, max and'
+                   ' histogram of the durations instead of creating resource for each call.')
+@click.option('--bucket-width', '-bw', type=int, default=aggregator.DEFAULT_BUCKET_WIDTH,
+              help='Set the width of the buckets of structure unit sizes used for aggregation.')
 @click.pass_context
 def trace(ctx, **kwargs):
     """Generates `trace` performance profile, capturing running times of
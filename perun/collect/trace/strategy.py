@@ -9,12 +9,23 @@
     pair static rules, merge the sampled / non-sampled rules etc.)
 
     extract_configuration serves as a recommended module interface
+
+    The extracted function symbols (including the filtered user symbols and demangled names) and
+    static probe locations are cached in the ``.perun/cache`` directory, keyed by the build-id
+    of the binary (or hash of its contents, if the binary has no build-id), so the repeated
+    collections of the same binary skip the extraction. Only the caches of the most recently
+    profiled binaries are kept (see :data:`_MAX_PROBE_CACHES`).
 """
 
 import collections
+import json
+import os
+import tempfile
 from enum import IntEnum
 
+import perun.logic.pcs as pcs
 import perun.utils as utils
+import perun.utils.exceptions as exceptions
 
 
 class _Status(IntEnum):
@@ -26,6 +37,10 @@ class _Status(IntEnum):
 
 # The default global sampling for 'sample' strategies if global sampling is not set
 _DEFAULT_SAMPLE = 20
+# The prefix of the files with cached extracted probes
+_PROBE_CACHE_PREFIX = 'trace-probes-'
+# The maximal number of binaries with cached extracted probes
+_MAX_PROBE_CACHES = 64
 
 
 # TODO: rethink the probes data structures!!!
@@ -245,22 +260,44 @@ def _extract_functions(binary, method, global_sampling, **_):
     :param int global_sampling: the sampling value applied to all extracted function locations
     :return list: extracted function symbols stored as a probes = dictionaries
     """
+    symbols = _cached_extraction(binary, 'functions', lambda: _extract_function_symbols(binary))
+    if symbols is None:
+        return []
+    # Take only the filtered user functions for the userspace strategies
+    functions = symbols['user'] if method in ('userspace', 'u_sampled') else symbols['all']
+    return [{'name': func, 'sample': global_sampling} for func in functions]
+
+
+def _extract_function_symbols(binary):
+    """Extracts the function symbols from the supplied binary using nm.
+
+    :param str binary: path to the binary file
+    :return dict: the names of all ('T' and 'W') function symbols, of the user ('T' and filtered
+        by :func:`_filter_user_symbol`) function symbols and the demangled names of all function
+        symbols (if c++filt is available), or None if the nm or awk utils are missing
+    """
     # Check if nm and awk utils are available, both are needed for the extraction
     if not utils.check_dependency('nm') or not utils.check_dependency('awk'):
-        return []
-    user = method in ('userspace', 'u_sampled')
+        return None
 
-    # Extract user function symbols from the supplied binary
-    awk_filter = '$2 == "T"' if user else '$2 == "T" || $2 == "W"'
+    # Extract function symbols from the supplied binary together with their types
     output, _ = utils.run_safely_external_command(
-        'nm -P {bin} | awk \'{filt} {{print $1}}\''.format(bin=binary, filt=awk_filter))
-    output = output.decode('utf-8')
+        'nm -P {bin} | awk \'$2 == "T" || $2 == "W" {{print $1, $2}}\''.format(bin=binary))
+    symbols = [line.split(' ') for line in output.decode('utf-8').splitlines()]
+    symbols = [symbol for symbol in symbols if len(symbol) == 2]
 
     # Transform to the desired format
-    if user:
-        return [{'name': func, 'sample': global_sampling} for func in output.splitlines() if
-                _filter_user_symbol(func)]
-    return [{'name': func, 'sample': global_sampling} for func in output.splitlines()]
+    extracted = {
+        'all': [func for (func, _) in symbols],
+        'user': [func for (func, kind) in symbols if kind == 'T' and _filter_user_symbol(func)]
+    }
+    if utils.check_dependency('c++filt') and extracted['all']:
+        with tempfile.TemporaryFile() as names_handle:
+            names_handle.write('\n'.join(extracted['all']).encode('utf-8'))
+            names_handle.seek(0)
+            output = utils.get_stdout_from_external_command(['c++filt'], stdin=names_handle)
+        extracted['demangled'] = output.splitlines()
+    return extracted
 
 
 def _extract_static_probes(binary, global_sampling, **_):
@@ -270,16 +307,28 @@ def _extract_static_probes(binary, global_sampling, **_):
     :param int global_sampling: the sampling value applied to all extracted static probe locations
     :return list: extracted static locations stored as a probes = dictionaries
     """
+    probes = _cached_extraction(binary, 'static', lambda: _extract_static_probe_names(binary))
+
+    # Transform
+    return [{'name': probe, 'sample': global_sampling} for probe in probes or []]
+
+
+def _extract_static_probe_names(binary):
+    """Extracts the names of static probe locations from the supplied binary.
+
+    :param str binary: path to the binary file
+    :return list: the names of the static probe locations, or None if the stap is missing
+    """
     # Extract the static probe locations from the binary
     # note: stap -l returns code '1' if there are no static probes
     output = _static_stap_extractor(binary)
+    if output is None:
+        return None
 
     # There are no static probes in the binary
     if not output or output.lstrip(' ').startswith('Tip:'):
         return []
-
-    # Transform
-    return [{'name': probe, 'sample': global_sampling} for probe in _static_probe_filter(output)]
+    return list(_static_probe_filter(output))
 
 
 def _static_stap_extractor(binary):
@@ -287,13 +336,83 @@ def _static_stap_extractor(binary):
     systemtap invocation.
 
     :param str binary: path to the binary file
-    :return str: the decoded standard output
+    :return str: the decoded standard output, or None if the stap is missing
     """
     if utils.check_dependency('stap'):
         out, _ = utils.run_safely_external_command(
             'sudo stap -l \'process("{bin}").mark("*")\''.format(bin=binary), False)
         return out.decode('utf-8')
-    return ''
+    return None
+
+
+def _cached_extraction(binary, section, extractor):
+    """Looks up the extracted probes of the binary in the cache, or extracts and caches them
+
+    The cached probes are stored in the JSON file named by the identifier of the binary (see
+    :func:`perun.utils.get_binary_identifier`) in the ``.perun/cache`` directory, where each of
+    the sections is extracted and cached separately. The caches are ordered by the time of their
+    last use, and the least recently used ones are removed, when there are more than
+    :data:`_MAX_PROBE_CACHES` of them. If the binary is not profiled inside the perun instance,
+    the probes are extracted without caching.
+
+    :param str binary: path to the binary file
+    :param str section: the name of the section of the cached probes
+    :param function extractor: function extracting the probes, returning None if the extraction
+        is not possible (such results are not cached)
+    :return object: the extracted probes or None
+    """
+    try:
+        cache_directory = pcs.get_cache_directory()
+        cache_path = os.path.join(
+            cache_directory, _PROBE_CACHE_PREFIX + utils.get_binary_identifier(binary) + '.json'
+        )
+    except (exceptions.NotPerunRepositoryException, OSError):
+        return extractor()
+
+    cached_probes = {}
+    try:
+        with open(cache_path, 'r') as cache_handle:
+            cached_probes = json.load(cache_handle)
+        if section in cached_probes:
+            # Mark the cache as the most recently used one
+            os.utime(cache_path)
+            return cached_probes[section]
+    except (OSError, ValueError):
+        pass
+
+    extracted = extractor()
+    if extracted is not None:
+        cached_probes[section] = extracted
+        # Write the cache through the temporary file so the concurrent collections never read
+        # the partially written cache
+        temporary_path = "{}.{}.tmp".format(cache_path, os.getpid())
+        with open(temporary_path, 'w') as cache_handle:
+            json.dump(cached_probes, cache_handle)
+        os.replace(temporary_path, cache_path)
+        _evict_probe_caches(cache_directory)
+    return extracted
+
+
+def _evict_probe_caches(cache_directory):
+    """Removes the least recently used caches of the extracted probes over the limit
+
+    :param str cache_directory: the directory with the cached probes
+    """
+    cache_files = []
+    for cache_file in os.listdir(cache_directory):
+        if cache_file.startswith(_PROBE_CACHE_PREFIX) and cache_file.endswith('.json'):
+            cache_path = os.path.join(cache_directory, cache_file)
+            try:
+                cache_files.append((os.path.getmtime(cache_path), cache_path))
+            except OSError:
+                # The cache was removed by the concurrent collection
+                pass
+    cache_files.sort()
+    for _, cache_path in cache_files[:max(len(cache_files) - _MAX_PROBE_CACHES, 0)]:
+        try:
+            os.remove(cache_path)
+        except OSError:
+            pass
 
 
 def _static_probe_filter(static_list):
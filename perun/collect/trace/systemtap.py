@@ -12,14 +12,21 @@ import shutil
 import shlex
 import os
 import collections
+import heapq
 from subprocess import TimeoutExpired
 from enum import IntEnum
 
 import perun.utils as utils
 import perun.utils.exceptions as exceptions
 import perun.utils.log as log
+import perun.collect.trace.aggregator as aggregator
+import perun.collect.trace.decoder as decoder
 from perun.collect.trace.systemtap_script import RecordType
 
+import demandimport
+with demandimport.enabled():
+    import numpy
+
 
 # The default sleep value
 _DEFAULT_SLEEP = 0.5
@@ -36,11 +43,6 @@ class Status(IntEnum):
     EXCEPT = 3
 
 
-# The trace record template
-_TraceRecord = collections.namedtuple('record',
-                                      ['type', 'offset', 'name', 'timestamp', 'thread', 'sequence'])
-
-
 def systemtap_collect(script_path, log_path, output_path, cmd, args, **kwargs):
     """Collects performance data using the system tap wrapper, assembled script and
     external command. This function serves as a interface to the system tap collector.
@@ -78,7 +80,7 @@ def systemtap_collect(script_path, log_path, output_path, cmd, args, **kwargs):
             # Terminate SystemTap process after the file was fully written
             log.cprint('Data collection complete, terminating the SystemTap process... ', 'white')
             # _wait_for_fully_written(output_path)
-            _wait_for_fully_written(output_path)
+            _wait_for_fully_written(output_path, kwargs.get('output_format', 'text'))
             kill_systemtap_in_background(stap_pgid)
             log.done()
             return Status.OK, output_path
@@ -176,18 +178,26 @@ def _wait_for_systemtap_startup(logfile, stap_process):
                     return Status.OK
 
 
-def _wait_for_fully_written(output):
+def _wait_for_fully_written(output, output_format='text'):
     """Due to the system tap process being in the background, the output file is generally
     not fully written after the external command is finished and system tap process killed.
     Thus we scan the output file for ending marker that indicates finished writing.
 
     :param str output: name of the collection output file
+    :param str output_format: the format of the collection output, either 'text' or 'binary'
     """
     # Wait until the file exists and is not empty
     timeout = 0
     while not os.path.exists(output) or os.path.getsize(output) == 0:
         timeout = _sleep_with_timeout(timeout)
 
+    if output_format == 'binary':
+        # The file is ready if it ends with the complete end record
+        timeout = 0
+        while not decoder.is_binary_output_complete(output):
+            timeout = _sleep_with_timeout(timeout)
+        return True
+
     with open(output, 'rb') as content:
         # Find the last line of the file
         timeout = 0
@@ -319,44 +329,183 @@ def _remove_stap_modules(modules):
         utils.run_safely_external_command(rm_cmd, False)
 
 
-def trace_to_profile(output_path, func, static, **kwargs):
+def trace_to_profile(output_path, func, static, is_writing=None, output_format='text',
+                     names_path=None, aggregate=False,
+                     bucket_width=aggregator.DEFAULT_BUCKET_WIDTH, **kwargs):
     """Transforms the collection output into the performance profile, where the
     collected time data are paired and stored as a resources.
 
+    The output is decoded by blocks of lines (or binary records) into the arrays of records (see
+    :mod:`perun.collect.trace.decoder`), hence only the records on the trace stacks (i.e. bounded
+    by the depth of the live call stacks) are kept in the memory between the blocks. If the
+    function ``is_writing`` is given, the output is moreover followed as it is written, so the
+    resources can be produced while the collection is still running.
+
     :param str output_path: name of the collection output file
     :param list func: the function probe specifications
     :param list static: the static probe specifications as a dictionaries
+    :param function is_writing: function returning true while the output is still being written
+        (e.g. while the stap process is running), or None if the output is already complete
+    :param str output_format: the format of the collection output, either 'text' or 'binary'
+    :param str names_path: path to the names of the probes in the binary output
+    :param bool aggregate: if set to true, the durations are aggregated per uid, thread and bucket
+        of structure unit sizes (see :mod:`perun.collect.trace.aggregator`) and the aggregated
+        resources are produced after the whole output is processed
+    :param int bucket_width: the width of the buckets of structure unit sizes for aggregation
     :param kwargs: additional parameters
     :return object: the generator object that produces dictionaries representing the resources
     """
-    trace_stack = {'func': collections.defaultdict(list),  # thread -> trace stack
-                   # thread -> name -> stack
-                   'static': collections.defaultdict(lambda: collections.defaultdict(list)),
-                   'dynamic': collections.defaultdict(lambda: collections.defaultdict(list))}
-    sequence_map = {'func': {record['name']: {'seq': 0, 'sample': record['sample']}
-                             for record in func},
-                    'static': {record['name']: {'seq': 0, 'sample': record['sample']}
-                               for record in static},
-                    'dynamic': collections.defaultdict(int)}
-
-    with open(output_path, 'r') as trace:
+    # thread -> name -> stack
+    static_stack = collections.defaultdict(lambda: collections.defaultdict(list))
+    static_sequence_map = {record['name']: {'seq': 0, 'sample': record['sample']}
+                           for record in static}
+    name_table = decoder.NameTable()
+    func_pairing = decoder.FuncRecordPairing(func)
+    workload = kwargs.get('workload', "")
+
+    with open(output_path, 'rb') as trace:
         # Create demangled counterparts of the function names
         # trace = _demangle(trace)
 
-        for line in trace.read().splitlines(keepends=True):
-            # File ended
-            if line in ('end', 'end\n'):
-                return
-
-            # Parse the line into the _TraceRecord tuple
-            record = _parse_record(line)
-            # Process the record
-            resource = _process_record(record, trace_stack, sequence_map, static)
-            if resource:
-                resource['workload'] = kwargs.get('workload', "")
+        if output_format == 'binary':
+            probe_names = decoder.load_probe_names(names_path, name_table)
+            blocks = (decoder.decode_binary_records(binary_records, probe_names)
+                      for binary_records in decoder.read_binary_blocks(trace, is_writing))
+        else:
+            blocks = (decoder.decode_block(block, name_table)
+                      for block in decoder.read_trace_blocks(trace, is_writing))
+        if aggregate:
+            resource_aggregator = aggregator.ResourceAggregator(bucket_width)
+            for records in blocks:
+                _aggregate_records(
+                    records, func_pairing, static_stack, static_sequence_map, static, name_table,
+                    resource_aggregator
+                )
+            for resource in resource_aggregator.resources(name_table, workload):
+                yield resource
+            return
+
+        for records in blocks:
+            is_func = records['type'] <= RecordType.FuncEnd
+            func_resources = _process_func_records(
+                records, numpy.flatnonzero(is_func), func_pairing, name_table, workload
+            )
+            static_resources = _process_static_records(
+                records, numpy.flatnonzero(~is_func), static_stack, static_sequence_map, static,
+                name_table, workload
+            )
+            if not static_resources:
+                for _, resource in func_resources:
+                    yield resource
+                continue
+            # Keep the order of the resources given by their end records (the indices are unique)
+            for _, resource in heapq.merge(func_resources, static_resources):
                 yield resource
 
 
+def _aggregate_records(records, func_pairing, trace_stack, sequence_map, static, name_table,
+                       resource_aggregator):
+    """Pairs the records of one block and aggregates their durations
+
+    :param numpy.ndarray records: the decoded block of records
+    :param FuncRecordPairing func_pairing: the pairing of function records between blocks
+    :param dict trace_stack: the static trace stacks for every thread and probe name
+    :param dict sequence_map: stores the sequence counter for every static probe
+    :param list static: the list of static probes used for pairing the static records
+    :param NameTable name_table: the table of interned probe names
+    :param ResourceAggregator resource_aggregator: the aggregator of the durations
+    """
+    is_func = records['type'] <= RecordType.FuncEnd
+    _, amounts, names, threads, sequences = _pair_func_records(
+        records, numpy.flatnonzero(is_func), func_pairing, name_table
+    )
+    resource_aggregator.add(names, threads, sequences, amounts)
+
+    static_resources = [resource for (_, resource) in _process_static_records(
+        records, numpy.flatnonzero(~is_func), trace_stack, sequence_map, static, name_table, ''
+    )]
+    resource_aggregator.add(
+        [name_table.intern(resource['uid']) for resource in static_resources],
+        [aggregator.NO_THREAD] * len(static_resources),
+        [resource['structure-unit-size'] for resource in static_resources],
+        [resource['amount'] for resource in static_resources]
+    )
+
+
+def _pair_func_records(records, func_indices, func_pairing, name_table):
+    """Pairs the function records of one block
+
+    :param numpy.ndarray records: the decoded block of records
+    :param numpy.ndarray func_indices: the indices of function begin and end records
+    :param FuncRecordPairing func_pairing: the pairing of function records between blocks
+    :param NameTable name_table: the table of interned probe names
+    :return tuple: arrays of the indices of the end records, durations, name ids, threads and
+        sequence numbers of the paired calls
+    """
+    begins, sequences, ends = func_pairing.pair(records[func_indices], name_table)
+    end_indices = func_indices[ends]
+    end_records = records[end_indices]
+    amounts = end_records['timestamp'] - begins['timestamp']
+    return end_indices, amounts, begins['name'], end_records['thread'], sequences
+
+
+def _process_func_records(records, func_indices, func_pairing, name_table, workload):
+    """Pairs the function records of one block and transforms them into the resources
+
+    :param numpy.ndarray records: the decoded block of records
+    :param numpy.ndarray func_indices: the indices of function begin and end records
+    :param FuncRecordPairing func_pairing: the pairing of function records between blocks
+    :param NameTable name_table: the table of interned probe names
+    :param str workload: the workload of the resources
+    :return list: pairs of the index of the end record and the resource dictionary
+    """
+    end_indices, amounts, name_ids, threads, sequences = _pair_func_records(
+        records, func_indices, func_pairing, name_table
+    )
+    names = name_table.names
+    return [
+        (end_index, {'amount': amount,
+                     'uid': names[name],
+                     'type': 'mixed',
+                     'subtype': 'time delta',
+                     'thread': thread,
+                     'structure-unit-size': sequence,
+                     'workload': workload})
+        for end_index, amount, name, thread, sequence in zip(
+            end_indices.tolist(), amounts.tolist(), name_ids.tolist(), threads.tolist(),
+            sequences.tolist()
+        )
+    ]
+
+
+def _process_static_records(records, static_indices, trace_stack, sequence_map, static,
+                            name_table, workload):
+    """Pairs the static records of one block and transforms them into the resources
+
+    :param numpy.ndarray records: the decoded block of records
+    :param numpy.ndarray static_indices: the indices of static records
+    :param dict trace_stack: the static trace stacks for every thread and probe name
+    :param dict sequence_map: stores the sequence counter for every static probe
+    :param list static: the list of static probes used for pairing the static records
+    :param NameTable name_table: the table of interned probe names
+    :param str workload: the workload of the resources
+    :return list: pairs of the index of the record and the resource dictionary
+    """
+    resources = []
+    for index, rtype, offset, timestamp, thread, name in zip(
+            static_indices.tolist(), *(records[static_indices][field].tolist()
+                                       for field in ('type', 'offset', 'timestamp', 'thread',
+                                                     'name'))):
+        record = decoder.TraceRecord(
+            RecordType(rtype), offset, name_table[name], timestamp, thread, 0
+        )
+        resource = _process_static_record(record, trace_stack[thread], sequence_map, static)
+        if resource:
+            resource['workload'] = workload
+            resources.append((index, resource))
+    return resources
+
+
 # TODO: this should be used only after symbol cross-compare is functional
 # def _demangle(trace):
 #     """ Demangles the c++ function names in the collection output file if possible,
@@ -373,62 +522,10 @@ def trace_to_profile(output_path, func, static, **kwargs):
 #         return trace
 
 
-def _process_record(record, trace_stack, sequence_map, static):
-    """Process one output file line = record by calling corresponding functions for
-    the given record type.
-
-    :param namedtuple record: the _TraceRecord namedtuple with parsed line values
-    :param dict trace_stack: the trace stack dictionary containing trace stacks for
-                             function / static / etc. probes
-    :param dict sequence_map: the map of sequence numbers for function / static / etc. probe names
-    :param list static: the list of static probes used for pairing the static records
-    :return dict: the record transformed into the performance resource or empty dict if no resource
-                  could be produced
-    """
-    # The record is function begin or end point
-    if record.type == RecordType.FuncBegin or record.type == RecordType.FuncEnd:
-        resource = _process_func_record(record, trace_stack['func'][record.thread],
-                                        sequence_map['func'])
-        return resource
-    # The record is static probe point
-    resource = _process_static_record(record, trace_stack['static'][record.thread],
-                                      sequence_map['static'], static)
-    return resource
-
-
-def _process_func_record(record, trace_stack, sequence_map):
-    """Processes the function output record and tries to pair it with stack record if possible
-
-    :param namedtuple record: the _TraceRecord namedtuple with parsed line values
-    :param list trace_stack: the trace stack for function records
-    :param dict sequence_map: stores the sequence counter for every function
-    :returns dict: the resource dictionary or empty dict
-    """
-    if record.type == RecordType.FuncBegin:
-        # Function entry, add to stack and note the sequence number
-        # TODO: temporary workaround until symbol cross-compare is finished
-        try:
-            _add_to_stack(trace_stack, sequence_map, record)
-        except KeyError:
-            sequence_map[record.name] = {'seq': 0, 'sample': 1}
-            _add_to_stack(trace_stack, sequence_map, record)
-        return {}
-    if trace_stack and record.offset == trace_stack[-1].offset - 1:
-        # Function exit, match with the function enter to create resources record
-        matching_record = trace_stack.pop()
-        return {'amount': int(record.timestamp) - int(matching_record.timestamp),
-                'uid': matching_record.name,
-                'type': 'mixed',
-                'subtype': 'time delta',
-                'thread': record.thread,
-                'structure-unit-size': matching_record.sequence}
-    raise exceptions.TraceStackException(record, trace_stack)
-
-
 def _process_static_record(record, trace_stack, sequence_map, probes):
     """Processes the static output record and tries to pair it with stack record if possible
 
-    :param namedtuple record: the _TraceRecord namedtuple with parsed line values
+    :param namedtuple record: the TraceRecord namedtuple with parsed line values
     :param dict trace_stack: the dictionary containing trace stack (list) for each static probe
     :param dict sequence_map: stores the sequence counter for every static probe
     :param list probes: the list of all static probe definitions for pairing
@@ -471,32 +568,7 @@ def _add_to_stack(trace_stack, sequence_map, record):
 
     :param list trace_stack: the trace stack list
     :param dict sequence_map: the sequence mapping dictionary
-    :param namedtuple record: the _TraceRecord namedtuple representing the parsed record
+    :param namedtuple record: the TraceRecord namedtuple representing the parsed record
     """
     trace_stack.append(record._replace(sequence=sequence_map[record.name]['seq']))
     sequence_map[record.name]['seq'] += sequence_map[record.name]['sample']
-
-
-def _parse_record(line):
-    """ Parses line from collector output into record tuple consisting of:
-        record type, call stack offset, rule name, timestamp and sequence.
-
-    :param str line: one line from the collection output
-    :returns namedtuple: the _TraceRecord tuple
-    """
-
-    # Split the line into = 'type' 'timestamp' 'process(pid)' : 'offset' 'rule'
-    left, _, right = line.partition(':')
-    # Parse the type = '0 - 9 decimal'
-    left = left.split()
-    rtype = RecordType(int(left[0]))
-    # Parse the timestamp
-    timestamp = left[1]
-    # Parse the pid - find the rightmost '(' and read the number between braces
-    thread = int(left[2][left[2].rfind('(') + 1:-1])
-
-    # Parse the offset and rule name = 'offset-spaces rule\n'
-    right = right.rstrip('\n')
-    name = right.lstrip(' ')
-    offset = len(right) - len(name)
-    return _TraceRecord(rtype, offset, name, timestamp, thread, 0)
@@ -5,10 +5,12 @@ Creates SystemTap script according to the specification:
  - static probe locations
  - global sampling
  - custom sampling
+ - text or binary output format
 
 """
 
-
+import collections
+import json
 from enum import IntEnum
 
 
@@ -22,14 +24,26 @@ class RecordType(IntEnum):
     StaticEnd = 4
 
 
-def assemble_system_tap_script(script_path, func, static, dynamic, binary, **_):
+# The format of the records in the binary output: type, offset, probe id, timestamp and thread
+BINARY_RECORD_FORMAT = '%1b%4b%4b%8b%4b'
+# The type of the record that marks the end of the binary output
+BINARY_END_TYPE = 255
+
+
+def assemble_system_tap_script(script_path, func, static, dynamic, binary, output_format='text',
+                               names_path=None, **_):
     """Assembles system tap script according to the configuration parameters.
 
+    In the binary output format, the probes write fixed-width records with probe ids instead of
+    the probe names. The mapping of the ids to the names is then stored in the ``names_path``.
+
     :param str script_path: path to the script file, that should be generated
     :param list func: the list of functions to probe, each function is represented with dictionary
     :param list static: the list of static probe locations represented as a dictionaries
     :param list dynamic: the list of dynamic probe locations represented as a dictionaries
     :param str binary: the binary / executable file that contains specified probe points
+    :param str output_format: the format of the collection output, either 'text' or 'binary'
+    :param str names_path: path to the file with the names of the probes, used for binary format
     """
     script = ''
 
@@ -39,6 +53,14 @@ def assemble_system_tap_script(script_path, func, static, dynamic, binary, **_):
     static = next(indexer)
     dynamic = next(indexer)  # The dynamic probes are not supported yet
 
+    # Assign the ids to the probes for the binary output
+    probe_ids = None
+    if output_format == 'binary':
+        probe_ids = _index_probe_names(func, static)
+        with open(names_path, 'w') as names_handle:
+            json.dump(list(probe_ids), names_handle)
+        script += 'global stack_depth\n'
+
     # Get sampled probes and prepare the sampling array
     sampled_probes = next(indexer)
     if sampled_probes:
@@ -46,26 +68,60 @@ def assemble_system_tap_script(script_path, func, static, dynamic, binary, **_):
         script += _sampling_array_init_for(binary, 0, sampled_probes)
 
     for func_probe in func:
-        script += _function_probe(func_probe, binary, 0)
+        script += _function_probe(func_probe, binary, 0, probe_ids)
 
     for rule in static:
-        script += _static_probe(rule, binary, 0)
+        script += _static_probe(rule, binary, 0, probe_ids)
 
     # Add the ending marker to determine the output is fully written
-    script += _end_marker(binary)
+    script += _end_marker(binary, probe_ids is not None)
 
     # Create the file and save the script
     with open(script_path, 'w') as stp_handle:
         stp_handle.write(script)
 
 
-def _end_marker(process):
+def _index_probe_names(func, static):
+    """Assigns ids to the names of the function and static probes (including the paired ones)
+
+    :param list func: the list of function specification as dictionaries
+    :param list static: the list of static probe locations that will be probed
+    :return dict: the mapping of the probe names to their ids ordered by the ids
+    """
+    probe_ids = collections.OrderedDict()
+    for probe in func + static:
+        for name in (probe['name'], probe.get('pair')):
+            if name is not None and name not in probe_ids:
+                probe_ids[name] = len(probe_ids)
+    return probe_ids
+
+
+def _binary_record(record_type, offset, probe_id):
+    """Creates the printf of the binary record
+
+    :param RecordType record_type: the type of the record
+    :param str offset: the expression of the offset of the record
+    :param int probe_id: the id of the probe
+    :return str: the printf statement writing the record
+    """
+    return 'printf("{format}", {type}, {offset}, {id}, gettimeofday_us(), tid())'.format(
+        format=BINARY_RECORD_FORMAT, type=int(record_type), offset=offset, id=probe_id
+    )
+
+
+def _end_marker(process, is_binary=False):
     """Adds marker to the collection output indicating the end of collection. This is needed to
     determine that the output file is fully written and can be further analyzed and processed.
 
     :param str process: the name of the process / executable that is profiled
+    :param bool is_binary: true if the output is in the binary format
     :return str: the rule for marker generation
     """
+    if is_binary:
+        return 'probe process("{path}").end {{\n\t{marker}\n}}'.format(
+            path=process,
+            marker=_binary_record(BINARY_END_TYPE, 0, 0)
+        )
     return 'probe process("{path}").end {{\n\tprintf("end\\n")\n}}'.format(path=process)
 
 
@@ -107,12 +163,14 @@ def _sampling_array_init_for(process, process_id, samples):
 
 # TODO: improve the temporary func parameter
 # (we would like to cross-compare mangled / demangled / user specified names)
-def _function_probe(func, process, process_id):
+def _function_probe(func, process, process_id, probe_ids=None):
     """Assembles function entry and exit probes including sampling.
 
     :param dict func: the function probe specification
     :param str process: the name of the process / executable that contains the function
     :param int process_id: the process / executable identification
+    :param dict probe_ids: the mapping of probe names to their ids in the binary output format,
+        or None in the text output format
     :return str: the script component with function probes
     """
     # Probe start and end point declaration
@@ -121,9 +179,20 @@ def _function_probe(func, process, process_id):
     end_probe = ('probe process("{proc}").function("{func}").return? {{\n'
                  .format(proc=process, func=func['name']))
     # Probes definition
-    begin_body = ('printf("{type} %s {func}\\n", thread_indent(1))'
-                  .format(type=int(RecordType.FuncBegin), func=func['name']))
-    end_body = 'printf("{type} %s\\n", thread_indent(-1))'.format(type=int(RecordType.FuncEnd))
+    if probe_ids is not None:
+        # The depth of the call stack is tracked by the script instead of the thread_indent
+        begin_body = 'stack_depth[tid()]++; ' + _binary_record(
+            RecordType.FuncBegin, 'stack_depth[tid()]', probe_ids[func['name']]
+        )
+        end_body = _binary_record(
+            RecordType.FuncEnd, 'stack_depth[tid()] - 1', probe_ids[func['name']]
+        ) + '; stack_depth[tid()]--'
+    else:
+        begin_body = ('printf("{type} %s {func}\\n", thread_indent(1))'
+                      .format(type=int(RecordType.FuncBegin), func=func['name']))
+        end_body = 'printf("{type} %s\\n", thread_indent(-1))'.format(
+            type=int(RecordType.FuncEnd)
+        )
 
     # Add sampling counter manipulation to the probe definition if needed
     begin_probe += _probe_sampling_begin(process_id, func, begin_body)
@@ -132,7 +201,7 @@ def _function_probe(func, process, process_id):
     return begin_probe + end_probe
 
 
-def _static_probe(rule, process, process_id):
+def _static_probe(rule, process, process_id, probe_ids=None):
     """Assembles static rule probe. The static probe can have corresponding paired probe,
     which serves as a exitpoint for measuring, or the paired probe may not be present, which
     means that the time will be measured between each probe hit
@@ -140,23 +209,28 @@ def _static_probe(rule, process, process_id):
     :param dict rule: the static probe specification
     :param str process: the name of the process / executable that contains the static probe point
     :param int process_id: the process / executable identification
+    :param dict probe_ids: the mapping of probe names to their ids in the binary output format,
+        or None in the text output format
     :return str: the script component with the static probe(s)
     """
+    def static_body(record_type, location):
+        if probe_ids is not None:
+            return _binary_record(record_type, 0, probe_ids[location])
+        return ('printf("{type} %s {loc}\\n", thread_indent(0))'
+                .format(loc=location, type=int(record_type)))
+
     # Create static start probe
     begin_probe = ('probe process("{proc}").mark("{loc}") {{\n'
                    .format(proc=process, loc=rule['name']))
-    begin_body = ('printf("{type} %s {loc}\\n", thread_indent(0))'
-                  .format(loc=rule['name'], type=int(RecordType.StaticSingle)))
+    begin_body = static_body(RecordType.StaticSingle, rule['name'])
     end_probe = ''
     # Create also end probe if needed
     if 'pair' in rule:
         # Update the body record type
-        begin_body = ('printf("{type} %s {loc}\\n", thread_indent(0))'
-                      .format(loc=rule['name'], type=int(RecordType.StaticBegin)))
+        begin_body = static_body(RecordType.StaticBegin, rule['name'])
         end_probe = ('probe process("{proc}").mark("{loc}") {{\n'
                      .format(proc=process, loc=rule['pair']))
-        end_body = ('printf("{type} %s {loc}\\n", thread_indent(0))'
-                    .format(loc=rule['pair'], type=int(RecordType.StaticEnd)))
+        end_body = static_body(RecordType.StaticEnd, rule['pair'])
         # Add sampling to the end probe
         end_probe += _probe_sampling_end(process_id, rule, end_body)
 
@@ -24,7 +24,7 @@ import perun.utils.timestamps as timestamp
 import perun.vcs as vcs
 
 from perun.utils.exceptions import NotPerunRepositoryException, \
-    ExternalEditorErrorException, MissingConfigSectionException
+    ExternalEditorErrorException, MissingConfigSectionException, IncorrectProfileFormatException
 from perun.utils.helpers import \
     TEXT_EMPH_COLOUR, TEXT_ATTRS, TEXT_WARN_COLOUR, \
     PROFILE_TYPE_COLOURS, PROFILE_MALFORMED, SUPPORTED_PROFILE_TYPES, \
@@ -36,6 +36,8 @@ from perun.utils.log import cprint, cprintln
 colorama.init()
 UNTRACKED_REGEX = \
     re.compile(r"([^\\]+)-([0-9]{4}-[0-9]{2}-[0-9]{2}-[0-9]{2}-[0-9]{2}-[0-9]{2}).perf")
+# Regex for the dates in the names of the profiles, which are ignored by the configurations in gc
+PROFILE_DATE_REGEX = re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2}-[0-9]{2}-[0-9]{2}-[0-9]{2}")
 # Regex for parsing the formating tag [<tag>:<size>f<fill_char>]
 FMT_REGEX = re.compile("%([a-zA-Z]+)(:[0-9]+)?(f.)?%")
 # Scanner for parsing formating strings, i.e. breaking it to parts
@@ -230,6 +232,7 @@ def add(profile_names, minor_version, keep_profile=False):
         deleted, and will be kept as it is. By default false, i.e. profile is deleted.
     """
     added_profile_count = 0
+    object_format = perun_config.lookup_key_recursively('profiles.object_format', 'json')
     for profile_name in profile_names:
         # Test if the given profile exists (This should hold always, or not?)
         if not os.path.exists(profile_name):
@@ -252,15 +255,24 @@ def add(profile_names, minor_version, keep_profile=False):
 
         # Remove origin from file
         unpacked_profile.pop('origin')
-        profile_content = profile.to_string(unpacked_profile)
 
-        # Append header to the content of the file
-        header = "profile {} {}\0".format(unpacked_profile['header']['type'], len(profile_content))
-        profile_content = (header + profile_content).encode('utf-8')
+        if object_format == 'binary':
+            # Transform to binary columnar representation, which is stored uncompressed
+            compressed_content = store.pack_binary_content(unpacked_profile)
+            profile_sum = store.compute_checksum(compressed_content)
+        else:
+            profile_content = profile.to_string(unpacked_profile)
+
+            # Append header to the content of the file
+            header = "profile {} {}\0".format(
+                unpacked_profile['header']['type'], len(profile_content)
+            )
+            profile_content = (header + profile_content).encode('utf-8')
 
-        # Transform to internal representation - file as sha1 checksum and content packed with zlib
-        profile_sum = store.compute_checksum(profile_content)
-        compressed_content = store.pack_content(profile_content)
+            # Transform to internal representation - file as sha1 checksum and content packed
+            # with zlib
+            profile_sum = store.compute_checksum(profile_content)
+            compressed_content = store.pack_content(profile_content)
 
         # Add to control
         object_dir = pcs.get_object_directory()
@@ -299,6 +311,49 @@ def remove(profile_generator, minor_version, **kwargs):
     perun_log.info("successfully removed {} from index".format(len(profile_generator)))
 
 
+def gc():
+    """Packs the loose objects of profiles into new pack with sorted index
+
+    Profiles of the same configuration are delta compressed against the first profile of the
+    configuration. The configuration is estimated without loading the profiles, from the type
+    of the profile in the header of its object and from the path, under which it was registered
+    in the index of minor version, without the date (the profile names are generated from the
+    configuration, see :func:`perun.profile.factory.generate_profile_name`). Packed loose
+    objects are removed afterwards.
+    """
+    perun_log.msg_to_stdout("Running inner wrapper of the 'perun gc'", 2)
+
+    object_directory = pcs.get_object_directory()
+    indexed_paths = store.list_indexed_paths(object_directory)
+    configurations = collections.OrderedDict()
+    for checksum in store.list_loose_objects(object_directory):
+        _, object_file = store.split_object_name(object_directory, checksum)
+        try:
+            profile_type = store.peek_profile_type(object_file)
+        except (IncorrectProfileFormatException, ValueError):
+            profile_type = PROFILE_MALFORMED
+        if checksum in indexed_paths and profile_type != PROFILE_MALFORMED:
+            configuration = (profile_type, PROFILE_DATE_REGEX.sub('', indexed_paths[checksum]))
+        else:
+            configuration = checksum
+        configurations.setdefault(configuration, []).append(checksum)
+
+    packed_objects = []
+    for checksums in configurations.values():
+        packed_objects.append((checksums[0], None))
+        packed_objects.extend((checksum, checksums[0]) for checksum in checksums[1:])
+    if not packed_objects:
+        perun_log.info("nothing to pack")
+        return
+
+    pack_file = store.write_pack(object_directory, packed_objects)
+    for checksum, _ in packed_objects:
+        os.remove(store.split_object_name(object_directory, checksum)[1])
+    perun_log.info("successfully packed {} objects into {}".format(
+        len(packed_objects), os.path.relpath(pack_file)
+    ))
+
+
 def calculate_profile_numbers_per_type(profile_list):
     """Calculates how many profiles of given type are in the profile type.
 
@@ -795,11 +850,11 @@ def status(short=False, **_):
 
 
 @lookup_minor_version
-def load_profile_from_args(profile_name, minor_version):
+def lookup_profile_from_args(profile_name, minor_version):
     """
-    :param Profile profile_name: profile that will be stored for the minor version
+    :param Profile profile_name: profile that is registered for the minor version
     :param str minor_version: SHA-1 representation of the minor version
-    :returns dict: loaded profile represented as dictionary
+    :returns str: path to the object of the registered profile, or None if it is not registered
     """
     # If the profile is in raw form
     if not store.is_sha1(profile_name):
@@ -819,11 +874,22 @@ def load_profile_from_args(profile_name, minor_version):
         return None
     chosen_profile = profiles[0]
 
-    # Peek the type if the profile is correct and load the json
+    # Peek the type if the profile is correct
     _, profile_name = store.split_object_name(pcs.get_object_directory(), chosen_profile.checksum)
     profile_type = store.peek_profile_type(profile_name)
     if profile_type == PROFILE_MALFORMED:
         perun_log.error("malformed profile {}".format(profile_name))
-    loaded_profile = profile.load_profile_from_file(profile_name, False)
+    return profile_name
 
-    return loaded_profile
+
+@lookup_minor_version
+def load_profile_from_args(profile_name, minor_version):
+    """
+    :param Profile profile_name: profile that will be stored for the minor version
+    :param str minor_version: SHA-1 representation of the minor version
+    :returns dict: loaded profile represented as dictionary
+    """
+    profile_object = lookup_profile_from_args(profile_name, minor_version)
+    if profile_object is None:
+        return None
+    return profile.load_profile_from_file(profile_object, False)
@@ -89,6 +89,30 @@ def get_log_directory():
     return logs_directory
 
 
+@singleton
+def get_cache_directory():
+    """Returns the name of the directory, where cached data (i.e. the pickled profiles, the
+    probes extracted from the profiled binaries and the resolved symbols) are stored
+
+    :return str: directory, where cached data are stored
+    """
+    cache_directory = os.path.join(get_path(), "cache")
+    store.touch_dir(cache_directory)
+    return cache_directory
+
+
+@singleton
+def get_tmp_directory():
+    """Returns the name of the directory, where temporary files (e.g. isolated working
+    directories of the jobs) are stored
+
+    :return str: directory, where temporary files are stored
+    """
+    tmp_directory = os.path.join(get_path(), "tmp")
+    store.touch_dir(tmp_directory)
+    return tmp_directory
+
+
 @singleton
 def get_job_directory():
     """Returns the name of the directory, where pending profiles are stored
@@ -1,7 +1,13 @@
 """Collection of functions for running collectors and postprocessors"""
 
+import concurrent.futures
+import contextlib
+import copy
+import io
 import os
+import shutil
 import subprocess
+import tempfile
 
 import distutils.util as dutils
 import perun.vcs as vcs
@@ -353,9 +359,239 @@ def run_prephase_commands(phase, phase_colour='white'):
             ))
 
 
+def is_collector_concurrency_safe(collector):
+    """Checks whether the collector declares, that it can be run concurrently with other jobs
+
+    Collectors declare this by setting the ``CONCURRENCY_SAFE`` constant in their ``run`` module
+    to true value. Collectors, which do not declare this (e.g. collectors measuring time, that
+    need exclusive cores), are always run alone. The resources shared by the concurrent jobs
+    (e.g. the built libraries) are prepared by the ``prepare_concurrent_jobs`` function of the
+    ``run`` module, if there is any; if the preparation fails, the collector is run alone.
+
+    :param Unit collector: object representing the collector
+    :returns bool: true if the collector can be run concurrently with other jobs
+    """
+    try:
+        collector_module = get_module('perun.collect.{0}.run'.format(collector.name))
+    except ImportError:
+        return False
+    if not getattr(collector_module, 'CONCURRENCY_SAFE', False):
+        return False
+    prepare_concurrent_jobs = getattr(collector_module, 'prepare_concurrent_jobs', None)
+    return prepare_concurrent_jobs is None or prepare_concurrent_jobs()
+
+
+def resolve_job_paths(job, base_dir):
+    """Resolves the command and workload of the job, which are paths relative to the base dir
+
+    :param Job job: job, whose command and workload are resolved
+    :param str base_dir: directory, to which the paths in job are relative
+    :returns Job: copy of the job with absolute paths to command and workload
+    """
+    def resolve_path(path):
+        """Helper function for resolving one path"""
+        resolved_path = os.path.join(base_dir, path)
+        return resolved_path if path and os.path.exists(resolved_path) else path
+    resolved_job = copy.copy(job)
+    resolved_job.cmd = resolve_path(job.cmd)
+    resolved_job.workload = resolve_path(job.workload)
+    # Workload generators pass the generated workloads through the params of collector
+    if 'workload' in job.collector.params:
+        resolved_job.collector = Unit(job.collector.name, utils.merge_dictionaries(
+            job.collector.params, {'workload': resolve_path(str(job.collector.params['workload']))}
+        ))
+    return resolved_job
+
+
+def collect_job_in_directory(job, generator_spec, working_dir):
+    """Runs the collection of the job for all of the generated workloads in the working directory
+
+    The job is collected in its own working directory, so the files created by collectors (e.g.
+    the log of the memory collector) do not clash with other concurrently collected jobs. This is
+    run in the processes of the pool, hence the output is captured and returned with the profiles.
+
+    :param Job job: job that is collected
+    :param GeneratorSpec generator_spec: specification of the workload generator of the job
+    :param str working_dir: isolated working directory of the job
+    :returns (list, str): list of triples (collection status, collected profile, job) and the
+        captured output of the collection
+    """
+    base_dir = os.getcwd()
+
+    def run_collector_in_directory(_, generated_job):
+        """Runs the collector for the job with paths resolved w.r.t. the original directory"""
+        resolved_job = resolve_job_paths(generated_job, base_dir)
+        return run_collector(resolved_job.collector, resolved_job)
+
+    generator, params = generator_spec
+    collection_output = io.StringIO()
+    os.chdir(working_dir)
+    try:
+        with contextlib.redirect_stdout(collection_output):
+            # Generators update the job for each generated workload, hence we keep its copy
+            collected_profiles = [
+                (c_status, prof, copy.deepcopy(job)) for (c_status, prof)
+                in generator(job, **params).generate(run_collector_in_directory)
+            ]
+    finally:
+        os.chdir(base_dir)
+    return collected_profiles, collection_output.getvalue()
+
+
+def postprocess_job(job, prof):
+    """Runs all of the postprocessors of the job on the collected profile
+
+    This is run in the processes of the pool, hence the output is captured and returned with
+    the postprocessed profile.
+
+    :param Job job: job, whose profile is postprocessed
+    :param dict prof: collected profile
+    :returns (dict, Job, str): postprocessed profile (or None, if any postprocessor failed),
+        the postprocessed job and the captured output of the postprocessing
+    """
+    postprocess_output = io.StringIO()
+    with contextlib.redirect_stdout(postprocess_output):
+        for postprocessor in job.postprocessors:
+            # Run postprocess and check if the profile was successfully postprocessed
+            p_status, prof = run_postprocessor(postprocessor, job, prof)
+            if p_status != PostprocessStatus.OK or not prof:
+                prof = None
+                break
+    return prof, job, postprocess_output.getvalue()
+
+
+@decorators.print_elapsed_time
+@decorators.phase_function('parallel batch job run')
+def generate_jobs_on_current_working_dir_in_parallel(job_matrix, number_of_jobs, jobs):
+    """Runs the batch of jobs on current state of the VCS by the pools of processes.
+
+    Jobs, whose collectors are not safe to run concurrently (see
+    :func:`is_collector_concurrency_safe`), are collected first one by one in this process,
+    while nothing else is running. The rest of the jobs are then collected by the pool of
+    processes, each in its own temporary working directory. Collected profiles are postprocessed
+    by the separate pool of processes, while the collection goes on. Profiles are generated in
+    the order of the job matrix, i.e. the profiles of the job are generated as soon as the job
+    and all of the preceding jobs are finished.
+
+    :param dict job_matrix: dictionary with jobs that will be run
+    :param int number_of_jobs: number of jobs that will be run
+    :param int jobs: number of processes in each of the pools
+    :return: pair of job and generated profile
+    """
+    workload_generators_specs = workloads.load_generator_specifications()
+    exclusive_jobs, concurrent_jobs = [], []
+    # Collector name -> whether it is safe to run its jobs concurrently (checked only once)
+    concurrency_safe_collectors = {}
+    for workloads_per_cmd in job_matrix.values():
+        for workload, jobs_per_workload in workloads_per_cmd.items():
+            # Prepare the specification
+            generator_spec = workload_generators_specs.get(
+                workload, GeneratorSpec(SingletonGenerator, {'value': workload})
+            )
+            for job in jobs_per_workload:
+                job_index = len(exclusive_jobs) + len(concurrent_jobs)
+                if job.collector.name not in concurrency_safe_collectors:
+                    concurrency_safe_collectors[job.collector.name] = \
+                        is_collector_concurrency_safe(job.collector)
+                if concurrency_safe_collectors[job.collector.name]:
+                    concurrent_jobs.append((job_index, job, generator_spec))
+                else:
+                    exclusive_jobs.append((job_index, job, generator_spec))
+
+    log.print_job_progress.current_job = 1
+    print("")
+    jobs_directory = pcs.get_tmp_directory()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as collect_pool, \
+            concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as postprocess_pool:
+        running_collections, running_postprocessing = {}, set()
+        # Index of job -> its profiles or the futures of their postprocessing
+        collected_jobs = {}
+        # Future of postprocessing -> pair of postprocessed profile and job, or None
+        postprocessed_profiles = {}
+        next_job_index = 0
+
+        def finish_collection(job_index, collected_profiles, collection_output):
+            """Prints the output of the collection and submits its profiles to postprocessing
+
+            :param int job_index: index of the collected job in the job matrix
+            :param list collected_profiles: list of triples (collection status, profile, job)
+            :param str collection_output: captured output of the collection
+            """
+            log.print_job_progress(number_of_jobs)
+            print(collection_output, end='')
+            job_profiles = []
+            for c_status, prof, collected_job in collected_profiles:
+                # In case, the status was not OK, then we skip the postprocessing
+                if c_status != CollectStatus.OK or not prof:
+                    continue
+                prof = profile.finalize_profile_for_job(prof, collected_job)
+                if collected_job.postprocessors:
+                    postprocessing = postprocess_pool.submit(postprocess_job, collected_job, prof)
+                    running_postprocessing.add(postprocessing)
+                    job_profiles.append(postprocessing)
+                else:
+                    job_profiles.append((prof, collected_job))
+            collected_jobs[job_index] = job_profiles
+
+        def finished_profiles():
+            """Generates the profiles of the finished jobs in the order of the job matrix
+
+            :return: pair of job and generated profile
+            """
+            nonlocal next_job_index
+            while next_job_index in collected_jobs and all(
+                    job_profile in postprocessed_profiles
+                    for job_profile in collected_jobs[next_job_index]
+                    if isinstance(job_profile, concurrent.futures.Future)
+            ):
+                for job_profile in collected_jobs.pop(next_job_index):
+                    if isinstance(job_profile, concurrent.futures.Future):
+                        job_profile = postprocessed_profiles.pop(job_profile)
+                    if job_profile:
+                        yield job_profile
+                next_job_index += 1
+
+        # Exclusive jobs are finished first, so their postprocessing runs after all of them
+        exclusive_collections = []
+        for job_index, job, generator_spec in exclusive_jobs:
+            with tempfile.TemporaryDirectory(dir=jobs_directory) as working_dir:
+                exclusive_collections.append(
+                    (job_index, ) + collect_job_in_directory(job, generator_spec, working_dir)
+                )
+        for exclusive_collection in exclusive_collections:
+            finish_collection(*exclusive_collection)
+        yield from finished_profiles()
+
+        for job_index, job, generator_spec in concurrent_jobs:
+            working_dir = tempfile.mkdtemp(dir=jobs_directory)
+            running_collections[collect_pool.submit(
+                collect_job_in_directory, job, generator_spec, working_dir
+            )] = job_index, working_dir
+
+        while running_collections or running_postprocessing:
+            finished_futures, _ = concurrent.futures.wait(
+                set(running_collections) | running_postprocessing,
+                return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for finished_future in finished_futures:
+                if finished_future in running_collections:
+                    job_index, working_dir = running_collections.pop(finished_future)
+                    shutil.rmtree(working_dir, ignore_errors=True)
+                    finish_collection(job_index, *finished_future.result())
+                else:
+                    running_postprocessing.remove(finished_future)
+                    prof, postprocessed_job, postprocess_output = finished_future.result()
+                    log.print_job_progress.current_job += len(postprocessed_job.postprocessors) - 1
+                    log.print_job_progress(number_of_jobs)
+                    print(postprocess_output, end='')
+                    postprocessed_profiles[finished_future] = \
+                        (prof, postprocessed_job) if prof else None
+            yield from finished_profiles()
+
+
 @decorators.print_elapsed_time
 @decorators.phase_function('batch job run')
-def generate_jobs_on_current_working_dir(job_matrix, number_of_jobs):
+def generate_jobs_on_current_working_dir(job_matrix, number_of_jobs, jobs=1):
     """Runs the batch of jobs on current state of the VCS.
 
     This function expects no changes not commited in the repo, it excepts correct version
@@ -363,8 +599,16 @@ def generate_jobs_on_current_working_dir(job_matrix, number_of_jobs):
 
     :param dict job_matrix: dictionary with jobs that will be run
     :param int number_of_jobs: number of jobs that will be run
+    :param int jobs: number of jobs run in parallel (see
+        :func:`generate_jobs_on_current_working_dir_in_parallel`)
     :return: pair of job and generated profile
     """
+    if jobs > 1:
+        yield from generate_jobs_on_current_working_dir_in_parallel(
+            job_matrix, number_of_jobs, jobs
+        )
+        return
+
     workload_generators_specs = workloads.load_generator_specifications()
 
     log.print_job_progress.current_job = 1
@@ -401,26 +645,28 @@ def generate_jobs_on_current_working_dir(job_matrix, number_of_jobs):
 
 @decorators.print_elapsed_time
 @decorators.phase_function('overall profiling')
-def generate_jobs(minor_version_list, job_matrix, number_of_jobs):
+def generate_jobs(minor_version_list, job_matrix, number_of_jobs, jobs=1):
     """
     :param list minor_version_list: list of MinorVersion info
     :param dict job_matrix: dictionary with jobs that will be run
     :param int number_of_jobs: number of jobs that will be run
+    :param int jobs: number of jobs run in parallel
     """
     with vcs.CleanState():
         for minor_version in minor_version_list:
             vcs.checkout(minor_version.checksum)
             run_prephase_commands('pre_run', COLLECT_PHASE_CMD)
-            yield from generate_jobs_on_current_working_dir(job_matrix, number_of_jobs)
+            yield from generate_jobs_on_current_working_dir(job_matrix, number_of_jobs, jobs)
 
 
 @decorators.print_elapsed_time
 @decorators.phase_function('overall profiling')
-def generate_jobs_with_history(minor_version_list, job_matrix, number_of_jobs):
+def generate_jobs_with_history(minor_version_list, job_matrix, number_of_jobs, jobs=1):
     """
     :param list minor_version_list: list of MinorVersion info
     :param dict job_matrix: dictionary with jobs that will be run
     :param int number_of_jobs: number of jobs that will be run
+    :param int jobs: number of jobs run in parallel
     """
     with log.History(minor_version_list[0].checksum) as history:
         with vcs.CleanState():
@@ -430,7 +676,7 @@ def generate_jobs_with_history(minor_version_list, job_matrix, number_of_jobs):
                 history.finish_minor_version(minor_version, [])
                 vcs.checkout(minor_version.checksum)
                 run_prephase_commands('pre_run', COLLECT_PHASE_CMD)
-                yield from generate_jobs_on_current_working_dir(job_matrix, number_of_jobs)
+                yield from generate_jobs_on_current_working_dir(job_matrix, number_of_jobs, jobs)
                 print("")
                 history.flush(with_border=True)
 
@@ -474,12 +720,13 @@ def run_single_job(cmd, args, workload, collector, postprocessor, minor_version_
         store_generated_profile(prof, job)
 
 
-def run_matrix_job(minor_version_list, with_history=False):
+def run_matrix_job(minor_version_list, with_history=False, jobs=1):
     """
     :param list minor_version_list: list of MinorVersion info
     :param bool with_history: if set to true, then we will print the history object
+    :param int jobs: number of jobs run in parallel
     """
     job_matrix, number_of_jobs = construct_job_matrix(**load_job_info_from_config())
     generator_function = generate_jobs_with_history if with_history else generate_jobs
-    for prof, job in generator_function(minor_version_list, job_matrix, number_of_jobs):
+    for prof, job in generator_function(minor_version_list, job_matrix, number_of_jobs, jobs):
         store_generated_profile(prof, job)
@@ -5,6 +5,14 @@ or load and store into the directories or filenames.
 """
 
 import binascii
+import codecs
+import collections
+import heapq
+import io
+import itertools
+import json
+import math
+import mmap
 import re
 import os
 import string
@@ -14,15 +22,17 @@ import zlib
 import perun.utils.timestamps as timestamps
 import perun.utils.log as perun_log
 import perun.utils.helpers as helpers
+import perun.profile.columnar as columnar
 
 from perun.utils.helpers import IndexEntry, LINE_PARSING_REGEX
 from perun.utils.structs import PerformanceChange, DegradationInfo
 from perun.utils.exceptions import EntryNotFoundException, NotPerunRepositoryException, \
-    MalformedIndexFileException
+    MalformedIndexFileException, IncorrectProfileFormatException
 
 import demandimport
 with demandimport.enabled():
     import hashlib
+    import numpy
 
 __author__ = 'Tomas Fiedor'
 
@@ -31,6 +41,19 @@ INDEX_TAG_REGEX = re.compile(r"^(\d+)@i$")
 INDEX_TAG_RANGE_REGEX = re.compile(r"^(\d+)@i-(\d+)@i$")
 PENDING_TAG_REGEX = re.compile(r"^(\d+)@p$")
 PENDING_TAG_RANGE_REGEX = re.compile(r"^(\d+)@p-(\d+)@p$")
+INDEX_RECORD_SIZE = struct.calcsize(helpers.INDEX_RECORD_FORMAT)
+PACK_RECORD_SIZE = struct.calcsize(helpers.PACK_INDEX_RECORD_FORMAT)
+# Chunks of the objects, that are looked up in the base of the delta compressed objects
+DELTA_CHUNK_REGEX = re.compile(rb"[^{}]*[{}]|[^{}]+")
+DELTA_RESYNC_WINDOW = 1 << 20
+
+# Shared tables of entries of the read indexes: path of index -> (state of index, entries),
+# ordered from the least recently used index
+index_entries_cache = collections.OrderedDict()
+# The maximal number of indexes, whose tables of entries are shared
+MAX_CACHED_INDEXES = 64
+# Read indexes of packs: pack directory -> (state of directory, list of (pack, index contents))
+pack_indexes_cache = {}
 
 
 def touch_file(touched_filename, times=None):
@@ -133,17 +156,198 @@ def pack_content(content):
     return zlib.compress(content)
 
 
+def write_aligned_array(content, array, dtype):
+    """Writes the array to the content aligned to ``BINARY_PROFILE_ALIGNMENT`` bytes
+
+    :param io.BytesIO content: content the array is written to
+    :param numpy.ndarray array: written array
+    :param str dtype: type of the values in the written array (with byte order)
+    :returns int: offset of the array in the content
+    """
+    content.write(bytes(-content.tell() % helpers.BINARY_PROFILE_ALIGNMENT))
+    offset = content.tell()
+    content.write(array.astype(dtype, copy=False).tobytes())
+    return offset
+
+
+def pack_binary_content(profile):
+    """Pack the given profile into the binary (memory-mappable) columnar format.
+
+    The binary content consists of the fixed header (see ``BINARY_PROFILE_HEADER_FORMAT``), of
+    the aligned arrays of columns of the resources (see
+    :class:`perun.profile.columnar.ColumnarProfile`) and of the json directory, which contains the
+    profile without resources and the descriptions of the columns with offsets of their arrays.
+    Contrary to :func:`pack_content` the content is not compressed, so it can be mapped to the
+    memory and the columns can be read without copying.
+
+    :param dict profile: profile w.r.t. :ref:`profile-spec` (or lazy or columnar profile)
+    :returns bytes: packed binary content
+    """
+    if not isinstance(profile, columnar.ColumnarProfile):
+        profile = columnar.ColumnarProfile(profile)
+
+    content = io.BytesIO()
+    content.write(bytes(struct.calcsize(helpers.BINARY_PROFILE_HEADER_FORMAT)))
+    columns = []
+    for key, column in profile.columns.items():
+        if isinstance(column, columnar.NumericColumn):
+            dtype = '<' + column.values.dtype.str[1:]
+            columns.append({
+                'key': key, 'kind': 'numeric', 'dtype': dtype,
+                'values': write_aligned_array(content, column.values, dtype),
+                'kinds': None if column.kinds is None else write_aligned_array(
+                    content, column.kinds, '<i1'
+                )
+            })
+        else:
+            columns.append({
+                'key': key, 'kind': 'encoded', 'categories': column.categories,
+                'codes': write_aligned_array(content, column.codes, '<i4')
+            })
+    directory = json.dumps({
+        'skeleton': profile.skeleton,
+        'resources': len(profile),
+        'snapshots': write_aligned_array(content, profile.snapshots, '<i8'),
+        'columns': columns
+    }).encode('utf-8')
+
+    directory_offset = content.tell()
+    content.write(directory)
+    content.seek(0)
+    content.write(struct.pack(
+        helpers.BINARY_PROFILE_HEADER_FORMAT, helpers.BINARY_PROFILE_MAGIC_PREFIX,
+        helpers.BINARY_PROFILE_VERSION, profile['header']['type'].encode('utf-8'),
+        directory_offset, len(directory)
+    ))
+    return content.getvalue()
+
+
+def read_binary_header(profile_name, buffer):
+    """Reads and checks the header of the binary profile content
+
+    :param str profile_name: filename of the profile
+    :param buffer: bytes-like object with the (prefix of) binary content
+    :returns (str, int, int): type of the profile and the offset and size of its directory
+    :raises IncorrectProfileFormatException: when the header is malformed or of different version
+    """
+    header_size = struct.calcsize(helpers.BINARY_PROFILE_HEADER_FORMAT)
+    if len(buffer) < header_size:
+        raise IncorrectProfileFormatException(profile_name, "malformed profile '{}'")
+    magic, version, profile_type, directory_offset, directory_size = struct.unpack(
+        helpers.BINARY_PROFILE_HEADER_FORMAT, buffer[:header_size]
+    )
+    if magic != helpers.BINARY_PROFILE_MAGIC_PREFIX \
+            or version != helpers.BINARY_PROFILE_VERSION:
+        raise IncorrectProfileFormatException(profile_name, "malformed profile '{}'")
+    return profile_type.rstrip(b'\0').decode('utf-8'), directory_offset, directory_size
+
+
+def unpack_binary_content(profile_name, buffer):
+    """Unpacks the columnar profile from the binary content.
+
+    The arrays of the columns are not copied, i.e. they share the memory with the buffer.
+
+    :param str profile_name: filename of the profile
+    :param buffer: bytes-like object or memory map with the binary content
+    :returns ColumnarProfile: profile with columns sharing the memory with buffer
+    :raises IncorrectProfileFormatException: when the binary content is malformed
+    """
+    _, directory_offset, directory_size = read_binary_header(profile_name, buffer)
+    try:
+        directory = json.loads(
+            bytes(buffer[directory_offset:directory_offset+directory_size]).decode('utf-8')
+        )
+        resource_count = directory['resources']
+
+        def read_array(offset, dtype):
+            """Reads the array of resource_count values of dtype without copying"""
+            return numpy.frombuffer(buffer, dtype=dtype, count=resource_count, offset=offset)
+
+        columns = collections.OrderedDict()
+        for column in directory['columns']:
+            if column['kind'] == 'numeric':
+                columns[column['key']] = columnar.NumericColumn.from_arrays(
+                    read_array(column['values'], column['dtype']),
+                    None if column['kinds'] is None else read_array(column['kinds'], '<i1')
+                )
+            else:
+                columns[column['key']] = columnar.EncodedColumn.from_arrays(
+                    read_array(column['codes'], '<i4'), column['categories']
+                )
+        return columnar.ColumnarProfile.from_columns(
+            directory['skeleton'], read_array(directory['snapshots'], '<i8'), columns
+        )
+    except (ValueError, KeyError, TypeError):
+        raise IncorrectProfileFormatException(profile_name, "malformed profile '{}'")
+
+
+def is_binary_profile_handle(file_handle):
+    """Checks if the opened object is stored in the binary format (rewinding the handle back)
+
+    :param file file_handle: opened file handle
+    :returns bool: true if the object starts with the magic prefix of the binary format
+    """
+    prefix = file_handle.read(len(helpers.BINARY_PROFILE_MAGIC_PREFIX))
+    file_handle.seek(0)
+    return prefix == helpers.BINARY_PROFILE_MAGIC_PREFIX
+
+
+def map_binary_profile(profile_name, file_handle):
+    """Maps the binary profile from the opened handle to the memory
+
+    The mapping stays valid even after the handle is closed.
+
+    :param str profile_name: filename of the profile
+    :param file file_handle: opened file handle (or in-memory handle of packed object)
+    :returns ColumnarProfile: profile with columns sharing the memory with the mapped file
+    :raises IncorrectProfileFormatException: when the binary content is malformed
+    """
+    if isinstance(file_handle, io.BytesIO):
+        return unpack_binary_content(profile_name, file_handle.getbuffer())
+    try:
+        mapped_content = mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        raise IncorrectProfileFormatException(profile_name, "malformed profile '{}'")
+    return unpack_binary_content(profile_name, mapped_content)
+
+
+def load_binary_profile(profile_name):
+    """
+    :param str profile_name: filename of the profile stored in the binary format
+    :returns ColumnarProfile: profile with columns sharing the memory with the mapped file
+    :raises IncorrectProfileFormatException: when the binary content is malformed
+    """
+    profile_handle, _ = open_object(profile_name)
+    with profile_handle:
+        return map_binary_profile(profile_name, profile_handle)
+
+
 def peek_profile_type(profile_name):
     """Retrieves from the binary file the type of the profile from the header.
 
     Peeks inside the binary file of the profile_name and returns the type of the
-    profile, without reading it whole.
+    profile, without reading it whole. Types of profiles stored in the binary format
+    are read from their uncompressed header.
 
     :param str profile_name: filename of the profile
     :returns str: type of the profile
     """
-    with open(profile_name, 'rb') as profile_handle:
-        profile_chunk = read_and_deflate_chunk(profile_handle, helpers.READ_CHUNK_SIZE)
+    profile_handle, is_inflated = open_object(profile_name)
+    with profile_handle:
+        if is_binary_profile_handle(profile_handle):
+            header = profile_handle.read(struct.calcsize(helpers.BINARY_PROFILE_HEADER_FORMAT))
+            try:
+                profile_type, *_ = read_binary_header(profile_name, header)
+            except IncorrectProfileFormatException:
+                return helpers.PROFILE_MALFORMED
+            if profile_type not in helpers.SUPPORTED_PROFILE_TYPES:
+                return helpers.PROFILE_MALFORMED
+            return profile_type
+
+        if is_inflated:
+            profile_chunk = profile_handle.read(helpers.READ_CHUNK_SIZE).decode('utf-8', 'ignore')
+        else:
+            profile_chunk = read_and_deflate_chunk(profile_handle, helpers.READ_CHUNK_SIZE)
         prefix, profile_type, *_ = profile_chunk.split(" ")
 
         # Return that the stored profile is malformed
@@ -168,6 +372,33 @@ def read_and_deflate_chunk(file_handle, chunk_size=-1):
     return decompressor.decompress(packed_content).decode('utf-8')
 
 
+def read_and_deflate_chunks(file_handle, chunk_size=helpers.STREAM_CHUNK_SIZE):
+    """Generator of the deflated chunks of the packed file
+
+    In contrast to read_and_deflate_chunk, the file is read and decompressed incrementally,
+    so only one chunk of the packed and deflated content is kept in the memory at once.
+
+    :param file file_handle: opened file handle
+    :param int chunk_size: size of one chunk read from the file
+    :returns: iterable stream of deflated and decoded string chunks
+    """
+    decompressor = zlib.decompressobj()
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for packed_chunk in iter(lambda: file_handle.read(chunk_size), b''):
+        yield decoder.decode(decompressor.decompress(packed_chunk))
+    yield decoder.decode(decompressor.flush(), final=True)
+
+
+def read_chunks(file_handle, chunk_size=helpers.STREAM_CHUNK_SIZE):
+    """Generator of the decoded chunks of the (not packed) binary file
+
+    :param file file_handle: opened file handle
+    :param int chunk_size: size of one chunk read from the file
+    :returns: iterable stream of decoded string chunks
+    """
+    return codecs.iterdecode(iter(lambda: file_handle.read(chunk_size), b''), 'utf-8')
+
+
 def split_object_name(base_dir, object_name, object_ext=""):
     """
     :param str base_dir: base directory for the object_name
@@ -201,22 +432,401 @@ def add_loose_object_to_dir(base_dir, object_name, object_content):
             object_handle.write(object_content)
 
 
-def read_int_from_handle(file_handle):
-    """Helper function for reading one integer from handle
+def get_pack_directory(base_dir):
+    """
+    :param str base_dir: base directory of the objects
+    :returns str: directory, where the packs of the objects are stored
+    """
+    return os.path.join(base_dir, 'pack')
 
-    :param file file_handle: read file
-    :returns int: one integer
+
+def list_objects(base_dir):
+    """Generator of checksums of loose objects stored in the base directory
+
+    Files with extensions (e.g. lists of degradations) are skipped.
+
+    :param str base_dir: base directory of the objects
+    :returns: iterable stream of pairs of the checksum of the loose object and true if the object
+        is an index of minor version
     """
-    return struct.unpack('i', file_handle.read(4))[0]
+    for object_dir in sorted(os.listdir(base_dir)):
+        object_dir_full_path = os.path.join(base_dir, object_dir)
+        if len(object_dir) != 2 or not os.path.isdir(object_dir_full_path):
+            continue
+        for object_file in sorted(os.listdir(object_dir_full_path)):
+            if not is_sha1(object_dir + object_file):
+                continue
+            with open(os.path.join(object_dir_full_path, object_file), 'rb') as object_handle:
+                is_index = object_handle.read(4) == helpers.INDEX_MAGIC_PREFIX
+            yield object_dir + object_file, is_index
+
+
+def list_loose_objects(base_dir):
+    """Generator of checksums of loose objects of profiles stored in the base directory
+
+    Indexes of minor versions and files with extensions (e.g. lists of degradations) are skipped.
+
+    :param str base_dir: base directory of the objects
+    :returns: iterable stream of checksums of the loose objects
+    """
+    for checksum, is_index in list_objects(base_dir):
+        if not is_index:
+            yield checksum
+
+
+def list_indexed_paths(base_dir):
+    """Maps the objects registered in the indexes of minor versions to their registered paths
+
+    :param str base_dir: base directory of the objects
+    :returns dict: the checksums of the registered objects mapped to their paths in the indexes
+    """
+    indexed_paths = {}
+    for checksum, is_index in list_objects(base_dir):
+        if is_index:
+            with open(split_object_name(base_dir, checksum)[1], 'rb') as index_handle:
+                indexed_paths.update(
+                    (entry.checksum, entry.path) for entry in load_index_entries(index_handle)
+                )
+    return indexed_paths
+
+
+def split_delta_chunks(content):
+    """Splits the content to chunks ending at braces, i.e. roughly at boundaries of resources
+
+    :param bytes content: inflated content of the object
+    :returns list: list of chunks of the content
+    """
+    return DELTA_CHUNK_REGEX.findall(content)
+
+
+def compute_delta(base, target):
+    """Computes the delta of the target against the base
+
+    Both contents are split to chunks (see :func:`split_delta_chunks`), chunks of the target
+    found in the base are encoded as copies of the base and the rest as inserted data. Chunks
+    are preferably copied from the position in the base corresponding to the target, so the
+    aligned parts of both objects are encoded as single copies. The resulting instructions are
+    compressed with zlib.
+
+    :param bytes base: inflated content of the base object
+    :param bytes target: inflated content of the target object
+    :returns bytes: compressed instructions reconstructing the target from the base
+    """
+    base_offsets = {}
+    offset = 0
+    for chunk in split_delta_chunks(base):
+        base_offsets.setdefault(chunk, offset)
+        offset += len(chunk)
+
+    instructions = io.BytesIO()
+    copy_offset, copy_length, inserted = 0, 0, []
+
+    def flush_pending():
+        """Writes the pending copy and inserted chunks as instructions"""
+        if copy_length:
+            instructions.write(b'c' + struct.pack('<QI', copy_offset, copy_length))
+        if inserted:
+            inserted_data = b''.join(inserted)
+            instructions.write(b'i' + struct.pack('<I', len(inserted_data)) + inserted_data)
+            inserted.clear()
+
+    # Position in the base that corresponds to the current position in the target; a chunk not
+    # found at this position most likely replaces the chunk of the base there. After several
+    # mismatched chunks in a row, the chunk is searched for near the place, where the mismatches
+    # started, to resynchronize after inserted or removed parts.
+    base_position, mismatch_position = 0, None
+    for chunk in split_delta_chunks(target):
+        aligned_offset = base_position if base.startswith(chunk, base_position) else -1
+        if aligned_offset == -1 and mismatch_position is not None and chunk in base_offsets:
+            aligned_offset = base.find(
+                chunk, mismatch_position, mismatch_position + DELTA_RESYNC_WINDOW
+            )
+        if aligned_offset != -1:
+            chunk_offset, mismatch_position = aligned_offset, None
+            base_position = aligned_offset + len(chunk)
+        else:
+            chunk_offset = base_offsets.get(chunk)
+            if mismatch_position is None:
+                mismatch_position = base_position
+            base_chunk = DELTA_CHUNK_REGEX.match(base, base_position)
+            base_position = base_chunk.end() if base_chunk else base_position
+        if chunk_offset is None:
+            if copy_length:
+                flush_pending()
+                copy_length = 0
+            inserted.append(chunk)
+        elif copy_length and copy_offset + copy_length == chunk_offset:
+            copy_length += len(chunk)
+        else:
+            flush_pending()
+            copy_offset, copy_length = chunk_offset, len(chunk)
+    flush_pending()
+    return zlib.compress(instructions.getvalue())
+
+
+def apply_delta(base, delta):
+    """Reconstructs the target from the base and the delta computed by :func:`compute_delta`
+
+    :param bytes base: inflated content of the base object
+    :param bytes delta: compressed instructions
+    :returns bytes: inflated content of the target object
+    """
+    instructions = zlib.decompress(delta)
+    target = []
+    position = 0
+    while position < len(instructions):
+        if instructions[position:position+1] == b'c':
+            copy_offset, copy_length = struct.unpack_from('<QI', instructions, position + 1)
+            target.append(base[copy_offset:copy_offset+copy_length])
+            position += 13
+        else:
+            insert_length = struct.unpack_from('<I', instructions, position + 1)[0]
+            target.append(instructions[position+5:position+5+insert_length])
+            position += 5 + insert_length
+    return b''.join(target)
+
+
+def inflate_object_content(object_content):
+    """
+    :param bytes object_content: content of the stored object
+    :returns bytes: inflated content of the object or None, if the object is not compressed
+    """
+    if object_content.startswith(helpers.BINARY_PROFILE_MAGIC_PREFIX):
+        return None
+    return zlib.decompress(object_content)
+
+
+def write_pack(base_dir, packed_objects):
+    """Bundles the loose objects into the new pack and its index
+
+    Objects with given base are delta compressed against the base, if both are compressed
+    (i.e. not binary) objects and if the delta is smaller than the object. Bases have to be
+    packed as full objects in the same pack.
+
+    :param str base_dir: base directory of the objects
+    :param list packed_objects: list of pairs (checksum, checksum of base or None), where each
+        base precedes the objects delta compressed against it
+    :returns str: path to the written pack
+    """
+    pack_dir = get_pack_directory(base_dir)
+    touch_dir(pack_dir)
+    pack_name = compute_checksum("".join(sorted(c for (c, _) in packed_objects)).encode('utf-8'))
+    pack_file = os.path.join(pack_dir, "pack-{}.pack".format(pack_name))
+
+    def read_loose_object(checksum):
+        """Reads the content of the loose object"""
+        with open(split_object_name(base_dir, checksum)[1], 'rb') as object_handle:
+            return object_handle.read()
+
+    pack_records = []
+    inflated_bases = {}
+    with open(pack_file + '.tmp', 'wb') as pack_handle:
+        pack_handle.write(struct.pack(
+            helpers.PACK_HEADER_FORMAT, helpers.PACK_MAGIC_PREFIX, helpers.PACK_VERSION,
+            len(packed_objects)
+        ))
+        for checksum, base_checksum in packed_objects:
+            object_content = read_loose_object(checksum)
+            entry_kind, entry_base = helpers.PACK_ENTRY_FULL, bytes(20)
+            entry_content = object_content
+            if base_checksum is None:
+                # Only the latest base is kept, since the objects are grouped by their bases
+                inflated_bases = {checksum: inflate_object_content(object_content)}
+            elif inflated_bases.get(base_checksum) is not None:
+                inflated_content = inflate_object_content(object_content)
+                delta = compute_delta(inflated_bases[base_checksum], inflated_content) \
+                    if inflated_content is not None else None
+                if delta is not None and len(delta) < len(object_content):
+                    entry_kind, entry_base, entry_content \
+                        = helpers.PACK_ENTRY_DELTA, bytes.fromhex(base_checksum), delta
+
+            pack_records.append((bytes.fromhex(checksum), pack_handle.tell(), len(entry_content)))
+            pack_handle.write(struct.pack(helpers.PACK_ENTRY_HEADER_FORMAT, entry_kind, entry_base))
+            pack_handle.write(entry_content)
+
+    # The pack index is written after the pack, so the pack is used only when it is complete
+    pack_records.sort()
+    fanout = [0]*256
+    for record_checksum, _, _ in pack_records:
+        fanout[record_checksum[0]] += 1
+    with open(pack_file[:-len('.pack')] + '.idx.tmp', 'wb') as index_handle:
+        index_handle.write(struct.pack(
+            helpers.PACK_HEADER_FORMAT, helpers.PACK_INDEX_MAGIC_PREFIX, helpers.PACK_VERSION,
+            len(pack_records)
+        ))
+        index_handle.write(struct.pack(
+            helpers.PACK_INDEX_FANOUT_FORMAT, *itertools.accumulate(fanout)
+        ))
+        for record in pack_records:
+            index_handle.write(struct.pack(helpers.PACK_INDEX_RECORD_FORMAT, *record))
+    os.replace(pack_file + '.tmp', pack_file)
+    os.replace(pack_file[:-len('.pack')] + '.idx.tmp', pack_file[:-len('.pack')] + '.idx')
+    return pack_file
+
+
+def lookup_object_in_pack_index(index_buffer, checksum):
+    """Looks up the object in the index of the pack using the fanout table and binary search
+
+    :param bytes index_buffer: contents of the index of the pack
+    :param bytes checksum: binary SHA-1 of the object
+    :returns (int, int): offset and size of the object in the pack or None if it is not packed
+    """
+    header_size = struct.calcsize(helpers.PACK_HEADER_FORMAT)
+    magic, version, _ = struct.unpack_from(helpers.PACK_HEADER_FORMAT, index_buffer)
+    if magic != helpers.PACK_INDEX_MAGIC_PREFIX or version != helpers.PACK_VERSION:
+        raise MalformedIndexFileException("read blob is not an index of pack")
+
+    fanout = struct.unpack_from(helpers.PACK_INDEX_FANOUT_FORMAT, index_buffer, header_size)
+    records_offset = header_size + struct.calcsize(helpers.PACK_INDEX_FANOUT_FORMAT)
+    low = fanout[checksum[0] - 1] if checksum[0] else 0
+    high = fanout[checksum[0]]
+    while low < high:
+        middle = (low + high) // 2
+        record_checksum, offset, size = struct.unpack_from(
+            helpers.PACK_INDEX_RECORD_FORMAT, index_buffer, records_offset + middle*PACK_RECORD_SIZE
+        )
+        if record_checksum == checksum:
+            return offset, size
+        elif record_checksum < checksum:
+            low = middle + 1
+        else:
+            high = middle
+    return None
+
+
+def read_pack_indexes(pack_dir):
+    """Reads the indexes of all of the packs in the pack directory
+
+    :param str pack_dir: directory with the packs
+    :returns list: list of pairs of the path to the pack and the contents of its index
+    """
+    pack_indexes = []
+    for pack_index in sorted(os.listdir(pack_dir)):
+        if pack_index.endswith('.idx'):
+            with open(os.path.join(pack_dir, pack_index), 'rb') as index_handle:
+                pack_indexes.append((
+                    os.path.join(pack_dir, pack_index[:-len('.idx')] + '.pack'),
+                    index_handle.read()
+                ))
+    return pack_indexes
+
+
+def load_pack_indexes(pack_dir):
+    """Returns the indexes of the packs, which are read once and are reused, until the pack
+    directory is modified
+
+    The packs and their indexes are only ever added or removed by renaming (see
+    :func:`write_pack`), which updates the modification time of the pack directory.
+
+    :param str pack_dir: directory with the packs
+    :returns list: list of pairs of the path to the pack and the contents of its index
+    """
+    try:
+        pack_dir_stat = os.stat(pack_dir)
+    except OSError:
+        return []
+    pack_dir_state = (pack_dir_stat.st_ino, pack_dir_stat.st_mtime_ns)
+    cached_state, cached_indexes = pack_indexes_cache.get(pack_dir, (None, None))
+    if cached_state != pack_dir_state:
+        cached_indexes = read_pack_indexes(pack_dir)
+        pack_indexes_cache[pack_dir] = (pack_dir_state, cached_indexes)
+    return cached_indexes
+
+
+def lookup_packed_object(base_dir, checksum):
+    """Looks up the object in the packs of the base directory
+
+    :param str base_dir: base directory of the objects
+    :param str checksum: SHA-1 of the object
+    :returns (str, int, int): path to the pack, offset and size of the object, or None
+    """
+    binary_checksum = bytes.fromhex(checksum)
+    for pack_file, index_buffer in load_pack_indexes(get_pack_directory(base_dir)):
+        location = lookup_object_in_pack_index(index_buffer, binary_checksum)
+        if location:
+            return (pack_file, ) + location
+    return None
+
+
+def read_packed_object(base_dir, checksum):
+    """Reads the object from the packs of the base directory, applying the deltas
+
+    :param str base_dir: base directory of the objects
+    :param str checksum: SHA-1 of the object
+    :returns (bytes, bool): content of the object and true if the content is already inflated,
+        or None if the object is not packed
+    :raises IncorrectProfileFormatException: when the reconstructed object does not correspond
+        to its checksum
+    """
+    location = lookup_packed_object(base_dir, checksum)
+    if location is None:
+        return None
+    pack_file, offset, size = location
+    entry_header_size = struct.calcsize(helpers.PACK_ENTRY_HEADER_FORMAT)
+    with open(pack_file, 'rb') as pack_handle:
+        pack_handle.seek(offset)
+        entry_kind, base_checksum = struct.unpack(
+            helpers.PACK_ENTRY_HEADER_FORMAT, pack_handle.read(entry_header_size)
+        )
+        entry_content = pack_handle.read(size)
+
+    if entry_kind == helpers.PACK_ENTRY_FULL:
+        return entry_content, False
+
+    base_content, _ = read_packed_object(base_dir, binascii.hexlify(base_checksum).decode('utf-8'))
+    object_content = apply_delta(inflate_object_content(base_content), entry_content)
+    if compute_checksum(object_content) != checksum:
+        raise IncorrectProfileFormatException(checksum, "malformed packed object '{}'")
+    return object_content, True
+
+
+def split_object_path(object_path):
+    """
+    :param str object_path: path to the (loose) object
+    :returns (str, str): base directory of the objects and the checksum of the object
+    """
+    object_dir, object_file = os.path.split(object_path)
+    base_dir, object_dir = os.path.split(object_dir)
+    return base_dir, object_dir + object_file
+
+
+def object_exists(object_path):
+    """
+    :param str object_path: path to the (loose) object
+    :returns bool: true if the object is stored either as loose object or in some pack
+    """
+    if os.path.exists(object_path):
+        return True
+    base_dir, checksum = split_object_path(object_path)
+    return is_sha1(checksum) and lookup_packed_object(base_dir, checksum) is not None
 
 
-def read_char_from_handle(file_handle):
-    """Helper function for reading one char from handle
+def open_object(object_path):
+    """Opens the object stored either as loose object or in some pack
+
+    :param str object_path: path to the (loose) object
+    :returns (file, bool): opened handle of the object and true if its content is already
+        inflated (i.e. it was delta compressed in the pack)
+    :raises IncorrectProfileFormatException: when the object does not exist
+    """
+    if os.path.exists(object_path):
+        return open(object_path, 'rb'), False
+
+    base_dir, checksum = split_object_path(object_path)
+    packed_object = read_packed_object(base_dir, checksum) if is_sha1(checksum) else None
+    if packed_object is None:
+        raise IncorrectProfileFormatException(object_path, "file '{}' not found")
+    object_content, is_inflated = packed_object
+    return io.BytesIO(object_content), is_inflated
+
+
+def read_int_from_handle(file_handle):
+    """Helper function for reading one integer from handle
 
     :param file file_handle: read file
-    :returns char: one read char
+    :returns int: one integer
     """
-    return struct.unpack('c', file_handle.read(1))[0].decode('utf-8')
+    return struct.unpack('i', file_handle.read(4))[0]
 
 
 def read_number_of_entries_from_handle(index_handle):
@@ -233,60 +843,234 @@ def read_number_of_entries_from_handle(index_handle):
     return number_of_entries
 
 
-def walk_index(index_handle):
-    """Iterator through index entries
-
-    Reads the beginning of the file, verifying the version and type of the index. Then it iterates
-    through all of the index entries and returns them as a IndexEntry structure for further
-    processing.
+def read_index_version(index_handle):
+    """Reads the beginning of the index, verifying its type and version
 
     :param file index_handle: handle to file containing index
-    :returns IndexEntry: Index entry named tuple
+    :returns int: version of the index (either current or legacy)
+    :raises MalformedIndexFileException: when the file is not index or when the index is of
+        unsupported version
     """
-    # Get end of file position
-    index_handle.seek(0, 2)
-    last_position = index_handle.tell()
-
-    # Move to the begging of the handle
     index_handle.seek(0)
     magic_bytes = index_handle.read(4)
     if magic_bytes != helpers.INDEX_MAGIC_PREFIX:
         raise MalformedIndexFileException("read blob is not an index file")
 
     index_version = read_int_from_handle(index_handle)
-    if index_version != helpers.INDEX_VERSION:
+    if index_version not in (helpers.INDEX_VERSION, helpers.LEGACY_INDEX_VERSION):
         raise MalformedIndexFileException("read index file is in format of different index version"
                                           " (read index file = {}".format(index_version) +
                                           ", supported = {})".format(helpers.INDEX_VERSION))
+    return index_version
 
-    number_of_objects = read_int_from_handle(index_handle)
-    loaded_objects = 0
-
-    def read_entry():
-        """
-        :returns IndexEntry: one read index entry
-        """
-        # Rather nasty hack, but nothing better comes to my mind currently
-        if index_handle.tell() + 24 >= last_position:
-            return ''
-
-        file_offset = index_handle.tell()
-        file_time = timestamps.timestamp_to_str(timestamps.read_timestamp_from_file(index_handle))
-        file_sha = binascii.hexlify(index_handle.read(20)).decode('utf-8')
-        file_path, byte = "", read_char_from_handle(index_handle)
-        while byte != '\0':
-            file_path += byte
-            byte = read_char_from_handle(index_handle)
-        return IndexEntry(file_time, file_sha, file_path, file_offset)
-
-    for entry in iter(read_entry, ''):
-        loaded_objects += 1
-        if loaded_objects > number_of_objects:
+
+def read_index_counts(index_handle):
+    """Reads the number of records and the number of sorted records of the index
+
+    :param file index_handle: handle to file containing index of current version
+    :returns (int, int): number of all records (including tombstones) and of sorted records
+    """
+    index_handle.seek(helpers.INDEX_NUMBER_OF_RECORDS_OFFSET)
+    number_of_records = read_int_from_handle(index_handle)
+    number_of_sorted_records = read_int_from_handle(index_handle)
+    return number_of_records, number_of_sorted_records
+
+
+def unpack_index_record(record, offset):
+    """
+    :param bytes record: fixed-size record of the index
+    :param int offset: offset of the record in the index
+    :returns (IndexEntry, int): entry and flags of the record
+    """
+    timestamp, checksum, flags, path = struct.unpack(helpers.INDEX_RECORD_FORMAT, record)
+    entry = IndexEntry(
+        timestamps.timestamp_to_str(timestamp), binascii.hexlify(checksum).decode('utf-8'),
+        path.rstrip(b'\0').decode('utf-8'), offset
+    )
+    return entry, flags
+
+
+def read_index_record(index_handle, record_number):
+    """
+    :param file index_handle: handle to file containing index of current version
+    :param int record_number: number of the read record
+    :returns (IndexEntry, int): entry and flags of the record
+    """
+    offset = helpers.INDEX_ENTRIES_START_OFFSET + record_number * INDEX_RECORD_SIZE
+    index_handle.seek(offset)
+    return unpack_index_record(index_handle.read(INDEX_RECORD_SIZE), offset)
+
+
+def read_index_records(index_handle, first_record, last_record):
+    """Reads the range of records of the index at once
+
+    :param file index_handle: handle to file containing index of current version
+    :param int first_record: number of the first read record
+    :param int last_record: number of the record after the last read record
+    :returns list: list of (IndexEntry, flags) pairs of the records
+    """
+    offset = helpers.INDEX_ENTRIES_START_OFFSET + first_record * INDEX_RECORD_SIZE
+    index_handle.seek(offset)
+    buffer = index_handle.read((last_record - first_record) * INDEX_RECORD_SIZE)
+    if len(buffer) != (last_record - first_record) * INDEX_RECORD_SIZE:
+        perun_log.error("fatal: malformed index file")
+    return [
+        unpack_index_record(buffer[position:position+INDEX_RECORD_SIZE], offset + position)
+        for position in range(0, len(buffer), INDEX_RECORD_SIZE)
+    ]
+
+
+def index_entry_key(entry):
+    """
+    :param IndexEntry entry: entry of the index
+    :returns tuple: key, by which the entries are sorted in the index
+    """
+    return entry.path, entry.time
+
+
+def parse_index_entries(buffer):
+    """Parses the entries of the index of current version from the buffer
+
+    :param bytes buffer: whole contents of the index
+    :returns list: list of live entries sorted by their paths and times
+    """
+    number_of_records = struct.unpack_from('i', buffer, helpers.INDEX_NUMBER_OF_RECORDS_OFFSET)[0]
+    number_of_sorted_records = struct.unpack_from(
+        'i', buffer, helpers.INDEX_NUMBER_OF_SORTED_RECORDS_OFFSET
+    )[0]
+    records_end = helpers.INDEX_ENTRIES_START_OFFSET + number_of_records * INDEX_RECORD_SIZE
+    if len(buffer) < records_end:
+        perun_log.error("fatal: malformed index file")
+
+    sorted_entries, unsorted_entries = [], []
+    for record_number, (timestamp, checksum, flags, path) in enumerate(struct.iter_unpack(
+            helpers.INDEX_RECORD_FORMAT, buffer[helpers.INDEX_ENTRIES_START_OFFSET:records_end]
+    )):
+        if not flags & helpers.INDEX_RECORD_TOMBSTONE:
+            entries = sorted_entries if record_number < number_of_sorted_records \
+                else unsorted_entries
+            entries.append(IndexEntry(
+                timestamps.timestamp_to_str(timestamp), binascii.hexlify(checksum).decode('utf-8'),
+                path.rstrip(b'\0').decode('utf-8'),
+                helpers.INDEX_ENTRIES_START_OFFSET + record_number * INDEX_RECORD_SIZE
+            ))
+    unsorted_entries.sort(key=index_entry_key)
+    return list(heapq.merge(sorted_entries, unsorted_entries, key=index_entry_key))
+
+
+def parse_legacy_index_entries(buffer):
+    """Parses the variable length entries of the legacy index from the buffer
+
+    Paths of entries are split by looking up the terminating zero bytes.
+
+    :param bytes buffer: whole contents of the index
+    :returns list: list of entries in the order they are stored in the index
+    """
+    entries = []
+    offset = helpers.INDEX_NUMBER_OF_ENTRIES_OFFSET + 4
+    while offset + 24 < len(buffer):
+        path_end = buffer.find(b'\0', offset + 24)
+        if path_end == -1:
             perun_log.error("fatal: malformed index file")
-        yield entry
+        timestamp = struct.unpack_from('<I', buffer, offset)[0]
+        entries.append(IndexEntry(
+            timestamps.timestamp_to_str(timestamp),
+            binascii.hexlify(buffer[offset+4:offset+24]).decode('utf-8'),
+            buffer[offset+24:path_end].decode('utf-8'), offset
+        ))
+        offset = path_end + 1
+    return entries
+
 
-    if loaded_objects != number_of_objects:
+def read_index_entries(index_handle):
+    """Reads the whole index in one buffer and parses the table of its entries
+
+    :param file index_handle: handle to file containing index
+    :returns list: list of live entries of the index (as IndexEntry)
+    """
+    index_version = read_index_version(index_handle)
+    index_handle.seek(0)
+    buffer = index_handle.read()
+    if index_version == helpers.LEGACY_INDEX_VERSION:
+        entries = parse_legacy_index_entries(buffer)
+    else:
+        entries = parse_index_entries(buffer)
+
+    number_of_objects = struct.unpack_from('i', buffer, helpers.INDEX_NUMBER_OF_ENTRIES_OFFSET)[0]
+    if len(entries) != number_of_objects:
         perun_log.error("fatal: malformed index file")
+    return entries
+
+
+def load_index_entries(index_handle):
+    """Returns the table of entries of the index shared between the lookups in the index
+
+    The table is read once and is reused, until the index is modified (either by the functions
+    of this module, or by change of its generation, modification time or size), or until it is
+    evicted as the least recently used table of more than MAX_CACHED_INDEXES. The generation
+    is incremented by each modification, so the in-place modifications, that keep the size of
+    the index (e.g. the removal of entries) and happen within the resolution of its modification
+    time, are noticed by other processes as well.
+
+    :param file index_handle: handle to file containing index
+    :returns tuple: tuple of live entries of the index (as IndexEntry)
+    """
+    # Check the version even for the cached entries
+    index_version = read_index_version(index_handle)
+    if not isinstance(index_handle.name, str):
+        return tuple(read_index_entries(index_handle))
+
+    index_path = os.path.realpath(index_handle.name)
+    index_stat = os.fstat(index_handle.fileno())
+    index_state = (
+        read_index_generation(index_handle) if index_version == helpers.INDEX_VERSION else None,
+        index_stat.st_mtime_ns, index_stat.st_size
+    )
+    cached_state, cached_entries = index_entries_cache.pop(index_path, (None, None))
+    if cached_state != index_state:
+        cached_entries = tuple(read_index_entries(index_handle))
+    index_entries_cache[index_path] = (index_state, cached_entries)
+    if len(index_entries_cache) > MAX_CACHED_INDEXES:
+        index_entries_cache.popitem(last=False)
+    return cached_entries
+
+
+def read_index_generation(index_handle):
+    """
+    :param file index_handle: handle to file containing index of current version
+    :returns int: generation of the index
+    """
+    index_handle.seek(helpers.INDEX_GENERATION_OFFSET)
+    return read_int_from_handle(index_handle)
+
+
+def invalidate_index_entries(index_handle):
+    """Increments the generation of the modified index and drops its shared table of entries
+
+    :param file index_handle: handle to file containing modified index of current version
+    """
+    generation = read_index_generation(index_handle)
+    index_handle.seek(helpers.INDEX_GENERATION_OFFSET)
+    index_handle.write(struct.pack('i', (generation + 1) & 0x7fffffff))
+    if isinstance(index_handle.name, str):
+        index_entries_cache.pop(os.path.realpath(index_handle.name), None)
+
+
+def walk_index(index_handle):
+    """Iterator through index entries
+
+    Reads the beginning of the file, verifying the version and type of the index. Then it iterates
+    through all of the index entries and returns them as a IndexEntry structure for further
+    processing. Entries are iterated sorted by their paths and times, regardless whether they are
+    stored in sorted or unsorted records, while the deleted records (tombstones) are skipped.
+
+    The whole index is read in one buffer and the parsed entries are shared (see
+    :func:`load_index_entries`), so walking the same index again does not read it.
+
+    :param file index_handle: handle to file containing index
+    :returns IndexEntry: Index entry named tuple
+    """
+    yield from load_index_entries(index_handle)
 
 
 def print_index(index_file):
@@ -331,7 +1115,7 @@ def get_profile_list_for_minor(base_dir, minor_version):
 
     if os.path.exists(minor_index_file):
         with open(minor_index_file, 'rb') as index_handle:
-            return [entry for entry in walk_index(index_handle)]
+            return list(load_index_entries(index_handle))
     else:
         return []
 
@@ -368,16 +1152,23 @@ def get_profile_number_for_minor(base_dir, minor_version):
 def touch_index(index_path):
     """Initializes and creates the index if it does not exists
 
-    The Version 1 index is of following form:
+    The Version 2 index is of following form:
       -  4B magic prefix 'pidx' (perun index) for quick identification of the file
-      -  4B version number (currently 1)
+      -  4B version number (currently 2)
       -  4B number of index entries
+      -  4B number of records (i.e. entries and deleted entries)
+      -  4B number of sorted records
+      -  4B generation of the index (incremented by each modification)
 
-    Followed by the entries of profiles of form:
+    Followed by the fixed-size records of profiles of form:
       -  4B time of the file creation
       - 20B SHA-1 representation of the object
-      -  ?B Variable length path
-      -  ?B zero byte padding
+      -  1B flags (1 for deleted record, i.e. tombstone)
+      - 255B zero padded path
+
+    The first records are sorted by the path and time of the entries and can be binary
+    searched, the rest of the records is appended unsorted. Deleted records are marked as
+    tombstones. Once there are too many unsorted records or tombstones, the index is compacted.
 
     :param str index_path: path to the index
     """
@@ -388,7 +1179,7 @@ def touch_index(index_path):
         with open(index_path, 'wb') as index_handle:
             index_handle.write(helpers.INDEX_MAGIC_PREFIX)
             index_handle.write(struct.pack('i', helpers.INDEX_VERSION))
-            index_handle.write(struct.pack('i', 0))
+            index_handle.write(struct.pack('iiii', 0, 0, 0, 0))
 
 
 def modify_number_of_entries_in_index(index_handle, modify):
@@ -403,74 +1194,132 @@ def modify_number_of_entries_in_index(index_handle, modify):
     index_handle.write(struct.pack('i', modify(number_of_entries)))
 
 
-def write_entry(index_handle, file_entry):
-    """Writes entry at current location in the index_handle
+def write_entry(index_handle, file_entry, flags=0):
+    """Writes entry as fixed-size record at current location in the index_handle
 
     :param file index_handle: file handle of the index
     :param IndexEntry file_entry: entry to be written at current position
+    :param int flags: flags of the written record
     """
-    timestamps.write_timestamp(index_handle, timestamps.str_to_timestamp(file_entry.time))
-    index_handle.write(bytearray.fromhex(file_entry.checksum))
-    index_handle.write(bytes(file_entry.path, 'utf-8'))
-    index_handle.write(struct.pack('B', 0))
+    index_handle.write(struct.pack(
+        helpers.INDEX_RECORD_FORMAT,
+        round(timestamps.str_to_timestamp(file_entry.time)),
+        bytes.fromhex(file_entry.checksum), flags, file_entry.path.encode('utf-8')
+    ))
 
 
-def write_entry_to_index(index_file, file_entry):
-    """Writes the file_entry to its appropriate position within the index.
+def compact_index(index_handle, entries=None):
+    """Rewrites the index in one pass, so all of its records are sorted and tombstones are removed
 
-    Given the file entry, writes the entry within the file, moving everything by the given offset
-    and then incrementing the number of entries within the index.
+    The legacy index is upgraded to the current version of the index as well.
 
-    :param str index_file: path to the index file
-    :param IndexEntry file_entry: index entry that will be written to the file
+    :param file index_handle: opened file handle of the index
+    :param list entries: live entries of the index sorted by their paths and times, if they are
+        already loaded, or None
     """
-    with open(index_file, 'rb+') as index_handle:
-        # Lookup the position of the registered file within the index
-        if file_entry.offset == -1:
-            try:
-                predicate = (
-                    lambda entry: entry.path > file_entry.path or (
-                        entry.path == file_entry.path and entry.time >= file_entry.time
-                    )
-                )
-                looked_up_entry = lookup_entry_within_index(index_handle, predicate)
-
-                # If there is an exact match, we do not add the entry to the index
-                if looked_up_entry.path == file_entry.path and \
-                        looked_up_entry.time == file_entry.time:
-                    perun_log.msg_to_stdout("{0.path} ({0.time}) already registered in {1}".format(
-                        file_entry, index_file
-                    ), 0)
-                    return
-                offset_in_file = looked_up_entry.offset
-            except EntryNotFoundException:
-                # Move to end of the file and set the offset to the end of the file
-                index_handle.seek(0, 2)
-                offset_in_file = index_handle.tell()
+    if entries is None:
+        entries = list(walk_index(index_handle))
+    is_legacy = read_index_version(index_handle) == helpers.LEGACY_INDEX_VERSION
+    generation = 0 if is_legacy else read_index_generation(index_handle)
+    index_handle.seek(0)
+    index_handle.write(helpers.INDEX_MAGIC_PREFIX)
+    index_handle.write(struct.pack('i', helpers.INDEX_VERSION))
+    index_handle.write(struct.pack('iiii', len(entries), len(entries), len(entries), generation))
+    for entry in entries:
+        write_entry(index_handle, entry)
+    index_handle.truncate()
+    invalidate_index_entries(index_handle)
+
+
+def find_entry_within_index(index_handle, file_entry):
+    """Finds the entry with the same path and time as the given entry
+
+    The sorted records are binary searched, the unsorted records are read at once and scanned.
+
+    :param file index_handle: opened file handle of the index of current version
+    :param IndexEntry file_entry: looked up entry
+    :returns IndexEntry: found entry or None if there is no such entry
+    """
+    number_of_records, number_of_sorted_records = read_index_counts(index_handle)
+    looked_up_key = index_entry_key(file_entry)
+
+    low, high = 0, number_of_sorted_records
+    while low < high:
+        middle = (low + high) // 2
+        entry, _ = read_index_record(index_handle, middle)
+        if index_entry_key(entry) < looked_up_key:
+            low = middle + 1
         else:
-            offset_in_file = file_entry.offset
+            high = middle
+
+    # There can be several records with the same key, some of them deleted
+    for record_number in range(low, number_of_sorted_records):
+        entry, flags = read_index_record(index_handle, record_number)
+        if index_entry_key(entry) != looked_up_key:
+            break
+        elif not flags & helpers.INDEX_RECORD_TOMBSTONE:
+            return entry
 
-        # Modify the number of entries in index and return to position
-        modify_number_of_entries_in_index(index_handle, lambda x: x + 1)
-        index_handle.seek(offset_in_file)
+    for entry, flags in read_index_records(
+            index_handle, number_of_sorted_records, number_of_records
+    ):
+        if index_entry_key(entry) == looked_up_key and not flags & helpers.INDEX_RECORD_TOMBSTONE:
+            return entry
+    return None
 
-        # Read previous entries to buffer and return back to the position
-        buffer = index_handle.read()
-        index_handle.seek(offset_in_file)
 
-        # Write the index_file entry to index
+def write_entry_to_index(index_file, file_entry):
+    """Writes the file_entry to the index.
+
+    Given the file entry, appends the entry to the unsorted records of the index and then
+    increments the number of entries within the index. Once the number of unsorted records
+    exceeds the square root of the number of records, the index is compacted, so the number of
+    records read by lookups stays low while the index is rewritten only occasionally.
+
+    :param str index_file: path to the index file
+    :param IndexEntry file_entry: index entry that will be written to the file (its offset is
+        ignored)
+    """
+    with open(index_file, 'rb+') as index_handle:
+        if read_index_version(index_handle) == helpers.LEGACY_INDEX_VERSION:
+            compact_index(index_handle)
+
+        # If there is an exact match, we do not add the entry to the index
+        if find_entry_within_index(index_handle, file_entry):
+            perun_log.msg_to_stdout("{0.path} ({0.time}) already registered in {1}".format(
+                file_entry, index_file
+            ), 0)
+            return
+
+        # Append the entry after the last record and modify the number of entries and records
+        number_of_records, number_of_sorted_records = read_index_counts(index_handle)
+        index_handle.seek(helpers.INDEX_ENTRIES_START_OFFSET + number_of_records*INDEX_RECORD_SIZE)
         write_entry(index_handle, file_entry)
+        modify_number_of_entries_in_index(index_handle, lambda x: x + 1)
+        index_handle.seek(helpers.INDEX_NUMBER_OF_RECORDS_OFFSET)
+        index_handle.write(struct.pack('i', number_of_records + 1))
+        invalidate_index_entries(index_handle)
 
-        # Write the stuff stored in buffer
-        index_handle.write(buffer)
+        number_of_unsorted_records = number_of_records + 1 - number_of_sorted_records
+        if number_of_unsorted_records > max(
+                helpers.INDEX_MINIMAL_UNSORTED_RECORDS, math.sqrt(number_of_records + 1)
+        ):
+            compact_index(index_handle)
 
 
-def remove_entry_from_index(index_handle, file_entry):
-    """
-    :param file index_handle: opened file handle of index
-    :param IndexEntry file_entry: removed entry
+def remove_entries_from_index(index_handle, file_entries):
+    """Marks the records of the entries as deleted (i.e. as tombstones)
+
+    :param file index_handle: opened file handle of index of current version
+    :param iterable file_entries: removed entries
     """
-    index_handle.seek(file_entry.offset)
+    number_of_removed_entries = 0
+    for file_entry in file_entries:
+        index_handle.seek(file_entry.offset + helpers.INDEX_RECORD_FLAGS_OFFSET)
+        index_handle.write(struct.pack('B', helpers.INDEX_RECORD_TOMBSTONE))
+        number_of_removed_entries += 1
+    modify_number_of_entries_in_index(index_handle, lambda x: x - number_of_removed_entries)
+    invalidate_index_entries(index_handle)
 
 
 def lookup_entry_within_index(index_handle, predicate):
@@ -480,7 +1329,7 @@ def lookup_entry_within_index(index_handle, predicate):
     :param function predicate: predicate that tests given entry in index IndexEntry -> bool
     :returns IndexEntry: index entry satisfying the given predicate
     """
-    for entry in walk_index(index_handle):
+    for entry in load_index_entries(index_handle):
         if predicate(entry):
             return entry
 
@@ -494,7 +1343,7 @@ def lookup_all_entries_within_index(index_handle, predicate):
 
     :returns [IndexEntry]: list of index entries satisfying given predicate
     """
-    return [entry for entry in walk_index(index_handle) if predicate(entry)]
+    return [entry for entry in load_index_entries(index_handle) if predicate(entry)]
 
 
 def register_in_index(base_dir, minor_version, registered_file, registered_file_checksum):
@@ -526,7 +1375,9 @@ def remove_from_index(base_dir, minor_version, removed_file_generator, remove_al
     """Removes stream of removed files from the index.
 
     Iterates through all of the removed files, and removes their partial/full occurence from the
-    index. The index is walked just once.
+    index. The index is walked just once and the removed entries are marked as tombstones in
+    place. If the index would contain more tombstones than entries, it is rather compacted
+    at once without the removed entries.
 
     :param str base_dir: base directory of the minor version
     :param str minor_version: sha-1 representation of the minor version of vcs (like e..g commit)
@@ -542,38 +1393,34 @@ def remove_from_index(base_dir, minor_version, removed_file_generator, remove_al
 
     # Lookup all entries for the given function
     with open(minor_version_index, 'rb+') as index_handle:
-        # Gather all of the entries from the index
-        all_entries = [entry for entry in walk_index(index_handle)]
-        all_entries.sort(key=lambda unsorted_entry: unsorted_entry.offset)
-        removed_entries = []
+        if read_index_version(index_handle) == helpers.LEGACY_INDEX_VERSION:
+            compact_index(index_handle)
+
+        # Gather all of the entries from the index, shared for lookups of all removed files
+        all_entries = load_index_entries(index_handle)
+        entries_by_checksum = collections.defaultdict(list)
+        entries_by_path = collections.defaultdict(list)
+        for entry in all_entries:
+            entries_by_checksum[entry.checksum].append(entry)
+            entries_by_path[entry.path].append(entry)
+        removed_entries = set()
 
         for removed_file in removed_file_generator:
-            def lookup_function(entry):
-                """Helper lookup function according to the type of the removed file"""
-                if is_sha1(removed_file):
-                    return entry.checksum == removed_file
-                else:
-                    return entry.path == removed_file
-
-            if remove_all:
-                removed_entries.append(
-                    lookup_all_entries_within_index(index_handle, lookup_function)
-                )
-            else:
-                removed_entries.extend([lookup_entry_within_index(index_handle, lookup_function)])
+            entries = entries_by_checksum if is_sha1(removed_file) else entries_by_path
+            found_entries = [
+                entry for entry in entries.get(removed_file, []) if entry not in removed_entries
+            ]
+            if not found_entries and not remove_all:
+                raise EntryNotFoundException(removed_file)
+            removed_entries.update(found_entries if remove_all else found_entries[:1])
             perun_log.info("deregistered: {}".format(removed_file))
 
-        # Update number of entries
-        index_handle.seek(helpers.INDEX_NUMBER_OF_ENTRIES_OFFSET)
-        index_handle.write(struct.pack('i', len(all_entries) - len(removed_entries)))
-
-        # For each entry remove from the index, starting from the greatest offset
-        for entry in all_entries:
-            if entry in removed_entries:
-                continue
-            write_entry(index_handle, entry)
-
-        index_handle.truncate()
+        remaining_entries = [entry for entry in all_entries if entry not in removed_entries]
+        number_of_records, _ = read_index_counts(index_handle)
+        if number_of_records > 2 * len(remaining_entries):
+            compact_index(index_handle, remaining_entries)
+        else:
+            remove_entries_from_index(index_handle, removed_entries)
 
 
 def save_degradation_list_for(base_dir, minor_version, degradation_list):
@@ -121,8 +121,9 @@ def moving_average(x_pts, y_pts, configuration):
     :param dict configuration: the perun and option context with needed parameters
     :return dict: the output dictionary with result of analysis
     """
-    # Sort the points to the right order for computation
-    x_pts, y_pts = zip(*sorted(zip(x_pts, y_pts)))
+    # Sort the points to the right order for computation (by x and then y coordinates)
+    order = np.lexsort((y_pts, x_pts))
+    x_pts, y_pts = np.asarray(x_pts)[order].tolist(), np.asarray(y_pts)[order].tolist()
 
     # If has been specified the window width by user, then will be followed the direct computation
     if configuration.get('window_width'):
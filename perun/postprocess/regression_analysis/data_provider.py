@@ -2,6 +2,8 @@
 
 from operator import itemgetter
 
+import numpy as np
+
 import perun.profile.query as query
 import perun.profile.convert as convert
 
@@ -26,6 +28,44 @@ def resource_sort_key(resource):
     return convert.flatten(resource['uid'])
 
 
+def group_resources_by_uid(profile, of_key, per_key):
+    """Groups the points of the resources by their uids in one pass over the resources.
+
+    The points are appended to the lists of their uids looked up in the hash table (i.e. the
+    resources are not sorted) and each (hashable) uid is flattened only once. The lists are then
+    converted to the numpy arrays, hence the groups can be shared by all postprocessors working
+    with the points of uids (e.g. regression analysis, regressogram or moving average).
+
+    :param dict profile: the profile dictionary
+    :param str of_key: key for which we are finding the model
+    :param str per_key: key of the independent variable
+    :returns list: the triples of x points array, y points array and flattened uid ordered by the
+        flattened uids (the points of each uid are in the order of the resources)
+    """
+    flattened_uids = {}
+    groups = {}
+    for _, resource in query.all_resources_of(profile):
+        uid = resource['uid']
+        try:
+            flattened_uid = flattened_uids.get(uid)
+            if flattened_uid is None:
+                flattened_uid = flattened_uids[uid] = convert.flatten(uid)
+        except TypeError:
+            # Unhashable uids (e.g. dictionaries) are flattened every time
+            flattened_uid = convert.flatten(uid)
+        group = groups.get(flattened_uid)
+        if group is None:
+            group = groups[flattened_uid] = ([], [])
+        group[0].append(resource[per_key])
+        group[1].append(resource[of_key])
+    return [
+        (np.asarray(x_points_list), np.asarray(y_points_list), function_name)
+        for function_name, (x_points_list, y_points_list) in sorted(
+            groups.items(), key=itemgetter(0)
+        )
+    ]
+
+
 def generic_profile_provider(profile, of_key, per_key, **_):
     """Data provider for trace collector profiling output.
 
@@ -33,33 +73,10 @@ def generic_profile_provider(profile, of_key, per_key, **_):
     :param str of_key: key for which we are finding the model
     :param str per_key: key of the independent variable
     :param dict _: rest of the key arguments
-    :returns generator: each subsequent call returns tuple: x points list, y points list, function
-        name
+    :returns generator: each subsequent call returns tuple: x points array, y points array,
+        function name
     """
-    # Get the file resources contents
-    resources = list(map(itemgetter(1), query.all_resources_of(profile)))
-
-    # Sort the dictionaries by function name for easier traversing
-    resources = sorted(resources, key=resource_sort_key)
-    x_points_list = []
-    y_points_list = []
-    function_name = convert.flatten(resources[0]['uid'])
-    # Store all the points until the function name changes
-    for resource in resources:
-        if convert.flatten(resource['uid']) != function_name:
-            if x_points_list:
-                # Function name changed, yield the list of data points
-                yield x_points_list, y_points_list, function_name
-                x_points_list = [resource[per_key]]
-                y_points_list = [resource[of_key]]
-                function_name = convert.flatten(resource['uid'])
-        else:
-            # Add the data points
-            x_points_list.append(resource[per_key])
-            y_points_list.append(resource[of_key])
-    # End of resources, yield the current lists
-    if x_points_list:
-        yield x_points_list, y_points_list, function_name
+    yield from group_resources_by_uid(profile, of_key, per_key)
 
 # profile types : data provider functions mapping dictionary
 # to add new profile type - simply add new keyword and specific provider function with signature:
@@ -0,0 +1,310 @@
+"""Vectorised engine for computing the sums (i.e. the sufficient statistics) of regression models.
+
+The points of the regression (e.g. the points of one uid) are converted to numpy arrays only once
+and all of the models are computed over these arrays. The transformations of the points (the
+'f_x' and 'f_y' functions of the models) are computed once per points and shared by all models
+with the same transformation. Instead of catching the domain errors point by point, the points
+outside of the domain of the transformation (e.g. the logarithm of non-positive values) are masked
+out and do not contribute to the sums. The terms of the sums of all computation steps are summed
+at once. For the sorted points, whose contiguous parts are summed repeatedly (e.g. the intervals
+of the bisection), the terms are computed once together with their prefix sums, hence the sums
+over any contiguous part of the points are the differences of two prefix sums.
+
+The engine is used by the data generators of the models (see 'data_gen' in the _MODELS of the
+regression_models module), which transform the sums to the data dictionaries.
+
+The points of several uids can also be stored in one buffer of shared memory (see SharedPoints),
+which is inherited by the pool of processes computing the uids in parallel, hence the points
+are never copied to the processes.
+"""
+
+import multiprocessing
+
+import numpy as np
+
+import perun.postprocess.regression_analysis.tools as tools
+
+__author__ = 'Tomas Fiedor'
+
+
+class RegressionPoints(object):
+    """The x and y coordinates of the regression points stored in numpy arrays
+
+    The contiguous parts of the points (e.g. the intervals of bisection) are views of the points
+    they were selected from (i.e. their root points), which keep the transformed coordinates and
+    (for the sorted points) the prefix sums of the terms of the models. The transformations and
+    prefix sums are hence computed only once for all parts and the sums over any part are
+    differences of two prefix sums.
+
+    :ivar numpy.ndarray x_pts: the x coordinates (in the original type, if possible)
+    :ivar numpy.ndarray y_pts: the y coordinates (in the original type, if possible)
+    """
+    def __init__(self, x_pts, y_pts):
+        """
+        :param list x_pts: the x coordinates of the points
+        :param list y_pts: the y coordinates of the points
+        """
+        self.x_pts = _as_numeric_array(x_pts)
+        self.y_pts = _as_numeric_array(y_pts)
+        self._root, self._offset = self, 0
+        self._is_sorted = False
+        self._transformed = {}
+        self._prefix_sums = {}
+        self._last_valid = {}
+
+    @classmethod
+    def of(cls, x_pts, y_pts):
+        """
+        :param list x_pts: the x coordinates of the points or the regression points
+        :param list y_pts: the y coordinates of the points (ignored for regression points)
+        :returns RegressionPoints: the regression points
+        """
+        return x_pts if isinstance(x_pts, RegressionPoints) else cls(x_pts, y_pts)
+
+    def __len__(self):
+        return min(len(self.x_pts), len(self.y_pts))
+
+    def __getitem__(self, index):
+        """Selects the points
+
+        The contiguous slices are views sharing the cached values with the root points, while the
+        other selections are new root points with the selected transformed coordinates.
+
+        :param object index: the slice or the array of indices of the selected points
+        :returns RegressionPoints: the selected points
+        """
+        if isinstance(index, slice) and index.step in (None, 1):
+            start, stop, _ = index.indices(len(self))
+            selected = RegressionPoints.__new__(RegressionPoints)
+            selected.x_pts, selected.y_pts = self.x_pts[start:stop], self.y_pts[start:stop]
+            selected._root, selected._offset = self._root, self._offset + start
+            return selected
+
+        selected = RegressionPoints(self.x_pts[index], self.y_pts[index])
+        selected._transformed = {
+            key: tuple(values[index] for values in self._view_of(transformed))
+            for key, transformed in self._root._transformed.items()
+        }
+        return selected
+
+    def check(self):
+        """
+        :raises InvalidPointsException: if the points count is too low or their coordinates list
+            have different lengths
+        """
+        tools.check_points(len(self.x_pts), len(self.y_pts), tools.MIN_POINTS_COUNT)
+
+    def sorted(self):
+        """
+        :raises InvalidPointsException: if the points count is too low
+        :returns RegressionPoints: the points (stably) sorted by x coordinates in ascending order
+        """
+        self.check()
+        sorted_points = self[np.argsort(self.x_pts, kind='mergesort')]
+        sorted_points._is_sorted = True
+        return sorted_points
+
+    def shuffled(self):
+        """
+        :raises InvalidPointsException: if the points count is too low
+        :returns RegressionPoints: the points in random order
+        """
+        self.check()
+        return self[np.random.permutation(len(self))]
+
+    def transformed(self, f_x, f_y):
+        """Transforms the coordinates and masks out the points outside of the domain
+
+        :param function f_x: the vectorised transformation of x coordinates
+        :param function f_y: the vectorised transformation of y coordinates
+        :returns tuple: the transformed x and y coordinates (zeroed outside of the domain) and
+            the mask of points inside the domain
+        """
+        root = self._root
+        key = (f_x, f_y)
+        if key not in root._transformed:
+            x_values, x_mask = root._transform('x', f_x)
+            y_values, y_mask = root._transform('y', f_y)
+            mask = x_mask & y_mask
+            root._transformed[key] = (
+                np.where(mask, x_values, 0.0), np.where(mask, y_values, 0.0), mask
+            )
+        return self._view_of(root._transformed[key])
+
+    def _transform(self, axis, transformation):
+        """
+        :param str axis: the axis of the transformed coordinates, i.e. 'x' or 'y'
+        :param function transformation: the vectorised transformation of coordinates
+        :returns tuple: the transformed coordinates and the mask of finite values
+        """
+        key = (axis, transformation)
+        if key not in self._transformed:
+            values = (self.x_pts if axis == 'x' else self.y_pts).astype(float)
+            with np.errstate(all='ignore'):
+                transformed = np.asarray(transformation(values), dtype=float)
+            self._transformed[key] = (transformed, np.isfinite(transformed))
+        return self._transformed[key]
+
+    def _view_of(self, root_values):
+        """
+        :param tuple root_values: the arrays of values of the root points
+        :returns tuple: the arrays of values of these points
+        """
+        if self._root is self:
+            return root_values
+        end = self._offset + len(self)
+        return tuple(values[self._offset:end] for values in root_values)
+
+    def cumulative_sums(self, steps, terms, *args):
+        """Computes the sums of the terms over the points of each computation step, where each
+        step continues the previous one (i.e. the sums are cumulative)
+
+        The sums of the sorted points, whose contiguous parts are summed repeatedly (e.g. by the
+        interval or bisection methods), are computed from the prefix sums of the terms, which are
+        computed only once for the root points, hence the sums are computed in constant time for
+        each step. The terms of other points are summed directly by the steps and not kept.
+
+        :param int steps: the number of steps the points are split into
+        :param function terms: the function computing the list of arrays of the summed terms of
+            the given points and additional arguments, the function and arguments also identify
+            the cached prefix sums
+        :param list args: the additional arguments of the terms function
+        :raises InvalidSequenceSplitException: if the split produces too few points per step
+        :returns list: the lists of the cumulative sums of the terms after each step
+        """
+        ends = self._step_ends(steps)
+        root = self._root
+        # The sums are kept in extended precision (if available), so the differences of the
+        # prefix sums of long sequences lose less precision than the sums themselves
+        if not root._is_sorted:
+            starts = [0] + ends[:-1]
+            return [
+                np.cumsum(np.add.reduceat(term, starts, dtype=np.longdouble)).astype(float).tolist()
+                for term in terms(self, *args)
+            ]
+
+        key = (terms, ) + args
+        if key not in root._prefix_sums:
+            root._prefix_sums[key] = [
+                np.concatenate(([0], np.cumsum(term, dtype=np.longdouble)))
+                for term in terms(root, *args)
+            ]
+        ends = self._offset + np.asarray(ends)
+        return [
+            (prefix_sums[ends] - prefix_sums[self._offset]).astype(float).tolist()
+            for prefix_sums in root._prefix_sums[key]
+        ]
+
+    def _step_ends(self, steps):
+        """
+        :param int steps: the number of steps the points are split into
+        :raises InvalidSequenceSplitException: if the split produces too few points per step
+        :returns list: the indices after the last points of each step
+        """
+        # One step covers all of the points, hence it can be computed for arbitrary (non-zero)
+        # number of points, e.g. for the new points of the incremental computation
+        if steps == 1 and len(self):
+            return [len(self)]
+        return [end for _, end in tools.split_sequence(len(self), steps)]
+
+    def cumulative_interval(self, steps, f_x=None, f_y=None):
+        """Computes the interval of the x coordinates after each step, where the first point is
+        always part of the interval
+
+        For sorted points the interval is found in constant time for each step: it starts at
+        the first point and ends at the last point inside the domain of the transformations.
+
+        :param int steps: the number of steps the points are split into
+        :param function f_x: the vectorised transformation of x coordinates or None
+        :param function f_y: the vectorised transformation of y coordinates or None
+        :returns tuple: the lists of the starts and the ends of the intervals after each step
+        """
+        ends = self._step_ends(steps)
+        if self._root._is_sorted:
+            root = self._root
+            last_valid = np.asarray(ends) - 1 + self._offset
+            if f_x is not None:
+                last_valid = root._last_valid_before(f_x, f_y)[last_valid]
+            last_valid = np.maximum(last_valid, self._offset)
+            return [self.x_pts[0].item()] * len(ends), root.x_pts[last_valid].tolist()
+
+        starts = [0] + ends[:-1]
+        x_pts = self.x_pts
+        if f_x is not None:
+            x_pts = np.where(self.transformed(f_x, f_y)[2], x_pts, x_pts[0])
+        return (np.minimum.accumulate(np.minimum.reduceat(x_pts, starts)).tolist(),
+                np.maximum.accumulate(np.maximum.reduceat(x_pts, starts)).tolist())
+
+    def _last_valid_before(self, f_x, f_y):
+        """
+        :param function f_x: the vectorised transformation of x coordinates
+        :param function f_y: the vectorised transformation of y coordinates
+        :returns numpy.ndarray: the indices of the last points inside the domain of the
+            transformations up to each point (or -1, if there is none)
+        """
+        key = (f_x, f_y)
+        if key not in self._last_valid:
+            mask = self.transformed(f_x, f_y)[2]
+            self._last_valid[key] = np.maximum.accumulate(
+                np.where(mask, np.arange(len(mask)), -1)
+            )
+        return self._last_valid[key]
+
+
+class SharedPoints(object):
+    """The coordinates of regression points of several uids stored in one buffer of shared memory
+
+    The coordinates keep their original type, each array of coordinates is stored at the offset
+    aligned to 8 bytes. The buffer is shared with the processes forked after its creation.
+
+    :ivar multiprocessing.RawArray buffer: the shared memory with the coordinates
+    :ivar list layout: the offsets, types and lengths of x and y coordinates of each uid
+    """
+    def __init__(self, points_list):
+        """
+        :param list points_list: the list of RegressionPoints stored in the buffer
+        """
+        self.layout = []
+        offset = 0
+        for points in points_list:
+            arrays_layout = []
+            for array in (points.x_pts, points.y_pts):
+                arrays_layout.append((offset, array.dtype.str, len(array)))
+                offset += -(-array.nbytes // 8) * 8
+            self.layout.append(tuple(arrays_layout))
+        self.buffer = multiprocessing.RawArray('b', max(offset, 1))
+        for points, arrays_layout in zip(points_list, self.layout):
+            for array, array_layout in zip((points.x_pts, points.y_pts), arrays_layout):
+                self._view(*array_layout)[:] = array
+
+    def __len__(self):
+        return len(self.layout)
+
+    def __getitem__(self, index):
+        """
+        :param int index: the index of the points in the buffer
+        :returns RegressionPoints: the points with coordinates backed by the shared memory
+        """
+        x_layout, y_layout = self.layout[index]
+        return RegressionPoints(self._view(*x_layout), self._view(*y_layout))
+
+    def _view(self, offset, dtype, length):
+        """
+        :param int offset: the offset of the array in the buffer
+        :param str dtype: the type of the array
+        :param int length: the number of items of the array
+        :returns numpy.ndarray: the array backed by the shared memory
+        """
+        return np.frombuffer(self.buffer, dtype=dtype, count=length, offset=offset)
+
+
+def _as_numeric_array(values):
+    """
+    :param list values: the coordinates
+    :returns numpy.ndarray: the numeric array of coordinates (floats, if the coordinates cannot be
+        stored in the numeric array of their type)
+    """
+    array = np.asarray(values)
+    if array.dtype.kind not in 'iuf':
+        array = array.astype(float)
+    return array
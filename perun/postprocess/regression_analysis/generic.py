@@ -16,6 +16,10 @@ the given argument and return value conventions.
 from math import sqrt
 import perun.postprocess.regression_analysis.tools as tools
 
+# The sums of the points, from which the generic models are computed, i.e. their sufficient
+# statistics, which can be merged with the statistics of other points
+GENERIC_STATISTICS = ('pts_num', 'x_sum', 'y_sum', 'xy_sum', 'x_sq_sum', 'y_sq_sum')
+
 
 def generic_compute_regression(data_gen, func_list, **model):
     """The core of the computation process.
@@ -44,74 +48,64 @@ def generic_compute_regression(data_gen, func_list, **model):
         yield data
 
 
-def generic_regression_data(x_pts, y_pts, f_x, f_y, steps, **_):
+def generic_regression_data(points, f_x, f_y, steps, **_):
     """The generic data generator.
 
     Produces the sums of x, y, square x, square y and x * y values. Also provides the x min/max
     values and the number of points.
 
-    'f_x' and 'f_y' refer to the x and y values modification for the sums (e.g. log10 for x values
-    => sum of log10(x) values).
+    'f_x' and 'f_y' refer to the vectorised x and y values modification for the sums (e.g. log10
+    for x values => sum of log10(x) values). The points outside of the domain of 'f_x' or 'f_y'
+    are skipped.
 
     The 'steps' allows to split the points sequence into parts (for iterative computation),
     where each part continues the computation (the part contains results from the previous).
 
     Yielded data dictionary contains 'x_sum', 'y_sum', 'xy_sum', 'x_sq_sum', 'y_sq_sum', 'pts_num',
-    'num_sqrt', 'x_interval_start' and 'x_interval_end' keys.
+    'x_interval_start' and 'x_interval_end' keys.
 
-    :param list x_pts: the list of x data points
-    :param list y_pts: the list of y data points
-    :param function f_x: function object for modification of x values (e.g. log10, **2, etc.) as
-        specified by the model formula
-    :param function f_y: function object for modification of y values (e.g. log10, **2, etc.) as
-        specified by the model formula
+    :param RegressionPoints points: the data points
+    :param function f_x: vectorised function object for modification of x values (e.g. log10, **2,
+        etc.) as specified by the model formula
+    :param function f_y: vectorised function object for modification of y values (e.g. log10, **2,
+        etc.) as specified by the model formula
     :param int steps: splits the data generation into specified steps
     :raises GenericRegressionExceptionBase: the derived exceptions
     :raises TypeError: if the required function arguments are not in the unpacked dictionary input
     :returns iterable: generator object which produces intermediate results for each computation
         step in a data dictionary
     """
+    # Compute the sums of x, y, x^2, y^2 and x*y of all steps at once
+    sums = points.cumulative_sums(steps, generic_regression_terms, f_x, f_y)
     # We also need the min and max values
-    x_min = x_pts[0]
-    x_max = x_pts[0]
-
-    # Compute the sums of x, y, x^2, y^2 and x*y
-    x_sum, y_sum, x_square_sum, y_square_sum, xy_sum = 0.0, 0.0, 0.0, 0.0, 0.0
-    # Split the computation into specified steps
-    for part_start, part_end in tools.split_sequence(len(x_pts), steps):
-        skipped = 0
-        for x_pt, y_pt in zip(x_pts[part_start:part_end], y_pts[part_start:part_end]):
-
-            # Account for possible domain errors with f_x and f_y functions, simply skip the point
-            try:
-                x_tmp = f_x(x_pt)
-                y_tmp = f_y(y_pt)
-            except ValueError:
-                skipped += 1
-                continue
-
-            # Compute the intermediate results
-            x_sum += x_tmp
-            y_sum += y_tmp
-            x_square_sum += x_tmp ** 2
-            y_square_sum += y_tmp ** 2
-            xy_sum += x_tmp * y_tmp
-
-            # Check the min and max
-            x_min, x_max = min(x_min, x_pt), max(x_max, x_pt)
+    intervals = points.cumulative_interval(steps, f_x, f_y)
 
+    for pts_num, x_sum, y_sum, x_square_sum, y_square_sum, xy_sum, x_min, x_max in zip(
+            *(sums + list(intervals))):
         # Computation step is complete, save the data
-        pts_num = part_end - skipped
+        pts_num = int(pts_num)
         data = dict(
             x_sum=x_sum, y_sum=y_sum, xy_sum=xy_sum, x_sq_sum=x_square_sum,
-            y_sq_sum=y_square_sum, pts_num=pts_num, num_sqrt=sqrt(pts_num),
-            x_interval_start=x_min, x_interval_end=x_max
+            y_sq_sum=y_square_sum, pts_num=pts_num, x_interval_start=x_min, x_interval_end=x_max
         )
         yield data
 
 
+def generic_regression_terms(points, f_x, f_y):
+    """The terms of the points summed by the generic data generator.
+
+    :param RegressionPoints points: the data points
+    :param function f_x: vectorised function object for modification of x values
+    :param function f_y: vectorised function object for modification of y values
+    :returns list: the arrays of the terms, i.e. the mask of the points inside the domain of
+        'f_x' and 'f_y', x, y, x^2, y^2 and x * y values
+    """
+    x_pts, y_pts, mask = points.transformed(f_x, f_y)
+    return [mask, x_pts, y_pts, x_pts * x_pts, y_pts * y_pts, x_pts * y_pts]
+
+
 def generic_regression_coefficients(
-        f_a, f_b, x_sum, y_sum, xy_sum, x_sq_sum, pts_num, num_sqrt, **_):
+        f_a, f_b, x_sum, y_sum, xy_sum, x_sq_sum, pts_num, **_):
     """The generic function for coefficients computation.
 
     The function uses the general coefficient computation formula, which produces two coefficients
@@ -121,8 +115,8 @@ def generic_regression_coefficients(
     'f_y', e.g. 10**x for b0 coefficient => 10**(b0) coefficient value)), which is applied after
     the coefficients are computed.
 
-    Returns the data dictionary with intermediate values 's_xx', 's_xy' and 'coeffs' key containing
-    the coefficients list in ascending order.
+    Returns the data dictionary with intermediate values 's_xx', 's_xy', 'num_sqrt' and 'coeffs'
+    key containing the coefficients list in ascending order.
 
     The coefficients are computed using formula below:
         b0 = (SUM(y) - b1 * SUM(x)) / n
@@ -155,19 +149,20 @@ def generic_regression_coefficients(
     :param float xy_sum: sum of x*y values
     :param float x_sq_sum: sum of x^2 values
     :param int pts_num: number of summed points
-    :param float num_sqrt: square root of pts_num
     :raises TypeError: if the required function arguments are not in the unpacked dictionary input
     :returns dict: data dictionary with coefficients and intermediate results
     """
     # Compute the coefficients
+    num_sqrt = sqrt(pts_num)
     s_xy = xy_sum - tools.safe_division(x_sum, num_sqrt) * tools.safe_division(y_sum, num_sqrt)
-    s_xx = x_sq_sum - (tools.safe_division(x_sum, num_sqrt) ** 2)
+    # S_xx is never negative, however the rounding errors of the sums can make it so
+    s_xx = max(x_sq_sum - (tools.safe_division(x_sum, num_sqrt) ** 2), 0.0)
 
     b1 = tools.safe_division(s_xy, s_xx)
     b0 = tools.safe_division(y_sum - b1 * x_sum, pts_num)
 
     # Apply the modification functions on the coefficients and save them
-    data = dict(coeffs=[f_a(b0), f_b(b1)], s_xy=s_xy, s_xx=s_xx)
+    data = dict(coeffs=[f_a(b0), f_b(b1)], s_xy=s_xy, s_xx=s_xx, num_sqrt=num_sqrt)
     return data
 
 
@@ -5,7 +5,10 @@ This module exposes all currently implemented computational methods for regressi
 """
 
 import collections
+import concurrent.futures
+import multiprocessing
 
+import perun.postprocess.regression_analysis.engine as engine
 import perun.postprocess.regression_analysis.regression_models as mod
 import perun.utils.exceptions as exceptions
 import perun.postprocess.regression_analysis.tools as tools
@@ -19,12 +22,22 @@ def get_supported_methods():
     return list(_METHODS.keys())
 
 
-def compute(data_gen, method, models, **kwargs):
+def compute(data_gen, method, models, jobs=1, base_models=None, **kwargs):
     """The regression analysis wrapper for various computation methods.
 
+    With more than one job, the uids are computed by the pool of processes (see
+    :func:`_compute_in_parallel`), the results are however in the same order as if they were
+    computed sequentially.
+
+    With base models, the full models are computed incrementally from the statistics stored in
+    the base models and the statistics of the new points (see :func:`incremental_computation`).
+
     :param iter data_gen: the generator object with collected data (data provider generators)
     :param str method: the _METHODS key value indicating requested computation method
     :param tuple of str models: tuple of requested regression models to compute
+    :param int jobs: the number of processes computing the uids in parallel
+    :param list base_models: the previously computed models (with their statistics), which are
+        updated by the new points, or None
     :param kwargs: various additional configuration arguments for specific models
     :raises GenericRegressionExceptionBase: derived versions which are used in the computation
         functions
@@ -34,17 +47,22 @@ def compute(data_gen, method, models, **kwargs):
     """
     # Split the models into derived and standard ones
     derived, models = mod.filter_derived(models)
+    if base_models is not None:
+        computed_uids = _compute_incremental(data_gen, method, models, base_models)
+    elif jobs > 1:
+        computed_uids = _compute_in_parallel(data_gen, method, models, jobs, **kwargs)
+    else:
+        computed_uids = (
+            _compute_uid(chunk[0], chunk[1], chunk[2], method, models, **kwargs)
+            for chunk in data_gen
+        )
     analysis = []
-    for chunk in data_gen:
-        try:
-            # First compute all the standard models
-            for result in _METHODS[method](chunk[0], chunk[1], models, **kwargs):
-                result['uid'] = chunk[2]
-                result['method'] = method
-                analysis.append(result)
-        except exceptions.GenericRegressionExceptionBase as e:
-            print("info: unable to perform regression analysis on function '{0}'.".format(chunk[2]))
-            print("  - " + str(e))
+    for uid, results, error in computed_uids:
+        # First collect all the standard models
+        analysis.extend(results)
+        if error is not None:
+            print("info: unable to perform regression analysis on function '{0}'.".format(uid))
+            print("  - " + error)
     # Compute the derived models
     for der in compute_derived(derived, analysis, **kwargs):
         analysis.append(der)
@@ -52,6 +70,120 @@ def compute(data_gen, method, models, **kwargs):
     return list(map(_transform_to_output_data, analysis))
 
 
+# The keys of the results, which are needed by the output and the derived models
+_RESULT_KEYS = (
+    'model', 'coeffs', 'r_square', 'x_interval_start', 'x_interval_end', 'method', 'uid',
+    'y_sum', 'pts_num', 'statistics'
+)
+
+
+def _compute_uid(x_pts, y_pts, uid, method, models, **kwargs):
+    """Computes the standard models of one uid (incrementally, if the base models are given).
+
+    :param list x_pts: the list of x points coordinates (or the regression points)
+    :param list y_pts: the list of y points coordinates
+    :param str uid: the uid of the points
+    :param str method: the _METHODS key value indicating requested computation method
+    :param tuple of str models: tuple of requested standard regression models to compute
+    :param kwargs: various additional configuration arguments for specific models
+    :returns tuple: the uid, the list of results (with only the keys needed by the output and
+        the derived models) computed before the error (if any) and the message of the error or None
+    """
+    results = []
+    computation = incremental_computation if 'base_models' in kwargs else _METHODS[method]
+    try:
+        for result in computation(x_pts, y_pts, models, **kwargs):
+            result['uid'] = uid
+            result['method'] = method
+            # Drop the points (with their cached transformations and sums) and other details
+            # of the computation, so they are released as soon as the uid is computed
+            results.append({
+                key: result[key]
+                for key in _RESULT_KEYS + tuple(result.get('statistics', ()))
+                if key in result
+            })
+    except exceptions.GenericRegressionExceptionBase as e:
+        return uid, results, str(e)
+    return uid, results, None
+
+
+# The points of uids shared with the pool of processes computing the uids in parallel
+_SHARED_POINTS = None
+
+
+def _compute_in_parallel(data_gen, method, models, jobs, **kwargs):
+    """Computes the standard models of the uids by the pool of processes.
+
+    With the 'fork' start method, the points of all uids are stored in the shared memory (see
+    :class:`engine.SharedPoints`), which is inherited by the forked processes, hence only the
+    indices of the uids are sent to the processes. With other start methods (e.g. 'spawn' or
+    'forkserver'), the processes do not inherit the shared memory, so the coordinates of the uids
+    are sent together with the batches. The uids are sent by batches of consecutive uids and the
+    results are yielded in the order of the uids.
+
+    :param iter data_gen: the generator object with collected data (data provider generators)
+    :param str method: the _METHODS key value indicating requested computation method
+    :param tuple of str models: tuple of requested standard regression models to compute
+    :param int jobs: the number of processes computing the uids in parallel
+    :param kwargs: various additional configuration arguments for specific models
+    :returns iterable: the stream of the computed uids (see :func:`_compute_uid`)
+    """
+    global _SHARED_POINTS
+    uids, points_list = [], []
+    for chunk in data_gen:
+        points_list.append(engine.RegressionPoints(chunk[0], chunk[1]))
+        uids.append(chunk[2])
+    if not uids:
+        return []
+
+    batch_size = -(-len(uids) // (jobs * 4))
+    batch_starts = range(0, len(uids), batch_size)
+    if multiprocessing.get_start_method() == 'fork':
+        _SHARED_POINTS = engine.SharedPoints(points_list)
+        batches_points = [None] * len(batch_starts)
+    else:
+        batches_points = [
+            [(points.x_pts, points.y_pts) for points in points_list[start:start + batch_size]]
+            for start in batch_starts
+        ]
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            computed_batches = [
+                executor.submit(
+                    _compute_shared_batch, batch_start, uids[batch_start:batch_start + batch_size],
+                    method, models, kwargs, batch_points
+                ) for batch_start, batch_points in zip(batch_starts, batches_points)
+            ]
+            return [
+                computed_uid for computed_batch in computed_batches
+                for computed_uid in computed_batch.result()
+            ]
+    finally:
+        _SHARED_POINTS = None
+
+
+def _compute_shared_batch(batch_start, uids, method, models, kwargs, batch_points=None):
+    """Computes the standard models of the batch of uids with points in the shared memory.
+
+    :param int batch_start: the index of the points of the first uid in the shared memory
+    :param list uids: the uids of the batch
+    :param str method: the _METHODS key value indicating requested computation method
+    :param tuple of str models: tuple of requested standard regression models to compute
+    :param dict kwargs: various additional configuration arguments for specific models
+    :param list batch_points: the pairs of x and y coordinates of the uids, if the points are not
+        inherited in the shared memory, or None
+    :returns list: the computed uids (see :func:`_compute_uid`)
+    """
+    if batch_points is None:
+        points_list = [_SHARED_POINTS[batch_start + index] for index in range(len(uids))]
+    else:
+        points_list = [engine.RegressionPoints(x_pts, y_pts) for x_pts, y_pts in batch_points]
+    return [
+        _compute_uid(points, None, uid, method, models, **kwargs)
+        for points, uid in zip(points_list, uids)
+    ]
+
+
 def compute_derived(derived_models, analysis, **kwargs):
     """The computation wrapper for derived models.
 
@@ -71,7 +203,7 @@ def full_computation(x_pts, y_pts, computation_models, **_):
 
     The method might have performance issues in case of too many models or data points.
 
-    :param list x_pts: the list of x points coordinates
+    :param list x_pts: the list of x points coordinates (or the regression points)
     :param list y_pts: the list of y points coordinates
     :param tuple of str computation_models: the collection of regression models to compute
     :raises GenericRegressionExceptionBase: derived versions which are used in the computation
@@ -81,11 +213,13 @@ def full_computation(x_pts, y_pts, computation_models, **_):
     :returns iterable: the generator object which produces computed models one by one as a
         transformed output data dictionary
     """
+    # Convert the points only once for all the models
+    points = engine.RegressionPoints.of(x_pts, y_pts)
     # Get all the models properties
     for model in mod.map_keys_to_models(computation_models):
         # Update the properties accordingly
         model['steps'] = 1
-        model = _build_uniform_regression_data_format(x_pts, y_pts, model)
+        model = _build_uniform_regression_data_format(points, model)
         # Compute each model
         for result in model['computation'](**model):
             yield result
@@ -111,10 +245,10 @@ def iterative_computation(x_pts, y_pts, computation_models, steps, **_):
     :returns iterable: the generator object which produces best fitting model as a transformed data
         dictionary
     """
-    x_pts, y_pts = tools.shuffle_points(x_pts, y_pts)
+    points = engine.RegressionPoints.of(x_pts, y_pts).shuffled()
 
     # Do the initial step for specified models
-    model_generators, results = _models_initial_step(x_pts, y_pts, computation_models, steps)
+    model_generators, results = _models_initial_step(points, computation_models, steps)
     best_fit = -1
     while True:
         try:
@@ -148,11 +282,10 @@ def interval_computation(x_pts, y_pts, computation_models, steps, **_):
         transformed output data dictionary
     """
     # Sort the regression data
-    x_pts, y_pts = tools.sort_points(x_pts, y_pts)
+    points = engine.RegressionPoints.of(x_pts, y_pts).sorted()
     # Split the data into intervals and do a full computation on each one of them
-    for part_start, part_end in tools.split_sequence(len(x_pts), steps):
-        interval_gen = full_computation(x_pts[part_start:part_end], y_pts[part_start:part_end],
-                                        computation_models)
+    for part_start, part_end in tools.split_sequence(len(points), steps):
+        interval_gen = full_computation(points[part_start:part_end], None, computation_models)
         # Provide result for each model on every interval
         results = []
         for model in interval_gen:
@@ -183,10 +316,10 @@ def initial_guess_computation(x_pts, y_pts, computation_models, steps, **_):
     :raises TypeError: if the required function arguments are not in the unpacked dictionary input
     :returns iterable: the generator object that produces the complete result in one step
     """
-    x_pts, y_pts = tools.shuffle_points(x_pts, y_pts)
+    points = engine.RegressionPoints.of(x_pts, y_pts).shuffled()
 
     # Do the initial step for specified models
-    model_generators, results = _models_initial_step(x_pts, y_pts, computation_models, steps)
+    model_generators, results = _models_initial_step(points, computation_models, steps)
     # Find the model that fits the most
     best_fit = _find_best_fitting_model(results)
 
@@ -216,23 +349,90 @@ def bisection_computation(x_pts, y_pts, computation_models, **_):
     :returns iterable: the generator object that produces interval models in order
     """
     # Sort the regression data
-    x_pts, y_pts = tools.sort_points(x_pts, y_pts)
+    points = engine.RegressionPoints.of(x_pts, y_pts).sorted()
 
     # Compute the initial model on the whole data set
-    init_model = _compute_bisection_model(x_pts, y_pts, computation_models)
+    init_model = _compute_bisection_model(points, computation_models)
 
     # Do bisection and try to find different model for the new sections
-    for sub_model in _bisection_step(x_pts, y_pts, computation_models, init_model):
+    for sub_model in _bisection_step(points, computation_models, init_model):
         yield sub_model
 
 
-def _compute_bisection_model(x_pts, y_pts, computation_models, **kwargs):
+def incremental_computation(x_pts, y_pts, computation_models, base_models, **_):
+    """The incremental computation method which updates the fully computed models by new points.
+
+    The models are computed from the sufficient statistics of the base models (i.e. the sums over
+    the previously computed points) merged with the statistics of the new points, hence the old
+    points are not needed. The models without base model are fully computed from the new points.
+    The result is the same as the full computation over the old and new points together.
+
+    :param list x_pts: the list of x coordinates of new points (or the regression points)
+    :param list y_pts: the list of y coordinates of new points
+    :param tuple of str computation_models: the collection of regression models to compute
+    :param dict base_models: mapping of the names of models to the base models with statistics
+    :raises GenericRegressionExceptionBase: derived versions which are used in the computation
+        functions
+    :raises DictionaryKeysValidationFailed: in case the data format dictionary is incorrect
+    :returns iterable: the generator object which produces computed models one by one
+    """
+    points = engine.RegressionPoints.of(x_pts, y_pts)
+    for model in mod.map_keys_to_models(computation_models):
+        model['steps'] = 1
+        base_model = base_models.get(model['model'])
+        if base_model is None:
+            model = _build_uniform_regression_data_format(points, model)
+        else:
+            data = dict(
+                base_model['statistics'], x_interval_start=base_model['x_interval_start'],
+                x_interval_end=base_model['x_interval_end']
+            )
+            # Merge the statistics of the new points, if there are any
+            if len(points):
+                model['points'] = points
+                data = tools.merge_statistics(
+                    data, next(model['data_gen'](**model)), model['statistics']
+                )
+            model['data_gen'] = iter([data])
+        for result in model['computation'](**model):
+            yield result
+
+
+def _compute_incremental(data_gen, method, models, base_models):
+    """Computes the standard models of the uids incrementally from the base models.
+
+    Only the fully computed base models with stored statistics are used, the uids of base models
+    without new points are recomputed from the statistics as well.
+
+    :param iter data_gen: the generator object with collected data (data provider generators)
+    :param str method: the _METHODS key value indicating requested computation method
+    :param tuple of str models: tuple of requested standard regression models to compute
+    :param list base_models: the previously computed models
+    :raises UnsupportedIncrementalMethodException: if the method is not the full computation
+    :returns iterable: the stream of the computed uids (see :func:`_compute_uid`)
+    """
+    if method != 'full':
+        raise exceptions.UnsupportedIncrementalMethodException(method)
+    base_uids = collections.defaultdict(dict)
+    for base_model in base_models:
+        if base_model.get('method') == 'full' and 'statistics' in base_model:
+            base_uids[base_model['uid']][base_model['model']] = base_model
+
+    for chunk in data_gen:
+        yield _compute_uid(
+            chunk[0], chunk[1], chunk[2], method, models, base_models=base_uids.pop(chunk[2], {})
+        )
+    # The models of uids without new points are recomputed only from their statistics
+    for uid in sorted(base_uids.keys()):
+        yield _compute_uid([], [], uid, method, models, base_models=base_uids[uid])
+
+
+def _compute_bisection_model(points, computation_models, **kwargs):
     """Compute specified models on a given data set and find the best fitting model.
 
     Currently uses the full computation method.
 
-    :param list x_pts: the list of x points coordinates
-    :param list y_pts: the list of y points coordinates
+    :param RegressionPoints points: the regression points
     :param tuple of str computation_models: the collection of regression models that will be
         computed
     :param kwargs: additional configuration parameters
@@ -245,22 +445,21 @@ def _compute_bisection_model(x_pts, y_pts, computation_models, **kwargs):
 
     results = []
     # Compute the step using the full computation
-    for result in full_computation(x_pts, y_pts, computation_models, **kwargs):
+    for result in full_computation(points, None, computation_models, **kwargs):
         results.append(result)
     # Find the best model
     return results[_find_best_fitting_model(results)]
 
 
-def _bisection_step(x_pts, y_pts, computation_models, last_model):
+def _bisection_step(points, computation_models, last_model):
     """The bisection step computation.
 
-    Performs one computation step for bisection. Splits the interval set by x_pts, y_pts and
+    Performs one computation step for bisection. Splits the interval set by points and
     tries to compute each half. In case of model change, the interval is split again and the
     process repeats. Otherwise the last model is used as a final model.
 
 
-    :param list x_pts: the list of x points coordinates
-    :param list y_pts: the list of y points coordinates
+    :param RegressionPoints points: the regression points
     :param tuple of str computation_models: the collection of regression models to compute
     :param dict last_model: the full interval model that is split
     :raises GenericRegressionExceptionBase: derived versions which are used in the computation
@@ -272,10 +471,9 @@ def _bisection_step(x_pts, y_pts, computation_models, last_model):
     # Split the interval and compute each one of them
     half_models = []
     parts = []
-    for part_start, part_end in tools.split_sequence(len(x_pts), 2):
+    for part_start, part_end in tools.split_sequence(len(points), 2):
         half_models.append(
-            _compute_bisection_model(x_pts[part_start:part_end], y_pts[part_start:part_end],
-                                     computation_models))
+            _compute_bisection_model(points[part_start:part_end], computation_models))
         parts.append((part_start, part_end))
 
     # The half models are not different, return the full interval model
@@ -285,25 +483,22 @@ def _bisection_step(x_pts, y_pts, computation_models, last_model):
         return
 
     # Check the first half interval and continue with bisection if needed
-    for half_model in _bisection_solve_half_model(x_pts[parts[0][0]:parts[0][1]],
-                                                  y_pts[parts[0][0]:parts[0][1]],
+    for half_model in _bisection_solve_half_model(points[parts[0][0]:parts[0][1]],
                                                   computation_models, half_models[0], last_model):
         yield half_model
     # Check the second half interval and continue with bisection if needed
-    for half_model in _bisection_solve_half_model(x_pts[parts[1][0]:parts[1][1]],
-                                                  y_pts[parts[1][0]:parts[1][1]],
+    for half_model in _bisection_solve_half_model(points[parts[1][0]:parts[1][1]],
                                                   computation_models, half_models[1], last_model):
         yield half_model
 
 
-def _bisection_solve_half_model(x_pts, y_pts, computation_models, half_model, last_model):
+def _bisection_solve_half_model(points, computation_models, half_model, last_model):
     """Helper function for solving half intervals and producing their results.
 
     The functions checks if the model has changed for the given half and if yes, then continues
     with bisection - otherwise the half model is used as the final one for the interval.
 
-    :param list x_pts: the list of x points coordinates
-    :param list y_pts: the list of y points coordinates
+    :param RegressionPoints points: the regression points
     :param tuple of str computation_models: the collection of regression models to compute
     :param dict half_model: the half interval model
     :param dict last_model: the full interval model that is split
@@ -311,7 +506,7 @@ def _bisection_solve_half_model(x_pts, y_pts, computation_models, half_model, la
     if half_model['model'] != last_model['model']:
         # The model is different, continue with bisection
         try:
-            for submodel in _bisection_step(x_pts, y_pts, computation_models, half_model):
+            for submodel in _bisection_step(points, computation_models, half_model):
                 yield submodel
         except exceptions.InvalidPointsException:
             # Too few submodel points to perform regression, use the half model instead
@@ -321,11 +516,10 @@ def _bisection_solve_half_model(x_pts, y_pts, computation_models, half_model, la
         yield half_model
 
 
-def _models_initial_step(x_pts, y_pts, computation_models, steps):
+def _models_initial_step(points, computation_models, steps):
     """Performs initial step with specified models in multi-step methods.
 
-    :param list x_pts: the list of x points coordinates
-    :param list y_pts: the list of y points coordinates
+    :param RegressionPoints points: the regression points
     :param tuple of str computation_models: the collection of regression models to compute
     :param int steps: number of total steps
     :raises GenericRegressionExceptionBase: derived versions which are used in the computation
@@ -340,7 +534,7 @@ def _models_initial_step(x_pts, y_pts, computation_models, steps):
     for model in mod.map_keys_to_models(computation_models):
         # Transform the properties
         model['steps'] = steps
-        data = _build_uniform_regression_data_format(x_pts, y_pts, model)
+        data = _build_uniform_regression_data_format(points, model)
         # Do a single computational step for each model
         model_generators.append(model['computation'](**data))
         results.append(next(model_generators[-1]))
@@ -373,7 +567,8 @@ def _transform_to_output_data(data, extra_keys=None):
     'x_interval_end' keys taken from the data dictionary. The function also allows to specify
     extra keys to be included in the output dictionary. If certain key is missing in the data
     dictionary, then it's not included in the output dictionary. Coefficients are saved with
-    default names 'b0', 'b1'...
+    default names 'b0', 'b1'... The sufficient statistics of the model (as specified by the
+    'statistics' of the model) are saved as 'statistics' dictionary.
 
     :param dict data: the data dictionary with results
     :param list of str extra_keys: the extra keys to include
@@ -395,19 +590,21 @@ def _transform_to_output_data(data, extra_keys=None):
             'name': 'b{0}'.format(idx),
             'value': coeff
         })
+    # Store the statistics, so the model can be incrementally updated by new points
+    if 'statistics' in data:
+        transformed['statistics'] = {key: data[key] for key in data['statistics']}
 
     return transformed
 
 
-def _build_uniform_regression_data_format(x_pts, y_pts, model):
+def _build_uniform_regression_data_format(points, model):
     """Creates the uniform regression data dictionary from the model properties and regression
     data points.
 
     The uniform data dictionary is used in the regression computation as it allows to build
     generic and easily extensible computational methods and models.
 
-    :param list x_pts: the list of x points coordinates
-    :param list y_pts: the list of y points coordinates
+    :param RegressionPoints points: the regression points
     :param dict model: the regression model properties
     :raises InvalidPointsException: if the points count is too low or their coordinates list have
         different lengths
@@ -415,11 +612,10 @@ def _build_uniform_regression_data_format(x_pts, y_pts, model):
     :returns dict: the uniform data dictionary
     """
     # Check the requirements
-    tools.check_points(len(x_pts), len(y_pts), tools.MIN_POINTS_COUNT)
+    points.check()
     tools.validate_dictionary_keys(model, ['data_gen'], ['x', 'y'])
 
-    model['x_pts'] = x_pts
-    model['y_pts'] = y_pts
+    model['points'] = points
     # Initialize the data generator
     model['data_gen'] = model['data_gen'](**model)
     return model
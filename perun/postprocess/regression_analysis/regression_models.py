@@ -7,7 +7,9 @@ the sections of _MODELS dictionary representing the model properties.
 """
 
 import math
+import numpy as np
 
+import perun.utils as utils
 import perun.postprocess.regression_analysis.generic as generic
 import perun.postprocess.regression_analysis.specific as specific
 import perun.postprocess.regression_analysis.derived as derived
@@ -138,11 +140,13 @@ def filter_derived(regression_models_keys):
 # The record can also contain optional parameters as needed.
 # Keys description:
 # - model: full name of the regression model
-# - f_x: function that modifies x values in model computation according to formulae
-# - f_y: function that modifies y values in model computation according to formulae
+# - f_x: vectorised function that modifies x values in model computation according to formulae
+# - f_y: vectorised function that modifies y values in model computation according to formulae
 # - f_a: function that modifies b0 (a) coefficient in model computation according to formulae
 # - f_b: function that modifies b1 (b) coefficient in model computation according to formulae
 # - data_gen: function that generates intermediate values from points for model computation
+# - statistics: the generated values, which are sums over the points (i.e. the sufficient
+#   statistics of the model), hence they can be merged with the values of other points
 # - computation: core function that controls the model computation
 # - func_list: functions that are applied to the 'data_gen'erated values
 # -------------------------------------------------------------------------------------
@@ -172,11 +176,12 @@ _MODELS = {
     },
     'linear': {
         'model': 'linear',
-        'f_x': lambda x: x,
-        'f_y': lambda y: y,
+        'f_x': utils.identity,
+        'f_y': utils.identity,
         'f_a': lambda a: a,
         'f_b': lambda b: b,
         'data_gen': generic.generic_regression_data,
+        'statistics': generic.GENERIC_STATISTICS,
         'computation': generic.generic_compute_regression,
         'func_list': [
             generic.generic_regression_coefficients,
@@ -193,11 +198,12 @@ _MODELS = {
     },
     'logarithmic': {
         'model': 'logarithmic',
-        'f_x': math.log,
-        'f_y': lambda y: y,
+        'f_x': np.log,
+        'f_y': utils.identity,
         'f_a': lambda a: a,
         'f_b': lambda b: b,
         'data_gen': generic.generic_regression_data,
+        'statistics': generic.GENERIC_STATISTICS,
         'computation': generic.generic_compute_regression,
         'func_list': [
             generic.generic_regression_coefficients,
@@ -217,6 +223,7 @@ _MODELS = {
     'quadratic': {
         'model': 'quadratic',
         'data_gen': specific.specific_quad_data,
+        'statistics': specific.QUAD_STATISTICS,
         'computation': generic.generic_compute_regression,
         'func_list': [
             specific.specific_quad_coefficients,
@@ -233,11 +240,12 @@ _MODELS = {
     },
     'power': {
         'model': 'power',
-        'f_x': math.log10,
-        'f_y': math.log10,
+        'f_x': np.log10,
+        'f_y': np.log10,
         'f_a': lambda a: 10 ** a,
         'f_b': lambda b: b,
         'data_gen': generic.generic_regression_data,
+        'statistics': generic.GENERIC_STATISTICS,
         'computation': generic.generic_compute_regression,
         'func_list': [
             generic.generic_regression_coefficients,
@@ -254,11 +262,12 @@ _MODELS = {
     },
     'exponential': {
         'model': 'exponential',
-        'f_x': lambda x: x,
-        'f_y': math.log10,
+        'f_x': utils.identity,
+        'f_y': np.log10,
         'f_a': lambda a: 10 ** a,
         'f_b': lambda b: 10 ** b,
         'data_gen': generic.generic_regression_data,
+        'statistics': generic.GENERIC_STATISTICS,
         'computation': generic.generic_compute_regression,
         'func_list': [
             generic.generic_regression_coefficients,
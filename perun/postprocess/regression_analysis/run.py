@@ -3,6 +3,7 @@
 import click
 
 import perun.logic.runner as runner
+import perun.profile.factory as profiles
 import perun.postprocess.regression_analysis.data_provider as data_provider
 import perun.postprocess.regression_analysis.tools as tools
 import perun.utils.cli_helpers as cli_helpers
@@ -24,9 +25,18 @@ def postprocess(profile, **configuration):
     # Validate the input configuration
     tools.validate_dictionary_keys(configuration, ['method', 'regression_models', 'steps'], [])
 
+    # Load the models, which are incrementally updated by the points of the profile
+    base_models = None
+    if configuration.get('incremental_from'):
+        if configuration['method'] != 'full':
+            return PostprocessStatus.ERROR, "incremental computation requires 'full' method", {}
+        base_profile = profiles.load_profile_from_file(configuration['incremental_from'], True)
+        base_models = base_profile['global'].get('models', [])
+
     # Perform the regression analysis
     analysis = methods.compute(data_provider.data_provider_mapper(profile, **configuration),
                                configuration['method'], configuration['regression_models'],
+                               jobs=configuration.get('jobs', 1), base_models=base_models,
                                steps=configuration['steps'])
 
     # Store the results
@@ -49,6 +59,12 @@ def postprocess(profile, **configuration):
               required=False, default=_DEFAULT_STEPS,
               help=('Restricts the number of number of steps / data parts used'
                     ' by the iterative, interval and initial guess methods'))
+@click.option('--jobs', '-j', type=click.IntRange(min=1), default=1,
+              help='Computes the models of the uids in parallel by <jobs> processes.')
+@click.option('--incremental-from', '-if', type=click.Path(exists=True, dir_okay=False),
+              default=None, metavar='<profile>',
+              help='Updates the full models stored (with their statistics) in the <profile> by'
+                   ' the points of the postprocessed profile instead of recomputing them.')
 @click.option('--depending-on', '-dp', 'per_key', default='structure-unit-size',
               nargs=1, metavar='<depending_on>',
               callback=cli_helpers.process_resource_key_param,
@@ -92,6 +108,16 @@ def regression_analysis(profile, **kwargs):
            them. If the best fitting models changed for sub intervals, then we
            continue with the splitting.
 
+    With ``--jobs`` the uids are computed in parallel by the pool of processes,
+    which share the points of all uids in one buffer of shared memory. The
+    models are however stored in the same order as by sequential computation.
+
+    With ``--incremental-from`` the full models stored in the given profile are
+    updated by the points of the postprocessed profile (e.g. by the points of
+    new workloads), without recomputing the points of the given profile. Each
+    stored model keeps the sums over its points (e.g. `x_sum` or `xy_sum`) as
+    its `statistics`, which are merged with the sums over the new points.
+
     Currently we support **linear**, **quadratic**, **power**, **logaritmic**
     and **constant** models and use the `coeficient of determination`
     (:math:`R^2`) to measure the fitness of model. The models are stored as
@@ -117,6 +143,14 @@ def regression_analysis(profile, **kwargs):
             "x_interval_end": 11892,
             "model": "linear",
             "method": "full",
+            "statistics": {
+                "pts_num": 11893,
+                "x_sum": 70719778.0,
+                "y_sum": 6713.0,
+                "xy_sum": 40713914.0,
+                "x_sq_sum": 560679413334.0,
+                "y_sq_sum": 13493.0
+            }
         }
 
     Note that if your data are not suitable for regression analysis, check out
@@ -5,10 +5,19 @@ This module contains the required specific versions for the models computation.
 
 """
 
+import numpy as np
+
 import perun.postprocess.regression_analysis.tools as tools
 
+# The sums of the points, from which the quadratic model is computed, i.e. its sufficient
+# statistics, which can be merged with the statistics of other points
+QUAD_STATISTICS = (
+    'pts_num', 'x_sum', 'y_sum', 'xy_sum', 'x_sq_sum', 'y_sq_sum', 'x_cube_sum', 'x4_sum',
+    'x_sq_y_sum'
+)
+
 
-def specific_quad_data(x_pts, y_pts, steps, **_):
+def specific_quad_data(points, steps, **_):
     """The quadratic data generator.
 
     Produces the sums of x, y, square x, x^3, x^4, square y, x * y and x^2 * y values.
@@ -20,49 +29,44 @@ def specific_quad_data(x_pts, y_pts, steps, **_):
     Yielded data dictionary contains 'x_sum', 'y_sum', 'xy_sum', 'x_sq_sum', 'y_sq_sum',
     x_cube_sum, x4_sum, x_sq_y_sum, 'pts_num', 'x_interval_start' and 'x_interval_end' keys.
 
-    :param list x_pts: the list of x data points
-    :param list y_pts: the list of y data points
+    :param RegressionPoints points: the data points
     :param int steps: splits the data generation into specified steps
     :raises GenericRegressionExceptionBase: the derived exceptions
     :raises TypeError: if the required function arguments are not in the unpacked dictionary input
     :returns iterable: generator object which produces intermediate results for each computation
         step in a data dictionary
     """
+    # Compute the sums of x, y, y^2, x^2, x^3, x^4, x * y and x^2 * y of all steps at once
+    sums = points.cumulative_sums(steps, specific_quad_terms)
     # We also need the min and max values
-    x_min = x_pts[0]
-    x_max = x_pts[0]
-
-    # Compute the sums of x, y, y^2, x^2, x^3, x^4, x * y and x^2 * y
-    x_sum, y_sum, x_square_sum, x_cube_sum = 0.0, 0.0, 0.0, 0.0
-    x4_sum, xy_sum, x_square_y_sum, y_square_sum = 0.0, 0.0, 0.0, 0.0
-    # Split the computation into specified steps
-    for part_start, part_end in tools.split_sequence(len(x_pts), steps):
-        skipped = 0
-        for x_pt, y_pt in zip(x_pts[part_start:part_end], y_pts[part_start:part_end]):
-
-            # Compute the intermediate results
-            x_sum += x_pt
-            y_sum += y_pt
-            y_square_sum += y_pt ** 2
-            x_square_sum += x_pt ** 2
-            x_cube_sum += x_pt ** 3
-            x4_sum += x_pt ** 4
-            xy_sum += x_pt * y_pt
-            x_square_y_sum += (x_pt ** 2) * y_pt
-
-            # Check the min and max
-            x_min, x_max = min(x_min, x_pt), max(x_max, x_pt)
+    intervals = points.cumulative_interval(steps)
 
+    for pts_num, x_sum, y_sum, y_square_sum, x_square_sum, x_cube_sum, x4_sum, xy_sum, \
+            x_square_y_sum, x_min, x_max in zip(*(sums + list(intervals))):
         # Computation step is complete, save the data
-        pts_num = part_end - skipped
         data = dict(
             x_sum=x_sum, y_sum=y_sum, xy_sum=xy_sum, x_sq_sum=x_square_sum, y_sq_sum=y_square_sum,
             x_cube_sum=x_cube_sum, x4_sum=x4_sum, x_sq_y_sum=x_square_y_sum,
-            pts_num=pts_num, x_interval_start=x_min, x_interval_end=x_max
+            pts_num=int(pts_num), x_interval_start=x_min, x_interval_end=x_max
         )
         yield data
 
 
+def specific_quad_terms(points):
+    """The terms of the points summed by the quadratic data generator.
+
+    :param RegressionPoints points: the data points
+    :returns list: the arrays of the terms, i.e. ones (counting the points), x, y, y^2, x^2, x^3,
+        x^4, x * y and x^2 * y values
+    """
+    x_pts, y_pts = points.x_pts.astype(float), points.y_pts.astype(float)
+    x_square_pts = x_pts * x_pts
+    return [
+        np.ones(len(points)), x_pts, y_pts, y_pts * y_pts, x_square_pts, x_square_pts * x_pts,
+        x_square_pts * x_square_pts, x_pts * y_pts, x_square_pts * y_pts
+    ]
+
+
 def specific_quad_coefficients(
         x_sum, y_sum, xy_sum, x_sq_sum, x_cube_sum, x4_sum, x_sq_y_sum, pts_num, **_):
     """The quadratic specific function for coefficients computation.
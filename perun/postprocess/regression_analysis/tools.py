@@ -56,6 +56,29 @@ def check_points(x_len, y_len, threshold):
         raise exceptions.InvalidPointsException(x_len, y_len, MIN_POINTS_COUNT)
 
 
+def merge_statistics(data, other, statistics):
+    """Merges the sufficient statistics of two disjoint sets of points.
+
+    The statistics (i.e. the sums over the points) are added together and the x intervals are
+    joined, unless the other statistics do not sum any point.
+
+    :param dict data: the statistics and x interval of the first set of points
+    :param dict other: the statistics and x interval of the second set of points
+    :param tuple statistics: the keys of the merged statistics
+    :raises DictionaryKeysValidationFailed: if some of the statistics are missing
+    :returns dict: the merged statistics and x interval
+    """
+    validate_dictionary_keys(data, statistics, [])
+    validate_dictionary_keys(other, statistics, [])
+    merged = {key: data[key] + other[key] for key in statistics}
+    merged['x_interval_start'] = data['x_interval_start']
+    merged['x_interval_end'] = data['x_interval_end']
+    if other['pts_num']:
+        merged['x_interval_start'] = min(merged['x_interval_start'], other['x_interval_start'])
+        merged['x_interval_end'] = max(merged['x_interval_end'], other['x_interval_end'])
+    return merged
+
+
 def split_sequence(length, parts):
     """Generator. Splits the given (collection) length into roughly equal parts and yields the part
        start and end indices pair one by one.
@@ -81,7 +81,7 @@ def regressogram(x_pts, y_pts, statistic_function, buckets):
         'bucket_stats': bucket_stats.tolist(),
         'x_interval_start': np.min(bucket_edges),
         'x_interval_end': np.max(bucket_edges),
-        'y_interval_start': min(y_pts),
+        'y_interval_start': np.min(y_pts).item(),
         'r_square': sklearn.metrics.r2_score(y_pts,
                                              [bucket_stats[bucket_number - 1] for bucket_number in bucket_numbers])
     }
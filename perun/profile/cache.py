@@ -0,0 +1,216 @@
+"""``perun.profile.cache`` contains process-wide cache of loaded profiles.
+
+The stored profiles are addressed by the checksums of their objects, hence once the profile
+is loaded (i.e. decompressed and parsed), any further loading of the same object (e.g. when
+the same baseline profile is checked against several minor versions) is served from the cache.
+
+The cache is bounded by the size of its profiles in bytes and the least recently used
+profiles are evicted first. The profiles are kept pickled, so each lookup returns new copy of
+the profile, which can be freely modified by the caller, and the size of the cache is exact.
+Since most of the profiles are loaded only once, the profile is pickled and cached only when
+it is loaded for the second time. Optionally (see :ckey:`profiles.persistent_cache`), the
+cached profiles are persisted in the ``.perun/cache`` directory, so they are shared by the
+subsequent runs of perun as well.
+"""
+
+import collections
+import distutils.util as dutils
+import os
+import pickle
+
+import perun.logic.config as config
+import perun.logic.pcs as pcs
+import perun.utils.decorators as decorators
+from perun.utils.helpers import PROFILE_CACHE_SIZE
+
+__author__ = 'Tomas Fiedor'
+
+PERSISTED_PROFILE_SUFFIX = '.pickle'
+# The maximal number of remembered checksums of the profiles, that were loaded only once
+MAX_SEEN_PROFILES = 4096
+
+
+class ProfileCache(object):
+    """LRU cache of loaded profiles addressed by the checksums of their objects
+
+    :ivar int max_size: maximal size of the cached profiles in bytes
+    :ivar str cache_dir: directory, where the profiles are persisted, or None if the profiles
+        are kept only in the memory
+    :ivar int size: current size of the profiles kept in the memory
+    :ivar int persisted_size: current size of the persisted profiles known to this cache
+    """
+    def __init__(self, max_size, cache_dir=None):
+        """
+        :param int max_size: maximal size of the cached profiles in bytes
+        :param str cache_dir: directory, where the profiles are persisted, or None
+        """
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        self.size = 0
+        self.persisted_size = 0
+        self._profiles = collections.OrderedDict()
+        # Checksums of the profiles, that were put to the cache only once so far
+        self._seen = collections.OrderedDict()
+        # Checksums of the persisted profiles (from least recently used) -> their sizes
+        self._persisted = None
+
+    def __contains__(self, checksum):
+        return checksum in self._profiles
+
+    def __len__(self):
+        return len(self._profiles)
+
+    def get(self, checksum):
+        """Looks up the profile of the given checksum in the cache
+
+        :param str checksum: checksum of the object of the profile
+        :returns dict: copy of the cached profile or None, if the profile is not cached
+        """
+        pickled_profile = self._profiles.get(checksum)
+        if pickled_profile is not None:
+            self._profiles.move_to_end(checksum)
+        elif self.cache_dir is not None:
+            pickled_profile = self._load_persisted(checksum)
+            if pickled_profile is not None:
+                self._insert(checksum, pickled_profile)
+        if pickled_profile is None:
+            return None
+        return pickle.loads(pickled_profile)
+
+    def put(self, checksum, profile):
+        """Stores the profile under the checksum of its object to the cache
+
+        The profile put to the cache for the first time is not pickled, only its checksum is
+        remembered, hence only the profiles, which are loaded repeatedly, are cached.
+
+        :param str checksum: checksum of the object of the profile
+        :param dict profile: loaded profile w.r.t :ref:`profile-spec`
+        """
+        if checksum not in self._seen:
+            self._seen[checksum] = None
+            if len(self._seen) > MAX_SEEN_PROFILES:
+                self._seen.popitem(last=False)
+            return
+        del self._seen[checksum]
+        pickled_profile = pickle.dumps(profile, pickle.HIGHEST_PROTOCOL)
+        self._insert(checksum, pickled_profile)
+        if self.cache_dir is not None and len(pickled_profile) <= self.max_size:
+            self._persist(checksum, pickled_profile)
+
+    def clear(self):
+        """Removes all of the profiles kept in the memory (the persisted profiles are kept)"""
+        self._profiles.clear()
+        self._seen.clear()
+        self.size = 0
+
+    def _insert(self, checksum, pickled_profile):
+        """Inserts the pickled profile to the memory and evicts the least recently used profiles
+
+        Profiles bigger than the whole cache are not stored at all.
+
+        :param str checksum: checksum of the object of the profile
+        :param bytes pickled_profile: pickled profile
+        """
+        if len(pickled_profile) > self.max_size:
+            return
+        if checksum in self._profiles:
+            self.size -= len(self._profiles.pop(checksum))
+        self._profiles[checksum] = pickled_profile
+        self.size += len(pickled_profile)
+        while self.size > self.max_size:
+            _, evicted_profile = self._profiles.popitem(last=False)
+            self.size -= len(evicted_profile)
+
+    def _persisted_path(self, checksum):
+        """
+        :param str checksum: checksum of the object of the profile
+        :returns str: path to the persisted profile
+        """
+        return os.path.join(self.cache_dir, checksum + PERSISTED_PROFILE_SUFFIX)
+
+    def _get_persisted(self):
+        """Lists the persisted profiles only once, when they are accessed for the first time
+
+        :returns OrderedDict: the checksums of the persisted profiles ordered from the least
+            recently used one mapped to their sizes
+        """
+        if self._persisted is None:
+            persisted_profiles = []
+            for persisted_file in os.listdir(self.cache_dir):
+                if persisted_file.endswith(PERSISTED_PROFILE_SUFFIX):
+                    persisted_stat = os.stat(os.path.join(self.cache_dir, persisted_file))
+                    persisted_profiles.append((
+                        persisted_stat.st_mtime, persisted_file[:-len(PERSISTED_PROFILE_SUFFIX)],
+                        persisted_stat.st_size
+                    ))
+            self._persisted = collections.OrderedDict(
+                (checksum, size) for (_, checksum, size) in sorted(persisted_profiles)
+            )
+            self.persisted_size = sum(self._persisted.values())
+        return self._persisted
+
+    def _mark_persisted(self, checksum, size):
+        """Marks the persisted profile as the most recently used one
+
+        :param str checksum: checksum of the object of the profile
+        :param int size: size of the persisted profile in bytes
+        """
+        persisted = self._get_persisted()
+        self.persisted_size += size - persisted.pop(checksum, 0)
+        persisted[checksum] = size
+
+    def _load_persisted(self, checksum):
+        """Loads the persisted pickled profile and marks it as recently used
+
+        :param str checksum: checksum of the object of the profile
+        :returns bytes: pickled profile or None, if the profile is not persisted
+        """
+        persisted_path = self._persisted_path(checksum)
+        try:
+            with open(persisted_path, 'rb') as persisted_handle:
+                pickled_profile = persisted_handle.read()
+            os.utime(persisted_path)
+        except OSError:
+            return None
+        self._mark_persisted(checksum, len(pickled_profile))
+        return pickled_profile
+
+    def _persist(self, checksum, pickled_profile):
+        """Persists the pickled profile and removes the least recently used persisted profiles
+
+        The profile is first written to temporary file, so other processes never read
+        partially written profiles.
+
+        :param str checksum: checksum of the object of the profile
+        :param bytes pickled_profile: pickled profile
+        """
+        persisted_path = self._persisted_path(checksum)
+        temporary_path = "{}.{}.tmp".format(persisted_path, os.getpid())
+        with open(temporary_path, 'wb') as persisted_handle:
+            persisted_handle.write(pickled_profile)
+        os.replace(temporary_path, persisted_path)
+
+        self._mark_persisted(checksum, len(pickled_profile))
+        persisted = self._get_persisted()
+        while self.persisted_size > self.max_size:
+            evicted_checksum, evicted_size = persisted.popitem(last=False)
+            self.persisted_size -= evicted_size
+            try:
+                os.remove(self._persisted_path(evicted_checksum))
+            except OSError:
+                # The profile was already removed by other process
+                pass
+
+
+@decorators.singleton
+def get_profile_cache():
+    """Returns the process-wide cache of profiles configured by :ckey:`profiles.cache_size` and
+    :ckey:`profiles.persistent_cache`
+
+    :returns ProfileCache: cache of loaded profiles
+    """
+    max_size = int(config.lookup_key_recursively('profiles.cache_size', PROFILE_CACHE_SIZE))
+    is_persistent = dutils.strtobool(
+        str(config.lookup_key_recursively('profiles.persistent_cache', 'false'))
+    )
+    return ProfileCache(max_size, pcs.get_cache_directory() if is_persistent else None)
@@ -0,0 +1,468 @@
+"""``perun.profile.columnar`` specifies the columnar (i.e. struct-of-arrays)
+representation of the profiles w.r.t :ref:`profile-spec`.
+
+Resources of profiles are stored as a list of dictionaries, where each of the
+resource repeats its keys and values (e.g. `type`, `subtype` or `uid`). The
+columnar profile instead stores each resource key as one column: numeric
+values are stored in typed NumPy arrays and the rest of the values (strings,
+traces, etc.) is dictionary encoded, i.e. each unique value is stored once and
+the column contains only integer codes to the list of unique values.
+
+Run the following in the Python interpreter to convert the profile to its
+columnar representation::
+
+    import perun.profile.columnar as columnar
+    columnar_profile = columnar.ColumnarProfile(profile)
+
+Columnar profiles can be iterated by :func:`perun.profile.query.all_resources_of`
+and converted to dataframe by
+:func:`perun.profile.convert.resources_to_pandas_dataframe`. Note that the
+columnar profile can be built from lazy profiles as well, without loading the
+whole profile into the memory.
+"""
+
+import array
+import collections
+import copy
+import itertools
+import json
+import numbers
+import struct
+
+import perun.profile.query as query
+
+import demandimport
+with demandimport.enabled():
+    import numpy
+
+__author__ = 'Tomas Fiedor'
+
+# Code of the missing values in the dictionary encoded columns
+MISSING_CODE = -1
+# Marker of the missing values in the columns
+MISSING_VALUE = object()
+# Number of resources, that are reconstructed from the columns at once
+RESOURCE_BLOCK_SIZE = 4096
+
+
+def is_numeric_value(value):
+    """
+    :param object value: checked value
+    :returns bool: true if the value can be stored in the numeric column
+    """
+    return isinstance(value, numbers.Real) and not isinstance(value, bool)
+
+
+def category_key(value):
+    """Returns hashable key of the value, which identifies the value in the encoded column
+
+    :param object value: value of the resource (can be nested)
+    :returns object: hashable key of the value
+    """
+    if isinstance(value, str):
+        return value
+    return type(value).__name__, json.dumps(value, sort_keys=True)
+
+
+class EncodedColumn(object):
+    """Column of dictionary encoded values
+
+    :ivar array codes: codes of the values to the list of unique values (MISSING_CODE if the
+        resource is missing the key), after finalization converted to numpy array
+    :ivar list categories: list of unique values of the column
+    :ivar dict _category_codes: map of keys of the unique values to their codes
+    """
+    def __init__(self):
+        """Initializes the empty column"""
+        self.codes = array.array('i')
+        self.categories = []
+        self._category_codes = {}
+
+    @classmethod
+    def from_arrays(cls, codes, categories):
+        """Creates finalized encoded column from the array of codes and the list of categories
+
+        :param numpy.ndarray codes: codes of the values of the column
+        :param list categories: list of unique values of the column
+        :returns EncodedColumn: finalized dictionary encoded column
+        """
+        encoded_column = cls()
+        encoded_column.codes = codes
+        encoded_column.categories = categories
+        return encoded_column
+
+    @classmethod
+    def from_column(cls, column):
+        """Creates new encoded column from values of another column
+
+        :param column: column that is converted to encoded column
+        :returns EncodedColumn: dictionary encoded column with the same values
+        """
+        encoded_column = cls()
+        for value in column.block(0, len(column)):
+            if value is MISSING_VALUE:
+                encoded_column.codes.append(MISSING_CODE)
+            else:
+                encoded_column.append(value)
+        return encoded_column
+
+    def __len__(self):
+        return len(self.codes)
+
+    def pad(self, length):
+        """Pads the column by missing values up to the given length
+
+        :param int length: length of the padded column
+        """
+        self.codes.extend(itertools.repeat(MISSING_CODE, length - len(self.codes)))
+
+    def append(self, value):
+        """
+        :param object value: appended value
+        """
+        key = category_key(value)
+        code = self._category_codes.get(key)
+        if code is None:
+            code = self._category_codes[key] = len(self.categories)
+            self.categories.append(value)
+        self.codes.append(code)
+
+    def finalize(self):
+        """Converts the codes to numpy array (sharing the memory with the array of codes)"""
+        self.codes = numpy.frombuffer(self.codes, dtype=numpy.int32)
+        self._category_codes = {}
+
+    def block(self, start, end):
+        """
+        :param int start: first row of the block
+        :param int end: row after the last row of the block
+        :returns list: list of values in the block of rows (or MISSING_VALUE)
+        """
+        categories = self.categories
+        return [
+            categories[code] if code != MISSING_CODE else MISSING_VALUE
+            for code in self.codes[start:end].tolist()
+        ]
+
+    def flattened(self, key):
+        """Flattens the column w.r.t :func:`perun.profile.query.all_items_of`
+
+        Each of the unique values is flattened only once, and the flattened columns are created
+        by indexing the flattened unique values by codes.
+
+        :param str key: key of the column
+        :returns: iterable stream of (flattened key, numpy array) pairs
+        """
+        flattened_categories = [
+            dict(query.flattened_values(key, category)) for category in self.categories
+        ]
+        flattened_keys = []
+        for flattened_category in flattened_categories:
+            flattened_keys.extend(k for k in flattened_category if k not in flattened_keys)
+
+        has_missing_codes = bool((self.codes == MISSING_CODE).any())
+        for flattened_key in flattened_keys:
+            values = [
+                flattened_category.get(flattened_key, numpy.nan)
+                for flattened_category in flattened_categories
+            ]
+            if has_missing_codes:
+                # Last value corresponds to the missing values, i.e. to the MISSING_CODE index
+                values.append(numpy.nan)
+            if all(is_numeric_value(value) for value in values):
+                yield flattened_key, numpy.array(values)[self.codes]
+            else:
+                yield flattened_key, numpy.array(values, dtype=object)[self.codes]
+
+
+class NumericColumn(object):
+    """Column of numeric values stored in typed array
+
+    Columns of integers are stored as 64-bit integers and columns of floats as 64-bit floats.
+    Columns with mixed types of values stay stored as integers, with the float values stored as
+    their binary (IEEE 754) representation, so neither of the values loses its precision. The
+    kinds of values (missing, integer or float) are tracked only for irregular columns, i.e.
+    columns with missing values or with mixed types of values, and determine how each of the
+    stored values is read back.
+
+    :ivar array values: array of values of the column (either 'q' or 'd' typed), after
+        finalization converted to numpy array
+    :ivar array kinds: kinds of the values in the column or None if the column is regular
+    """
+    MISSING, INTEGER, FLOAT = 0, 1, 2
+
+    def __init__(self):
+        """Initializes the empty column"""
+        self.values = array.array('q')
+        self.kinds = None
+
+    @classmethod
+    def from_arrays(cls, values, kinds=None):
+        """Creates finalized numeric column from the array of values and their kinds
+
+        :param numpy.ndarray values: int64 or float64 values of the column (float values of
+            int64 columns are stored as their binary representation)
+        :param numpy.ndarray kinds: int8 kinds of the values or None if the column is regular
+        :returns NumericColumn: finalized numeric column
+        """
+        numeric_column = cls()
+        numeric_column.values = values
+        numeric_column.kinds = kinds
+        return numeric_column
+
+    def __len__(self):
+        return len(self.values)
+
+    def _is_float_column(self):
+        """
+        :returns bool: true if the values are stored as floats
+        """
+        return isinstance(self.values, numpy.ndarray) and self.values.dtype == numpy.float64 \
+            or isinstance(self.values, array.array) and self.values.typecode == 'd'
+
+    def _has_integers(self):
+        """
+        :returns bool: true if there is any (non-missing) integer value in the column
+        """
+        if self._is_float_column():
+            return False
+        if self.kinds is None:
+            return len(self.values) > 0
+        return NumericColumn.INTEGER in self.kinds
+
+    def _track_kinds(self):
+        """Starts tracking of kinds of the values (if they are not tracked yet)"""
+        if self.kinds is None:
+            kind = NumericColumn.FLOAT if self._is_float_column() else NumericColumn.INTEGER
+            self.kinds = array.array('b', [kind]) * len(self.values)
+
+    def pad(self, length):
+        """Pads the column by missing values up to the given length
+
+        :param int length: length of the padded column
+        """
+        missing_count = length - len(self.values)
+        if missing_count > 0:
+            self._track_kinds()
+            missing_value = numpy.nan if self._is_float_column() else 0
+            self.values.extend(itertools.repeat(missing_value, missing_count))
+            self.kinds.extend(itertools.repeat(NumericColumn.MISSING, missing_count))
+
+    def append(self, value):
+        """
+        :param object value: appended numeric value
+        :raises TypeError: when the value is not numeric
+        :raises OverflowError: when the integer value cannot be stored in 64 bits
+        """
+        if not is_numeric_value(value):
+            raise TypeError("non-numeric value '{}'".format(value))
+
+        if isinstance(value, numbers.Integral):
+            kind = NumericColumn.INTEGER
+            if self._is_float_column():
+                # Mixed values are stored as integers, floats as their binary representation
+                self._track_kinds()
+                self.values = array.array('q', self.values.tobytes())
+        else:
+            kind = NumericColumn.FLOAT
+            if self._has_integers():
+                self._track_kinds()
+                value = struct.unpack('=q', struct.pack('=d', value))[0]
+            elif not self._is_float_column():
+                # The column contains missing values only (if any)
+                self.values = array.array('d', [numpy.nan]) * len(self.values)
+        self.values.append(value)
+        if self.kinds is not None:
+            self.kinds.append(kind)
+
+    def finalize(self):
+        """Converts the arrays to numpy arrays (sharing the memory with the arrays)"""
+        self.values = numpy.frombuffer(
+            self.values, dtype=numpy.float64 if self._is_float_column() else numpy.int64
+        )
+        if self.kinds is not None:
+            self.kinds = numpy.frombuffer(self.kinds, dtype=numpy.int8)
+
+    def _float_values(self, start, end):
+        """
+        :param int start: first row of the block
+        :param int end: row after the last row of the block
+        :returns list: list of values in the block of rows, where the float values are readable
+        """
+        values = self.values[start:end]
+        if not self._is_float_column():
+            values = numpy.frombuffer(values, dtype=numpy.float64)
+        return values.tolist()
+
+    def block(self, start, end):
+        """
+        :param int start: first row of the block
+        :param int end: row after the last row of the block
+        :returns list: list of values in the block of rows (or MISSING_VALUE)
+        """
+        values = self.values[start:end].tolist()
+        if self.kinds is None:
+            return values
+        float_values = self._float_values(start, end)
+        return [
+            MISSING_VALUE if kind == NumericColumn.MISSING else
+            int(value) if kind == NumericColumn.INTEGER else float_value
+            for (value, float_value, kind) in zip(
+                values, float_values, self.kinds[start:end].tolist()
+            )
+        ]
+
+    def flattened(self, key):
+        """Flattens the column w.r.t :func:`perun.profile.query.all_items_of`
+
+        The values of regular columns are returned without copying.
+
+        :param str key: key of the column
+        :returns: iterable stream of (flattened key, numpy array) pairs
+        """
+        if self.kinds is None or self._is_float_column():
+            yield key, self.values
+        else:
+            values = self.values.astype(numpy.float64)
+            float_rows = self.kinds == NumericColumn.FLOAT
+            values[float_rows] = self.values.view(numpy.float64)[float_rows]
+            values[self.kinds == NumericColumn.MISSING] = numpy.nan
+            yield key, values
+
+
+def profile_skeleton(profile):
+    """Returns the profile without the resources
+
+    :param dict profile: profile w.r.t. :ref:`profile-spec` (or lazy profile)
+    :returns dict: profile with empty lists of resources
+    """
+    if hasattr(profile, 'skeleton'):
+        return profile.skeleton
+
+    skeleton = dict(profile)
+    if 'snapshots' in skeleton:
+        skeleton['snapshots'] = [
+            dict(snapshot, resources=[]) for snapshot in skeleton['snapshots']
+        ]
+    if isinstance(skeleton.get('global'), dict) and 'resources' in skeleton['global']:
+        skeleton['global'] = dict(skeleton['global'], resources=[])
+    return skeleton
+
+
+class ColumnarProfile(object):
+    """Profile, whose resources are stored in columns of typed arrays.
+
+    The columnar profile is built in one pass through the resources of the profile. Except for
+    resources, the profile can be accessed as a dictionary. Note that the lists of resources are
+    empty in this part of the profile and that the nested values of resources (e.g. traces) are
+    shared between the resources and should not be modified.
+
+    :ivar dict skeleton: profile without the resources
+    :ivar numpy.ndarray snapshots: numbers of snapshots of the resources
+    :ivar collections.OrderedDict columns: map of keys of resources to their columns
+    """
+    def __init__(self, profile):
+        """
+        :param dict profile: profile w.r.t. :ref:`profile-spec` (or lazy profile)
+        """
+        snapshots = array.array('q')
+        columns = collections.OrderedDict()
+        for row, (snapshot, resource) in enumerate(query.all_resources_of(profile)):
+            snapshots.append(snapshot)
+            for key, value in resource.items():
+                column = columns.get(key)
+                if column is None:
+                    column = NumericColumn() if is_numeric_value(value) else EncodedColumn()
+                    columns[key] = column
+                column.pad(row)
+                try:
+                    column.append(value)
+                except (TypeError, OverflowError):
+                    column = columns[key] = EncodedColumn.from_column(column)
+                    column.append(value)
+
+        for column in columns.values():
+            column.pad(len(snapshots))
+            column.finalize()
+
+        self.skeleton = profile_skeleton(profile)
+        self.snapshots = numpy.frombuffer(snapshots, dtype=numpy.int64)
+        self.columns = columns
+
+    @classmethod
+    def from_columns(cls, skeleton, snapshots, columns):
+        """Creates the columnar profile from already built columns
+
+        :param dict skeleton: profile without the resources
+        :param numpy.ndarray snapshots: numbers of snapshots of the resources
+        :param collections.OrderedDict columns: map of keys of resources to finalized columns
+        :returns ColumnarProfile: columnar profile consisting of the given columns
+        """
+        columnar_profile = cls.__new__(cls)
+        columnar_profile.skeleton = skeleton
+        columnar_profile.snapshots = snapshots
+        columnar_profile.columns = columns
+        return columnar_profile
+
+    def __len__(self):
+        return len(self.snapshots)
+
+    def all_resources(self):
+        """Generator of resources reconstructed from columns, w.r.t. :func:`query.all_resources_of`
+
+        :returns: iterable stream of resources represented as pair ``(int, dict)`` of snapshot
+            number and the resources w.r.t. the specification of the :pkey:`resources`
+        """
+        keys = list(self.columns.keys())
+        for start in range(0, len(self), RESOURCE_BLOCK_SIZE):
+            end = start + RESOURCE_BLOCK_SIZE
+            blocks = [column.block(start, end) for column in self.columns.values()]
+            for snapshot, *values in zip(self.snapshots[start:end].tolist(), *blocks):
+                yield snapshot, {
+                    key: value for (key, value) in zip(keys, values) if value is not MISSING_VALUE
+                }
+
+    def flattened_columns(self):
+        """Returns the columns flattened w.r.t. :func:`perun.profile.query.all_items_of`
+
+        :returns dict: map of flattened keys to numpy arrays of values, with 'snapshots' key
+            containing the numbers of snapshots
+        """
+        flattened_columns = {}
+        for key, column in self.columns.items():
+            flattened_columns.update(column.flattened(key))
+        flattened_columns['snapshots'] = self.snapshots
+        return flattened_columns
+
+    def to_profile(self):
+        """
+        :returns dict: profile w.r.t. :ref:`profile-spec` with resources stored as dictionaries
+        """
+        profile = copy.deepcopy(self.skeleton)
+        snapshots = profile.get('snapshots', [])
+        for snapshot, resource in self.all_resources():
+            if snapshot < len(snapshots):
+                snapshots[snapshot]['resources'].append(resource)
+            else:
+                profile['global']['resources'].append(resource)
+        return profile
+
+    def __getitem__(self, key):
+        return self.skeleton[key]
+
+    def __contains__(self, key):
+        return key in self.skeleton
+
+    def get(self, key, default=None):
+        """
+        :param str key: key of the profile
+        :param object default: value returned if the key is not in the profile
+        :returns object: value of the key in the profile without resources
+        """
+        return self.skeleton.get(key, default)
+
+    def keys(self):
+        """
+        :returns: keys of the profile
+        """
+        return self.skeleton.keys()
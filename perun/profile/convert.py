@@ -17,6 +17,8 @@ import operator
 
 import perun.utils.helpers as helpers
 import perun.profile.query as query
+import perun.profile.columnar as columnar
+import perun.profile.stacks as stacks
 import perun.postprocess.regression_analysis.transform as transform
 
 import demandimport
@@ -55,10 +57,17 @@ def resources_to_pandas_dataframe(profile):
         0  main:../memo...:22         main        22   ../memory_collect_test.c
         1  main:../memo...:27         main        27   ../memory_collect_test.c
 
+    Columnar profiles (see :class:`perun.profile.columnar.ColumnarProfile`)
+    are converted straight from their columns, i.e. each unique value is
+    flattened only once and numeric columns are passed as they are.
+
     :param dict profile: dictionary with profile w.r.t. :ref:`profile-spec`
     :returns: converted profile to ``pandas.DataFramelist`` with resources
         flattened as a pandas dataframe
     """
+    if isinstance(profile, columnar.ColumnarProfile):
+        return pandas.DataFrame(profile.flattened_columns())
+
     resource_keys = list(query.all_resource_fields_of(profile))
     values = {key: [] for key in resource_keys}
     values['snapshots'] = []
@@ -405,23 +414,36 @@ def to_flame_graph_format(profile):
     allocated memory) preceeded by its trace (i.e. functions or other unique
     identifiers joined using ``;`` character.
 
-    :param dict profile: the memory profile
+    :param dict profile: the memory profile (possibly lazy, i.e. streamed from file)
     :returns: list of lines, each representing one allocation call stack
     """
-    stacks = []
-    for snap in profile['snapshots']:
-        for alloc in snap['resources']:
-            if alloc['subtype'] != 'free':
-                stack_str = ""
-                for frame in alloc['trace']:
-                    line = to_string_line(frame)
-                    stack_str += line + ';'
-                if stack_str and stack_str.endswith(';'):
-                    final = stack_str[:-1]
-                    final += " " + str(alloc['amount']) + '\n'
-                    stacks.append(final)
-
-    return stacks
+    # The resources are iterated first, so lazy profiles are streamed from the file only once;
+    #   inline traces are converted right away, the interned ones are kept as stack ids
+    allocations = []
+    for _, alloc in query.all_snapshot_resources_of(profile):
+        if alloc['subtype'] != 'free':
+            if 'trace' in alloc:
+                stack = ";".join(map(to_string_line, alloc['trace']))
+            else:
+                stack = alloc.get('trace_id', stacks.EMPTY_STACK)
+            allocations.append((stack, alloc['amount']))
+
+    # The interned stacks (see perun.profile.stacks) are converted to strings only once; the
+    #   table of lazy profile is already loaded after the resources were streamed
+    table = stacks.StackTable.of(profile)
+    stack_strings = {}
+    stack_lines = []
+    for stack, amount in allocations:
+        if not isinstance(stack, str):
+            stack_id = stack
+            stack = stack_strings.get(stack_id)
+            if stack is None:
+                stack = ";".join(map(to_string_line, table.trace(stack_id)))
+                stack_strings[stack_id] = stack
+        if stack:
+            stack_lines.append(stack + " " + str(amount) + '\n')
+
+    return stack_lines
 
 
 def to_string_line(frame):
@@ -14,6 +14,7 @@ For further manipulations refer either to :ref:`profile-conversion-api`
 handle the JSON objects in Python refer to `Python JSON library`_.
 """
 
+import itertools
 import json
 import os
 import time
@@ -24,18 +25,26 @@ import perun.logic.pcs as pcs
 import perun.logic.config as config
 import perun.logic.store as store
 import perun.vcs as vcs
+import perun.profile.cache as cache
 import perun.profile.query as query
+import perun.profile.stacks as stacks
 import perun.utils.log as perun_log
+import perun.utils.streams as streams
 from perun.utils import get_module
 from perun.utils.exceptions import IncorrectProfileFormatException, InvalidParameterException, \
     MissingConfigSectionException
-from perun.utils.helpers import SUPPORTED_PROFILE_TYPES, Unit, Job
+from perun.utils.helpers import SUPPORTED_PROFILE_TYPES, STREAMED_PROFILE_SIZE, Unit, Job
 
 __author__ = 'Tomas Fiedor'
 
 
 PROFILE_COUNTER = 0
 DEFAULT_SORT_KEY = 'time'
+# Paths to resources, which are decoded one by one, when the profile is streamed from the file
+RESOURCE_PATHS = [
+    ('snapshots', streams.JSON_ITEM, 'resources', streams.JSON_ITEM),
+    ('global', 'resources', streams.JSON_ITEM)
+]
 
 
 def lookup_value(container, key, missing):
@@ -163,6 +172,9 @@ def generate_profile_name(profile):
 def load_profile_from_file(file_name, is_raw_profile):
     """Loads profile w.r.t :ref:`profile-spec` from file.
 
+    Profiles stored in the objects are looked up in the cache of loaded profiles first (see
+    :mod:`perun.profile.cache`), so each object is decompressed and parsed only once.
+
     :param str file_name: file path, where the profile is stored
     :param bool is_raw_profile: if set to true, then the profile was loaded
         from the file system and is thus in the JSON already and does not have
@@ -171,6 +183,24 @@ def load_profile_from_file(file_name, is_raw_profile):
     :raises IncorrectProfileFormatException: raised, when **filename** contains
         data, which cannot be converted to valid :ref:`profile-spec`
     """
+    if not is_raw_profile:
+        # Stored profiles are content addressed, hence once loaded, they are served from cache
+        _, checksum = store.split_object_path(file_name)
+        profile_cache = cache.get_profile_cache() if store.is_sha1(checksum) else None
+        loaded_profile = profile_cache.get(checksum) if profile_cache is not None else None
+        if loaded_profile is not None:
+            return loaded_profile
+
+        # Stored profiles are either loose objects or are packed
+        file_handle, is_inflated = store.open_object(file_name)
+        with file_handle:
+            loaded_profile = load_profile_from_handle(
+                file_name, file_handle, is_raw_profile, is_inflated
+            )
+        if profile_cache is not None:
+            profile_cache.put(checksum, loaded_profile)
+        return loaded_profile
+
     if not os.path.exists(file_name):
         raise IncorrectProfileFormatException(file_name, "file '{}' not found")
 
@@ -178,33 +208,127 @@ def load_profile_from_file(file_name, is_raw_profile):
         return load_profile_from_handle(file_name, file_handle, is_raw_profile)
 
 
-def load_profile_from_handle(file_name, file_handle, is_raw_profile):
+def split_profile_header(file_name, chunks):
+    """Splits the stream of deflated chunks of the stored profile to its header and body
+
+    The header is of the form 'profile <type> <size>\\0' and is checked from the first chunks,
+    without reading the rest of the profile.
+
+    :param str file_name: name of the file the chunks are read from
+    :param iterable chunks: iterable stream of deflated chunks of the stored profile
+    :returns (str, int, iterable): type of the profile, size of its body and iterable stream of
+        the chunks of the body
+    :raises IncorrectProfileFormatException: when the header of the profile is malformed
+    """
+    chunks = iter(chunks)
+    header = ''
+    for chunk in chunks:
+        header += chunk
+        if '\0' in header:
+            break
+    header, delimiter, body_start = header.partition('\0')
+    header_tokens = header.split(' ')
+
+    # Check the header, if the body is not malformed
+    if not delimiter or len(header_tokens) != 3 or header_tokens[0] != 'profile' \
+            or header_tokens[1] not in SUPPORTED_PROFILE_TYPES or not header_tokens[2].isdigit():
+        raise IncorrectProfileFormatException(file_name, "malformed profile '{}'")
+    return header_tokens[1], int(header_tokens[2]), itertools.chain([body_start], chunks)
+
+
+def check_profile_body_size(file_name, body_chunks, body_size):
+    """Passes through the stream of body chunks and checks that the body is of expected size
+
+    :param str file_name: name of the file the chunks are read from
+    :param iterable body_chunks: iterable stream of the chunks of the profile body
+    :param int body_size: expected size of the body as read from the header
+    :returns: iterable stream of the chunks of the profile body
+    :raises IncorrectProfileFormatException: when the body is not of the expected size
+    """
+    read_size = 0
+    for chunk in body_chunks:
+        read_size += len(chunk)
+        yield chunk
+    if read_size != body_size:
+        raise IncorrectProfileFormatException(file_name, "malformed profile '{}'")
+
+
+def read_profile_body_chunks(file_name, file_handle, is_raw_profile, is_inflated=False):
+    """Reads the body of the profile from the handle as a stream of (deflated) chunks
+
+    :param str file_name: name of the file opened in the handle
+    :param file file_handle: opened file handle
+    :param bool is_raw_profile: true if the profile is in json format already
+    :param bool is_inflated: true if the stored profile is already decompressed (e.g. when it
+        was reconstructed from delta compressed object in pack)
+    :returns (int, iterable): size of the body and iterable stream of its chunks
+    :raises IncorrectProfileFormatException: when the header of the profile is malformed or when
+        the body does not correspond to the size stated in the header
+    """
+    if is_raw_profile:
+        return os.fstat(file_handle.fileno()).st_size, store.read_chunks(file_handle)
+
+    # Deflate the contents by chunks and split the header from the body
+    if is_inflated:
+        deflated_chunks = store.read_chunks(file_handle)
+    else:
+        deflated_chunks = store.read_and_deflate_chunks(file_handle)
+    _, body_size, body_chunks = split_profile_header(file_name, deflated_chunks)
+    return body_size, check_profile_body_size(file_name, body_chunks, body_size)
+
+
+def load_lazy_profile_from_file(file_name, is_raw_profile):
+    """Loads the profile from file without loading its resources to the memory.
+
+    Profiles stored in the binary format are mapped to the memory as ColumnarProfile (see
+    :func:`perun.logic.store.map_binary_profile`), other profiles are loaded as LazyProfile,
+    i.e. their resources are streamed from the file, when they are iterated.
+
+    :param str file_name: file path, where the profile is stored
+    :param bool is_raw_profile: if set to true, then the profile was loaded from the file system
+        and is thus in the JSON already
+    :returns: lazily loaded profile, which can be processed by :func:`query.all_resources_of`
+    :raises IncorrectProfileFormatException: raised, when **filename** does not exist
     """
+    if not is_raw_profile:
+        profile_handle, _ = store.open_object(file_name)
+        with profile_handle:
+            if store.is_binary_profile_handle(profile_handle):
+                return store.map_binary_profile(file_name, profile_handle)
+    return LazyProfile(file_name, is_raw_profile)
+
+
+def load_profile_from_handle(file_name, file_handle, is_raw_profile, is_inflated=False):
+    """Loads the profile from the handle, by reading and deflating its contents by chunks
+
+    The file is read and deflated by chunks, so the whole packed contents is never held in the
+    memory. Bodies of profiles bigger than ``STREAMED_PROFILE_SIZE`` are moreover
+    streamed straight to the incremental json decoder, which decodes the resources one by one,
+    so the whole deflated contents is not held in the memory either. Profiles stored in
+    the binary format are mapped to the memory and converted from their columns.
+
     Fixme: Add check that the loaded profile is in valid format!!!
 
     :param str file_name: name of the file opened in the handle
     :param file file_handle: opened file handle
     :param bool is_raw_profile: true if the profile is in json format already
+    :param bool is_inflated: true if the stored profile is already decompressed
     :returns dict: JSON representation of the profile
-    :raises IncorrectProfileFormatException: when the profile cannot be parsed by json.loads(body)
+    :raises IncorrectProfileFormatException: when the profile cannot be parsed by json decoder
         or when the profile is not in correct supported format or when the profile is malformed
     """
-    if is_raw_profile:
-        body = file_handle.read().decode('utf-8')
-    else:
-        # Read deflated contents and split to header and body
-        contents = store.read_and_deflate_chunk(file_handle)
-        header, body = contents.split('\0')
-        prefix, profile_type, profile_size = header.split(' ')
+    if not is_raw_profile and store.is_binary_profile_handle(file_handle):
+        return store.map_binary_profile(file_name, file_handle).to_profile()
 
-        # Check the header, if the body is not malformed
-        if prefix != 'profile' or profile_type not in SUPPORTED_PROFILE_TYPES or \
-                len(body) != int(profile_size):
-            raise IncorrectProfileFormatException(file_name, "malformed profile '{}'")
+    body_size, body_chunks = read_profile_body_chunks(
+        file_name, file_handle, is_raw_profile, is_inflated
+    )
 
     # Try to load the json, if there is issue with the profile
     try:
-        return json.loads(body)
+        if body_size < STREAMED_PROFILE_SIZE:
+            return json.loads("".join(body_chunks))
+        return streams.load_json_from_chunks(body_chunks, RESOURCE_PATHS)
     except ValueError:
         raise IncorrectProfileFormatException(file_name, "profile '{}' is not in profile format")
 
@@ -435,6 +559,7 @@ def merge_resources_of(lhs, rhs):
         return rhs
 
     # Note that we assume  that lhs and rhs are the same type ;)
+    stacks.merge_tables(lhs, rhs)
     if 'global' in lhs.keys() and lhs['global']:
         lhs['global']['resources'].extend(rhs['global']['resources'])
         lhs['global']['timestamp'] += rhs['global']['timestamp']
@@ -445,6 +570,142 @@ def merge_resources_of(lhs, rhs):
     return lhs
 
 
+class LazyProfile(object):
+    """Profile, whose resources are lazily streamed from the file one resource at a time.
+
+    Resources of the lazy profile are iterated by :func:`query.all_resources_of`, which streams
+    them straight from the (possibly compressed) file on each iteration, without loading the whole
+    profile. Hence, one pass algorithms can process profiles bigger than the available memory.
+
+    The rest of the profile (i.e. the profile without resources) can be accessed as a dictionary.
+    Note that the lists of resources are empty in this part of the profile.
+
+    :ivar str file_name: file path, where the profile is stored
+    :ivar bool is_raw_profile: true if the profile is in json format already
+    :ivar dict _skeleton: profile without resources, or None if it was not yet loaded
+    """
+    def __init__(self, file_name, is_raw_profile):
+        """
+        :param str file_name: file path, where the profile is stored
+        :param bool is_raw_profile: true if the profile is in json format already
+        :raises IncorrectProfileFormatException: when the file does not exist
+        """
+        if not os.path.exists(file_name) and (is_raw_profile or not store.object_exists(file_name)):
+            raise IncorrectProfileFormatException(file_name, "file '{}' not found")
+
+        self.file_name = file_name
+        self.is_raw_profile = is_raw_profile
+        self._skeleton = None
+
+    def _stream_resources(self):
+        """Streams the resources of the profile from the file, storing the rest of the profile
+
+        :returns: iterable stream of (location, resource) pairs, where location is the path to
+            the resource in the profile, e.g. ('snapshots', 0, 'resources', 1)
+        :raises IncorrectProfileFormatException: when the profile cannot be parsed by json decoder
+            or when the profile is not in correct supported format or when the profile is malformed
+        """
+        if self.is_raw_profile:
+            file_handle, is_inflated = open(self.file_name, 'rb'), False
+        else:
+            file_handle, is_inflated = store.open_object(self.file_name)
+        with file_handle:
+            _, body_chunks = read_profile_body_chunks(
+                self.file_name, file_handle, self.is_raw_profile, is_inflated
+            )
+            try:
+                self._skeleton = yield from streams.stream_json_from_chunks(
+                    body_chunks, RESOURCE_PATHS
+                )
+            except ValueError:
+                raise IncorrectProfileFormatException(
+                    self.file_name, "profile '{}' is not in profile format"
+                )
+
+    @property
+    def skeleton(self):
+        """
+        :returns dict: profile without the resources
+        """
+        if self._skeleton is None:
+            for _ in self._stream_resources():
+                pass
+        return self._skeleton
+
+    def _are_global_resources_last(self):
+        """Checks if the global resources are stored after snapshots (if there are any)
+
+        :returns bool: true if the profile was already streamed and global resources are last
+        """
+        if self._skeleton is None:
+            return False
+        profile_keys = list(self._skeleton.keys())
+        return 'snapshots' not in profile_keys or 'global' not in profile_keys \
+            or profile_keys.index('snapshots') < profile_keys.index('global')
+
+    def all_resources(self):
+        """Generator of resources streamed from the file, w.r.t. :func:`query.all_resources_of`
+
+        Global resources are yielded after the snapshots and are numbered by the number of
+        snapshots. Hence, unless the profile was already streamed and it is known, that the global
+        resources are stored after snapshots, the global resources are streamed in second pass.
+
+        :returns: iterable stream of resources represented as pair ``(int, dict)`` of snapshot
+            number and the resources w.r.t. the specification of the :pkey:`resources`
+        """
+        are_global_resources_streamed = self._are_global_resources_last()
+        has_global_resources = False
+        for location, resource in self._stream_resources():
+            if location[0] == 'snapshots':
+                yield location[1], resource
+            elif are_global_resources_streamed:
+                yield len(self._skeleton.get('snapshots', [])), resource
+            else:
+                has_global_resources = True
+
+        if has_global_resources:
+            number_of_snapshots = len(self._skeleton.get('snapshots', []))
+            for location, resource in self._stream_resources():
+                if location[0] == 'global':
+                    yield number_of_snapshots, resource
+
+    def snapshot_resources(self):
+        """Generator of resources of the snapshots streamed from the file in one pass
+
+        :returns: iterable stream of resources represented as pair ``(int, dict)`` of snapshot
+            number and the resources w.r.t. the specification of the :pkey:`resources`
+        """
+        for location, resource in self._stream_resources():
+            if location[0] == 'snapshots':
+                yield location[1], resource
+
+    def load(self):
+        """
+        :returns dict: whole profile loaded from the file w.r.t. :ref:`profile-spec`
+        """
+        return load_profile_from_file(self.file_name, self.is_raw_profile)
+
+    def __getitem__(self, key):
+        return self.skeleton[key]
+
+    def __contains__(self, key):
+        return key in self.skeleton
+
+    def get(self, key, default=None):
+        """
+        :param str key: key of the profile
+        :param object default: value returned if the key is not in the profile
+        :returns object: value of the key in the profile without resources
+        """
+        return self.skeleton.get(key, default)
+
+    def keys(self):
+        """
+        :returns: keys of the profile
+        """
+        return self.skeleton.keys()
+
+
 class ProfileInfo(object):
     """Structure for storing information about profiles.
 
@@ -481,14 +742,19 @@ class ProfileInfo(object):
             ",".join(self.postprocessors)
         )
 
-    def load(self):
+    def load(self, lazy=False):
         """Loads the profile from given file
 
         This is basically a wrapper that loads the profile, whether it is raw (i.e. in pending)
         or not raw and stored in index
 
+        :param bool lazy: if set to true, then the profile is loaded as LazyProfile, i.e. its
+            resources are streamed from the file, when they are iterated, or as ColumnarProfile
+            mapped to the memory, if the profile is stored in the binary format
         :return: loaded profile in dictionary format, w.r.t :ref:`profile-spec`
         """
+        if lazy:
+            return load_lazy_profile_from_file(self.realpath, self._is_raw_profile)
         return load_profile_from_file(self.realpath, self._is_raw_profile)
 
     valid_attributes = [
@@ -33,6 +33,11 @@ def all_resources_of(profile):
     refer to :pkey:`resources`. Resources are not flattened and, thus, can
     contain nested dictionaries (e.g. for `traces` or `uids`).
 
+    Resources of lazy profiles (``perun.profile.factory.LazyProfile``) are
+    streamed straight from the file, one resource at a time, and resources of
+    columnar profiles (``perun.profile.columnar.ColumnarProfile``) are
+    reconstructed from their columns.
+
     :param dict profile: performance profile w.r.t :ref:`profile-spec`
     :returns: iterable stream of resources represented as pair ``(int, dict)``
         of snapshot number and the resources w.r.t. the specification of the
@@ -42,6 +47,10 @@ def all_resources_of(profile):
     :raises KeyError: when the profile misses some expected key, as given
         by :ref:`profile-spec`
     """
+    if hasattr(profile, 'all_resources'):
+        yield from profile.all_resources()
+        return
+
     try:
         # Get snapshot resources
         snapshots = profile.get('snapshots', [])
@@ -64,6 +73,28 @@ def all_resources_of(profile):
             'profile', "Missing key in dictionary.") from None
 
 
+def all_snapshot_resources_of(profile):
+    """Generator for iterating through the resources of the snapshots of the performance
+    profile, i.e. without the resources of the global region.
+
+    Unlike :func:`all_resources_of`, resources of lazy profiles are streamed from the file in
+    one pass, since the global resources need not be ordered after the snapshots.
+
+    :param dict profile: performance profile w.r.t :ref:`profile-spec`
+    :returns: iterable stream of resources represented as pair ``(int, dict)``
+        of snapshot number and the resources w.r.t. the specification of the
+        :pkey:`resources`
+    """
+    if hasattr(profile, 'snapshot_resources'):
+        yield from profile.snapshot_resources()
+        return
+
+    number_of_snapshots = len(profile.get('snapshots', []))
+    for snap_no, resource in all_resources_of(profile):
+        if snap_no < number_of_snapshots:
+            yield snap_no, resource
+
+
 def flattened_values(root_key, root_value):
     """Converts the (root_key, root_value) pair to something that can be added to table.
 
@@ -0,0 +1,190 @@
+"""``perun.profile.stacks`` contains the profile-level table of interned call stacks.
+
+The call stacks of the resources (e.g. the `traces` of allocations collected by
+:ref:`collectors-memory`) repeat through the whole profile. Hence, instead of storing the whole
+trace in each of the resources, the traces are interned in the table of stacks stored in the
+:preg:`stacks` region of the profile and the resources refer to their traces by ``trace_id``.
+
+The table is a prefix tree of the frames rooted in the outermost frames (e.g. ``main``). Each
+node of the tree is stored as a pair ``[parent_id, frame]``, where ``parent_id`` is the index
+of the node of the calling frame (or ``-1`` for the outermost frames) and the parents always
+precede their children in the table. The id of the stack is then the index of the node of its
+innermost frame, while the empty stack has id ``-1``. The functions transforming the stacks
+(e.g. :func:`perun.collect.memory.filter.trace_filter`) hence process each unique stack only
+once, regardless of the number of resources referring to it.
+"""
+
+__author__ = 'Tomas Fiedor'
+
+# The id of the empty stack (and the parent id of the outermost frames)
+EMPTY_STACK = -1
+
+
+def frame_key(frame):
+    """
+    :param dict frame: the frame of the stack
+    :returns tuple: hashable key identifying the frame
+    """
+    return tuple(sorted(frame.items()))
+
+
+class StackTable(object):
+    """Prefix tree of the frames of interned stacks
+
+    :ivar list nodes: the nodes of the tree as pairs of the id of the parent node and the frame
+    """
+    def __init__(self, nodes=None):
+        """
+        :param list nodes: the nodes of the tree (e.g. loaded from the profile) or None
+        """
+        self.nodes = nodes if nodes is not None else []
+        self._node_ids = {
+            (parent_id, frame_key(frame)): node_id
+            for node_id, (parent_id, frame) in enumerate(self.nodes)
+        }
+        self._traces = {EMPTY_STACK: []}
+
+    def __len__(self):
+        return len(self.nodes)
+
+    @classmethod
+    def of(cls, profile):
+        """
+        :param dict profile: the profile w.r.t :ref:`profile-spec`
+        :returns StackTable: the table of stacks of the profile (empty if it has none)
+        """
+        return cls(profile.get('stacks', []))
+
+    def intern_frame(self, parent_id, frame):
+        """Returns the id of the node of the frame called from the parent node
+
+        :param int parent_id: the id of the node of the calling frame
+        :param dict frame: the frame of the stack
+        :returns int: the id of the node of the frame, created if it was not in the table yet
+        """
+        key = (parent_id, frame_key(frame))
+        node_id = self._node_ids.get(key)
+        if node_id is None:
+            node_id = self._node_ids[key] = len(self.nodes)
+            self.nodes.append([parent_id, frame])
+        return node_id
+
+    def intern(self, trace):
+        """
+        :param list trace: the frames of the stack starting with the innermost frame
+        :returns int: the id of the stack in the table
+        """
+        stack_id = EMPTY_STACK
+        for frame in reversed(trace):
+            stack_id = self.intern_frame(stack_id, frame)
+        return stack_id
+
+    def trace(self, stack_id):
+        """Returns the frames of the stack, which are built only once for each stack
+
+        Note that the returned list is shared by the callers, hence it must not be modified.
+
+        :param int stack_id: the id of the stack in the table
+        :returns list: the frames of the stack starting with the innermost frame
+        """
+        missing = []
+        while stack_id not in self._traces:
+            missing.append(stack_id)
+            stack_id = self.nodes[stack_id][0]
+        trace = self._traces[stack_id]
+        for node_id in reversed(missing):
+            trace = self._traces[node_id] = [self.nodes[node_id][1]] + trace
+        return trace
+
+    def filter(self, predicate):
+        """Removes the frames not satisfying the predicate from all of the stacks at once
+
+        :param function predicate: the predicate of the kept frames
+        :returns tuple: the table of filtered stacks and the map of ids of the original stacks
+            to the ids of the filtered stacks
+        """
+        filtered_table = StackTable()
+        stack_map = {EMPTY_STACK: EMPTY_STACK}
+        for node_id, (parent_id, frame) in enumerate(self.nodes):
+            filtered_parent_id = stack_map[parent_id]
+            stack_map[node_id] = filtered_table.intern_frame(filtered_parent_id, frame) \
+                if predicate(frame) else filtered_parent_id
+        return filtered_table, stack_map
+
+
+def trace_of(resource, table):
+    """
+    :param dict resource: the resource with either inline trace or the id of its stack
+    :param StackTable table: the table of stacks of the profile of the resource
+    :returns list: the frames of the trace of the resource
+    """
+    if 'trace' in resource:
+        return resource['trace']
+    return table.trace(resource.get('trace_id', EMPTY_STACK))
+
+
+def resources_of(profile):
+    """
+    :param dict profile: the profile w.r.t :ref:`profile-spec`
+    :returns iterable: the stream of the resources of the snapshots and global region
+    """
+    for snapshot in profile.get('snapshots', []):
+        yield from snapshot['resources']
+    yield from (profile.get('global') or {}).get('resources', [])
+
+
+def intern_traces(profile):
+    """Moves the inline traces of the resources to the table of stacks of the profile
+
+    The resources with inline `trace` get `trace_id` instead, hence the function can be used
+    to convert legacy profiles as well as profiles with some of the traces already interned.
+
+    :param dict profile: the profile w.r.t :ref:`profile-spec`
+    :returns StackTable: the table of stacks of the profile
+    """
+    table = StackTable.of(profile)
+    stack_ids = {}
+    for resource in resources_of(profile):
+        if 'trace' in resource:
+            trace = resource.pop('trace')
+            key = tuple(map(frame_key, trace))
+            stack_id = stack_ids.get(key)
+            if stack_id is None:
+                stack_id = stack_ids[key] = table.intern(trace)
+            resource['trace_id'] = stack_id
+    profile['stacks'] = table.nodes
+    return table
+
+
+def expand_traces(profile):
+    """Replaces the ids of the stacks of the resources by their inline traces
+
+    :param dict profile: the profile w.r.t :ref:`profile-spec`
+    :returns dict: the profile without the table of stacks
+    """
+    table = StackTable(profile.pop('stacks', []))
+    for resource in resources_of(profile):
+        if 'trace_id' in resource:
+            resource['trace'] = [dict(frame) for frame in table.trace(resource.pop('trace_id'))]
+    return profile
+
+
+def merge_tables(lhs, rhs):
+    """Interns the stacks of rhs profile to the table of lhs profile
+
+    The resources of rhs profile are updated to refer to the stacks in the table of lhs profile,
+    so the resources can be merged to lhs profile.
+
+    :param dict lhs: the profile, to which the stacks are merged
+    :param dict rhs: the profile, whose stacks are merged
+    """
+    if 'stacks' not in rhs:
+        return
+    table = StackTable.of(lhs)
+    stack_map = {EMPTY_STACK: EMPTY_STACK}
+    for node_id, (parent_id, frame) in enumerate(rhs['stacks']):
+        stack_map[node_id] = table.intern_frame(stack_map[parent_id], frame)
+    for resource in resources_of(rhs):
+        if 'trace_id' in resource:
+            resource['trace_id'] = stack_map[resource['trace_id']]
+    lhs['stacks'] = table.nodes
@@ -4,16 +4,24 @@ Utils contains various helper modules and functions, that can be used in arbitra
 are not specific for perun pcs, like e.g. helper decorators, logs, etc.
 """
 
+import binascii
+import hashlib
 import importlib
 import shlex
 import subprocess
 import os
 import magic
 import shutil
+import struct
 
 from .log import error, cprint, warn
 from .exceptions import UnsupportedModuleException, UnsupportedModuleFunctionException
 
+# The type of ELF program header with notes and type of the note with GNU build-id
+_PT_NOTE, _NT_GNU_BUILD_ID = 4, 3
+# The size of chunks of binaries without the build-id read for computing their hash
+BINARY_HASH_CHUNK_SIZE = 1 << 20
+
 __author__ = 'Tomas Fiedor'
 __coauthor__ = 'Jiri Pavela'
 
@@ -89,6 +97,72 @@ def is_executable_elf(file, only_not_stripped=False):
         return True
 
 
+def get_binary_identifier(binary):
+    """Returns the identifier of the binary, i.e. its GNU build-id, or the sha1 of the contents
+    of the binary, if it was built without the build-id
+
+    :param str binary: path to the binary file
+    :return str: the identifier of the binary
+    """
+    with open(binary, 'rb') as binary_handle:
+        build_id = get_elf_build_id(binary_handle)
+        if build_id is not None:
+            return 'build-id-' + build_id
+        binary_handle.seek(0)
+        content_hash = hashlib.sha1()
+        for chunk in iter(lambda: binary_handle.read(BINARY_HASH_CHUNK_SIZE), b''):
+            content_hash.update(chunk)
+    return 'sha1-' + content_hash.hexdigest()
+
+
+def get_elf_build_id(binary_handle):
+    """Finds the GNU build-id in the notes of the ELF file
+
+    Only the ELF header, the program headers and the note segments of the file are read.
+
+    :param file binary_handle: the binary file opened for reading bytes
+    :return str: the hexadecimal build-id or None, if it is not present
+    """
+    binary_handle.seek(0)
+    elf_header = binary_handle.read(64)
+    if elf_header[:4] != b'\x7fELF' or len(elf_header) < 64:
+        return None
+    is_64bit, byte_order = elf_header[4] == 2, '<' if elf_header[5] == 1 else '>'
+    if is_64bit:
+        phoff, = struct.unpack_from(byte_order + 'Q', elf_header, 32)
+        phentsize, phnum = struct.unpack_from(byte_order + 'HH', elf_header, 54)
+        header_format, offset_index, size_index = 'IIQQQQQQ', 2, 5
+    else:
+        phoff, = struct.unpack_from(byte_order + 'I', elf_header, 28)
+        phentsize, phnum = struct.unpack_from(byte_order + 'HH', elf_header, 42)
+        header_format, offset_index, size_index = 'IIIIIIII', 1, 4
+
+    binary_handle.seek(phoff)
+    program_headers = binary_handle.read(phnum * phentsize)
+    if len(program_headers) < phnum * phentsize \
+            or phentsize < struct.calcsize(byte_order + header_format):
+        return None
+    for header in range(phnum):
+        program_header = struct.unpack_from(
+            byte_order + header_format, program_headers, header * phentsize
+        )
+        if program_header[0] != _PT_NOTE:
+            continue
+        # Iterate the notes of the segment, each aligned to four bytes
+        binary_handle.seek(program_header[offset_index])
+        notes = binary_handle.read(program_header[size_index])
+        note = 0
+        while note + 12 <= len(notes):
+            name_size, desc_size, note_type = struct.unpack_from(byte_order + 'III', notes, note)
+            name_start = note + 12
+            desc_start = name_start + (name_size + 3) // 4 * 4
+            name = notes[name_start:name_start + name_size].rstrip(b'\0')
+            if note_type == _NT_GNU_BUILD_ID and name == b'GNU':
+                return binascii.hexlify(notes[desc_start:desc_start + desc_size]).decode('ascii')
+            note = desc_start + (desc_size + 3) // 4 * 4
+    return None
+
+
 def get_project_elf_executables(root='.', only_not_stripped=False):
     """Get all ELF executable files stripped or not from project specified by root
     The function searches for executable files in build directories - if there are any, otherwise
@@ -61,7 +61,7 @@ def process_bokeh_axis_title(ctx, param, value):
 def process_resource_key_param(ctx, param, value):
     """Processes value for the key param (according to the profile)
 
-    Checks the global context for stored profile, and obtains all of the keys, which serves
+    Checks the parent context for stored profile, and obtains all of the keys, which serves
     as a validation list for the given values for the parameters. For X axis, snapshots are
     an additional valid parameter.
 
@@ -74,7 +74,7 @@ def process_resource_key_param(ctx, param, value):
     if param.human_readable_name in ('per_key', 'through_key') and value == 'snapshots':
         return value
     # Validate the keys, if it is one of the set
-    valid_keys = set(query.all_resource_fields_of(ctx.parent.params['profile']))
+    valid_keys = set(query.all_resource_fields_of(ctx.parent.obj))
     if value not in valid_keys:
         error_msg_ending = ", snaphots" if param.human_readable_name == 'per_key' else ""
         raise click.BadParameter("invalid choice: {}. (choose from {})".format(
@@ -99,7 +99,7 @@ def process_continuous_key(ctx, _, value):
         return value
 
     # Get all of the numerical keys
-    valid_numeric_keys = set(query.all_numerical_resource_fields_of(ctx.parent.params['profile']))
+    valid_numeric_keys = set(query.all_numerical_resource_fields_of(ctx.parent.obj))
     if value not in valid_numeric_keys:
         raise click.BadParameter("invalid choice: {}. (choose from {})".format(
             value, ", ".join(str(vnk) for vnk in valid_numeric_keys) + ", snapshots"
@@ -375,12 +375,15 @@ def lookup_minor_version_callback(_, __, value):
             raise click.BadParameter(str(exception))
 
 
-def lookup_any_profile_callback(ctx, _, value):
-    """Callback for looking up any profile, i.e. anywhere (in index, in pending, etc.)
+def lookup_any_profile_file_callback(ctx, _, value):
+    """Callback for looking up the file of any profile, i.e. anywhere (in index, in pending, etc.)
+
+    The profile is not loaded, so the command can decide how it is loaded (e.g. lazily).
 
     :param click.core.Context ctx: context
     :param click.core.Argument _: param
     :param str value: value of the profile parameter
+    :returns tuple: pair of the path to the profile and flag whether the profile is raw
     """
     # 0) First check if the value is tag or not
     index_tag_match = store.INDEX_TAG_REGEX.match(value)
@@ -388,22 +391,33 @@ def lookup_any_profile_callback(ctx, _, value):
         index_profile = commands.get_nth_profile_of(
             int(index_tag_match.group(1)), ctx.params['minor']
         )
-        return profiles.load_profile_from_file(index_profile, is_raw_profile=False)
+        return index_profile, False
 
     pending_tag_match = store.PENDING_TAG_REGEX.match(value)
     if pending_tag_match:
         pending_profile = lookup_nth_pending_filename(int(pending_tag_match.group(1)))
-        return profiles.load_profile_from_file(pending_profile, is_raw_profile=True)
+        return pending_profile, True
 
     # 1) Check the index, if this is registered
-    profile_from_index = commands.load_profile_from_args(value, ctx.params['minor'])
+    profile_from_index = commands.lookup_profile_from_args(value, ctx.params['minor'])
     if profile_from_index:
-        return profile_from_index
+        return profile_from_index, False
 
     log.info("file '{}' not found in index. Checking filesystem...".format(value))
-    # 2) Else lookup filenames and load the profile
+    # 2) Else lookup filenames
     abs_path = lookup_profile_in_filesystem(value)
     if not os.path.exists(abs_path):
         log.error("could not find the file '{}'".format(abs_path))
 
-    return profiles.load_profile_from_file(abs_path, is_raw_profile=True)
+    return abs_path, True
+
+
+def lookup_any_profile_callback(ctx, _, value):
+    """Callback for looking up any profile, i.e. anywhere (in index, in pending, etc.)
+
+    :param click.core.Context ctx: context
+    :param click.core.Argument _: param
+    :param str value: value of the profile parameter
+    """
+    profile_file, is_raw_profile = lookup_any_profile_file_callback(ctx, _, value)
+    return profiles.load_profile_from_file(profile_file, is_raw_profile)
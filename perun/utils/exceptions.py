@@ -222,6 +222,18 @@ class InvalidSequenceSplitException(GenericRegressionExceptionBase):
         return self.msg
 
 
+class UnsupportedIncrementalMethodException(GenericRegressionExceptionBase):
+    """Raised when the models should be incrementally computed by other than full computation"""
+    def __init__(self, method):
+        super().__init__("")
+        self.method = method
+        self.msg = ("Incremental computation is supported only by the full method, "
+                    "not by: {0}.".format(str(self.method)))
+
+    def __str__(self):
+        return self.msg
+
+
 class InvalidModelException(GenericRegressionExceptionBase):
     """Raised when invalid or unknown regression model is requested"""
     def __init__(self, model):
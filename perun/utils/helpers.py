@@ -14,6 +14,10 @@ __author__ = 'Tomas Fiedor'
 
 # File system specific
 READ_CHUNK_SIZE = 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAMED_PROFILE_SIZE = 16 * 1024 * 1024
+# Default bound of the cache of loaded profiles (in bytes of the pickled profiles)
+PROFILE_CACHE_SIZE = 256 * 1024 * 1024
 
 # Config specific constants and helpers
 CONFIG_UNIT_ATTRIBUTES = {
@@ -30,10 +34,41 @@ TEXT_EMPH_COLOUR = 'green'
 TEXT_WARN_COLOUR = 'red'
 
 # List of current versions of format and magic constants
-INDEX_ENTRIES_START_OFFSET = 12
+INDEX_ENTRIES_START_OFFSET = 24
 INDEX_NUMBER_OF_ENTRIES_OFFSET = 8
+INDEX_NUMBER_OF_RECORDS_OFFSET = 12
+INDEX_NUMBER_OF_SORTED_RECORDS_OFFSET = 16
+# Generation of the index is incremented by each modification of the index
+INDEX_GENERATION_OFFSET = 20
 INDEX_MAGIC_PREFIX = b'pidx'
-INDEX_VERSION = 1
+INDEX_VERSION = 2
+# Fixed-size records of index: timestamp, SHA-1 of the object, flags and zero padded path (paths
+# are file names, which are limited to 255 bytes)
+INDEX_RECORD_FORMAT = '<I20sB255s'
+INDEX_RECORD_FLAGS_OFFSET = 24
+INDEX_RECORD_TOMBSTONE = 1
+INDEX_MINIMAL_UNSORTED_RECORDS = 16
+# Indexes of the previous version are still read and are upgraded, when they are modified
+LEGACY_INDEX_VERSION = 1
+
+# Binary (memory-mappable) profile objects: magic prefix, version, type of the profile and the
+# offset and size of the json directory describing the skeleton and columns of the profile
+BINARY_PROFILE_MAGIC_PREFIX = b'pbin'
+BINARY_PROFILE_VERSION = 1
+BINARY_PROFILE_HEADER_FORMAT = '<4sI16sQQ'
+BINARY_PROFILE_ALIGNMENT = 8
+
+# Packs of objects: pack files with stored (possibly delta compressed) objects and their indexes
+# with fanout table of first bytes of checksums followed by records sorted by checksums
+PACK_MAGIC_PREFIX = b'ppck'
+PACK_INDEX_MAGIC_PREFIX = b'ppix'
+PACK_VERSION = 1
+PACK_HEADER_FORMAT = '<4sII'
+PACK_INDEX_FANOUT_FORMAT = '<256I'
+PACK_INDEX_RECORD_FORMAT = '<20sQQ'
+PACK_ENTRY_HEADER_FORMAT = '<B20s'
+PACK_ENTRY_FULL = 0
+PACK_ENTRY_DELTA = 1
 
 IndexEntry = collections.namedtuple("IndexEntry", "time checksum path offset")
 
@@ -80,6 +115,20 @@ COLLECT_PHASE_ATTRS_HIGH = []
 # Show specific
 pass_profile = click.make_pass_decorator(dict)
 
+
+def pass_lazy_profile(func):
+    """Decorator for views, which process the profile in one pass (e.g. by query.all_resources_of)
+
+    The profile of such views is loaded lazily (see :class:`perun.profile.factory.LazyProfile`),
+    i.e. its resources are streamed from the file and not kept in the memory.
+
+    :param function func: the view function, which takes the profile as its first parameter
+    :returns function: the view function, with the lazily loaded profile passed to it
+    """
+    view = click.pass_obj(func)
+    view.is_lazy_view = True
+    return view
+
 # Degradation specific
 CHANGE_CMD_COLOUR = 'magenta'
 CHANGE_STRINGS = {
@@ -1,16 +1,27 @@
-"""Functions for loading and working with streams (e.g. yaml)
+"""Functions for loading and working with streams (e.g. yaml or json)
 
 Some of the stuff are stored in the stream, like e.g. yaml and are reused in several places.
 This module encapulates such functions, so they can be used in CLI, in tests, in configs.
 """
 
+import json
 import os
+import re
 from ruamel.yaml import YAML
 
 import perun.utils.log as log
 
 __author__ = 'Tomas Fiedor'
 
+# Marker of the array items in the paths of json values
+JSON_ITEM = '[]'
+# Marker of the values, that were streamed out of the decoded document
+STREAMED_VALUE = object()
+JSON_WHITESPACE_REGEX = re.compile(r'[ \t\n\r]*')
+JSON_ITEM_DELIMITER_REGEX = re.compile(r'[ \t\n\r]*([,\]])[ \t\n\r]*')
+# Characters that can continue the number, that was decoded only partially
+JSON_NUMBER_CONTINUATION = frozenset('0123456789.eE+-')
+
 
 def safely_load_yaml_from_file(yaml_file):
     """
@@ -51,3 +62,333 @@ def safely_load_yaml(yaml_source):
         return safely_load_yaml_from_file(yaml_source)
     else:
         return safely_load_yaml_from_stream(yaml_source)
+
+
+def json_path_prefixes(paths):
+    """Computes the set of all proper prefixes of the given json paths
+
+    The prefixes corresponds to the containers, that has to be unfolded (i.e. parsed item by item),
+    in order to reach the values on the given paths.
+
+    :param list paths: list of tuples of keys (or JSON_ITEM markers) identifying the values
+    :returns set: set of all proper prefixes of the paths
+    """
+    return {path[:length] for path in paths for length in range(len(path))}
+
+
+class JsonChunkDecoder(object):
+    """Incremental decoder of json documents, that are read as a stream of text chunks.
+
+    The decoder keeps in the memory only the currently processed part of the document. Values on
+    the given paths (e.g. resources) are decoded one by one using the standard json decoder, and
+    the containers on the prefixes of the paths are parsed item by item. The rest of the values is
+    decoded as a whole. Hence, the peak memory consumption is bounded by the size of the decoded
+    values and not by the size of the document. Note that the decoding is slower than decoding the
+    whole document by json.loads.
+
+    :ivar iterator _chunks: stream of the text chunks of the document
+    :ivar str _buffer: buffer of the currently read chunks
+    :ivar int _position: position of the first not yet decoded character in the buffer
+    :ivar bool _is_exhausted: true if all of the chunks were read into the buffer
+    :ivar set _paths: set of paths to values that are decoded one by one
+    :ivar set _unfolded_paths: set of paths to containers that are parsed item by item
+    :ivar dict _keys: map of already decoded keys of objects, that are shared between objects
+    """
+    def __init__(self, chunks, paths=None):
+        """
+        :param iterable chunks: iterable stream of the text chunks of the document
+        :param list paths: list of paths to values, which will be decoded one by one, with the
+            JSON_ITEM marker denoting items of the arrays
+        """
+        self._chunks = iter(chunks)
+        self._buffer = ''
+        self._position = 0
+        self._is_exhausted = False
+        self._paths = set(paths or [])
+        self._unfolded_paths = json_path_prefixes(self._paths)
+        self._keys = {}
+        self._raw_decode = json.JSONDecoder(object_hook=self._share_keys).raw_decode
+
+    def _share_keys(self, decoded_object):
+        """Replaces the keys of decoded object with already seen equal keys
+
+        Standard json decoder shares equal keys within one decoded document only, hence without
+        this, each of the separately decoded resources would hold its own copies of keys.
+
+        :param dict decoded_object: object decoded by the json decoder
+        :returns dict: the same object with keys shared with the previously decoded objects
+        """
+        share_key = self._keys.setdefault
+        return {share_key(key, key): value for key, value in decoded_object.items()}
+
+    def _read_chunk(self):
+        """Appends next non-empty chunk to the buffer, and drops already decoded part of buffer
+
+        :returns bool: true if there was a chunk to be read, false if the stream is exhausted
+        """
+        for chunk in self._chunks:
+            if chunk:
+                self._buffer = self._buffer[self._position:] + chunk
+                self._position = 0
+                return True
+        self._is_exhausted = True
+        return False
+
+    def _extend_buffer(self):
+        """Reads the chunks, until the unprocessed part of the buffer is at least doubled
+
+        Doubling the buffer ensures, that values spanning through many chunks are retried to be
+        decoded only logarithmic number of times.
+
+        :returns bool: true if at least one chunk was read
+        """
+        expected_length = 2 * (len(self._buffer) - self._position)
+        was_extended = False
+        while self._read_chunk():
+            was_extended = True
+            if len(self._buffer) - self._position >= expected_length:
+                break
+        return was_extended
+
+    def _error(self, msg):
+        """
+        :param str msg: message of the error
+        :returns ValueError: error at the current position of the buffer (the same as raised by
+            the json decoder)
+        """
+        line = self._buffer.count('\n', 0, self._position) + 1
+        column = self._position - self._buffer.rfind('\n', 0, self._position)
+        return ValueError("{}: line {} column {} (char {})".format(
+            msg, line, column, self._position
+        ))
+
+    def _peek(self):
+        """Skips the whitespaces and returns the next character of the document
+
+        :returns str: next non-whitespace character or empty string at the end of document
+        """
+        while True:
+            self._position = JSON_WHITESPACE_REGEX.match(self._buffer, self._position).end()
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+            elif not self._read_chunk():
+                return ''
+
+    def _consume(self, expected_chars):
+        """Consumes next character of the document, which has to be one of the expected ones
+
+        :param str expected_chars: string of allowed characters
+        :returns str: consumed character
+        :raises ValueError: when the next character is not one of the expected
+        """
+        char = self._peek()
+        if not char or char not in expected_chars:
+            raise self._error("Expecting one of '{}' delimiters".format(expected_chars))
+        self._position += 1
+        return char
+
+    def _decode_whole_value(self):
+        """Decodes the next value of the document as whole using the json decoder
+
+        Note that value that ends at the end of the buffer has to be decoded again with the
+        next chunk, since e.g. numbers could continue in the following chunk. Similarly, the
+        value followed by the character continuing the number (e.g. '1' followed by '.' of '1.'
+        ending the chunk) is only the prefix of the number and has to be decoded again as well.
+
+        :returns object: decoded value
+        :raises ValueError: when the value is not in the json format
+        """
+        self._peek()
+        while True:
+            try:
+                value, end = self._raw_decode(self._buffer, self._position)
+                is_incomplete = end == len(self._buffer) or (
+                    self._buffer[end] in JSON_NUMBER_CONTINUATION
+                    and not isinstance(value, (str, list, dict))
+                )
+                if not is_incomplete or not self._extend_buffer():
+                    self._position = end
+                    return value
+            except ValueError:
+                if not self._extend_buffer():
+                    raise
+
+    def _iterate_object_keys(self):
+        """Iterates through the keys of the next object in the document
+
+        Note that the value of each key has to be decoded by the caller, before the next key.
+
+        :returns: iterable stream of the keys of the object
+        """
+        self._consume('{')
+        if self._peek() == '}':
+            self._position += 1
+            return
+        while True:
+            key = self._decode_whole_value()
+            if not isinstance(key, str):
+                raise self._error("Expecting property name enclosed in double quotes")
+            self._consume(':')
+            yield key
+            if self._consume(',}') == '}':
+                return
+
+    def _iterate_array_items(self):
+        """Iterates through the items of the next array in the document
+
+        Note that each item has to be decoded by the caller, before continuing the iteration.
+
+        :returns: iterable stream of None for each of the items of the array
+        """
+        self._consume('[')
+        if self._peek() == ']':
+            self._position += 1
+            return
+        while True:
+            yield
+            if self._consume(',]') == ']':
+                return
+
+    def _iterate_whole_items(self):
+        """Fast path for iterating through the items of array, that are decoded as whole values
+
+        Items are decoded straight from the buffer, unless they are at the end of the buffer, where
+        the generic (and slower) decoding together with reading of the chunks is used.
+
+        :returns: iterable stream of the values of the next array
+        """
+        self._consume('[')
+        if self._peek() == ']':
+            self._position += 1
+            return
+        raw_decode, match_delimiter = self._raw_decode, JSON_ITEM_DELIMITER_REGEX.match
+        while True:
+            buffer = self._buffer
+            try:
+                value, end = raw_decode(buffer, self._position)
+                delimiter = match_delimiter(buffer, end)
+            except ValueError:
+                delimiter = None
+            if delimiter and delimiter.end() < len(buffer):
+                self._position = delimiter.end()
+                yield value
+                if delimiter.group(1) == ']':
+                    return
+            else:
+                yield self._decode_whole_value()
+                if self._consume(',]') == ']':
+                    return
+                self._peek()
+
+    def _decode_value(self, path):
+        """
+        :param tuple path: path to the decoded value
+        :returns object: decoded value
+        """
+        if path in self._unfolded_paths:
+            next_char = self._peek()
+            if next_char == '{':
+                return {
+                    key: self._decode_value(path + (key, )) for key in self._iterate_object_keys()
+                }
+            elif next_char == '[':
+                item_path = path + (JSON_ITEM, )
+                if item_path not in self._unfolded_paths:
+                    return list(self._iterate_whole_items())
+                return [self._decode_value(item_path) for _ in self._iterate_array_items()]
+        return self._decode_whole_value()
+
+    def _stream_value(self, path, location):
+        """Streams the values on the decoded paths, that are nested in the value on the path
+
+        :param tuple path: path to the decoded value
+        :param tuple location: path to the decoded value with indexes of the items of arrays
+        :returns: iterable stream of (location, value) pairs of streamed values, which returns the
+            rest of the decoded value (without the streamed values) or STREAMED_VALUE if the whole
+            value was streamed
+        """
+        if path in self._paths:
+            yield location, self._decode_value(path)
+            return STREAMED_VALUE
+        elif path in self._unfolded_paths:
+            next_char = self._peek()
+            if next_char == '{':
+                decoded_object = {}
+                for key in self._iterate_object_keys():
+                    value = yield from self._stream_value(path + (key, ), location + (key, ))
+                    if value is not STREAMED_VALUE:
+                        decoded_object[key] = value
+                return decoded_object
+            elif next_char == '[':
+                item_path = path + (JSON_ITEM, )
+                if item_path in self._paths and item_path not in self._unfolded_paths:
+                    for index, item in enumerate(self._iterate_whole_items()):
+                        yield location + (index, ), item
+                    return []
+                decoded_array = []
+                for index, _ in enumerate(self._iterate_array_items()):
+                    value = yield from self._stream_value(item_path, location + (index, ))
+                    if value is not STREAMED_VALUE:
+                        decoded_array.append(value)
+                return decoded_array
+        return self._decode_whole_value()
+
+    def _check_end_of_document(self):
+        """
+        :raises ValueError: when there is some non whitespace data after the document
+        """
+        if self._peek():
+            raise self._error("Extra data")
+
+    def decode(self):
+        """Decodes the whole document
+
+        :returns object: decoded json document
+        :raises ValueError: when the document is not in the json format
+        """
+        document = self._decode_value(())
+        self._check_end_of_document()
+        return document
+
+    def stream(self):
+        """Streams the values on the decoded paths one by one
+
+        :returns: iterable stream of (location, value) pairs, where location is the path to the
+            value with concrete indexes of arrays instead of JSON_ITEM markers, which returns
+            the rest of the document without the streamed values
+        :raises ValueError: when the document is not in the json format
+        """
+        document = yield from self._stream_value((), ())
+        self._check_end_of_document()
+        return document
+
+
+def load_json_from_chunks(chunks, unfolded_paths=None):
+    """Loads the json document from the stream of the text chunks
+
+    :param iterable chunks: iterable stream of text chunks of the document
+    :param list unfolded_paths: list of paths to values, which will be decoded one by one, with
+        the JSON_ITEM marker denoting items of the arrays
+    :returns object: loaded json document
+    :raises ValueError: when the document is not in the json format
+    """
+    return JsonChunkDecoder(chunks, unfolded_paths).decode()
+
+
+def stream_json_from_chunks(chunks, streamed_paths):
+    """Streams the values on the given paths of the json document read by chunks
+
+    E.g. the following streams the items of the 'resources' list one by one::
+
+        >>> stream = stream_json_from_chunks(['{"resources": [1, ', '2]}'], [('resources', '[]')])
+        >>> list(stream)
+        [(('resources', 0), 1), (('resources', 1), 2)]
+
+    :param iterable chunks: iterable stream of text chunks of the document
+    :param list streamed_paths: list of paths to values, which will be streamed, with the
+        JSON_ITEM marker denoting items of the arrays
+    :returns: iterable stream of (location, value) pairs, which returns the rest of the document
+        without the streamed values, e.g. {'resources': []} in the example above
+    :raises ValueError: when the document is not in the json format
+    """
+    return JsonChunkDecoder(chunks, streamed_paths).stream()
@@ -15,7 +15,7 @@ def draw_flame_graph(profile, output_file, height):
         To create Flame graphs it's uses perl script created by Brendan Gregg.
         https://github.com/brendangregg/FlameGraph/blob/master/flamegraph.pl
 
-    :param dict profile: the memory profile
+    :param dict profile: the memory profile (possibly lazy, i.e. streamed from file)
     :param str output_file: filename of the output file, expected is SVG format
     :param int height: graphs height
     """
@@ -2,7 +2,7 @@
 
 import click
 import perun.view.flamegraph.flamegraph as flame
-from perun.utils.helpers import pass_profile
+from perun.utils.helpers import pass_lazy_profile
 
 __author__ = 'Radim Podola'
 
@@ -12,7 +12,7 @@ __author__ = 'Radim Podola'
               help="Sets the output file of the resulting flame graph.")
 @click.option('--graph-height', '-h', default=20, type=int,
               help="Increases the width of the resulting flame graph.")
-@pass_profile
+@pass_lazy_profile
 def flamegraph(profile, filename, graph_height, **_):
     """Flame graph interprets the relative and inclusive presence of the
     resources according to the stack depth of the origin of resources.
@@ -0,0 +1,82 @@
+"""Benchmark of decoding the output of trace collector by blocks against the per-line parsing
+
+The benchmark is not part of the test suite, since it measures the wall-clock time. Run it from
+the root of the repository as follows::
+
+    python3 tests/benchmark_trace_decoder.py [calls] [threads]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import perun.collect.trace.decoder as decoder
+import perun.collect.trace.systemtap as stap
+
+from test_collect import _generate_synthetic_trace, _pair_trace_by_lines, \
+    _trace_to_resources_by_lines
+
+__author__ = 'Tomas Fiedor'
+
+
+def decode_and_pair_trace(trace_file, func):
+    """Decodes and pairs the function records by blocks
+
+    :param str trace_file: path to the output of trace collector
+    :param list func: the function probe specifications
+    :return int: the number of paired records
+    """
+    name_table, pairing = decoder.NameTable(), decoder.FuncRecordPairing(func)
+    paired = 0
+    with open(trace_file, 'rb') as trace_handle:
+        for block in decoder.read_trace_blocks(trace_handle):
+            records = decoder.decode_block(block, name_table)
+            paired += len(pairing.pair(records[records['type'] <= 1], name_table)[0])
+    return paired
+
+
+def best_time(function, *args):
+    """
+    :param function function: the benchmarked function
+    :param list args: the arguments of the function
+    :return float: the best time of three runs of the function
+    """
+    times = []
+    for _ in range(3):
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run_benchmark(calls, threads):
+    """Benchmarks the decoding of the synthetic output of trace collector
+
+    :param int calls: number of function calls in the synthetic output
+    :param int threads: number of threads calling the functions
+    """
+    names = ['_Z{0}function{0}Pii'.format(i) for i in range(100)]
+    func = [{'name': name, 'sample': (i % 3) + 1} for (i, name) in enumerate(names[:50])]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        trace_file = os.path.join(tmpdir, 'synthetic_record.txt')
+        _generate_synthetic_trace(trace_file, calls, threads, names)
+
+        by_lines_time = best_time(_pair_trace_by_lines, trace_file, func)
+        decoder_time = best_time(decode_and_pair_trace, trace_file, func)
+        print("decoding and pairing: {:.3f}s by lines, {:.3f}s by blocks ({:.1f}x)".format(
+            by_lines_time, decoder_time, by_lines_time / decoder_time
+        ))
+
+        resources_by_lines_time = best_time(_trace_to_resources_by_lines, trace_file, func)
+        resources_time = best_time(lambda: list(stap.trace_to_profile(trace_file, func, [])))
+        print("transformation to resources: {:.3f}s by lines, {:.3f}s by blocks ({:.1f}x)".format(
+            resources_by_lines_time, resources_time, resources_by_lines_time / resources_time
+        ))
+
+
+if __name__ == '__main__':
+    run_benchmark(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    )
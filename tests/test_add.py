@@ -13,6 +13,8 @@ import pytest
 import termcolor
 
 import perun.logic.commands as commands
+import perun.logic.config as config
+import perun.profile.factory as factory
 import perun.utils.timestamps as timestamps
 from perun.utils.exceptions import NotPerunRepositoryException, UnsupportedModuleException, \
     IncorrectProfileFormatException, EntryNotFoundException, VersionControlSystemException
@@ -173,6 +175,43 @@ def test_add(helpers, pcs_full, valid_profile_pool):
     assert before_count[0] == (after_count[0] - (len(valid_profile_pool) - 1) - 2)
 
 
+def test_add_binary(helpers, pcs_full, valid_profile_pool):
+    """Test calling 'perun add profile hash' with profiles stored in binary format
+
+    Expecting no error. Profiles are added to the index and stored uncompressed in binary format,
+    which is loaded to the same profile.
+    """
+    git_repo = git.Repo(os.path.split(pcs_full.get_path())[0])
+    current_head = binascii.hexlify(next(git_repo.iter_commits()).binsha).decode('utf-8')
+    obj_path = pcs_full.get_path()
+
+    config.runtime().set('profiles.object_format', 'binary')
+    for valid_profile in valid_profile_pool:
+        valid_profile = helpers.prepare_profile(
+            pcs_full.get_job_directory(), valid_profile, current_head
+        )
+        before_entries_count = assert_before_add(helpers, obj_path, current_head, valid_profile)
+        commands.add([valid_profile], current_head, keep_profile=True)
+        after_entries_count = assert_after_valid_add(helpers, obj_path, current_head, valid_profile)
+        assert before_entries_count == (after_entries_count - 1)
+
+        with helpers.open_index(obj_path, current_head) as index_handle:
+            entry = store.lookup_entry_within_index(
+                index_handle, lambda entry: entry.path == os.path.split(valid_profile)[-1]
+            )
+        _, object_file = store.split_object_name(pcs_full.get_object_directory(), entry.checksum)
+        with open(object_file, 'rb') as object_handle:
+            assert store.is_binary_profile_handle(object_handle)
+
+        added_profile = factory.load_profile_from_file(valid_profile, True)
+        added_profile.pop('origin')
+        loaded_profile = commands.load_profile_from_args(
+            os.path.split(valid_profile)[-1], current_head
+        )
+        assert loaded_profile == added_profile
+    config.runtime().set('profiles.object_format', 'json')
+
+
 def test_add_no_minor(helpers, pcs_full, valid_profile_pool):
     """Test calling 'perun add profile hash' without specified minor version
 
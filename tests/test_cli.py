@@ -24,6 +24,7 @@ import perun.collect.trace.strategy as strategy
 import perun.utils.exceptions as exceptions
 import perun.check.factory as check
 import perun.vcs as vcs
+import perun.profile.factory as profiles
 
 __author__ = 'Tomas Fiedor'
 
@@ -645,6 +646,44 @@ def test_status_correct(pcs_full):
     assert pcs_full.local_config().get('format.sort_profiles_by') == 'source'
 
 
+def test_gc_correct(pcs_full, monkeypatch):
+    """Test running perun gc, packing all of the loose objects of profiles
+
+    Expecting no exceptions, zero status, no loose objects left, no profile loaded by the gc and
+    the same profiles loaded from the pack, whose index is read only once.
+    """
+    runner = CliRunner()
+    git_repo = git.Repo(pcs_full.get_vcs_path())
+    head = str(git_repo.head.commit)
+    object_dir = pcs_full.get_object_directory()
+    loose_objects = list(store.list_loose_objects(object_dir))
+    profiles_before = [
+        profile.load() for profile in profiles.load_list_for_minor_version(head)
+    ]
+    status_before = runner.invoke(cli.status, ['--short']).output
+
+    monkeypatch.setattr(profiles, 'load_profile_from_handle', lambda *_: pytest.fail("loaded"))
+    result = runner.invoke(cli.gc, [])
+    monkeypatch.undo()
+    assert result.exit_code == 0
+    assert "successfully packed {} objects".format(len(loose_objects)) in result.output
+    assert list(store.list_loose_objects(object_dir)) == []
+    assert store.object_exists(store.split_object_name(object_dir, loose_objects[0])[1])
+    monkeypatch.setattr(store, 'read_pack_indexes', lambda *_: pytest.fail("indexes reread"))
+    for checksum in loose_objects:
+        assert store.object_exists(store.split_object_name(object_dir, checksum)[1])
+    monkeypatch.undo()
+
+    assert runner.invoke(cli.status, ['--short']).output == status_before
+    assert [
+        profile.load() for profile in profiles.load_list_for_minor_version(head)
+    ] == profiles_before
+
+    result = runner.invoke(cli.gc, [])
+    assert result.exit_code == 0
+    assert "nothing to pack" in result.output
+
+
 @pytest.mark.usefixtures('cleandir')
 def test_init_correct():
     """Test running init from cli, without any problems
@@ -1360,6 +1399,12 @@ def test_check_all(pcs_with_degradations):
     result = runner.invoke(cli.check_all, [])
     assert result.exit_code == 0
 
+    result = runner.invoke(cli.check_all, ['--jobs', '2'])
+    assert result.exit_code == 0
+
+    result = runner.invoke(cli.check_all, ['--jobs', '0'])
+    assert result.exit_code == 2
+
 
 @pytest.mark.usefixtures('cleandir')
 def test_utils_create(monkeypatch, tmpdir):
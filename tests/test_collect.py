@@ -1,12 +1,39 @@
 """Basic tests for running the currently supported collectors"""
 
+import collections
+import concurrent.futures
+import json
 import os
+import random
+import shutil
+import subprocess
+import threading
+import time
+
+import numpy
+import pytest
 
 import perun.vcs as vcs
+import perun.logic.config as config
+import perun.logic.pcs as pcs
 import perun.logic.runner as runner
+import perun.profile.factory as profiles
 import perun.profile.query as query
+import perun.profile.stacks as stacks
+import perun.profile.convert as convert
+import perun.collect.memory.filter as memory_filter
+import perun.collect.memory.parsing as memory_parsing
+import perun.collect.memory.symbolizer as symbolizer
+import perun.collect.memory.syscalls as syscalls
 import perun.collect.trace.systemtap as stap
+import perun.collect.trace.aggregator as aggregator
+import perun.collect.trace.decoder as decoder
+import perun.collect.trace.systemtap_script as stap_script
+import perun.collect.trace.strategy as strategy
+import perun.utils as utils
+import perun.utils.exceptions as exceptions
 
+from perun.collect.trace.systemtap_script import RecordType
 from perun.utils.helpers import Unit, Job
 from perun.workload.integer_generator import IntegerGenerator
 
@@ -143,6 +170,331 @@ def test_collect_memory(capsys, helpers, pcs_full, memory_collect_job, memory_co
     assert len(list(query.all_resources_of(prof))) == 0
 
 
+def test_collect_memory_binary_log(tmpdir, memory_collect_job):
+    """Test parsing the binary log of the memory collector
+
+    Expecting the same profile as from the equivalent text log
+    """
+    target_bin = memory_collect_job[0][0]
+    nm_output = subprocess.check_output(['nm', target_bin]).decode('utf-8')
+    main_address = int(next(
+        line.split()[0] for line in nm_output.splitlines() if line.endswith(' main')
+    ), 16)
+    traces = [[main_address + 8, 0x7ff012345678], [main_address + 20]]
+
+    text_log = os.path.join(str(tmpdir), 'MemoryLog')
+    with open(text_log, 'w') as text_handle:
+        for i, (allocator, trace) in enumerate(zip(['malloc', 'free'], traces)):
+            text_handle.write('time 0.00{}000s\n'.format(i + 1))
+            text_handle.write('{} {}B {}{}\n'.format(
+                allocator, i * 4, 1000 + i, ' x2.500000' if allocator == 'malloc' else ''
+            ))
+            for ip in trace:
+                text_handle.write('{} 0x{:x}\n'.format('main' if ip < 0x7ff000000000 else '?', ip))
+            text_handle.write('\n')
+        text_handle.write('EXIT 0.004000s\n')
+
+    records = numpy.zeros(3, dtype=memory_parsing.BINARY_RECORD_DTYPE)
+    records['time'] = [0.001, 0.002, 0.004]
+    records['size'][:2] = [0, 4]
+    records['ptr'][:2] = [1000, 1001]
+    records['weight'][:2] = [2.5, 1]
+    records['allocator'] = [0, 1, memory_parsing.EXIT_ALLOCATOR]
+    for i, trace in enumerate(traces):
+        records['frames'][i] = len(trace)
+        records['ips'][i][:len(trace)] = trace
+    binary_log = os.path.join(str(tmpdir), 'MemoryLog.bin')
+    records.tofile(binary_log)
+
+    memory_parsing.UID_RESOURCE_MAP.clear()
+    text_profile = memory_parsing.parse_log(text_log, target_bin, 0.001, 'w')
+    memory_parsing.UID_RESOURCE_MAP.clear()
+    binary_profile = memory_parsing.parse_binary_log(binary_log, target_bin, 0.001, 'w')
+    assert binary_profile == text_profile
+    resources = [res for snapshot in binary_profile['snapshots'] for res in snapshot['resources']]
+    assert [res['subtype'] for res in resources] == ['malloc', 'free']
+    trace = stacks.StackTable.of(binary_profile).trace(resources[0]['trace_id'])
+    assert trace[0]['function'] == 'main'
+    assert trace[1] == {'function': '?', 'source': 'unreachable', 'line': 0}
+    assert resources[0]['weight'] == 2.5 and 'weight' not in resources[1]
+
+    # Test scaling the amounts of sampled allocations by their weights
+    uid_map = collections.defaultdict(int)
+    resource = memory_parsing.parse_resources(
+        ['time 0.1s', 'malloc 10B 1000 x2.500000'], 'w', uid_map
+    )
+    assert (resource['amount'], resource['weight'], resource['address']) == (25, 2.5, 1000)
+    resource = memory_parsing.parse_resources(['time 0.1s', 'malloc 10B 1000'], 'w', uid_map)
+    assert resource['amount'] == 10 and 'weight' not in resource
+
+    # Test malformed binary logs
+    records[:2].tofile(binary_log)
+    with pytest.raises(ValueError):
+        memory_parsing.parse_binary_log(binary_log, target_bin, 0.001, 'w')
+    with open(binary_log, 'wb') as binary_handle:
+        binary_handle.write(records.tobytes()[:-1])
+    with pytest.raises(ValueError):
+        memory_parsing.parse_binary_log(binary_log, target_bin, 0.001, 'w')
+
+    # Test the logs with the address range and the load bias of the relocated binary
+    bias = 0x555500000000
+    module = (bias + main_address - 0x100, bias + main_address + 0x100, bias)
+    with open(text_log, 'r') as text_handle:
+        content = text_handle.read()
+    with open(text_log, 'w') as text_handle:
+        text_handle.write('MODULE 0x{:x} 0x{:x} 0x{:x}\n\n'.format(*module))
+        for ip in (main_address + 8, main_address + 20):
+            content = content.replace('0x{:x}'.format(ip), '0x{:x}'.format(ip + bias))
+        text_handle.write(content)
+    module_record = numpy.zeros(1, dtype=memory_parsing.BINARY_RECORD_DTYPE)
+    module_record['allocator'] = memory_parsing.MODULE_ALLOCATOR
+    module_record['frames'] = 3
+    module_record['ips'][0][:3] = module
+    records['ips'][:2][records['ips'][:2] < 0x7ff000000000] += bias
+    numpy.concatenate((module_record, records)).tofile(binary_log)
+    memory_parsing.UID_RESOURCE_MAP.clear()
+    assert memory_parsing.parse_log(text_log, target_bin, 0.001, 'w') == text_profile
+    memory_parsing.UID_RESOURCE_MAP.clear()
+    assert memory_parsing.parse_binary_log(binary_log, target_bin, 0.001, 'w') == text_profile
+
+
+def test_collect_memory_log_chunks(monkeypatch, tmpdir, memory_collect_job):
+    """Test parsing the log of the memory collector by chunks, sequentially and in parallel
+
+    Expecting the same profile as when the log is parsed at once
+    """
+    target_bin = memory_collect_job[0][0]
+    nm_output = subprocess.check_output(['nm', target_bin]).decode('utf-8')
+    main_address = int(next(
+        line.split()[0] for line in nm_output.splitlines() if line.endswith(' main')
+    ), 16)
+
+    log_file = os.path.join(str(tmpdir), 'MemoryLog')
+    with open(log_file, 'w') as log_handle:
+        for i in range(60):
+            log_handle.write('time {:f}s\n'.format(i * 0.0004))
+            log_handle.write('{} {}B {}\n'.format(['malloc', 'free'][i % 2], i, 1000 + i))
+            log_handle.write('main 0x{:x}\n\n'.format(main_address + 4 * (i % 3)))
+        log_handle.write('EXIT 0.1s\n')
+
+    memory_parsing.UID_RESOURCE_MAP.clear()
+    profile = memory_parsing.parse_log(log_file, target_bin, 0.001, 'w')
+    assert len(profile['snapshots']) == 24
+    orders = [res['allocation_order'] for snap in profile['snapshots'] for res in snap['resources']]
+    assert max(orders) > 1
+
+    monkeypatch.setattr(memory_parsing, 'LOG_CHUNK_SIZE', 100)
+    with open(log_file, 'r') as log_handle:
+        assert len(list(memory_parsing.read_allocation_chunks(log_handle))) > 10
+    saved_caches = []
+    monkeypatch.setattr(
+        symbolizer.PersistentCache, 'save', lambda cache: saved_caches.append(cache.entries)
+    )
+    for jobs in (1, 3):
+        symbolizer.close()
+        saved_caches.clear()
+        memory_parsing.UID_RESOURCE_MAP.clear()
+        assert memory_parsing.parse_log(log_file, target_bin, 0.001, 'w', jobs) == profile
+        # The symbols resolved by the workers are persisted once by the parent process
+        assert len(saved_caches) == 2
+        assert {'0x{:x}'.format(main_address + 4 * i) for i in range(3)} <= set().union(
+            *saved_caches
+        )
+    symbolizer.close()
+    monkeypatch.undo()
+    monkeypatch.setattr(memory_parsing, 'LOG_CHUNK_SIZE', 100)
+
+    # The chunks are read only slightly ahead of the parsed chunks
+    read_chunks = []
+    with open(log_file, 'r') as log_handle:
+        chunks = (read_chunks.append(chunk) or chunk
+                  for chunk in memory_parsing.read_allocation_chunks(log_handle))
+        for parsed_count, parsed_chunk in enumerate(
+                memory_parsing.parse_chunks_in_parallel(chunks, target_bin, 'w', 2), 1
+        ):
+            assert parsed_chunk == memory_parsing.parse_allocation_chunk(
+                read_chunks[parsed_count - 1], target_bin, 'w'
+            )
+            assert len(read_chunks) - parsed_count <= 4
+        assert parsed_count == len(read_chunks)
+
+    # Test the log without the exit record
+    with open(log_file, 'r') as log_handle:
+        content = log_handle.read()
+    with open(log_file, 'w') as log_handle:
+        log_handle.write(content[:content.rfind('EXIT')])
+    with pytest.raises(ValueError):
+        memory_parsing.parse_log(log_file, target_bin, 0.001, 'w')
+
+
+def test_collect_memory_stacks():
+    """Test interning the traces of the memory profile in the table of stacks
+
+    Expecting the same filtered traces and flame graph as for the inline traces
+    """
+    def frame(function, source='s.c', line=1):
+        """Creates the frame of the trace"""
+        return {'function': function, 'source': source, 'line': line}
+    traces = [
+        [frame('malloc', 'unreachable', 0), frame('f', line=2), frame('main')],
+        [frame('malloc', 'unreachable', 0), frame('g', line=3), frame('main')],
+        [frame('free', 'unreachable', 0), frame('f', line=2), frame('main')],
+        [frame('malloc', 'unreachable', 0)],
+        []
+    ]
+    resources = [
+        {'type': 'memory', 'subtype': 'malloc', 'amount': i, 'trace': traces[i % len(traces)]}
+        for i in range(20)
+    ]
+    legacy_profile = {'snapshots': [{'resources': resources}], 'global': {'resources': []}}
+    profile = json.loads(json.dumps(legacy_profile))
+    table = stacks.intern_traces(profile)
+    # The shared prefixes are interned only once
+    assert len(table) == 7
+    assert all('trace' not in res for res in profile['snapshots'][0]['resources'])
+    assert [res['trace_id'] for res in profile['snapshots'][0]['resources'][:5]] == [2, 4, 5, 6, -1]
+    assert convert.to_flame_graph_format(profile) == \
+        convert.to_flame_graph_format(legacy_profile)
+
+    memory_filter.remove_allocators(profile)
+    assert len(profile['stacks']) == 3
+    for res in resources:
+        res['trace'] = [call for call in res['trace'] if call['source'] != 'unreachable']
+        res['uid'] = memory_parsing.parse_allocation_location(res['trace'])
+    assert stacks.expand_traces(json.loads(json.dumps(profile))) == legacy_profile
+    assert [res['uid'] for res in profile['snapshots'][0]['resources'][:5]] == \
+        [frame('f', line=2), frame('g', line=3), frame('f', line=2), {}, {}]
+
+    # Test merging profiles with different tables
+    other_profile = {'snapshots': [{'resources': [
+        {'amount': 1, 'trace': [frame('h'), frame('main')]}, {'amount': 2, 'trace': traces[1]}
+    ]}]}
+    stacks.intern_traces(other_profile)
+    memory_filter.set_global_region(profile)
+    merged_profile = profiles.merge_resources_of(profile, other_profile)
+    merged_table = stacks.StackTable.of(merged_profile)
+    assert len(merged_table) == 5
+    assert [merged_table.trace(res['trace_id'])[0]['function']
+            for res in merged_profile['snapshots'][1]['resources']] == ['h', 'malloc']
+
+
+def test_collect_memory_symbolizer(monkeypatch, pcs_full, memory_collect_job):
+    """Test resolving the symbols of the memory collector by co-processes with persistent caches
+
+    Expecting the same symbols as by the separate calls and no resolution of the cached symbols
+    """
+    target_bin = memory_collect_job[0][0]
+    addresses = ['0x{:x}'.format(address) for address in range(0x1000, 0x1000 + 600)]
+    symbols = symbolizer.resolve_addresses(addresses, target_bin)
+    expected = subprocess.check_output(
+        ['addr2line', '-f', '-C', '-e', target_bin] + addresses[-3:]
+    ).decode('utf-8').splitlines()
+    assert [line for address in addresses[-3:] for line in symbols[address]] == expected
+    names = symbolizer.demangle(['_Z4SwapRiS_', 'main', '?'])
+    assert names == {'_Z4SwapRiS_': 'Swap(int&, int&)', 'main': 'main', '?': '?'}
+    symbolizer.close()
+    assert len(os.listdir(pcs.get_cache_directory())) == 2
+
+    def failing_query(*_):
+        """The cached symbols are not resolved again"""
+        assert False
+    monkeypatch.setattr(symbolizer.CoProcess, 'query', failing_query)
+    assert symbolizer.resolve_addresses(addresses, target_bin) == symbols
+    assert symbolizer.demangle(['main']) == {'main': 'main'}
+    syscalls.build_address_to_line_cache(addresses[:2], target_bin)
+    assert syscalls.address_to_line(addresses[0]) == symbols[addresses[0]][1].split(':')
+
+    # The addresses in the relocated binary are resolved and cached by their offsets
+    for bias in (0x555500000000, 0x7f0000000000):
+        module = (bias + 0x1000, bias + 0x1000 + 600, bias)
+        relocated = ['0x{:x}'.format(int(address, 16) + bias) for address in addresses]
+        relocated_symbols = symbolizer.resolve_addresses(relocated + ['0x10'], target_bin, module)
+        assert [relocated_symbols[address] for address in relocated] == \
+            [symbols[address] for address in addresses]
+        assert relocated_symbols['0x10'] == symbolizer.UNKNOWN_SYMBOL
+    symbolizer.close()
+
+
+def test_collect_memory_symbolizer_limits(monkeypatch, pcs_full, memory_collect_job):
+    """Test the limits of the caches and restarting of the co-processes of the symbolizer
+
+    Expecting the least recently used entries are evicted and the co-process is restarted, when
+    the resolved binary changes
+    """
+    cache = symbolizer.PersistentCache('test-cache', max_entries=2)
+    cache.update([('a', 1), ('b', 2)])
+    assert cache.get('a') == 1
+    cache.update([('c', 3)])
+    assert list(cache.entries) == ['a', 'c'] and cache.get('b') is None
+    cache.save()
+    cache = symbolizer.PersistentCache('test-cache', max_entries=1)
+    assert list(cache.entries) == ['c']
+
+    target_bin = memory_collect_job[0][0]
+    symbols = symbolizer.resolve_addresses(['0x1000'], target_bin)
+    command = ('addr2line', '-f', '-C', '-e', target_bin)
+    _, coprocess = symbolizer._COPROCESSES[command]
+    monkeypatch.setattr(symbolizer, '_get_binary_identifier', lambda _: 'rebuilt')
+    assert symbolizer.resolve_addresses(['0x1000'], target_bin) == symbols
+    assert coprocess.process.poll() is not None
+    assert symbolizer._COPROCESSES[command] != ('rebuilt', coprocess)
+    symbolizer.close()
+    assert not symbolizer._COPROCESSES
+
+
+def test_collect_memory_symbolizer_long_names():
+    """Test resolving the long names, whose queries and answers do not fit to the pipe buffers
+
+    Expecting the co-process does not deadlock and all of the names are demangled
+    """
+    names = [
+        '_Z520{}{:020d}v'.format(chr(ord('a') + i % 26) * 500, i) for i in range(1024)
+    ]
+    demangled = symbolizer.demangle(names)
+    symbolizer.close()
+    assert len(demangled) == len(names)
+    assert all(demangled[name] == name[5:-1] + '()' for name in names)
+
+
+def test_collect_memory_library_rebuild(monkeypatch, tmpdir):
+    """Test checking if the injected library of memory collector has to be rebuilt
+
+    Expecting the library rebuilt when it is missing, when its sources are newer or when it was
+    built with different flags, and the flags of the successful build stored next to it.
+    """
+    library_dir = str(tmpdir)
+    for source in syscalls.LIBRARY_SOURCES:
+        shutil.copy(os.path.join(syscalls.LIBRARY_DIR, source), library_dir)
+        os.utime(os.path.join(library_dir, source), (1, 1))
+    assert syscalls.is_library_outdated(library_dir)
+
+    builds = []
+
+    def mocked_make(command, cwd):
+        """Creates the library instead of building it"""
+        builds.append(command)
+        open(os.path.join(cwd, syscalls.LIBRARY_NAME), 'w').close()
+        return 0
+    monkeypatch.setattr(subprocess, 'call', mocked_make)
+    monkeypatch.setenv('CFLAGS', '-O2')
+    assert syscalls.init(library_dir) == 0
+    assert builds == [['make', 'CC=' + os.environ.get('CC', 'gcc'), 'CFLAGS=-O2']]
+    assert not syscalls.is_library_outdated(library_dir)
+
+    # Library built with different flags, or before the last change of sources
+    monkeypatch.setenv('CFLAGS', '-O0')
+    assert syscalls.is_library_outdated(library_dir)
+    assert syscalls.init(library_dir) == 0
+    assert not syscalls.is_library_outdated(library_dir)
+    os.utime(os.path.join(library_dir, syscalls.LIBRARY_NAME), (0, 0))
+    assert syscalls.is_library_outdated(library_dir)
+
+    # Library built by the older version of collector, without the stored flags
+    assert syscalls.init(library_dir) == 0
+    os.remove(os.path.join(library_dir, syscalls.LIBRARY_FLAGS_NAME))
+    assert syscalls.is_library_outdated(library_dir)
+
+
 def test_collect_memory_with_generator(pcs_full, memory_collect_job):
     """Tries to collect the memory with integer generators"""
     cmd = memory_collect_job[0][0]
@@ -185,3 +537,518 @@ def test_collect_time(monkeypatch, helpers, pcs_full, capsys):
     runner.run_single_job(["echo"], "", ["hello"], ["time"], [], [head])
     _, err = capsys.readouterr()
     assert 'Something happened lol!' in err
+
+
+def test_collect_in_parallel(monkeypatch, pcs_full, capsys):
+    """Test running the job matrix in parallel
+
+    Expecting the jobs of collectors, which are not safe to be run concurrently, are collected one
+    by one, the rest in isolated working directories and that all of the profiles are postprocessed
+    """
+    matrix = config.Config('local', '', {
+        'vcs': {'type': 'git', 'url': '../'},
+        'cmds': ['ls'],
+        'args': ['-a perun'],
+        'workloads': ['tests', 'perun'],
+        'collectors': [
+            {'name': 'time', 'params': {}}
+        ],
+        'postprocessors': [
+            {'name': 'normalizer', 'params': {}}
+        ]
+    })
+    monkeypatch.setattr("perun.logic.config.local", lambda _: matrix)
+    head = vcs.get_minor_version_info(vcs.get_minor_head())
+    job_dir = pcs_full.get_job_directory()
+    os.makedirs('tests')
+    os.makedirs('perun')
+
+    def collect_in_working_directory(**kwargs):
+        """Collects the listing of the workload and leaves a file in the working directory"""
+        assert os.path.isabs(kwargs['workload'])
+        assert kwargs['args'] == '-a perun'
+        assert os.listdir(os.getcwd()) == []
+        with open('MemoryLog', 'w'):
+            pass
+        return 0, "", {'profile': {'global': {'timestamp': 1.0, 'resources': [
+            {'amount': 1.0, 'uid': kwargs['cmd'], 'type': 'time', 'subtype': 'real'}
+        ]}}}
+    monkeypatch.setattr("perun.collect.time.run.collect", collect_in_working_directory)
+
+    runner.run_matrix_job([head], jobs=2)
+    out, _ = capsys.readouterr()
+    assert out.count('Successfully collected data from ls') == 2
+    assert out.count('Successfully postprocessed data by normalizer') == 2
+    assert len(os.listdir(job_dir)) == 2
+
+    # Time cannot be run concurrently, so pretend it can
+    time.sleep(1)
+    monkeypatch.setattr("perun.collect.time.run.CONCURRENCY_SAFE", True)
+    monkeypatch.setattr(syscalls, 'is_library_outdated', lambda: False)
+    assert runner.is_collector_concurrency_safe(Unit('memory', {}))
+    # The collectors, whose concurrent jobs cannot be prepared, are run alone
+    monkeypatch.setattr(syscalls, 'is_library_outdated', lambda: True)
+    monkeypatch.setattr(syscalls, 'init', lambda: 2)
+    assert not runner.is_collector_concurrency_safe(Unit('memory', {}))
+    runner.run_matrix_job([head], jobs=2)
+    out, _ = capsys.readouterr()
+    assert out.count('Successfully collected data from ls') == 2
+    assert len(os.listdir(job_dir)) == 4
+    assert os.listdir(os.path.join(pcs_full.get_path(), 'tmp')) == []
+    for job_profile in os.listdir(job_dir):
+        loaded_profile = profiles.load_profile_from_file(os.path.join(job_dir, job_profile), True)
+        assert loaded_profile['header']['workload'] in ('tests', 'perun')
+        assert [post['name'] for post in loaded_profile['postprocessors']] == ['normalizer']
+        assert loaded_profile['header']['params'] == '-a perun'
+
+    # The profiles are generated in the order of the job matrix, though the first job finishes last
+    submitted_futures = []
+
+    class SynchronousExecutor(concurrent.futures.Executor):
+        """Executor running the submitted calls at once in this process"""
+        def __init__(self, **_):
+            pass
+
+        def submit(self, fn, *args, **kwargs):
+            future = concurrent.futures.Future()
+            future.set_result(fn(*args, **kwargs))
+            submitted_futures.append(future)
+            return future
+
+    def wait_for_last_submitted(futures, **_):
+        """Finishes the last submitted of the futures first"""
+        last_future = max(futures, key=submitted_futures.index)
+        return {last_future}, set(futures) - {last_future}
+    monkeypatch.setattr(concurrent.futures, 'ProcessPoolExecutor', SynchronousExecutor)
+    monkeypatch.setattr(concurrent.futures, 'wait', wait_for_last_submitted)
+    job_matrix, number_of_jobs = runner.construct_job_matrix(**runner.load_job_info_from_config())
+    generated_profiles = runner.generate_jobs_on_current_working_dir(job_matrix, number_of_jobs, 2)
+    assert [job.workload for _, job in generated_profiles] == ['tests', 'perun']
+
+
+def test_collect_trace_streamed(tmpdir):
+    """Test transforming the output of trace collector to resources while it is still written
+
+    Expecting the same resources as when the output is transformed after the collection
+    """
+    record_file = os.path.join(os.path.dirname(__file__), 'collect_trace', 'tst_stap_record.txt')
+    static = [
+        {'name': 'BEFORE_CYCLE', 'pair': 'BEFORE_CYCLE_end', 'sample': 1},
+        {'name': 'BEFORE_CYCLE_end', 'sample': 1},
+        {'name': 'INSIDE_CYCLE', 'sample': 1}
+    ]
+    func = [{'name': 'main', 'sample': 1}]
+    resources = list(stap.trace_to_profile(record_file, func, static, workload='w'))
+    assert len(resources) == 10
+
+    with open(record_file, 'r') as record_handle:
+        record_content = record_handle.read()
+    followed_file = os.path.join(str(tmpdir), 'followed_record.txt')
+    open(followed_file, 'w').close()
+    writer_progress = {'is_writing': True}
+
+    def write_record_by_chunks():
+        """Writes the record by chunks splitting the lines, as the stap process would"""
+        with open(followed_file, 'a') as followed_handle:
+            for i in range(0, len(record_content), 7):
+                followed_handle.write(record_content[i:i+7])
+                followed_handle.flush()
+                time.sleep(0.01)
+        writer_progress['is_writing'] = False
+
+    writer = threading.Thread(target=write_record_by_chunks)
+    writer.start()
+    followed_resources = list(stap.trace_to_profile(
+        followed_file, func, static, is_writing=lambda: writer_progress['is_writing'], workload='w'
+    ))
+    writer.join()
+    assert followed_resources == resources
+
+
+def test_trace_decoder(tmpdir):
+    """Test decoding the output of trace collector by blocks of lines
+
+    Expecting the same records regardless of the boundaries of the blocks
+    """
+    record_file = os.path.join(os.path.dirname(__file__), 'collect_trace', 'tst_stap_record.txt')
+    with open(record_file, 'rb') as record_handle:
+        whole_blocks = list(decoder.read_trace_blocks(record_handle))
+        record_handle.seek(0)
+        content = record_handle.read()
+    assert b''.join(whole_blocks) == content[:content.rfind(b'end')]
+
+    name_table = decoder.NameTable()
+    records = decoder.decode_block(b''.join(whole_blocks), name_table)
+    assert list(records[0]) == [0, 1, 0, 5898, name_table.ids['main']]
+    assert records['offset'].max() == 2
+
+    with open(record_file, 'rb') as record_handle:
+        split_records = [
+            decoder.decode_block(block, name_table)
+            for block in decoder.read_trace_blocks(record_handle, block_size=13)
+        ]
+    assert (numpy.concatenate(split_records) == records).all()
+
+    # Test that the pairing of the records from different blocks is the same as at once
+    func = [{'name': 'main', 'sample': 1}, {'name': '_Z12QuickSortBadPii', 'sample': 2}]
+    pairing = decoder.FuncRecordPairing(func)
+    func_records = records[records['type'] <= 1]
+    begins, sequences, ends = pairing.pair(func_records, name_table)
+    assert len(begins) == len(ends) == len(func_records) // 2
+    assert (func_records[ends]['offset'] == begins['offset'] - 1).all()
+    assert sorted(sequences[begins['name'] == name_table.ids['_Z12QuickSortBadPii']]) == [0, 2, 4]
+
+    split_pairing = decoder.FuncRecordPairing(func)
+    split_begins = [split_pairing.pair(func_records[i:i+3], name_table)[0:2]
+                    for i in range(0, len(func_records), 3)]
+    assert (numpy.concatenate([b for (b, _) in split_begins]) == begins).all()
+    assert (numpy.concatenate([s for (_, s) in split_begins]) == sequences).all()
+
+    # Test malformed records
+    with pytest.raises(ValueError):
+        decoder.decode_block(b'7      0 quicksort(5898): main\n', name_table)
+    with pytest.raises(ValueError):
+        decoder.decode_block(b'0      0 quicksort(5898) main\n', name_table)
+    with pytest.raises(exceptions.TraceStackException) as exc:
+        decoder.FuncRecordPairing([]).pair(decoder.decode_block(
+            b'0  1 quicksort(5898): main\n1  2 quicksort(5898): \n', name_table
+        ), name_table)
+    assert "name='main'" in str(exc.value)
+
+
+def test_trace_binary_output(tmpdir):
+    """Test the binary output format of the trace collector
+
+    Expecting the script printing the binary records with the probe ids and the same resources
+    as from the text output
+    """
+    script_file = os.path.join(str(tmpdir), 'script.stp')
+    names_file = os.path.join(str(tmpdir), 'names.json')
+    static = [
+        {'name': 'BEFORE_CYCLE', 'pair': 'BEFORE_CYCLE_end', 'sample': 1},
+        {'name': 'INSIDE_CYCLE', 'sample': 1}
+    ]
+    stap_script.assemble_system_tap_script(
+        script_file, [{'name': 'main', 'sample': 1}], static, [], '/bin/ls', output_format='binary',
+        names_path=names_file
+    )
+    with open(names_file, 'r') as names_handle:
+        probe_names = json.load(names_handle)
+    assert probe_names == ['main', 'BEFORE_CYCLE', 'BEFORE_CYCLE_end', 'INSIDE_CYCLE']
+    with open(script_file, 'r') as script_handle:
+        script = script_handle.read()
+    binary_format = stap_script.BINARY_RECORD_FORMAT
+    assert 'printf("{}", 0, stack_depth[tid()], 0,'.format(binary_format) in script
+    assert 'printf("{}", 255, 0, 0,'.format(binary_format) in script
+    assert 'printf("end\\n")' not in script
+
+    # Convert the recorded text output to the binary one
+    record_file = os.path.join(os.path.dirname(__file__), 'collect_trace', 'tst_stap_record.txt')
+    with open(record_file, 'rb') as record_handle:
+        name_table = decoder.NameTable()
+        text_blocks = b''.join(decoder.read_trace_blocks(record_handle))
+    records = decoder.decode_block(text_blocks, name_table)
+    with open(names_file, 'w') as names_handle:
+        json.dump(name_table.names, names_handle)
+    binary_records = numpy.zeros(len(records) + 1, dtype=decoder.BINARY_RECORD_DTYPE)
+    for field in ('type', 'offset', 'timestamp', 'thread'):
+        binary_records[field][:-1] = records[field]
+    binary_records['name'][:-1] = numpy.maximum(records['name'], 0)
+    binary_records['type'][-1] = stap_script.BINARY_END_TYPE
+    binary_file = os.path.join(str(tmpdir), 'record.bin')
+    binary_records.tofile(binary_file)
+    assert decoder.is_binary_output_complete(binary_file)
+
+    static = [
+        {'name': 'BEFORE_CYCLE', 'pair': 'BEFORE_CYCLE_end', 'sample': 1},
+        {'name': 'BEFORE_CYCLE_end', 'sample': 1},
+        {'name': 'INSIDE_CYCLE', 'sample': 1}
+    ]
+    func = [{'name': 'main', 'sample': 1}]
+    resources = list(stap.trace_to_profile(record_file, func, static, workload='w'))
+    binary_resources = list(stap.trace_to_profile(
+        binary_file, func, static, output_format='binary', names_path=names_file, workload='w'
+    ))
+    assert binary_resources == resources
+
+    # Test that the records split between the blocks are read whole
+    with open(binary_file, 'rb') as binary_handle:
+        split_records = list(decoder.read_binary_blocks(binary_handle, block_size=50))
+    assert (numpy.concatenate(split_records) == binary_records[:-1]).all()
+
+    # Test truncated and malformed records
+    truncated_file = os.path.join(str(tmpdir), 'truncated.bin')
+    with open(truncated_file, 'wb') as truncated_handle:
+        truncated_handle.write(binary_records[:2].tobytes() + b'\0')
+    assert not decoder.is_binary_output_complete(truncated_file)
+    with open(truncated_file, 'rb') as truncated_handle:
+        with pytest.raises(ValueError):
+            list(decoder.read_binary_blocks(truncated_handle))
+    binary_records['name'][0] = len(name_table.names)
+    with pytest.raises(ValueError):
+        decoder.decode_binary_records(binary_records[:1], numpy.arange(len(name_table.names)))
+
+
+def test_trace_aggregated(tmpdir):
+    """Test the on-line aggregation of the resources of trace collector
+
+    Expecting the aggregated statistics to match the statistics of the separate resources,
+    regardless of the blocks of the output
+    """
+    record_file = os.path.join(os.path.dirname(__file__), 'collect_trace', 'tst_stap_record.txt')
+    static = [
+        {'name': 'BEFORE_CYCLE', 'pair': 'BEFORE_CYCLE_end', 'sample': 1},
+        {'name': 'BEFORE_CYCLE_end', 'sample': 1},
+        {'name': 'INSIDE_CYCLE', 'sample': 1}
+    ]
+    func = [{'name': 'main', 'sample': 1}]
+    resources = list(stap.trace_to_profile(record_file, func, static, workload='w'))
+
+    for bucket_width in (1, 2, 1000):
+        expected_groups = collections.defaultdict(list)
+        for resource in resources:
+            key = (resource['uid'], resource.get('thread'),
+                   resource['structure-unit-size'] // bucket_width * bucket_width)
+            expected_groups[key].append(resource['amount'])
+
+        aggregated = list(stap.trace_to_profile(
+            record_file, func, static, aggregate=True, bucket_width=bucket_width, workload='w'
+        ))
+        assert len(aggregated) == len(expected_groups)
+        for resource in aggregated:
+            amounts = expected_groups[
+                (resource['uid'], resource.get('thread'), resource['structure-unit-size'])
+            ]
+            assert resource['count'] == len(amounts) == sum(resource['histogram'])
+            assert resource['sum'] == sum(amounts)
+            assert resource['amount'] == sum(amounts) / len(amounts)
+            assert (resource['min'], resource['max']) == (min(amounts), max(amounts))
+            assert resource['histogram'][max(amounts).bit_length()] > 0
+            assert resource['workload'] == 'w'
+
+    # Test that the aggregation over the blocks is the same as at once
+    resource_aggregator = aggregator.ResourceAggregator(10)
+    uids, threads = [0, 1, 0, 0, 1, 0], [5, 5, 5, 6, 5, 5]
+    sizes, amounts = [0, 3, 9, 1, 14, 10], [0, 1, 7, 8, 2, 1024]
+    resource_aggregator.add(uids[:3], threads[:3], sizes[:3], amounts[:3])
+    resource_aggregator.add(uids[3:], threads[3:], sizes[3:], amounts[3:])
+    name_table = decoder.NameTable()
+    name_table.intern('f')
+    name_table.intern('g')
+    assert [(r['uid'], r['thread'], r['structure-unit-size'], r['count'], r['histogram'])
+            for r in resource_aggregator.resources(name_table, '')] == [
+        ('f', 5, 0, 2, [1, 0, 0, 1]), ('f', 5, 10, 1, [0] * 11 + [1]),
+        ('f', 6, 0, 1, [0, 0, 0, 0, 1]), ('g', 5, 0, 1, [0, 1]), ('g', 5, 10, 1, [0, 0, 1])
+    ]
+
+
+def test_trace_probe_cache(monkeypatch, pcs_full):
+    """Test caching of the probes extracted from the binary by the trace strategies
+
+    Expecting the probes to be extracted only once for the same binary
+    """
+    binary = os.path.join(os.path.dirname(__file__), 'collect_trace', 'tst')
+    extractions = collections.Counter()
+
+    def counted(extractor):
+        """Counts the calls of the extractor"""
+        def wrapper(*args):
+            extractions[extractor.__name__] += 1
+            return extractor(*args)
+        return wrapper
+
+    monkeypatch.setattr(strategy, '_extract_function_symbols',
+                        counted(strategy._extract_function_symbols))
+    monkeypatch.setattr(strategy, '_static_stap_extractor', counted(
+        lambda _: 'process("{}").mark("BEFORE_CYCLE")\n'.format(binary)
+    ))
+
+    user_functions = strategy._extract_functions(binary, 'userspace', 1)
+    assert {'name': 'main', 'sample': 1} in user_functions
+    assert strategy._extract_static_probes(binary, 2) == [{'name': 'BEFORE_CYCLE', 'sample': 2}]
+    assert strategy._extract_functions(binary, 'userspace', 1) == user_functions
+    all_functions = strategy._extract_functions(binary, 'all', 3)
+    assert len(all_functions) > len(user_functions)
+    assert strategy._extract_static_probes(binary, 2) == [{'name': 'BEFORE_CYCLE', 'sample': 2}]
+    assert list(extractions.values()) == [1, 1]
+
+    identifier = utils.get_binary_identifier(binary)
+    assert identifier.startswith('build-id-')
+    readelf_output = subprocess.check_output(['readelf', '-n', binary]).decode('utf-8')
+    assert 'Build ID: ' + identifier[len('build-id-'):] in readelf_output
+
+    # Only the headers and notes are read for the build-id, not the whole binary
+    read_sizes = []
+    with open(binary, 'rb') as binary_handle:
+        original_read = binary_handle.read
+        binary_handle.read = lambda size: read_sizes.append(size) or original_read(size)
+        assert 'build-id-' + utils.get_elf_build_id(binary_handle) == identifier
+    assert sum(read_sizes) < os.path.getsize(binary) // 4
+    cache_files = os.listdir(pcs.get_cache_directory())
+    assert cache_files == ['trace-probes-{}.json'.format(identifier)]
+
+    # The demangled names of all of the function symbols are cached as well
+    with open(os.path.join(pcs.get_cache_directory(), cache_files[0]), 'r') as cache_handle:
+        cached_functions = json.load(cache_handle)['functions']
+    assert len(cached_functions['demangled']) == len(cached_functions['all'])
+
+    # Test the binaries without build-id and missing extraction tools
+    assert utils.get_binary_identifier(os.path.join(os.path.dirname(__file__), 'collect_trace',
+                                                    'tst_stap_record.txt')).startswith('sha1-')
+    monkeypatch.setattr(strategy, '_static_stap_extractor', lambda _: None)
+    monkeypatch.setattr(utils, 'get_binary_identifier', lambda _: 'other')
+    assert strategy._extract_static_probes(binary, 2) == []
+    assert len(os.listdir(pcs.get_cache_directory())) == 1
+
+    # Only the caches of the most recently used binaries are kept
+    monkeypatch.setattr(strategy, '_MAX_PROBE_CACHES', 2)
+    monkeypatch.setattr(strategy, '_static_stap_extractor', lambda _: '')
+    os.utime(os.path.join(pcs.get_cache_directory(), cache_files[0]), (0, 0))
+    for (i, other_identifier) in enumerate(['first', 'second', 'third']):
+        monkeypatch.setattr(utils, 'get_binary_identifier', lambda _: other_identifier)
+        strategy._extract_static_probes(binary, 2)
+        # Separate the times of the last use of the caches
+        cache_path = os.path.join(
+            pcs.get_cache_directory(), 'trace-probes-{}.json'.format(other_identifier)
+        )
+        os.utime(cache_path, (i + 1, i + 1))
+    assert sorted(os.listdir(pcs.get_cache_directory())) == [
+        'trace-probes-second.json', 'trace-probes-third.json'
+    ]
+
+
+def _generate_synthetic_trace(trace_file, calls, threads, names):
+    """Generates synthetic output of trace collector with nested function calls
+
+    :param str trace_file: path to the generated output
+    :param int calls: number of generated function calls
+    :param int threads: number of threads calling the functions
+    :param list names: list of function names
+    """
+    generator = random.Random(42)
+    stacks = [[] for _ in range(threads)]
+    timestamp = 0
+    with open(trace_file, 'w') as trace_handle:
+        while calls or any(stacks):
+            thread = generator.randrange(threads)
+            stack = stacks[thread]
+            timestamp += generator.randint(1, 30)
+            if stack and (not calls or len(stack) > 20 or generator.random() < 0.5):
+                stack.pop()
+                trace_handle.write('1 {:>10} synthetic({}):{}\n'.format(
+                    timestamp, thread, ' ' * len(stack)
+                ))
+            elif calls:
+                name = generator.choice(names)
+                trace_handle.write('0 {:>10} synthetic({}): {}{}\n'.format(
+                    timestamp, thread, ' ' * len(stack), name
+                ))
+                stack.append(name)
+                calls -= 1
+        trace_handle.write('end\n')
+
+
+def _pair_trace_by_lines(trace_file, func):
+    """Parses and pairs the function records line by line, as the trace collector used to
+
+    :param str trace_file: path to the output of trace collector
+    :param list func: the function probe specifications
+    :return list: list of pairs of begin records (with sequence numbers) and end records
+    """
+    sequence_map = {record['name']: {'seq': 0, 'sample': record['sample']} for record in func}
+    trace_stacks = collections.defaultdict(list)
+    pairs = []
+    with open(trace_file, 'r') as trace_handle:
+        for line in trace_handle.read().splitlines(keepends=True):
+            if line in ('end', 'end\n'):
+                break
+            left, _, right = line.partition(':')
+            left = left.split()
+            right = right.rstrip('\n')
+            name = right.lstrip(' ')
+            record = decoder.TraceRecord(
+                RecordType(int(left[0])), len(right) - len(name), name, left[1],
+                int(left[2][left[2].rfind('(') + 1:-1]), 0
+            )
+            trace_stack = trace_stacks[record.thread]
+            if record.type == RecordType.FuncBegin:
+                sequence = sequence_map.setdefault(record.name, {'seq': 0, 'sample': 1})
+                trace_stack.append(record._replace(sequence=sequence['seq']))
+                sequence['seq'] += sequence['sample']
+            elif trace_stack and record.offset == trace_stack[-1].offset - 1:
+                pairs.append((trace_stack.pop(), record))
+            else:
+                raise exceptions.TraceStackException(record, trace_stack)
+    return pairs
+
+
+def _trace_to_resources_by_lines(trace_file, func):
+    """Transforms the records paired line by line to the resources, as the trace collector used to
+
+    :param str trace_file: path to the output of trace collector
+    :param list func: the function probe specifications
+    :return list: list of resources
+    """
+    return [
+        {'amount': int(record.timestamp) - int(matching_record.timestamp),
+         'uid': matching_record.name,
+         'type': 'mixed',
+         'subtype': 'time delta',
+         'thread': record.thread,
+         'structure-unit-size': matching_record.sequence,
+         'workload': ''}
+        for matching_record, record in _pair_trace_by_lines(trace_file, func)
+    ]
+
+
+def _assert_same_resources(trace_file, func):
+    """Asserts that the block decoder produces the same resources as the per-line parsing
+
+    :param str trace_file: path to the output of trace collector
+    :param list func: the function probe specifications
+    """
+    try:
+        expected_resources = _trace_to_resources_by_lines(trace_file, func)
+    except exceptions.TraceStackException:
+        with pytest.raises(exceptions.TraceStackException):
+            list(stap.trace_to_profile(trace_file, func, []))
+    else:
+        assert list(stap.trace_to_profile(trace_file, func, [])) == expected_resources
+
+
+def test_trace_decoder_lines(tmpdir):
+    """Test decoding of the output of trace collector by blocks against the per-line parsing
+
+    Expecting the same resources for synthetic outputs, for empty and truncated outputs and for
+    outputs with unpaired records, and errors for unpaired exits of functions.
+    """
+    names = ['_Z{0}function{0}Pii'.format(i) for i in range(100)]
+    func = [{'name': name, 'sample': (i % 3) + 1} for (i, name) in enumerate(names[:50])]
+    trace_file = os.path.join(str(tmpdir), 'synthetic_record.txt')
+    for calls, threads in ((20000, 4), (5000, 1)):
+        _generate_synthetic_trace(trace_file, calls, threads, names)
+        _assert_same_resources(trace_file, func)
+
+    # Truncated outputs, without the end marker, cut after the line and within the name
+    with open(trace_file, 'r') as trace_handle:
+        lines = trace_handle.readlines()[:-1]
+    begin_line = next(i for i in range(len(lines) // 2, len(lines)) if lines[i][0] == '0')
+    for truncated_output in (lines[:begin_line], lines[:begin_line] + [lines[begin_line][:-5]]):
+        with open(trace_file, 'w') as trace_handle:
+            trace_handle.write(''.join(truncated_output))
+        _assert_same_resources(trace_file, func)
+        assert list(stap.trace_to_profile(trace_file, func, []))
+
+    # Empty outputs and outputs with unpaired records
+    outputs = [
+        '', 'end\n',
+        '0 1 synthetic(1): f\n0 2 synthetic(1):  g\n1 3 synthetic(1): \nend\n',
+        '0 1 synthetic(1): f\n0 2 synthetic(2): g\n1 4 synthetic(1):\nend\n',
+        '0 1 synthetic(1): f\n1 2 synthetic(1):\n1 3 synthetic(1):\nend\n',
+        '1 1 synthetic(1):\nend\n',
+        '0 1 synthetic(1): f\n1 2 synthetic(1):  \nend\n',
+    ]
+    for output in outputs:
+        with open(trace_file, 'w') as trace_handle:
+            trace_handle.write(output)
+        _assert_same_resources(trace_file, func)
@@ -83,6 +83,11 @@ def test_degradation_in_history(pcs_with_degradations):
     result = check.degradation_in_history(head)
     assert check.PerformanceChange.Degradation in [r[0].result for r in result]
 
+    # Test that checking in parallel finds the same changes in the same order
+    parallel_result = check.degradation_in_history(head, jobs=2)
+    assert [(r[0].to_storage_record(), r[1], r[2]) for r in parallel_result] == \
+        [(r[0].to_storage_record(), r[1], r[2]) for r in result]
+
 
 def test_degradation_between_profiles(pcs_with_degradations, capsys):
     """Set of basic tests for testing degradation between profiles
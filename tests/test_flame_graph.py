@@ -5,6 +5,7 @@ import os
 from click.testing import CliRunner
 
 import perun.cli as cli
+import perun.profile.convert as convert
 import perun.profile.factory as profiles
 import perun.view.flamegraph.flamegraph as flamegraphs
 
@@ -41,3 +42,40 @@ def test_flame_graph(pcs_full, valid_profile_pool):
             second_contents = f2.readlines()
 
         assert len(first_contents) == len(second_contents)
+
+
+def test_flame_graph_lazy(pcs_full, valid_profile_pool, monkeypatch):
+    """Test creating flame graph out of the lazily loaded memory profile
+
+    Expecting the view to get the lazy profile, streamed from the file only once, and the same
+    flame graph format as of the fully loaded profile.
+    """
+    runner = CliRunner()
+    streamed_profiles = []
+    stream_resources = profiles.LazyProfile._stream_resources
+
+    def counted_stream_resources(lazy_profile):
+        """Counts the passes through the lazy profile"""
+        streamed_profiles.append(lazy_profile.file_name)
+        return stream_resources(lazy_profile)
+    monkeypatch.setattr(profiles.LazyProfile, '_stream_resources', counted_stream_resources)
+
+    shown_profiles = []
+    monkeypatch.setattr(flamegraphs, 'draw_flame_graph', lambda profile, *_: (
+        shown_profiles.append((profile, convert.to_flame_graph_format(profile)))
+    ))
+
+    for valid_profile in valid_profile_pool:
+        memory_profile = profiles.load_profile_from_file(valid_profile, is_raw_profile=True)
+        if memory_profile['header']['type'] != 'memory':
+            continue
+
+        streamed_profiles.clear()
+        result = runner.invoke(cli.show, [valid_profile, 'flamegraph'])
+        assert result.exit_code == 0
+
+        lazy_profile, flame = shown_profiles.pop()
+        assert isinstance(lazy_profile, profiles.LazyProfile)
+        assert flame == convert.to_flame_graph_format(memory_profile)
+        assert lazy_profile['header'] == memory_profile['header']
+        assert len(streamed_profiles) == 1
@@ -1,3 +1,9 @@
+import io
+import json
+import os
+import pickle
+import zlib
+
 import pytest
 import git
 
@@ -5,6 +11,10 @@ import perun.profile.factory as profiles
 import perun.logic.commands as commands
 import perun.logic.config as config
 import perun.profile.factory as factory
+import perun.profile.cache as cache
+import perun.utils.decorators as decorators
+import perun.utils.streams as streams
+import perun.utils.exceptions as exceptions
 
 __author__ = 'Tomas Fiedor'
 
@@ -32,6 +42,156 @@ def test_loading(helpers, pcs_full, valid_profile_pool):
     assert 'header' in first_indexed.keys()
 
 
+def test_streamed_loading(pcs_full, monkeypatch, postprocess_profiles):
+    """Test loading of the profiles streamed by chunks to the incremental json decoder
+
+    Expecting the profiles are the same as the ones loaded at once
+    """
+    git_repo = git.Repo(pcs_full.get_vcs_path())
+    head = str(git_repo.head.commit)
+    minor_version_profiles = profiles.load_list_for_minor_version(head)
+    loaded_profiles = [profile_info.load() for profile_info in minor_version_profiles]
+
+    monkeypatch.setattr('perun.profile.factory.STREAMED_PROFILE_SIZE', 0)
+    cache.get_profile_cache().clear()
+    streamed_profiles = [profile_info.load() for profile_info in minor_version_profiles]
+    assert streamed_profiles == loaded_profiles
+
+    # Test streaming of the profiles with various sizes of chunks
+    for _, profile in postprocess_profiles:
+        profile_content = factory.to_string(profile)
+        for chunk_size in (1, 7, 1024):
+            chunks = [
+                profile_content[i:i+chunk_size] for i in range(0, len(profile_content), chunk_size)
+            ]
+            streamed_profile = streams.load_json_from_chunks(chunks, factory.RESOURCE_PATHS)
+            assert factory.to_string(streamed_profile) == profile_content
+
+    # Test malformed headers and bodies of stored profiles
+    for malformed_content in (b'profile memory 3\0{}', b'profile memory 2{}', b'perf time 2\0{}'):
+        profile_handle = io.BytesIO(zlib.compress(malformed_content))
+        with pytest.raises(exceptions.IncorrectProfileFormatException) as exc:
+            factory.load_profile_from_handle('prof', profile_handle, False)
+        assert "malformed profile 'prof'" in str(exc.value)
+    profile_handle = io.BytesIO(zlib.compress(b'profile time 3\0{}}'))
+    with pytest.raises(exceptions.IncorrectProfileFormatException) as exc:
+        factory.load_profile_from_handle('prof', profile_handle, False)
+    assert "profile 'prof' is not in profile format" in str(exc.value)
+
+
+def test_streamed_numbers():
+    """Test decoding of the numbers split by the chunks at every possible position
+
+    Expecting the numbers are never decoded only partially, e.g. '1.' ending the chunk as 1
+    """
+    document = json.dumps({
+        'resources': [
+            {'amount': 1.5, 'time': -2.25e-3, 'size': 10, 'ratio': 1e+20, 'uid': 'f'},
+            {'amount': -0.0, 'time': 3E5, 'size': -12345, 'ratio': 123.456e-7, 'uid': 'g'},
+        ],
+        'values': [0.1, -17, 2.5E+10, 6e-8, 42, 1.0],
+        'total': 3.14159
+    })
+    expected = json.loads(document)
+    for chunk_size in range(1, len(document) + 1):
+        chunks = [document[i:i+chunk_size] for i in range(0, len(document), chunk_size)]
+        assert streams.load_json_from_chunks(chunks, [('values', '[]')]) == expected
+        unfolded_paths = [('resources', '[]', 'time'), ('total', )]
+        assert streams.load_json_from_chunks(chunks, unfolded_paths) == expected
+        streamed = list(streams.stream_json_from_chunks(chunks, [('values', '[]')]))
+        assert [value for _, value in streamed] == expected['values']
+    assert streams.load_json_from_chunks(
+        ['{"r": [1.', '5], "x": ', '1}'], [('r', '[]')]
+    ) == {'r': [1.5], 'x': 1}
+
+    # Malformed documents raise the same errors as the json decoder
+    with pytest.raises(ValueError) as exc:
+        streams.load_json_from_chunks(['{\n"r": [1], "x" 2}'], [('r', '[]')])
+    assert "line 2 column 15 (char 16)" in str(exc.value)
+
+
+def reset_profile_cache():
+    """Helper function for resetting the singleton cache of profiles (e.g. for new run of perun)"""
+    for singleton in decorators.registered_singletons:
+        if singleton.__name__ == 'get_profile_cache':
+            singleton.instance = None
+
+
+@pytest.fixture()
+def fresh_profile_cache():
+    """Fixture, which resets the singleton cache of profiles loaded by the previous tests or
+    fixtures, and resets it again after the test
+    """
+    reset_profile_cache()
+    yield
+    reset_profile_cache()
+
+
+def test_profile_cache(pcs_full, fresh_profile_cache, monkeypatch, tmpdir):
+    """Test the cache of loaded profiles addressed by the checksums of their objects
+
+    Expecting the profiles are loaded from the objects at most twice, each lookup returns new copy
+    of the profile, least recently used profiles are evicted and persisted profiles are reused.
+    """
+    git_repo = git.Repo(pcs_full.get_vcs_path())
+    head = str(git_repo.head.commit)
+    minor_version_profiles = profiles.load_list_for_minor_version(head)
+    profile_cache = cache.get_profile_cache()
+    # Listing the profiles of the minor version loads them once, so they are not cached yet
+    assert profile_cache.cache_dir is None
+    assert len(profile_cache) == 0
+
+    loaded_profiles = [profile_info.load() for profile_info in minor_version_profiles]
+    assert len(profile_cache) == len(minor_version_profiles)
+    monkeypatch.setattr(factory, 'load_profile_from_handle', lambda *_: pytest.fail("not cached"))
+    cached_profiles = [profile_info.load() for profile_info in minor_version_profiles]
+    assert cached_profiles == loaded_profiles
+    cached_profiles[0]['header']['type'] = 'modified'
+    assert minor_version_profiles[0].load() == loaded_profiles[0]
+    monkeypatch.undo()
+
+    # Test the eviction of the least recently used profiles
+    checksums = ['{:040x}'.format(i) for i in range(3)]
+    profile_size = len(pickle.dumps(loaded_profiles[0], -1))
+    bounded_cache = cache.ProfileCache(2 * profile_size, str(tmpdir))
+    for checksum in checksums:
+        bounded_cache.put(checksum, loaded_profiles[0])
+        bounded_cache.put(checksum, loaded_profiles[0])
+    assert checksums[0] not in bounded_cache and len(bounded_cache) == 2
+    assert bounded_cache.get(checksums[1]) == loaded_profiles[0]
+    bounded_cache.put(checksums[0], loaded_profiles[0])
+    bounded_cache.put(checksums[0], loaded_profiles[0])
+    assert checksums[2] not in bounded_cache and checksums[1] in bounded_cache
+    assert bounded_cache.size == 2 * profile_size
+    # The persisted profiles are evicted by the sizes of the pickled profiles as well
+    assert bounded_cache.persisted_size == 2 * profile_size
+    assert sorted(os.listdir(str(tmpdir))) == \
+        sorted(checksums[i] + cache.PERSISTED_PROFILE_SUFFIX for i in (0, 2))
+    bounded_cache.put(checksums[2], {'huge': 'a' * bounded_cache.max_size})
+    bounded_cache.put(checksums[2], {'huge': 'a' * bounded_cache.max_size})
+    assert checksums[2] not in bounded_cache
+    assert len(os.listdir(str(tmpdir))) == 2
+    # The profiles loaded only once are not pickled
+    monkeypatch.setattr(pickle, 'dumps', lambda *_: pytest.fail("pickled"))
+    bounded_cache.put(checksums[2], loaded_profiles[0])
+    assert checksums[2] not in bounded_cache
+    monkeypatch.undo()
+
+    # Test the persistent cache shared by the subsequent runs
+    config.runtime().set('profiles.persistent_cache', 'true')
+    reset_profile_cache()
+    minor_version_profiles[0].load()
+    persisted_profile = minor_version_profiles[0].load()
+    cache_dir = cache.get_profile_cache().cache_dir
+    assert cache_dir == os.path.join(pcs_full.get_path(), 'cache')
+    assert len(os.listdir(cache_dir)) == 1
+
+    reset_profile_cache()
+    monkeypatch.setattr(factory, 'load_profile_from_handle', lambda *_: pytest.fail("not cached"))
+    assert minor_version_profiles[0].load() == persisted_profile
+    monkeypatch.undo()
+
+
 def test_name_generation(capsys):
     """Test generation of profile names for various configurations
 
@@ -7,6 +7,7 @@ import pytest
 import perun.utils.exceptions as exceptions
 import perun.profile.convert as convert
 import perun.profile.query as query
+import perun.profile.columnar as columnar
 
 __author__ = 'Tomas Fiedor'
 __coauthored__ = 'Jiri Pavela'
@@ -49,6 +50,40 @@ def test_flame_graph(memory_profiles):
         assert line_no == len(flame_graph)
 
 
+def test_columnar_profile(memory_profiles, query_profiles):
+    """Test conversion of profiles to columnar representation and back
+
+    Expecting the same resources, the same profiles and the same dataframes as for the original
+    profiles.
+    """
+    irregular_profile = {
+        'header': {'type': 'time'},
+        'snapshots': [{'resources': [
+            {'uid': 'main', 'address': 2**53 + 1},
+            {'amount': 1, 'uid': {'function': 'main', 'line': 3}},
+            {'amount': 2.5, 'subtype': 'time', 'address': 0.5}, {'amount': 3, 'order': 1}
+        ]}],
+        'global': {'resources': [{'amount': 'none', 'uid': 'main'}]}
+    }
+    profiles = list(memory_profiles) + [irregular_profile] + [
+        profile for (name, profile) in query_profiles if 'corrupted' not in name
+    ]
+    for profile in profiles:
+        columnar_profile = columnar.ColumnarProfile(profile)
+        assert len(columnar_profile) == len(list(query.all_resources_of(profile)))
+        assert list(query.all_resources_of(columnar_profile)) \
+            == list(query.all_resources_of(profile))
+        assert columnar_profile.to_profile() == profile
+        assert columnar_profile['header'] == profile['header']
+
+        expected_frame = convert.resources_to_pandas_dataframe(profile)
+        columnar_frame = convert.resources_to_pandas_dataframe(columnar_profile)
+        assert sorted(columnar_frame.columns) == sorted(expected_frame.columns)
+        assert len(columnar_frame) == len(expected_frame)
+        for column in expected_frame.columns if len(expected_frame) else []:
+            assert columnar_frame[column].equals(expected_frame[column])
+
+
 def test_heap_map(memory_profiles):
     """Test creation of heap map out of the profile of memory type
 
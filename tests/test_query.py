@@ -6,7 +6,10 @@ Contains tests for query results of various valid / invalid profiles.
 import pytest
 import itertools
 import perun.utils.exceptions as exceptions
+import perun.profile.convert as convert
+import perun.profile.factory as factory
 import perun.profile.query as query
+import perun.vcs as vcs
 
 
 __author__ = "Jiri Pavela"
@@ -292,3 +295,37 @@ def test_unique_model_values(query_profiles):
     # Test key that is not in the models
     unique_values = list(query.unique_resource_values_of(models_profile, 'test'))
     assert not unique_values
+
+
+def test_lazy_profile_resources(query_profiles, pcs_full):
+    """Test iterating through the resources of lazy profiles, streamed from the files
+
+    Expecting the same resources as are iterated in fully loaded profiles.
+    """
+    for profile_name, profile in query_profiles:
+        lazy_profile = factory.LazyProfile(profile_name, True)
+        try:
+            expected_resources = list(query.all_resources_of(profile))
+        except exceptions.IncorrectProfileFormatException:
+            continue
+        assert list(query.all_resources_of(lazy_profile)) == expected_resources
+        assert list(query.all_snapshot_resources_of(lazy_profile)) == [
+            (snapshot, resource) for (snapshot, resource) in expected_resources
+            if snapshot < len(profile.get('snapshots', []))
+        ]
+        assert lazy_profile['header'] == profile['header']
+        assert ('snapshots' in lazy_profile) == ('snapshots' in profile)
+        if profile['header']['type'] == 'memory':
+            expected_stacks = convert.to_flame_graph_format(profile)
+            assert convert.to_flame_graph_format(lazy_profile) == expected_stacks
+
+    # Test streaming the resources from compressed objects
+    minor_version = vcs.get_minor_head()
+    for profile_info in factory.load_list_for_minor_version(minor_version):
+        lazy_profile = profile_info.load(lazy=True)
+        expected_resources = list(query.all_resources_of(profile_info.load()))
+        assert list(query.all_resources_of(lazy_profile)) == expected_resources
+        assert lazy_profile.get('global', {}).get('resources', []) == []
+
+    with pytest.raises(exceptions.IncorrectProfileFormatException):
+        factory.LazyProfile('nonexisting.perf', True)
@@ -7,9 +7,18 @@ Sources (if any) to examples are provided in the test functions.
 The postprocessby CLI is tested in test_cli module.
 """
 
+import copy
+import json
+import math
+import multiprocessing
+
+import numpy as np
 import pytest
 
 import perun.utils.exceptions as exceptions
+import perun.postprocess.regression_analysis.data_provider as data_provider
+import perun.postprocess.regression_analysis.engine as engine
+import perun.postprocess.regression_analysis.methods as methods
 from perun.postprocess.regression_analysis.run import postprocess
 
 __author__ = 'Jiri Pavela'
@@ -332,3 +341,233 @@ def test_exp_model(postprocess_profiles):
     compare_results(model['r_square'], 1.0)
     compare_results([c['value'] for c in model['coeffs'] if c['name'] == 'b0'][0], 1.0)
     compare_results([c['value'] for c in model['coeffs'] if c['name'] == 'b1'][0], 2.0)
+
+
+def test_vectorised_engine():
+    """Test the vectorised engine against the naive point-by-point computation of the sums.
+
+    Expecting the points outside of the domain of the transformations to be masked out and the
+    sums of the steps to be cumulative.
+    """
+    x_pts = [0, 3, -1, 2, 5, 1, 4, 8]
+    y_pts = [1, 2, 3, 4, 5, 6, 7, 8]
+    points = engine.RegressionPoints(x_pts, y_pts)
+
+    # The logarithm masks out the non-positive x coordinates
+    x_values, y_values, mask = points.transformed(np.log, np.log10)
+    assert mask.tolist() == [x > 0 for x in x_pts]
+    assert points.transformed(np.log, np.log10)[2] is mask
+
+    # Two steps: [0, 4) and [4, 8), the second step continues the first one
+    def terms(terms_points, f_x, f_y):
+        x_terms, y_terms, mask_terms = terms_points.transformed(f_x, f_y)
+        return [x_terms, x_terms * y_terms, mask_terms]
+    x_sums, xy_sums, counts = points.cumulative_sums(2, terms, np.log, np.log10)
+    valid = [(math.log(x), math.log10(y)) for x, y in zip(x_pts, y_pts) if x > 0]
+    valid_head = [(math.log(x), math.log10(y)) for x, y in zip(x_pts[:4], y_pts[:4]) if x > 0]
+    compare_results(x_sums[0], sum(x for x, _ in valid_head))
+    compare_results(x_sums[1], sum(x for x, _ in valid))
+    compare_results(xy_sums[1], sum(x * y for x, y in valid))
+    assert counts == [2, len(valid)]
+
+    # The interval of x coordinates ignores the masked out points (except the first one)
+    assert points.cumulative_interval(2, np.log, np.log10) == ([0, 0], [3, 8])
+
+    # The selection keeps the cached transformations
+    sorted_points = points.sorted()
+    assert sorted_points.x_pts.tolist() == sorted(x_pts)
+    assert sorted_points.transformed(np.log, np.log10)[2].tolist() == [
+        x > 0 for x in sorted(x_pts)
+    ]
+
+    # The methods compute the models on the points with masked out points
+    models = list(methods.full_computation(x_pts, y_pts, ('linear', 'logarithmic')))
+    assert [model['pts_num'] for model in models] == [len(x_pts), len(valid)]
+
+
+def test_prefix_sums():
+    """Test the sums over the parts of the points computed from the prefix sums.
+
+    Expecting the same sums and intervals of the parts (and their parts) as computed directly
+    from the points of the parts.
+    """
+    x_pts = [7, 0, 3, -1, 2, 5, 1, 4, 8, 6, 9, 2]
+    y_pts = [y * 1.5 + 1 for y in range(len(x_pts))]
+    points = engine.RegressionPoints(x_pts, y_pts).sorted()
+    sorted_pts = sorted(zip(x_pts, y_pts), key=lambda point: point[0])
+
+    def terms(terms_points, f_x, f_y):
+        x_terms, y_terms, mask_terms = terms_points.transformed(f_x, f_y)
+        return [mask_terms, x_terms * y_terms]
+
+    # The parts of the parts share the prefix sums of the sorted points
+    for start, end in [(0, 12), (2, 9), (5, 12)]:
+        part = points[start:end]
+        for sub_start, sub_end in [(0, end - start), (1, 5), (3, end - start)]:
+            sub_part = part[sub_start:sub_end]
+            expected = [
+                (x, y) for x, y in sorted_pts[start + sub_start:start + sub_end] if x > 0
+            ]
+            counts, xy_sums = sub_part.cumulative_sums(1, terms, np.log, np.log10)
+            assert counts == [len(expected)]
+            compare_results(xy_sums[0], sum(math.log(x) * math.log10(y) for x, y in expected))
+            # The interval starts at the first point and ends at the last point in the domain
+            assert sub_part.cumulative_interval(1, np.log, np.log10) == (
+                [sorted_pts[start + sub_start][0]], [max([x for x, _ in expected] or [
+                    sorted_pts[start + sub_start][0]
+                ])]
+            )
+    assert len(points._root._prefix_sums) == 1
+
+    # The unsorted points are summed by the steps directly, without keeping the prefix sums
+    unsorted = engine.RegressionPoints(x_pts, y_pts)
+    counts, xy_sums = unsorted.cumulative_sums(3, terms, np.log, np.log10)
+    assert counts == [sum(1 for x in x_pts[:end] if x > 0) for end in (4, 8, 12)]
+    compare_results(xy_sums[-1], sum(
+        math.log(x) * math.log10(y) for x, y in zip(x_pts, y_pts) if x > 0
+    ))
+    assert not unsorted._prefix_sums
+
+    # The bisection computes the same models as the full computation of the intervals
+    x_pts = list(range(1, 65))
+    y_pts = [x if x <= 32 else 32 + (x - 32) ** 2 for x in x_pts]
+    for model in methods.bisection_computation(x_pts, y_pts, ('linear', 'quadratic')):
+        start, end = x_pts.index(model['x_interval_start']), x_pts.index(model['x_interval_end'])
+        full_model = [
+            full for full in methods.full_computation(
+                x_pts[start:end + 1], y_pts[start:end + 1], (model['model'], )
+            )
+        ][0]
+        compare_results(model['r_square'], full_model['r_square'])
+        for coeff, full_coeff in zip(model['coeffs'], full_model['coeffs']):
+            compare_results(coeff, full_coeff)
+
+
+def test_parallel_computation(postprocess_profiles):
+    """Test the computation of uids by the pool of processes.
+
+    Expecting the same models in the same order as by the sequential computation.
+    """
+    uids = [
+        ('uid{}'.format(i), list(range(1, 21)), [i * x * x + x for x in range(1, 21)])
+        for i in range(10)
+    ]
+    # Too few points for any model of the last uid
+    uids.append(('few', [1], [1]))
+    chunks = [(x_pts, y_pts, uid) for uid, x_pts, y_pts in uids]
+    for method in ('full', 'bisection'):
+        sequential = methods.compute(iter(chunks), method, ('all', ), steps=3)
+        parallel = methods.compute(iter(chunks), method, ('all', ), jobs=3, steps=3)
+        assert parallel == sequential
+        assert 'few' not in {model['uid'] for model in parallel}
+        assert {model['model'] for model in parallel} >= {'linear', 'quadratic', 'constant'}
+
+    # The processes started without the fork do not inherit the shared points
+    multiprocessing.set_start_method('spawn', force=True)
+    try:
+        spawned = methods.compute(iter(chunks), 'full', ('all', ), jobs=2, steps=3)
+    finally:
+        multiprocessing.set_start_method('fork', force=True)
+    assert spawned == methods.compute(iter(chunks), 'full', ('all', ), steps=3)
+
+    # Shared points keep the types of coordinates
+    shared = engine.SharedPoints([
+        engine.RegressionPoints([1, 2, 3], [1.5, 2.5, 3.5]), engine.RegressionPoints([4], [5])
+    ])
+    assert len(shared) == 2
+    assert shared[0].x_pts.tolist() == [1, 2, 3] and shared[0].x_pts.dtype.kind == 'i'
+    assert shared[0].y_pts.tolist() == [1.5, 2.5, 3.5]
+    assert shared[1].x_pts.tolist() == [4] and shared[1].y_pts.tolist() == [5]
+
+    # Run the analysis through the postprocessor
+    const_model = profile_filter(postprocess_profiles, 'const_model')
+    code, _, profile = postprocess(
+        const_model, method='full', regression_models=[], steps=1, jobs=2,
+        of_key='amount', per_key='structure-unit-size')
+    assert code.value == 0
+    assert len(profile['profile']['global']['models']) > 0
+
+
+def test_group_resources_by_uid():
+    """Test grouping of the points of resources by uids in one pass.
+
+    Expecting the groups ordered by uids with points in the order of resources.
+    """
+    profile = {'global': {'resources': [
+        {'uid': 'b', 'amount': 1, 'structure-unit-size': 10},
+        {'uid': 'a', 'amount': 2, 'structure-unit-size': 20},
+        {'uid': 'b', 'amount': 3.5, 'structure-unit-size': 30},
+        {'uid': ['c', 'd'], 'amount': 4, 'structure-unit-size': 40},
+        {'uid': 'a', 'amount': 5, 'structure-unit-size': 50},
+    ]}, 'header': {'type': 'time'}}
+    groups = data_provider.group_resources_by_uid(profile, 'amount', 'structure-unit-size')
+    assert [uid for _, _, uid in groups] == ['a', 'b', 'c,d']
+    assert [(x.tolist(), y.tolist()) for x, y, _ in groups] == [
+        ([20, 50], [2, 5]), ([10, 30], [1.0, 3.5]), ([40], [4])
+    ]
+    assert groups[0][1].dtype.kind == 'i'
+
+    provided = list(data_provider.data_provider_mapper(
+        profile, of_key='amount', per_key='structure-unit-size'
+    ))
+    assert [uid for _, _, uid in provided] == ['a', 'b', 'c,d']
+
+
+def test_incremental_computation(postprocess_profiles, tmpdir):
+    """Test the incremental computation of the models from the statistics of base models.
+
+    Expecting the same models as by full computation over all of the points.
+    """
+    x_pts = list(range(1, 41))
+    y_pts = [3 * x * x + x % 7 for x in x_pts]
+    old_chunks = [(x_pts[:30], y_pts[:30], 'uid'), (x_pts, y_pts, 'old')]
+    new_chunks = [(x_pts[30:], y_pts[30:], 'uid')]
+    all_chunks = [(x_pts, y_pts, 'old'), (x_pts, y_pts, 'uid')]
+
+    base_models = methods.compute(iter(old_chunks), 'full', ('all', ))
+    assert all('statistics' in model for model in base_models if model['model'] != 'constant')
+    incremental = methods.compute(iter(new_chunks), 'full', ('all', ), base_models=base_models)
+    full = methods.compute(iter(all_chunks), 'full', ('all', ))
+
+    def by_uid_and_model(models):
+        return {(model['uid'], model['model']): model for model in models}
+    incremental, full = by_uid_and_model(incremental), by_uid_and_model(full)
+    assert incremental.keys() == full.keys()
+    for key, model in full.items():
+        compare_results(model['r_square'], incremental[key]['r_square'])
+        for coeff, incremental_coeff in zip(model['coeffs'], incremental[key]['coeffs']):
+            compare_results(
+                coeff['value'], incremental_coeff['value'], eps=abs(coeff['value']) * 1e-6 + 1e-9
+            )
+        assert model['x_interval_start'] == incremental[key]['x_interval_start']
+        assert model['x_interval_end'] == incremental[key]['x_interval_end']
+        assert model.get('statistics', {}).get('pts_num') == \
+            incremental[key].get('statistics', {}).get('pts_num')
+
+    # Only one new point is needed for the update
+    one_point = methods.compute(
+        iter([([41], [3 * 41 * 41], 'uid')]), 'full', ('linear', ), base_models=base_models
+    )
+    assert [model['statistics']['pts_num'] for model in one_point if model['uid'] == 'uid'] == [31]
+
+    # Other methods than full are not supported
+    with pytest.raises(exceptions.UnsupportedIncrementalMethodException):
+        methods.compute(iter(new_chunks), 'interval', ('all', ), base_models=base_models)
+
+    # Run the incremental analysis through the postprocessor
+    const_model = profile_filter(postprocess_profiles, 'const_model')
+    _, _, base_profile = postprocess(
+        copy.deepcopy(const_model), method='full', regression_models=['linear'], steps=1,
+        of_key='amount', per_key='structure-unit-size')
+    base_file = tmpdir.join('base.perf')
+    base_file.write(json.dumps(base_profile['profile']))
+    code, _, profile = postprocess(
+        const_model, method='full', regression_models=['linear'], steps=1,
+        incremental_from=str(base_file), of_key='amount', per_key='structure-unit-size')
+    assert code.value == 0
+    models = [m for m in profile['profile']['global']['models'] if 'statistics' in m]
+    base_models = {m['uid']: m for m in base_profile['profile']['global']['models']}
+    assert all(
+        model['statistics']['pts_num'] == 2 * base_models[model['uid']]['statistics']['pts_num']
+        for model in models
+    )
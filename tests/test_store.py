@@ -1,7 +1,12 @@
 import os
+import struct
+import zlib
 import pytest
 
 import perun.logic.store as store
+import perun.utils.timestamps as timestamps
+import perun.profile.factory as factory
+import perun.profile.query as query
 import perun.utils.helpers as helpers
 import perun.utils.exceptions as exceptions
 
@@ -33,3 +38,218 @@ def test_correct_index(tmpdir):
     index_file = os.path.join(str(tmpdir), "index")
     store.touch_index(index_file)
     store.print_index(index_file)
+
+
+@pytest.mark.usefixtures('cleandir')
+def test_index_records(tmpdir, monkeypatch):
+    """Test registering and removing of many entries in the index
+
+    Expecting entries walked sorted by path and time, in spite of being appended unsorted,
+    no duplicate entries, and deleted entries skipped and eventually compacted.
+    """
+    index_dir, index_file = store.split_object_name(str(tmpdir), "index")
+    store.touch_dir(index_dir)
+    store.touch_index(index_file)
+    entries = [
+        helpers.IndexEntry(
+            timestamps.timestamp_to_str(1500000000 + (entry_no * 7) % 13),
+            "{:040x}".format(entry_no), "profile-{}.perf".format((entry_no * 31) % 50), -1
+        ) for entry_no in range(200)
+    ]
+    for entry in entries:
+        store.write_entry_to_index(index_file, entry)
+    store.write_entry_to_index(index_file, entries[42])
+
+    def entry_keys(walked_entries):
+        """Helper function for getting the path, time and checksum of entries"""
+        return [(entry.path, entry.time, entry.checksum) for entry in walked_entries]
+    unique_entries = {(entry.path, entry.time): entry for entry in reversed(entries)}
+    with open(index_file, 'rb') as index_handle:
+        assert store.read_number_of_entries_from_handle(index_handle) == len(unique_entries)
+        number_of_records, number_of_sorted_records = store.read_index_counts(index_handle)
+        assert number_of_records - number_of_sorted_records <= \
+            max(helpers.INDEX_MINIMAL_UNSORTED_RECORDS, number_of_records ** 0.5)
+        assert entry_keys(store.walk_index(index_handle)) \
+            == sorted(entry_keys(unique_entries.values()))
+
+    store.remove_from_index(str(tmpdir), "index", ["profile-1.perf"], remove_all=True)
+    store.remove_from_index(str(tmpdir), "index", [entries[2].checksum])
+    remaining_entries = [
+        entry for entry in unique_entries.values()
+        if entry.path != "profile-1.perf" and entry.checksum != entries[2].checksum
+    ]
+    with open(index_file, 'rb') as index_handle:
+        assert store.read_number_of_entries_from_handle(index_handle) == len(remaining_entries)
+        assert entry_keys(store.walk_index(index_handle)) \
+            == sorted(entry_keys(remaining_entries))
+    with pytest.raises(exceptions.EntryNotFoundException):
+        store.remove_from_index(str(tmpdir), "index", [entries[2].checksum])
+
+    # Remove most of the entries, so the index is compacted at once without writing tombstones
+    monkeypatch.setattr(store, 'remove_entries_from_index', lambda *_: pytest.fail("tombstones"))
+    store.remove_from_index(str(tmpdir), "index", [e.checksum for e in remaining_entries[1:]])
+    with open(index_file, 'rb') as index_handle:
+        assert store.read_index_counts(index_handle) == (1, 1)
+        assert entry_keys(store.walk_index(index_handle)) == entry_keys(remaining_entries[:1])
+
+
+@pytest.mark.usefixtures('cleandir')
+def test_legacy_index(tmpdir):
+    """Test reading and upgrading of the index of the legacy version
+
+    Expecting legacy entries walked and the index upgraded to current version once modified.
+    """
+    index_file = os.path.join(str(tmpdir), "index")
+    legacy_entries = [
+        helpers.IndexEntry("2017-08-25 16:03:47", "{:040x}".format(1), "a.perf", -1),
+        helpers.IndexEntry("2017-08-25 16:03:48", "{:040x}".format(2), "b.perf", -1),
+        helpers.IndexEntry("2017-08-25 16:03:48", "{:040x}".format(4), "b\u010d.perf", -1)
+    ]
+    with open(index_file, 'wb') as index_handle:
+        index_handle.write(helpers.INDEX_MAGIC_PREFIX)
+        index_handle.write(struct.pack('ii', helpers.LEGACY_INDEX_VERSION, len(legacy_entries)))
+        for entry in legacy_entries:
+            timestamps.write_timestamp(index_handle, timestamps.str_to_timestamp(entry.time))
+            index_handle.write(bytes.fromhex(entry.checksum))
+            index_handle.write(entry.path.encode('utf-8') + b'\0')
+
+    with open(index_file, 'rb') as index_handle:
+        assert [(e.path, e.checksum) for e in store.walk_index(index_handle)] \
+            == [(e.path, e.checksum) for e in legacy_entries]
+
+    store.write_entry_to_index(index_file, helpers.IndexEntry(
+        "2017-08-25 16:03:49", "{:040x}".format(3), "c.perf", -1
+    ))
+    with open(index_file, 'rb') as index_handle:
+        assert store.read_index_version(index_handle) == helpers.INDEX_VERSION
+        assert [e.path for e in store.walk_index(index_handle)] \
+            == ['a.perf', 'b.perf', 'b\u010d.perf', 'c.perf']
+
+
+@pytest.mark.usefixtures('cleandir')
+def test_shared_index_entries(tmpdir, monkeypatch):
+    """Test sharing of the table of index entries between lookups
+
+    Expecting the index read once, until it is modified or evicted by other indexes.
+    """
+    index_file = os.path.join(str(tmpdir), "index")
+    store.touch_index(index_file)
+    store.write_entry_to_index(index_file, helpers.IndexEntry(
+        "2017-08-25 16:03:47", "{:040x}".format(1), "a.perf", -1
+    ))
+    with open(index_file, 'rb') as index_handle:
+        entries = store.load_index_entries(index_handle)
+        assert store.load_index_entries(index_handle) is entries
+        assert store.lookup_entry_within_index(index_handle, lambda e: e.path == 'a.perf')
+
+    store.write_entry_to_index(index_file, helpers.IndexEntry(
+        "2017-08-25 16:03:48", "{:040x}".format(2), "b.perf", -1
+    ))
+    with open(index_file, 'rb') as index_handle:
+        assert [e.path for e in store.load_index_entries(index_handle)] == ['a.perf', 'b.perf']
+
+    # The entries cached by other process are stale after the removal in place, even though
+    # the size and the modification time of the index are the same
+    index_stat = os.stat(index_file)
+    cached_entries = dict(store.index_entries_cache)
+    with open(index_file, 'rb+') as index_handle:
+        removed_entry = store.lookup_entry_within_index(index_handle, lambda e: e.path == 'b.perf')
+        store.remove_entries_from_index(index_handle, [removed_entry])
+    os.utime(index_file, ns=(index_stat.st_atime_ns, index_stat.st_mtime_ns))
+    assert os.stat(index_file).st_size == index_stat.st_size
+    store.index_entries_cache.update(cached_entries)
+    with open(index_file, 'rb') as index_handle:
+        assert [e.path for e in store.load_index_entries(index_handle)] == ['a.perf']
+
+    # Only the tables of the most recently used indexes are shared
+    monkeypatch.setattr(store, 'MAX_CACHED_INDEXES', 2)
+    index_files = [os.path.join(str(tmpdir), "index{}".format(i)) for i in range(3)]
+    for other_index_file in [index_file] + index_files:
+        if other_index_file != index_file:
+            store.touch_index(other_index_file)
+        with open(other_index_file, 'rb') as index_handle:
+            store.load_index_entries(index_handle)
+    assert list(store.index_entries_cache) == [os.path.realpath(f) for f in index_files[1:]]
+
+
+@pytest.mark.usefixtures('cleandir')
+def test_binary_profiles(tmpdir, memory_profiles, query_profiles):
+    """Test packing of profiles to binary format and loading them back
+
+    Expecting the same profiles after loading, the type of the profile peeked from the header and
+    errors for malformed binary profiles.
+    """
+    # Integers in columns mixed with floats are stored without loss of precision
+    mixed_profile = {
+        'header': {'type': 'memory'},
+        'snapshots': [{'resources': [
+            {'amount': 2**53 + 1, 'address': -2**63}, {'amount': 0.1}, {'address': 2**63 - 1},
+            {'amount': float('inf'), 'address': 1.5}, {'amount': -2**62 - 1, 'address': 2**53 + 3}
+        ]}]
+    }
+    profiles = list(memory_profiles) + [mixed_profile] + [
+        profile for (name, profile) in query_profiles if 'corrupted' not in name
+    ]
+    for profile_no, profile in enumerate(profiles):
+        binary_file = os.path.join(str(tmpdir), "binary{}".format(profile_no))
+        with open(binary_file, 'wb') as binary_handle:
+            binary_handle.write(store.pack_binary_content(profile))
+
+        assert store.peek_profile_type(binary_file) == profile['header']['type']
+        assert factory.load_profile_from_file(binary_file, False) == profile
+        mapped_profile = store.load_binary_profile(binary_file)
+        assert list(query.all_resources_of(mapped_profile)) \
+            == list(query.all_resources_of(profile))
+
+    malformed_file = os.path.join(str(tmpdir), "malformed")
+    with open(malformed_file, 'wb') as malformed_handle:
+        malformed_handle.write(helpers.BINARY_PROFILE_MAGIC_PREFIX + b'\0\0')
+    assert store.peek_profile_type(malformed_file) == helpers.PROFILE_MALFORMED
+    with pytest.raises(exceptions.IncorrectProfileFormatException):
+        factory.load_profile_from_file(malformed_file, False)
+
+
+@pytest.mark.usefixtures('cleandir')
+def test_packed_objects(tmpdir, memory_profiles):
+    """Test packing of loose objects with delta compression
+
+    Expecting objects loaded from pack the same as the loose ones, similar objects delta
+    compressed and the delta reconstructing the same object.
+    """
+    base_dir = str(tmpdir)
+    profile = next(iter(memory_profiles))
+    similar_profile = dict(profile, origin='different')
+    contents = [
+        zlib.compress("profile memory {}\0{}".format(len(p), p).encode('utf-8'))
+        for p in map(factory.to_string, (profile, similar_profile))
+    ] + [store.pack_binary_content(profile)]
+    # Checksums of objects are computed from their decompressed contents
+    checksums = [
+        store.compute_checksum(zlib.decompress(content)) for content in contents[:2]
+    ] + [store.compute_checksum(contents[2])]
+    for checksum, content in zip(checksums, contents):
+        store.add_loose_object_to_dir(base_dir, checksum, content)
+    assert sorted(store.list_loose_objects(base_dir)) == sorted(checksums)
+
+    base, target = (zlib.decompress(content) for content in contents[:2])
+    delta = store.compute_delta(base, target)
+    assert len(delta) < len(contents[1])
+    assert store.apply_delta(base, delta) == target
+
+    store.write_pack(base_dir, [(checksums[0], None), (checksums[1], checksums[0]),
+                                (checksums[2], checksums[0])])
+    for checksum, content in zip(checksums, contents):
+        object_file = store.split_object_name(base_dir, checksum)[1]
+        os.remove(object_file)
+        assert store.object_exists(object_file)
+    assert store.read_packed_object(base_dir, checksums[0]) == (contents[0], False)
+    assert store.read_packed_object(base_dir, checksums[1]) == (target, True)
+    assert store.read_packed_object(base_dir, checksums[2]) == (contents[2], False)
+    assert store.read_packed_object(base_dir, "0"*40) is None
+
+    object_files = [store.split_object_name(base_dir, checksum)[1] for checksum in checksums]
+    assert factory.load_profile_from_file(object_files[1], False) == similar_profile
+    assert factory.load_profile_from_file(object_files[2], False) == profile
+    assert store.peek_profile_type(object_files[1]) == 'memory'
+    assert list(query.all_resources_of(factory.LazyProfile(object_files[1], False))) \
+        == list(query.all_resources_of(profile))